@@ -7,7 +7,6 @@ import re
 import json
 import time
 import sqlite3
-import math
 import psutil
 import wmi
 import requests
@@ -27,6 +26,10 @@ import win32security
 import win32net
 import win32netcon
 
+from server.services.batch_scoring import BatchScorer, ScoringRules
+from server.services.geo_math import haversine_km, nearest
+from server.services.target_set import TargetSet, int_to_ip, iter_bounded
+
 class AdvancedMinerDetector:
     def __init__(self):
         # Ilam province boundaries (more precise)
@@ -102,6 +105,15 @@ class AdvancedMinerDetector:
             r"SYSTEM\currentControlSet\Services"
         ]
         
+        # Suspicion scoring rules (applied per scan batch)
+        self.scorer = BatchScorer(ScoringRules(
+            name='crypto_miner_detector',
+            port_weights={port: 25 for port in self.miner_ports},
+            count_weights={'other_ports': 25, 'banner_hits': 30, 'hostname_hits': 35},
+            thresholds={'report': 5, 'geolocate': 10},
+            strict_thresholds=True
+        ))
+        
         # Initialize WMI connection
         try:
             self.wmi_conn = wmi.WMI()
@@ -508,26 +520,27 @@ class AdvancedMinerDetector:
     
         # Discover active IPs first
         active_ips = []
-        for range_base in ranges:
-            update_progress(f"Scanning range {range_base}.x...")
-        
-            def ping_ip(i):
-                ip = f"{range_base}.{i}"
-                if self.ping_host(ip):
-                    return ip
-                return None
-        
-            # Concurrent ping scanning
-            with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-                futures = [executor.submit(ping_ip, i) for i in range(1, 255)]
-                for future in concurrent.futures.as_completed(futures):
-                    result = future.result()
-                    if result:
-                        active_ips.append(result)
+        update_progress(f"Scanning ranges {', '.join(f'{r}.x' for r in ranges)}...")
+        targets = TargetSet.from_networks(f"{range_base}.0/24" for range_base in ranges)
+    
+        def ping_ip(ip_int):
+            ip = int_to_ip(ip_int)
+            if self.ping_host(ip):
+                return ip
+            return None
+    
+        # Concurrent ping scanning over all ranges with a bounded window of futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
+            for _, future in iter_bounded(executor, ping_ip, targets, window=400):
+                result = future.result()
+                if result:
+                    active_ips.append(result)
     
         update_progress(f"Found {len(active_ips)} active IPs. Performing detailed scan...")
     
         # Detailed scan of active IPs
+        scanned = []
+        records = []
         for ip in active_ips:
             update_progress(f"Scanning {ip}...")
         
@@ -551,34 +564,46 @@ class AdvancedMinerDetector:
             for port in open_ports:
                 service = self.miner_ports.get(port, "Unknown Service")
                 device_info['services'][port] = service
-                device_info['suspicion_score'] += 25
                 device_info['detection_methods'].append(f'port_{port}')
         
             # Banner grabbing
             device_info['banners'] = self.grab_banners(ip, open_ports[:5])  # Limit to first 5 ports
         
             # Check for mining-specific banners
+            banner_hits = 0
             for port, banner in device_info['banners'].items():
                 if any(keyword in banner.lower() for keyword in 
                       ['miner', 'mining', 'stratum', 'cgminer', 'bfgminer']):
-                    device_info['suspicion_score'] += 30
+                    banner_hits += 1
                     device_info['detection_methods'].append('mining_banner')
         
             # Hostname analysis
+            hostname_hits = 0
             if device_info['hostname']:
                 hostname = device_info['hostname'].lower()
                 if any(keyword in hostname for keyword in 
                       ['miner', 'mining', 'asic', 'antminer', 'whatsminer']):
-                    device_info['suspicion_score'] += 35
+                    hostname_hits = 1
                     device_info['detection_methods'].append('suspicious_hostname')
         
+            scanned.append(device_info)
+            records.append({
+                'ports': open_ports,
+                'counts': {'banner_hits': banner_hits, 'hostname_hits': hostname_hits}
+            })
+    
+        # Score all scanned hosts in one vectorized pass
+        scored = self.scorer.score_records(records)
+        for i, device_info in enumerate(scanned):
+            device_info['suspicion_score'] = int(scored.scores[i])
+        
             # Geolocation (only for suspicious devices)
-            if device_info['suspicion_score'] > 10:  # Reduced threshold from 20 to 10
-                device_info['geolocation'] = self.geolocate_ip_sync(ip)
+            if scored.reached('geolocate')[i]:
+                device_info['geolocation'] = self.geolocate_ip_sync(device_info['ip'])
         
-            if device_info['suspicion_score'] > 5:  # Reduced threshold from 10 to 5
+            if scored.reached('report')[i]:
                 devices.append(device_info)
-                print(f"Suspicious device detected: {ip}, Score: {device_info['suspicion_score']}, Methods: {device_info['detection_methods']}")
+                print(f"Suspicious device detected: {device_info['ip']}, Score: {device_info['suspicion_score']}, Methods: {device_info['detection_methods']}")
     
         return devices
 
@@ -1286,26 +1311,14 @@ class AdvancedMinerDetector:
 
     def find_closest_city(self, lat, lon):
         """Find the closest city in Ilam"""
-        min_distance = float('inf')
-        closest_city = None
-        
-        for city, (city_lat, city_lon) in self.ilam_cities.items():
-            distance = self.haversine(lat, lon, city_lat, city_lon)
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city
-        
-        return {'city': closest_city, 'distance_km': min_distance}
+        names = list(self.ilam_cities)
+        city_lats, city_lons = zip(*self.ilam_cities.values())
+        index, distance = nearest([lat], [lon], city_lats, city_lons)
+        return {'city': names[index[0]], 'distance_km': float(distance[0])}
     
     def haversine(self, lat1, lon1, lat2, lon2):
-        """Calculate distance between two points"""
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        r = 6371  # Earth radius in kilometers
-        return c * r
+        """Calculate distance between two points (km)"""
+        return float(haversine_km(lat1, lon1, lat2, lon2))
 
     def close_database(self):
         """Close database connection"""
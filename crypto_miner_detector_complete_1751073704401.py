@@ -24,11 +24,12 @@ import statistics
 import sqlite3
 import math
 import numpy as np
-from geopy.distance import geodesic
 from scipy.optimize import minimize
 import wifi
 import netifaces
 
+from server.services.geo_math import haversine_km, nearest
+
 class IlamMinerGeoDetector:
     def __init__(self):
         # مختصات استان ایلام
@@ -202,16 +203,10 @@ class IlamMinerGeoDetector:
 
     def find_closest_city(self, lat, lon):
         """یافتن نزدیک‌ترین شهر ایلام"""
-        min_distance = float('inf')
-        closest_city = None
-        
-        for city, (city_lat, city_lon) in self.ilam_cities.items():
-            distance = geodesic((lat, lon), (city_lat, city_lon)).kilometers
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city
-        
-        return {'city': closest_city, 'distance_km': min_distance}
+        names = list(self.ilam_cities)
+        city_lats, city_lons = zip(*self.ilam_cities.values())
+        index, distance = nearest([lat], [lon], city_lats, city_lons)
+        return {'city': names[index[0]], 'distance_km': float(distance[0])}
 
     def wifi_triangulation_scan(self):
         """تشخیص ماینر از طریق تحلیل WiFi و مثلث‌بندی"""
@@ -393,15 +388,16 @@ class IlamMinerGeoDetector:
         if len(wifi_points) < 3:
             return None
         
-        def distance_error(pos, points):
-            error = 0
-            for point in points:
-                calculated_dist = geodesic(pos, (point['lat'], point['lon'])).meters
-                error += (calculated_dist - point['distance']) ** 2
-            return error
+        point_lats = np.array([p['lat'] for p in wifi_points], dtype=float)
+        point_lons = np.array([p['lon'] for p in wifi_points], dtype=float)
+        point_dists = np.array([p['distance'] for p in wifi_points], dtype=float)
+        
+        def distance_error(pos):
+            calculated_dist = haversine_km(pos[0], pos[1], point_lats, point_lons) * 1000
+            return float(((calculated_dist - point_dists) ** 2).sum())
         
         initial_guess = self.ilam_bounds['center']
-        result = minimize(distance_error, initial_guess, args=(wifi_points,))
+        result = minimize(distance_error, initial_guess)
         
         if result.success:
             return {'lat': result.x[0], 'lon': result.x[1]}
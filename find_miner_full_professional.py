@@ -5,6 +5,11 @@ import sqlite3
 import time
 from datetime import datetime
 
+try:
+    from server.services.enrichment_client import RangeEnricher
+except ImportError:
+    RangeEnricher = None
+
 # API KEYS (در محیط امن .env نگهداری شود)
 ABUSEIPDB_KEY = "your-abuseipdb-key"
 PROXYCHECK_KEY = "your-proxycheck-key"
@@ -144,13 +149,20 @@ def main():
         return
 
     current_ip = start_ip
+    # پرس‌وجوی دسته‌ای همه سرویس‌ها برای هر تکه از رنج (یک کلاینت و نشست مشترک، سهمیه هر کلید و کش)
+    keys = {"proxycheck": PROXYCHECK_KEY, "abuseipdb": ABUSEIPDB_KEY, "shodan": SHODAN_KEY, "ipinfo": IPINFO_KEY}
+    enricher = RangeEnricher(list(keys), keys=keys, missing={}) if RangeEnricher else None
+    enriched = enricher.hosts(start_ip, end_ip) if enricher else None
     while current_ip <= end_ip:
         ip = str(current_ip)
         print(f"\n🔎 {ip} ...")
-        proxycheck_res = call_proxycheck(ip)
-        abuseipdb_res = call_abuseipdb(ip)
-        shodan_res = call_shodan(ip)
-        ipinfo_res = call_ipinfo(ip)
+        if enriched is not None:
+            _, (proxycheck_res, abuseipdb_res, shodan_res, ipinfo_res) = next(enriched)
+        else:
+            proxycheck_res = call_proxycheck(ip)
+            abuseipdb_res = call_abuseipdb(ip)
+            shodan_res = call_shodan(ip)
+            ipinfo_res = call_ipinfo(ip)
         lat, lon, city, country = geoip_latlon_city(ipinfo_res)
         open_ports = []
         if is_suspect(ip, proxycheck_res, abuseipdb_res):
@@ -160,10 +172,13 @@ def main():
         else:
             print("IP مشکوک نیست.")
         save_result(ip, proxycheck_res, abuseipdb_res, shodan_res, ipinfo_res, open_ports, lat, lon, city, country)
-        time.sleep(1)
+        if enriched is None:
+            time.sleep(1)
         if current_ip == end_ip:
             break
         current_ip += 1
+    if enricher is not None:
+        enricher.close()
 
     print("\nاسکن پایان یافت. گزارش در miner_report.html")
     generate_html_report()
@@ -1,8 +1,12 @@
 import csv
 import json
 
+from server.services.range_db import RangeDB, RangeDBBuilder, verify_round_trip
+
 input_file = "ir.csv"
 output_file = "iran_isp_ip_ranges.full.json"
+# نسخه فشرده با mmap و checksum که مصرف‌کننده‌ها به جای JSON می‌خوانند
+packed_file = "data/iran_isp_ip_ranges.rdb"
 
 ranges = {}
 with open(input_file, encoding="utf-8") as f:
@@ -26,4 +30,11 @@ with open(input_file, encoding="utf-8") as f:
 with open(output_file, "w", encoding="utf-8") as f:
     json.dump(ranges, f, indent=2, ensure_ascii=False)
 
-print(f"Done! Exported {len(ranges)} ISPs and all their ranges to {output_file}")
\ No newline at end of file
+print(f"Done! Exported {len(ranges)} ISPs and all their ranges to {output_file}")
+
+builder = RangeDBBuilder()
+builder.add_isp_json(output_file)
+builder.write(packed_file)
+with RangeDB(packed_file) as db:
+    check = verify_round_trip(output_file, db)
+print(f"Packed {check['ranges']} ranges into {packed_file} (round-trip {'ok' if check['matches'] else 'MISMATCH'})")
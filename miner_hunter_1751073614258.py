@@ -13,8 +13,8 @@ Purpose     : Unite several cutting‑edge, power‑agnostic (no power‑meter,
 INCLUDED SUB‑MODULES
 ─────────────────────────────────────────────────────────────────────────────
   • LAN Stratum / ASIC port scan via Nmap or Scapy
-  • TLS JA3 / Stratum banner fingerprinting via PyShark
-  • NetFlow/PCAP offline ML classifier (placeholder model)
+  • TLS JA3 / JA4 ClientHello and Stratum session fingerprinting via PyShark
+  • NetFlow v5/v9 / IPFIX collector with per‑host flow features
   • BLE beacon and Wi‑Fi probe/SSID matcher (Bleak + Scapy)
   • RF front‑end (RTL‑SDR) hash‑rate‑noise fingerprint (prototype)
   • Acoustic fan‑signature classifier (pyaudio + TF/Lite)
@@ -34,6 +34,8 @@ import logging
 import os
 import platform
 import re
+import socket
+import struct
 import sys
 import tempfile
 from datetime import datetime
@@ -73,6 +75,31 @@ try:
 except ImportError:
     RtlSdr = None
 
+try:
+    from server.services.pcap_reader import PcapFormatError, PcapReader
+except ImportError:
+    PcapReader = None
+
+try:
+    from server.services.stratum_decoder import StratumDecoder
+except ImportError:
+    StratumDecoder = None
+
+try:
+    from server.services.clock_skew import STREAM_DTYPE, ClockSkewEngine, TimestampSamples
+except ImportError:
+    ClockSkewEngine = None
+
+try:
+    from server.services.netflow_collector import NetFlowCollector
+except ImportError:
+    NetFlowCollector = None
+
+try:
+    from server.services.tls_fingerprint import FingerprintDB, TLSFingerprinter
+except ImportError:
+    TLSFingerprinter = None
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
@@ -121,15 +148,9 @@ async def lan_scan(targets: str | list[str], fast: bool = True):
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# TLS / Stratum fingerprint (JA3, banner)
+# TLS / Stratum fingerprint (JA3/JA4, banner)
 # ─────────────────────────────────────────────────────────────────────────────
-# نمونه هش‌های JA3 برای ماینرها (نمونه، واقعی نیست)
-MINER_JA3_HASHES = {
-    "769c5d6b4b8c5e3e1a1e1e1e1e1e1e1e": "Antminer S9",
-    "aabbccddeeff00112233445566778899": "Whatsminer M20S"
-}
-
-async def live_capture(interface: str, duration: int = 60):
+async def live_capture(interface: str, duration: int = 60, tls_db: str = "tls_fingerprints.json"):
     if not pyshark:
         log.warning("pyshark not available; cannot perform live capture.")
         return []
@@ -140,23 +161,47 @@ async def live_capture(interface: str, duration: int = 60):
     )
     cap.sniff(timeout=duration)
     alerts = []
+    decoder = StratumDecoder() if StratumDecoder else None
+    fingerprinter = TLSFingerprinter(FingerprintDB(tls_db)) if TLSFingerprinter else None
     for pkt in cap:
         try:
-            if hasattr(pkt, "tls"):
-                ja3 = getattr(pkt.tls, 'handshake_extensions_type', None)
-                ja3_str = str(ja3)
-                miner_name = MINER_JA3_HASHES.get(ja3_str)
-                if miner_name:
-                    log.info(f"Miner detected by JA3: {miner_name}")
-                    alerts.append({"type": "TLS", "src": pkt.ip.src, "ja3": ja3_str, "miner": miner_name})
-                else:
-                    log.info(f"TLS JA3 hash: {ja3_str}")
-                    alerts.append({"type": "TLS", "src": pkt.ip.src, "ja3": ja3_str})
-            elif hasattr(pkt, 'tcp') and hasattr(pkt.tcp, 'payload') and b"mining.subscribe" in bytes(pkt.tcp.payload):
-                alerts.append({"type": "Stratum", "src": pkt.ip.src, "info": "subscribe"})
+            if not (hasattr(pkt, 'ip') and hasattr(pkt, 'tcp')):
+                continue
+            ts, src, dst = float(pkt.sniff_timestamp), pkt.ip.src, pkt.ip.dst
+            sport, dport = int(pkt.tcp.srcport), int(pkt.tcp.dstport)
+            payload = bytes.fromhex(pkt.tcp.payload.replace(':', '')) if hasattr(pkt.tcp, 'payload') else b''
+            seq = int(getattr(pkt.tcp, 'seq_raw', None) or pkt.tcp.seq)
+
+            if fingerprinter:
+                # JA3/JA4 از ClientHello بازسازی‌شده (Stratum روی TLS)
+                fp = fingerprinter.feed(ts, src, sport, dst, dport, seq, payload)
+                if fp:
+                    alert = {"type": "TLS", "src": fp.src_ip, "dst": fp.dst_ip, "ja3": fp.ja3,
+                             "ja4": fp.ja4, "sni": fp.sni}
+                    if fp.match:
+                        log.info(f"Miner detected by TLS fingerprint: {fp.match['name']} ({fp.ja4})")
+                        alert["miner"] = fp.match['name']
+                    else:
+                        log.info(f"TLS fingerprint {fp.src_ip}: JA3 {fp.ja3} JA4 {fp.ja4}")
+                    alerts.append(alert)
+            if decoder:
+                events = decoder.feed(ts, src, sport, dst, dport, seq, int(pkt.tcp.flags, 16), payload)
+                for event in events:
+                    if event.kind == 'subscribe':
+                        alerts.append({"type": "Stratum", "src": event.miner_ip, "info": "subscribe",
+                                       "pool": event.pool, "agent": event.user_agent})
         except Exception as e:
             log.error(f"Error in live_capture: {e}")
             continue
+    if fingerprinter:
+        fingerprinter.flush()
+    if decoder:
+        decoder.flush()
+        for miner in decoder.get_miners():
+            log.info("Stratum miner %s: %.2f MH/s via %s", miner['miner_ip'],
+                     miner['hashrate_hs'] / 1e6, ", ".join(miner['pools']))
+            alerts.append({"type": "Hashrate", "src": miner['miner_ip'], "pools": miner['pools'],
+                           "workers": miner['workers'], "hashrate_hs": miner['hashrate_hs']})
     log.info("Live capture produced %d suspect flows", len(alerts))
     return alerts
 
@@ -289,32 +334,85 @@ async def snmp_crawl(hosts, community="public"):
 # ─────────────────────────────────────────────────────────────────────────────
 # Clock‑skew fingerprint via p0f‑like passive capture
 # ─────────────────────────────────────────────────────────────────────────────
-def clock_skew_analyse(pcap_file):
-    try:
-        import pyshark
-    except ImportError:
-        log.warning("pyshark not available; skipping clock skew analysis")
-        return [{"error": "pyshark not available"}]
-    cap = pyshark.FileCapture(pcap_file)
-    times = []
-    for pkt in cap:
-        if hasattr(pkt, 'sniff_time'):
-            times.append(pkt.sniff_time.timestamp())
-    cap.close()
-    if len(times) < 2:
-        return [{"error": "Not enough packets for analysis"}]
-    diffs = np.diff(times)
-    skew = float(np.std(diffs))
-    log.info(f"Clock skew stddev: {skew:.6f} s")
-    return [{"clock_skew_stddev": skew}]
+def clock_skew_analyse(pcap_file, min_samples=50, min_duration=60.0, tolerance_ppm=1.0):
+    """
+    Per-device clock skew from TCP timestamp options (Kohno et al.).
+    Each sender's TSval clock drifts at a device-specific rate; streams sharing
+    a skew are one physical device, several skews behind one IP suggest NAT.
+    """
+    if ClockSkewEngine is None:
+        return [{"error": "clock skew engine not available"}]
+    engine = ClockSkewEngine(min_samples=min_samples, min_duration=min_duration,
+                             tolerance_ppm=tolerance_ppm)
+    result = None
+    if PcapReader is not None:
+        # Native mmap reader: TSval extracted for every packet in one vectorized pass
+        try:
+            result = engine.analyze_pcap(pcap_file)
+        except PcapFormatError as e:
+            log.warning("Native pcap reader failed (%s); falling back to pyshark", e)
+    if result is None:
+        try:
+            import pyshark
+        except ImportError:
+            log.warning("pyshark not available; skipping clock skew analysis")
+            return [{"error": "pyshark not available"}]
+        cap = pyshark.FileCapture(pcap_file, display_filter="tcp.options.timestamp.tsval")
+        keys, times, values = [], [], []
+        for pkt in cap:
+            try:
+                ip = pkt.ip
+                tcp = pkt.tcp
+                keys.append((struct.unpack("!I", socket.inet_aton(ip.src))[0], int(tcp.srcport),
+                             struct.unpack("!I", socket.inet_aton(ip.dst))[0], int(tcp.dstport)))
+                times.append(pkt.sniff_time.timestamp())
+                values.append(int(tcp.options_timestamp_tsval))
+            except (AttributeError, OSError, ValueError):
+                continue
+        cap.close()
+        result = engine.analyze(TimestampSamples(np.array(keys, dtype=STREAM_DTYPE), np.array(times),
+                                                 np.array(values, dtype=np.int64)))
+
+    if not result["streams"]:
+        return [{"error": "Not enough TCP timestamp samples for analysis"}]
+    alerts = []
+    for device in result["devices"]:
+        log.info("Clock device %d: %.2f ppm @ %.0f Hz on %s", device.device_id, device.skew_ppm,
+                 device.hz, ", ".join(device.hosts))
+    for host, info in result["hosts"].items():
+        devices = [result["devices"][i] for i in info["devices"]]
+        alerts.append({"type": "ClockSkew", "src": host, "devices": len(devices),
+                       "nat_suspected": info["nat_suspected"],
+                       "skew_ppm": [round(d.skew_ppm, 2) for d in devices],
+                       "shared_with": sorted({h for d in devices for h in d.hosts} - {host})})
+    return alerts
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# NetFlow/PCAP offline ML classifier (در حال حاضر پشتیبانی نمی‌شود)
+# NetFlow v5/v9 / IPFIX collector scored by the miner classifier
 # ─────────────────────────────────────────────────────────────────────────────
-def netflow_ml_classifier(*args, **kwargs):
-    log.warning("NetFlow/PCAP offline ML classifier is not implemented in this version.")
-    return [{"error": "NetFlow/PCAP ML classifier not implemented"}]
+async def netflow_ml_classifier(port=2055, duration=120, local_networks=(), pool_addresses=()):
+    if NetFlowCollector is None:
+        log.warning("NetFlow collector not available; skipping flow classification")
+        return [{"error": "NetFlow collector not available"}]
+    collector = NetFlowCollector(port=port, window_seconds=max(duration, 60),
+                                 score_interval=duration, local_networks=local_networks,
+                                 pool_addresses=pool_addresses)
+    await collector.start()
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        await collector.stop()
+    stats = collector.get_stats()
+    log.info("NetFlow: %d datagrams, %d flows from exporters", stats["datagrams"], stats["flows"])
+    alerts = []
+    for host in collector.evaluate():
+        if host.is_mining:
+            alerts.append({"type": "NetFlow", "src": host.host, "score": round(host.score, 2),
+                           "pool_port_flows": host.pool_port_flows,
+                           "periodicity": round(host.periodicity, 2),
+                           "upload_ratio": round(host.upload_ratio, 2)})
+    return alerts
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -330,12 +428,16 @@ async def main():
         default="192.168.0.0/24",
     )
     p.add_argument("--interface", help="Interface for live capture or Wi‑Fi scans")
+    p.add_argument("--tls-db", default="tls_fingerprints.json", help="JA3/JA4 miner fingerprint database (JSON)")
     p.add_argument("--fast", action="store_true", help="Fast Nmap timings")
     p.add_argument("--ble", action="store_true", help="Enable BLE scanner")
     p.add_argument("--wifi", action="store_true", help="Enable Wi‑Fi probe scanner")
     p.add_argument("--acoustic", action="store_true", help="Enable acoustic fan scan")
     p.add_argument("--rf", action="store_true", help="Enable RTL‑SDR RF scan")
     p.add_argument("--snmp", action="store_true", help="Enable SNMP OID crawl")
+    p.add_argument("--pcap", help="Offline capture for clock-skew device fingerprinting")
+    p.add_argument("--netflow-port", type=int, help="Collect NetFlow v5/v9/IPFIX exports on this UDP port")
+    p.add_argument("--netflow-seconds", type=int, default=120, help="NetFlow collection window")
     args = p.parse_args()
 
     findings = []
@@ -343,7 +445,7 @@ async def main():
     findings += await lan_scan(args.targets, fast=args.fast)
 
     if args.interface:
-        findings += await live_capture(args.interface)
+        findings += await live_capture(args.interface, tls_db=args.tls_db)
 
     if args.ble:
         findings += await ble_scan()
@@ -357,6 +459,13 @@ async def main():
     if args.rf:
         findings += await rf_scan()
 
+    if args.pcap:
+        findings += clock_skew_analyse(args.pcap)
+
+    if args.netflow_port:
+        findings += await netflow_ml_classifier(args.netflow_port, args.netflow_seconds,
+                                                local_networks=[args.targets])
+
     if args.snmp:
         targets = [f["ip"] for f in findings if "ip" in f]
         findings += await snmp_crawl(targets)
@@ -7,6 +7,11 @@ import time
 import subprocess
 from datetime import datetime
 
+try:
+    from server.services.enrichment_client import RangeEnricher
+except ImportError:
+    RangeEnricher = None
+
 # --- تنظیمات ---
 ABUSEIPDB_KEY = "11e9cbd8c7b5b2bf17a689c6ba61236287f62f7ca19c64d05a7bd420f5affe68"
 PROXYCHECK_KEY = "g4h996-3u1579-40s3e7-f18k55"
@@ -136,13 +141,20 @@ def main():
 
     current_ip = ipaddress.IPv4Address(start_ip)
     last_ip = ipaddress.IPv4Address(end_ip)
+    # پرس‌وجوی دسته‌ای همه سرویس‌ها برای هر تکه از رنج (یک کلاینت و نشست مشترک، سهمیه هر کلید و کش)
+    keys = {"proxycheck": PROXYCHECK_KEY, "abuseipdb": ABUSEIPDB_KEY, "shodan": SHODAN_KEY, "ipinfo": IPINFO_KEY}
+    enricher = RangeEnricher(list(keys), keys=keys) if RangeEnricher else None
+    enriched = enricher.hosts(start_ip, last_ip) if enricher else None
     while current_ip <= last_ip:
         ip = str(current_ip)
         print(f"\n🔎 بررسی: {ip}")
-        proxycheck_res = call_proxycheck(ip)
-        abuseipdb_res = call_abuseipdb(ip)
-        shodan_res = call_shodan(ip)
-        ipinfo_res = call_ipinfo(ip)
+        if enriched is not None:
+            _, (proxycheck_res, abuseipdb_res, shodan_res, ipinfo_res) = next(enriched)
+        else:
+            proxycheck_res = call_proxycheck(ip)
+            abuseipdb_res = call_abuseipdb(ip)
+            shodan_res = call_shodan(ip)
+            ipinfo_res = call_ipinfo(ip)
 
         open_ports = []
         if proxycheck_res and abuseipdb_res:
@@ -153,10 +165,13 @@ def main():
             else:
                 print(f"{ip} مشکوک نیست.")
         save_result(ip, proxycheck_res, abuseipdb_res, shodan_res, ipinfo_res, open_ports)
-        time.sleep(1)
+        if enriched is None:
+            time.sleep(1)
         if current_ip == last_ip:
             break
         current_ip += 1
+    if enricher is not None:
+        enricher.close()
 
     print("\nکار اسکن تمام شد. گزارش در فایل report.html ذخیره شد.")
     generate_html_report()
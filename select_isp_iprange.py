@@ -1,7 +1,16 @@
 import json
+import os
 
-with open("iran_isp_ip_ranges.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+from server.services.range_db import RangeDB
+
+# نسخه فشرده (range_db.py convert iran_isp_ip_ranges.json) بدون تجزیه کامل JSON بارگذاری می‌شود
+data = {}
+if os.path.exists("data/iran_isp_ip_ranges.rdb"):
+    with RangeDB("data/iran_isp_ip_ranges.rdb") as db:
+        data = db.to_region_json()
+if not data:
+    with open("iran_isp_ip_ranges.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
 
 # انتخاب استان
 print("\n📍 استان‌های ایران:")
@@ -10,12 +10,14 @@ from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
 class MinerClassifier:
-    def __init__(self, model_path: str = 'models/miner_classifier.joblib'):
+    def __init__(self, model_path: str = 'models/miner_classifier.joblib',
+                 feature_columns: Optional[List[str]] = None):
         self.model_path = model_path
         self.model: Optional[RandomForestClassifier] = None
         self.scaler: Optional[StandardScaler] = None
         self.logger = logging.getLogger('MinerClassifier')
-        self.feature_columns = [
+        # Custom columns train a model on another feature set (e.g. NetFlow host features)
+        self.feature_columns = list(feature_columns) if feature_columns else [
             'cpu_usage',
             'gpu_usage',
             'memory_usage',
@@ -136,6 +138,24 @@ class MinerClassifier:
             self.logger.error(f'Error during prediction: {str(e)}')
             raise
 
+    def predict_batch(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict many devices at once from a feature matrix (columns in feature_columns order)"""
+        try:
+            if self.model is None:
+                self.load_model()
+
+            features_scaled = self.scaler.transform(features) if self.scaler is not None else features
+            predictions = self.model.predict(features_scaled).astype(bool)
+            probabilities = self.model.predict_proba(features_scaled)[:, 1]
+
+            self.logger.info(f'Batch prediction made for {len(features)} devices')
+
+            return predictions, probabilities
+
+        except Exception as e:
+            self.logger.error(f'Error during batch prediction: {str(e)}')
+            raise
+
     def save_model(self) -> None:
         """Save the trained model and scaler"""
         if self.model is not None and self.scaler is not None:
@@ -25,6 +25,7 @@ from sklearn.preprocessing import StandardScaler
 # Import our modules
 from ..services.advanced_miner_detection import ai_detector
 from ..services.advanced_geolocation import geolocation_system
+from ..services.heatmap_tiles import get_heatmap_tiles
 from ..core.database import get_database
 from ..utils.logger import get_logger
 
@@ -248,6 +249,7 @@ async def save_detection_result(result: Dict, scan_id: str):
             scan_id,
             json.dumps(result['ai_analysis'])
         ))
+        get_heatmap_tiles().add([{**result, 'confidence_score': result['ai_analysis']['confidence_score']}])
         
     except Exception as e:
         logger.error(f"Error saving detection result: {e}")
@@ -5,8 +5,8 @@ Secondary API Router - Additional API endpoints
 روتر ثانویه API - نقاط پایانی اضافی API
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 from typing import Dict, List, Optional, Any
 import logging
 import json
@@ -470,3 +470,241 @@ async def get_summary_report(date_from: Optional[str] = None, date_to: Optional[
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to generate summary report"
         )
+
+@router.get("/v2/scan/fingerprint-cache")
+async def get_fingerprint_cache_stats():
+    """Get shared host fingerprint cache hit rates"""
+    try:
+        from ..services.host_fingerprint_cache import get_host_fingerprint_cache
+        
+        return {
+            "cache": get_host_fingerprint_cache().get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get fingerprint cache stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get fingerprint cache stats"
+        )
+
+@router.get("/v2/stratum/miners")
+async def get_stratum_miners():
+    """Get miners observed in decoded Stratum sessions with share-based hashrate"""
+    try:
+        from ..services.stratum_decoder import get_stratum_decoder
+        
+        miners = get_stratum_decoder().get_miners()
+        return {
+            "miners": miners,
+            "count": len(miners),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get stratum miners: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get stratum miners"
+        )
+
+@router.get("/v2/stratum/miners/{miner_ip}/series")
+async def get_stratum_series(miner_ip: str, since_minute: int = 0):
+    """Get per-minute share and hashrate series for a miner"""
+    try:
+        from ..services.stratum_decoder import get_stratum_decoder
+        
+        return {
+            "miner_ip": miner_ip,
+            "series": get_stratum_decoder().get_series(miner_ip, since_minute),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get stratum series: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get stratum series"
+        )
+
+@router.get("/v2/tls/hosts/{host_ip}")
+async def get_tls_fingerprint_history(host_ip: str):
+    """Get JA3/JA4 ClientHello fingerprints observed from a host"""
+    try:
+        from ..services.tls_fingerprint import get_tls_fingerprinter
+        
+        fingerprinter = get_tls_fingerprinter()
+        return {
+            "host_ip": host_ip,
+            "fingerprints": fingerprinter.get_host_history(host_ip),
+            "stats": fingerprinter.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get TLS fingerprint history: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get TLS fingerprint history"
+        )
+
+@router.get("/v2/geo/cache/stats")
+async def get_geo_cache_stats():
+    """Get hit/miss metrics of the shared geolocation cache"""
+    try:
+        from ..services.geo_cache import get_geo_cache
+        
+        return {
+            "cache": get_geo_cache().get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get geolocation cache stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get geolocation cache stats"
+        )
+
+@router.post("/v2/clusters/detections")
+async def add_cluster_detections(detections: List[Dict[str, Any]]):
+    """Add detections to the incremental haversine clustering engine"""
+    try:
+        from ..services.detection_clustering import get_detection_clusterer
+        
+        clusterer = get_detection_clusterer()
+        labels = clusterer.add(detections)
+        return {
+            "labels": labels.tolist(),
+            "engine": clusterer.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to add detections to clustering: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to add detections to clustering"
+        )
+
+@router.get("/v2/clusters")
+async def get_detection_clusters(limit: int = 100, include_detections: bool = False):
+    """Get current detection clusters with vectorized per-cluster statistics"""
+    try:
+        from ..services.detection_clustering import get_detection_clusterer
+        
+        clusterer = get_detection_clusterer()
+        return {
+            **clusterer.summary(include_detections=include_detections, limit=limit),
+            "engine": clusterer.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get detection clusters: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get detection clusters"
+        )
+
+@router.post("/v2/tiles/detections")
+async def add_tile_detections(detections: List[Dict[str, Any]]):
+    """Aggregate detections into the pre-computed heatmap tile cells"""
+    try:
+        from ..services.heatmap_tiles import get_heatmap_tiles
+        
+        tiles = get_heatmap_tiles()
+        return {
+            "added": tiles.add(detections),
+            "engine": tiles.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to add detections to heatmap tiles: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to add detections to heatmap tiles"
+        )
+
+@router.get("/v2/tiles/{z}/{x}/{y}")
+async def get_heatmap_tile(z: int, x: int, y: int, request: Request):
+    """Get aggregated heatmap cells of one web-mercator tile (ETag / If-None-Match aware)"""
+    from ..services.heatmap_tiles import get_heatmap_tiles, valid_tile
+    
+    if not valid_tile(z, x, y):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid tile {z}/{x}/{y}"
+        )
+    try:
+        tiles = get_heatmap_tiles()
+        headers = {"Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            etag = tiles.tile_etag(z, x, y)
+            if etag in [tag.strip() for tag in if_none_match.split(",")]:
+                tiles.not_modified()
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": etag})
+        etag, body = tiles.get_tile(z, x, y)
+        return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag})
+    except Exception as e:
+        logger.error(f"Failed to get heatmap tile {z}/{x}/{y}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get heatmap tile"
+        )
+
+@router.get("/v2/ip/classify/{ip_address}")
+async def classify_ip(ip_address: str):
+    """Classify an IP by longest-prefix match (ISP, operator type, province, city)"""
+    try:
+        from ..services.ip_classifier import get_ip_classifier
+        
+        return {
+            "classification": get_ip_classifier().classify(ip_address),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to classify IP {ip_address}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to classify IP"
+        )
+
+@router.post("/v2/ip/classify")
+async def classify_ips(ip_addresses: List[str]):
+    """Classify a whole batch of IPs (e.g. scan results) in one vectorized pass"""
+    try:
+        from ..services.ip_classifier import get_ip_classifier
+        
+        batch = get_ip_classifier().classify_many(ip_addresses)
+        return {
+            "classifications": batch.to_dicts(),
+            "matched": int(batch.found.sum()),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to classify IPs: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to classify IPs"
+        )
+
+@router.get("/v2/ip/ranges")
+async def get_ip_ranges(province: Optional[str] = None, city: Optional[str] = None,
+                        isp: Optional[str] = None, operator_type: Optional[str] = None, limit: int = 1000):
+    """Browse classified prefixes by province/city/ISP; without filters returns the region tree"""
+    try:
+        from ..services.ip_classifier import get_ip_classifier
+        
+        classifier = get_ip_classifier()
+        if not (province or city or isp or operator_type):
+            return {
+                "regions": classifier.regions(),
+                "index": classifier.get_stats(),
+                "timestamp": datetime.now().isoformat()
+            }
+        return {
+            "ranges": classifier.ranges(province, city, isp, operator_type, limit),
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Failed to get IP ranges: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get IP ranges"
+        )
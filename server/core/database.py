@@ -19,6 +19,8 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
 
+from ..services.heatmap_tiles import get_heatmap_tiles
+
 Base = declarative_base()
 
 class Device(Base):
@@ -350,6 +352,10 @@ class DatabaseManager:
                 miner_data.get('is_active', 'true')
             ))
             await conn.commit()
+            try:
+                get_heatmap_tiles().add([miner_data])
+            except Exception as e:
+                logger.warning(f"Error adding miner to heatmap tiles: {e}")
             return cursor.lastrowid
         finally:
             await self.close_connection(conn)
@@ -23,6 +23,8 @@ import requests
 import aiohttp
 import aiofiles
 
+from .host_fingerprint_cache import get_host_fingerprint_cache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -79,6 +81,9 @@ class AdvancedBlockchainScanner:
         self.proxy_indicators = [
             'proxy', 'socks', 'tor', 'vpn', 'tunnel', 'gateway'
         ]
+        
+        # کش مشترک اثر انگشت میزبان‌ها
+        self.fingerprints = get_host_fingerprint_cache()
     
     async def scan_global_blockchain_network(self, target_ranges: List[str] = None) -> List[BlockchainDetection]:
         """
@@ -177,8 +182,12 @@ class AdvancedBlockchainScanner:
             if not blockchain_type:
                 return None
             
+            self.fingerprints.put(host, f'port:{port}', True)
+            
             # تست اتصال مستقیم
-            connection_details = await self._test_blockchain_connection(host, port)
+            connection_details = await self.fingerprints.aget_or_probe(
+                host, f'rpc:{port}', lambda: self._test_blockchain_connection(host, port)
+            )
             
             # تشخیص VPN/Proxy
             vpn_detected, proxy_detected = await self._check_vpn_proxy(host)
@@ -327,6 +336,9 @@ class AdvancedBlockchainScanner:
         """
         بررسی استفاده از VPN یا Proxy
         """
+        return await self.fingerprints.aget_or_probe(host, 'vpn_proxy', lambda: self._probe_vpn_proxy(host))
+    
+    async def _probe_vpn_proxy(self, host: str) -> Tuple[bool, bool]:
         try:
             # بررسی DNS
             dns_info = await self._check_dns_characteristics(host)
@@ -365,15 +377,37 @@ class AdvancedBlockchainScanner:
             logger.error(f"Error checking VPN/Proxy for {host}: {e}")
             return False, False
     
+    async def _resolve_hostname(self, host: str) -> Optional[str]:
+        """
+        جست‌وجوی معکوس DNS
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            return (await loop.run_in_executor(None, socket.gethostbyaddr, host))[0]
+        except (socket.herror, socket.gaierror, OSError):
+            return None
+    
+    async def _fetch_ip_api(self, host: str) -> Optional[Dict[str, Any]]:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://ip-api.com/json/{host}') as response:
+                if response.status == 200:
+                    return await response.json()
+        return None
+    
+    async def _get_ip_api_data(self, host: str) -> Optional[Dict[str, Any]]:
+        """
+        پاسخ ip-api یک بار برای هر میزبان دریافت و بین WHOIS، ASN و موقعیت به اشتراک گذاشته می‌شود
+        """
+        return await self.fingerprints.aget_or_probe(host, 'ipapi', lambda: self._fetch_ip_api(host))
+    
     async def _check_dns_characteristics(self, host: str) -> Dict[str, Any]:
         """
         بررسی ویژگی‌های DNS برای تشخیص VPN/Proxy
         """
         try:
             # بررسی DNS PTR record
-            try:
-                hostname = socket.gethostbyaddr(host)[0]
-                
+            hostname = await self.fingerprints.aget_or_probe(host, 'hostname', lambda: self._resolve_hostname(host))
+            if hostname:
                 vpn_likely = any(provider in hostname.lower() for provider in self.vpn_providers)
                 proxy_likely = any(indicator in hostname.lower() for indicator in self.proxy_indicators)
                 
@@ -382,7 +416,7 @@ class AdvancedBlockchainScanner:
                     'vpn_likely': vpn_likely,
                     'proxy_likely': proxy_likely
                 }
-            except:
+            else:
                 return {
                     'hostname': None,
                     'vpn_likely': False,
@@ -399,24 +433,21 @@ class AdvancedBlockchainScanner:
         """
         try:
             # استفاده از API رایگان WHOIS
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'http://ip-api.com/json/{host}') as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # بررسی ISP
-                        isp = data.get('isp', '').lower()
-                        org = data.get('org', '').lower()
-                        
-                        vpn_likely = any(provider in isp or provider in org for provider in self.vpn_providers)
-                        proxy_likely = any(indicator in isp or indicator in org for indicator in self.proxy_indicators)
-                        
-                        return {
-                            'isp': isp,
-                            'org': org,
-                            'vpn_likely': vpn_likely,
-                            'proxy_likely': proxy_likely
-                        }
+            data = await self._get_ip_api_data(host)
+            if data:
+                # بررسی ISP
+                isp = data.get('isp', '').lower()
+                org = data.get('org', '').lower()
+                
+                vpn_likely = any(provider in isp or provider in org for provider in self.vpn_providers)
+                proxy_likely = any(indicator in isp or indicator in org for indicator in self.proxy_indicators)
+                
+                return {
+                    'isp': isp,
+                    'org': org,
+                    'vpn_likely': vpn_likely,
+                    'proxy_likely': proxy_likely
+                }
             
             return {'vpn_likely': False, 'proxy_likely': False}
             
@@ -429,21 +460,18 @@ class AdvancedBlockchainScanner:
         بررسی ویژگی‌های ASN برای تشخیص VPN/Proxy
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'http://ip-api.com/json/{host}') as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        asn = data.get('as', '').lower()
-                        
-                        vpn_likely = any(provider in asn for provider in self.vpn_providers)
-                        proxy_likely = any(indicator in asn for indicator in self.proxy_indicators)
-                        
-                        return {
-                            'asn': asn,
-                            'vpn_likely': vpn_likely,
-                            'proxy_likely': proxy_likely
-                        }
+            data = await self._get_ip_api_data(host)
+            if data:
+                asn = data.get('as', '').lower()
+                
+                vpn_likely = any(provider in asn for provider in self.vpn_providers)
+                proxy_likely = any(indicator in asn for indicator in self.proxy_indicators)
+                
+                return {
+                    'asn': asn,
+                    'vpn_likely': vpn_likely,
+                    'proxy_likely': proxy_likely
+                }
             
             return {'vpn_likely': False, 'proxy_likely': False}
             
@@ -513,19 +541,17 @@ class AdvancedBlockchainScanner:
         دریافت موقعیت جغرافیایی
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'http://ip-api.com/json/{host}') as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            'country': data.get('country'),
-                            'region': data.get('regionName'),
-                            'city': data.get('city'),
-                            'lat': data.get('lat'),
-                            'lon': data.get('lon'),
-                            'isp': data.get('isp'),
-                            'org': data.get('org')
-                        }
+            data = await self._get_ip_api_data(host)
+            if data:
+                return {
+                    'country': data.get('country'),
+                    'region': data.get('regionName'),
+                    'city': data.get('city'),
+                    'lat': data.get('lat'),
+                    'lon': data.get('lon'),
+                    'isp': data.get('isp'),
+                    'org': data.get('org')
+                }
             return None
             
         except Exception as e:
@@ -540,6 +566,7 @@ class AdvancedBlockchainScanner:
         
         while True:
             try:
+                self.fingerprints.start_cycle("blockchain_monitoring")
                 detections = await self.scan_global_blockchain_network(target_ranges)
                 
                 # ذخیره نتایج
@@ -547,6 +574,7 @@ class AdvancedBlockchainScanner:
                 
                 # گزارش نتایج
                 logger.info(f"📊 Found {len(detections)} blockchain activities")
+                self.fingerprints.end_cycle()
                 
                 # انتظار قبل از اسکن بعدی
                 await asyncio.sleep(300)  # 5 دقیقه
@@ -10,20 +10,17 @@ import aiohttp
 import json
 import logging
 import sqlite3
-import time
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import hashlib
+import os
 import requests
 from geopy.geocoders import Nominatim, GoogleV3
-from geopy.distance import geodesic
 import folium
 from folium import plugins
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 import reverse_geocoder as rg
 import phonenumbers
 from phonenumbers import geocoder, carrier
@@ -35,6 +32,14 @@ import geoip2.errors
 from shapely.geometry import Point, Polygon
 import geopandas as gpd
 
+from .detection_clustering import DetectionClusterer
+from .geo_cache import LOCATION_NAMESPACE, get_geo_cache
+from .geo_frontend import GeoFrontend, GeoProvider
+from .geo_math import spherical_centroid
+from .heatmap_tiles import (CELL_BITS, THREAT_LEVELS, aggregate_cells, cell_bounds, detection_confidence,
+                            detection_power, threat_rank)
+from .region_service import get_region_service
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -81,16 +86,24 @@ class AdvancedGeolocationSystem:
         self.geolocators = {}
         self.api_keys = {}
         self.cache_db = "geolocation_cache.db"
+        self.location_cache = get_geo_cache()
+        self.cache_namespace = LOCATION_NAMESPACE
         self.ilam_bounds = {
             'north': 34.5,
             'south': 32.0,
             'east': 48.5,
             'west': 45.5
         }
+        # create_heatmap grid (zoom 12 tiles of 32x32 cells, ~250 m) and marker cap
+        self.heatmap_zoom = 12
+        self.heatmap_max_markers = 200
         
         # Initialize geolocators
         self._initialize_geolocators()
         
+        # Concurrent provider fan-out with hedging and single-flight per IP
+        self.frontend = self._initialize_frontend()
+        
         # Initialize cache database
         self._initialize_cache()
         
@@ -123,6 +136,16 @@ class AdvancedGeolocationSystem:
         except Exception as e:
             logger.error(f"Error initializing geolocators: {e}")
     
+    def _initialize_frontend(self) -> GeoFrontend:
+        """Build the geolocation front end over the configured services (results cached per IP here)"""
+        providers = [
+            GeoProvider('ip-api', self._geolocate_ipapi, deadline=3.0),
+            GeoProvider('geoip2', self._geolocate_geoip2, deadline=0.5)
+        ]
+        if 'opencage' in self.geolocators:
+            providers.append(GeoProvider('opencage', self._geolocate_opencage, deadline=4.0))
+        return GeoFrontend(providers, fanout=2, hedge_delay=0.5, quorum=2, cache_namespace=None)
+    
     def _get_api_key(self, key_name: str) -> Optional[str]:
         """Get API key from environment or config"""
         import os
@@ -134,23 +157,7 @@ class AdvancedGeolocationSystem:
             conn = sqlite3.connect(self.cache_db)
             cursor = conn.cursor()
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS geolocation_cache (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ip_address TEXT UNIQUE,
-                    latitude REAL,
-                    longitude REAL,
-                    city TEXT,
-                    region TEXT,
-                    country TEXT,
-                    isp TEXT,
-                    accuracy REAL,
-                    source TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    hash TEXT
-                )
-            ''')
-            
+            # Location results live in the shared geolocation cache (geo_cache)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS owner_cache (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -197,45 +204,27 @@ class AdvancedGeolocationSystem:
         """
         Advanced IP geolocation using multiple services
         """
-        # Check cache first
-        cached_data = self._get_cached_location(ip_address)
+        # Check cache first (a cached miss means every service failed recently)
+        hit, cached_data = self._get_cached_location(ip_address)
+        if hit and cached_data is None:
+            raise Exception(f"All geolocation services failed for {ip_address} (cached)")
         if cached_data and self._is_cache_valid(cached_data):
             return cached_data
         
-        # Try multiple geolocation services
-        location_results = []
-        
-        # 1. IP-API (free, reliable)
-        try:
-            ipapi_result = await self._geolocate_ipapi(ip_address)
-            if ipapi_result:
-                location_results.append(ipapi_result)
-        except Exception as e:
-            logger.warning(f"IP-API failed for {ip_address}: {e}")
-        
-        # 2. GeoIP2 database
-        try:
-            geoip2_result = await self._geolocate_geoip2(ip_address)
-            if geoip2_result:
-                location_results.append(geoip2_result)
-        except Exception as e:
-            logger.warning(f"GeoIP2 failed for {ip_address}: {e}")
-        
-        # 3. OpenCage (if available)
-        if 'opencage' in self.geolocators:
-            try:
-                opencage_result = await self._geolocate_opencage(ip_address)
-                if opencage_result:
-                    location_results.append(opencage_result)
-            except Exception as e:
-                logger.warning(f"OpenCage failed for {ip_address}: {e}")
+        # Query services concurrently (IP-API, GeoIP2, OpenCage); concurrent callers for the
+        # same IP share one in-flight lookup and the answer returns once services agree
+        answer = await self.frontend.lookup(ip_address)
+        location_results = answer.results
         
-        # Combine results and calculate consensus
+        # Combine results and calculate consensus (only the leader of a coalesced lookup caches)
         if location_results:
             final_location = self._combine_location_results(location_results, ip_address)
-            self._cache_location(final_location)
+            if not answer.coalesced:
+                self._cache_location(ip_address, final_location)
             return final_location
         else:
+            if not answer.coalesced:
+                self.location_cache.put_negative(self.cache_namespace, ip_address)
             raise Exception(f"All geolocation services failed for {ip_address}")
     
     async def _geolocate_ipapi(self, ip_address: str) -> Optional[LocationData]:
@@ -283,7 +272,8 @@ class AdvancedGeolocationSystem:
         """Geolocate using OpenCage service"""
         try:
             if 'opencage' in self.geolocators:
-                result = self.geolocators['opencage'].geocode(ip_address)
+                # Blocking client: run off the event loop so other services proceed concurrently
+                result = await asyncio.to_thread(self.geolocators['opencage'].geocode, ip_address)
                 if result:
                     return LocationData(
                         latitude=result['geometry']['lat'],
@@ -310,10 +300,10 @@ class AdvancedGeolocationSystem:
         if len(results) == 1:
             return results[0]
         
-        # Calculate weighted average based on confidence
-        total_weight = sum(r.confidence for r in results)
-        weighted_lat = sum(r.latitude * r.confidence for r in results) / total_weight
-        weighted_lon = sum(r.longitude * r.confidence for r in results) / total_weight
+        # Confidence-weighted spherical centroid (shared geo_math implementation)
+        weighted_lat, weighted_lon = spherical_centroid([r.latitude for r in results],
+                                                        [r.longitude for r in results],
+                                                        [r.confidence for r in results])
         
         # Use most common city/region
         cities = [r.city for r in results if r.city]
@@ -344,71 +334,57 @@ class AdvancedGeolocationSystem:
             timestamp=datetime.now()
         )
     
-    def _get_cached_location(self, ip_address: str) -> Optional[LocationData]:
-        """Get cached location data"""
+    def _get_cached_location(self, ip_address: str) -> Tuple[bool, Optional[LocationData]]:
+        """Get cached location data from the shared geolocation record (written by any geolocator)"""
+        hit, data = self.location_cache.get(self.cache_namespace, ip_address)
+        if not hit or data is None:
+            return hit, None
         try:
-            conn = sqlite3.connect(self.cache_db)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT latitude, longitude, accuracy, city, region, country, 
-                       postal_code, address, isp, timezone, source, confidence, timestamp
-                FROM geolocation_cache 
-                WHERE ip_address = ?
-            ''', (ip_address,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return LocationData(
-                    latitude=row[0],
-                    longitude=row[1],
-                    accuracy=row[2],
-                    city=row[3],
-                    region=row[4],
-                    country=row[5],
-                    postal_code=row[6],
-                    address=row[7],
-                    isp=row[8],
-                    timezone=row[9],
-                    source=row[10],
-                    confidence=row[11],
-                    timestamp=datetime.fromisoformat(row[12])
-                )
-        except Exception as e:
+            city, region, country = data.get('city') or '', data.get('region') or '', data.get('country') or ''
+            timestamp = data.get('timestamp')
+            return True, LocationData(
+                latitude=float(data['latitude']),
+                longitude=float(data['longitude']),
+                accuracy=float(data.get('accuracy_score', 0.8)),
+                city=city,
+                region=region,
+                country=country,
+                postal_code=data.get('postal_code') or '',
+                address=data.get('address') or f"{city}, {region}, {country}",
+                isp=data.get('isp') or '',
+                timezone=data.get('timezone') or '',
+                source=data.get('service') or 'cache',
+                confidence=float(data.get('confidence', 0.85)),
+                timestamp=datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+            )
+        except (TypeError, KeyError, ValueError) as e:
             logger.error(f"Cache retrieval error: {e}")
-        
-        return None
+            return False, None
     
     def _is_cache_valid(self, location_data: LocationData) -> bool:
         """Check if cached data is still valid (less than 24 hours old)"""
         return (datetime.now() - location_data.timestamp).total_seconds() < 86400
     
-    def _cache_location(self, location_data: LocationData):
-        """Cache location data"""
-        try:
-            conn = sqlite3.connect(self.cache_db)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO geolocation_cache 
-                (ip_address, latitude, longitude, accuracy, city, region, country,
-                 postal_code, address, isp, timezone, source, confidence, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                location_data.latitude, location_data.longitude, location_data.accuracy,
-                location_data.city, location_data.region, location_data.country,
-                location_data.postal_code, location_data.address, location_data.isp,
-                location_data.timezone, location_data.source, location_data.confidence,
-                location_data.timestamp.isoformat()
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            logger.error(f"Cache storage error: {e}")
+    def _cache_location(self, ip_address: str, location_data: LocationData):
+        """Cache location data as the shared geolocation record (written to SQLite in batches)"""
+        self.location_cache.put(self.cache_namespace, ip_address, {
+            'ip': ip_address,
+            'status': 'success',
+            'latitude': location_data.latitude,
+            'longitude': location_data.longitude,
+            'city': location_data.city,
+            'region': location_data.region,
+            'country': location_data.country,
+            'postal_code': location_data.postal_code,
+            'address': location_data.address,
+            'isp': location_data.isp,
+            'timezone': location_data.timezone,
+            'accuracy': 'city',
+            'accuracy_score': location_data.accuracy,
+            'service': location_data.source,
+            'confidence': location_data.confidence,
+            'timestamp': location_data.timestamp.isoformat()
+        })
     
     async def identify_owner_advanced(self, ip_address: str, mac_address: Optional[str] = None) -> OwnerInfo:
         """
@@ -554,31 +530,21 @@ class AdvancedGeolocationSystem:
             logger.error(f"Owner cache storage error: {e}")
     
     def is_in_ilam_province(self, latitude: float, longitude: float) -> bool:
-        """Check if coordinates are within Ilam province"""
-        return (self.ilam_bounds['south'] <= latitude <= self.ilam_bounds['north'] and
-                self.ilam_bounds['west'] <= longitude <= self.ilam_bounds['east'])
+        """Check if coordinates are within the Ilam province polygon (region service)"""
+        return bool(get_region_service().in_province([latitude], [longitude])[0])
     
     def get_nearest_city(self, latitude: float, longitude: float) -> Dict:
-        """Get nearest city in Ilam province"""
-        nearest_city = None
-        min_distance = float('inf')
-        
-        for city_name, city_data in self.ilam_data['cities'].items():
-            distance = geodesic(
-                (latitude, longitude),
-                (city_data['lat'], city_data['lon'])
-            ).kilometers
-            
-            if distance < min_distance:
-                min_distance = distance
-                nearest_city = {
-                    'name': city_name,
-                    'distance_km': distance,
-                    'coordinates': (city_data['lat'], city_data['lon']),
-                    'population': city_data['population']
-                }
-        
-        return nearest_city or {}
+        """Get nearest settlement in Ilam province with its county and district"""
+        located = get_region_service().locate(latitude, longitude)
+        nearest_city = located.get('nearest_settlement')
+        if not nearest_city:
+            return {}
+        city_data = self.ilam_data['cities'].get(nearest_city['name'], {})
+        return {
+            **nearest_city,
+            'population': city_data.get('population'),
+            'district': located['district']
+        }
     
     def create_heatmap(self, detections: List[Dict]) -> str:
         """Create heatmap of detections"""
@@ -590,32 +556,40 @@ class AdvancedGeolocationSystem:
                 tiles='OpenStreetMap'
             )
             
-            # Add heatmap layer
-            heat_data = []
-            for detection in detections:
-                if detection.get('latitude') and detection.get('longitude'):
-                    heat_data.append([
-                        detection['latitude'],
-                        detection['longitude'],
-                        detection.get('confidence_score', 1)
-                    ])
-            
-            if heat_data:
-                plugins.HeatMap(heat_data).add_to(m)
-            
-            # Add markers for individual detections
-            for detection in detections:
-                if detection.get('latitude') and detection.get('longitude'):
+            # Aggregate detections into ~250 m grid cells instead of one point/marker each
+            located = [d for d in detections if d.get('latitude') and d.get('longitude')]
+            cells = aggregate_cells(
+                [d['latitude'] for d in located], [d['longitude'] for d in located],
+                [detection_power(d) for d in located], [threat_rank(d) for d in located],
+                [detection_confidence(d) for d in located], zooms=[self.heatmap_zoom]
+            ).get(self.heatmap_zoom)
+            if cells is None:
+                cells = (np.zeros(0, dtype=np.int64),) * 6
+            cx, cy, count, power, max_threat, confidence = cells
+            
+            # Identical cell aggregates produce an identical map file, so reuse it
+            digest = hashlib.sha1(b''.join(a.tobytes() for a in cells)).hexdigest()[:16]
+            map_file = f"detection_heatmap_{digest}.html"
+            if os.path.exists(map_file):
+                return map_file
+            
+            if len(cx):
+                south, west, north, east = cell_bounds(cx, cy, self.heatmap_zoom + CELL_BITS)
+                lat, lon = (south + north) / 2, (west + east) / 2
+                plugins.HeatMap(np.column_stack([lat, lon, count]).tolist()).add_to(m)
+                
+                # Markers only for the busiest cells; live maps should read /v2/tiles/{z}/{x}/{y}
+                for i in np.argsort(-count, kind='stable')[:self.heatmap_max_markers]:
                     folium.Marker(
-                        [detection['latitude'], detection['longitude']],
-                        popup=f"IP: {detection.get('ip_address', 'N/A')}<br>"
-                              f"Confidence: {detection.get('confidence_score', 0)}%<br>"
-                              f"Threat: {detection.get('threat_level', 'unknown')}",
+                        [float(lat[i]), float(lon[i])],
+                        popup=f"Detections: {count[i]}<br>"
+                              f"Avg confidence: {confidence[i] / count[i]:.1f}%<br>"
+                              f"Power: {power[i]:.0f} W<br>"
+                              f"Max threat: {THREAT_LEVELS[max_threat[i]]}",
                         icon=folium.Icon(color='red', icon='info-sign')
                     ).add_to(m)
             
             # Save map
-            map_file = f"detection_heatmap_{int(time.time())}.html"
             m.save(map_file)
             
             return map_file
@@ -624,57 +598,19 @@ class AdvancedGeolocationSystem:
             logger.error(f"Error creating heatmap: {e}")
             return ""
     
-    def analyze_detection_clusters(self, detections: List[Dict]) -> Dict:
-        """Analyze detection clusters for patterns"""
+    def analyze_detection_clusters(self, detections: List[Dict], eps_km: float = 1.0,
+                                   min_samples: int = 2, method: str = 'dbscan') -> Dict:
+        """Analyze detection clusters with haversine DBSCAN/HDBSCAN (eps in km)"""
         try:
-            # Extract coordinates
-            coordinates = []
-            for detection in detections:
-                if detection.get('latitude') and detection.get('longitude'):
-                    coordinates.append([detection['latitude'], detection['longitude']])
-            
-            if len(coordinates) < 2:
+            located = [d for d in detections if d.get('latitude') and d.get('longitude')]
+            if len(located) < 2:
                 return {'clusters': [], 'total_clusters': 0}
             
-            # Normalize coordinates
-            scaler = StandardScaler()
-            coordinates_scaled = scaler.fit_transform(coordinates)
-            
-            # Apply DBSCAN clustering
-            clustering = DBSCAN(eps=0.1, min_samples=2).fit(coordinates_scaled)
-            
-            # Analyze clusters
-            cluster_labels = clustering.labels_
-            unique_labels = set(cluster_labels)
-            
-            clusters = []
-            for label in unique_labels:
-                if label == -1:  # Noise points
-                    continue
-                
-                cluster_points = [i for i, l in enumerate(cluster_labels) if l == label]
-                cluster_detections = [detections[i] for i in cluster_points]
-                
-                # Calculate cluster statistics
-                cluster_coords = [coordinates[i] for i in cluster_points]
-                center_lat = np.mean([c[0] for c in cluster_coords])
-                center_lon = np.mean([c[1] for c in cluster_coords])
-                
-                clusters.append({
-                    'cluster_id': label,
-                    'center': {'latitude': center_lat, 'longitude': center_lon},
-                    'detection_count': len(cluster_detections),
-                    'average_confidence': np.mean([d.get('confidence_score', 0) for d in cluster_detections]),
-                    'threat_levels': [d.get('threat_level', 'unknown') for d in cluster_detections],
-                    'detections': cluster_detections
-                })
-            
-            return {
-                'clusters': clusters,
-                'total_clusters': len(clusters),
-                'total_detections': len(detections),
-                'clustered_detections': len([l for l in cluster_labels if l != -1])
-            }
+            clusterer = DetectionClusterer(eps_km=eps_km, min_samples=min_samples, method=method)
+            clusterer.fit(located)
+            analysis = clusterer.summary(include_detections=True)
+            analysis['total_detections'] = len(detections)
+            return analysis
             
         except Exception as e:
             logger.error(f"Error analyzing clusters: {e}")
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kernel-side BPF Capture Front-end
+پیش‌پردازش ضبط با فیلتر BPF در کرنل بر اساس پورت‌ها و پیشوند payload آشکارساز
+"""
+
+import ctypes
+import logging
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from .pcap_reader import LINKTYPE_ETHERNET, PacketView
+except ImportError:  # executed as a script from server/services
+    from pcap_reader import LINKTYPE_ETHERNET, PacketView
+
+logger = logging.getLogger(__name__)
+
+# Classic BPF opcodes (linux/filter.h)
+BPF_LD_W_ABS = 0x20
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_LD_W_IND = 0x40
+BPF_LD_H_IND = 0x48
+BPF_LD_B_IND = 0x50
+BPF_LDX_B_MSH = 0xB1
+BPF_ALU_AND_K = 0x54
+BPF_ALU_RSH_K = 0x74
+BPF_ALU_ADD_X = 0x0C
+BPF_MISC_TAX = 0x07
+BPF_JEQ_K = 0x15
+BPF_JGT_K = 0x25
+BPF_JGE_K = 0x35
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+
+SO_ATTACH_FILTER = 26
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+ETH_P_ALL = 0x0003
+
+_PROTOCOLS = {'tcp': 6, 'udp': 17}
+_ETH_HLEN = 14
+
+Instruction = Tuple[int, int, int, int]
+
+
+def _port_ranges(ports: Iterable[int]) -> List[Tuple[int, int]]:
+    """ادغام پورت‌های پیاپی در بازه‌ها برای کوتاه‌تر شدن برنامه"""
+    ranges: List[List[int]] = []
+    for port in sorted(set(int(p) for p in ports)):
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return [(lo, hi) for lo, hi in ranges]
+
+
+def build_bpf_expression(ports: Iterable[int], payload_prefixes: Sequence[bytes] = (),
+                         protocols: Sequence[str] = ('tcp',)) -> str:
+    """
+    عبارت فیلتر pcap معادل (برای tcpdump/dumpcap/pyshark).
+    پیشوندهای payload فقط برای TCP روی IPv4 بررسی می‌شوند.
+    """
+    port_terms = [f"port {lo}" if lo == hi else f"portrange {lo}-{hi}" for lo, hi in _port_ranges(ports)]
+    clauses = []
+    for protocol in protocols:
+        if port_terms:
+            clauses.append(f"({protocol} and ({' or '.join(port_terms)}))")
+    payload_offset = "((tcp[12:1] & 0xf0) >> 2)"
+    for prefix in payload_prefixes:
+        size, value, mask = _prefix_word(prefix)
+        field = f"tcp[{payload_offset}:{size}]"
+        if mask is not None:
+            field = f"({field} & 0x{mask:x})"
+        clauses.append(f"(tcp and {field} = 0x{value:x})")
+    return ' or '.join(clauses)
+
+
+def _prefix_word(prefix: bytes) -> Tuple[int, int, Optional[int]]:
+    """(اندازه بارگذاری، مقدار، ماسک) برای مقایسه حداکثر ۴ بایت اول payload"""
+    prefix = bytes(prefix[:4])
+    if not prefix:
+        raise ValueError("empty payload prefix")
+    if len(prefix) in (1, 2, 4):
+        return len(prefix), int.from_bytes(prefix, 'big'), None
+    padded = prefix.ljust(4, b'\0')
+    mask = int.from_bytes(b'\xff' * len(prefix) + b'\0' * (4 - len(prefix)), 'big')
+    return 4, int.from_bytes(padded, 'big'), mask
+
+
+class _Assembler:
+    """اسمبلر کوچک BPF با برچسب‌های پرش رو به جلو"""
+
+    def __init__(self):
+        self.code: List[Tuple[int, Any, Any, int]] = []
+        self.labels: Dict[str, int] = {}
+
+    def emit(self, op: int, k: int = 0, jt: Any = 0, jf: Any = 0):
+        self.code.append((op, jt, jf, k & 0xFFFFFFFF))
+
+    def label(self, name: str):
+        self.labels[name] = len(self.code)
+
+    def assemble(self) -> List[Instruction]:
+        program = []
+        for pc, (op, jt, jf, k) in enumerate(self.code):
+            offsets = []
+            for target in (jt, jf):
+                if isinstance(target, str):
+                    target = self.labels[target] - pc - 1
+                if not 0 <= target <= 255:
+                    raise ValueError(f"BPF jump out of range at {pc}")
+                offsets.append(target)
+            program.append((op, offsets[0], offsets[1], k))
+        if len(program) > 4096:
+            raise ValueError("BPF program too long")
+        return program
+
+
+def build_filter_program(ports: Iterable[int], payload_prefixes: Sequence[bytes] = (),
+                         protocols: Sequence[str] = ('tcp',), snaplen: int = 262144) -> List[Instruction]:
+    """
+    تولید مستقیم برنامه BPF کلاسیک برای فریم‌های Ethernet (IPv4 و IPv6 بدون هدر توسعه).
+    پذیرش وقتی است که پورت مبدأ یا مقصد در مجموعه باشد یا payload TCP با یکی از پیشوندها شروع شود.
+    هر بررسی پورت یک ret محلی دارد تا همه پرش‌ها کوتاه بمانند.
+    """
+    ranges = _port_ranges(ports)
+    proto_numbers = [_PROTOCOLS[p] for p in protocols]
+    asm = _Assembler()
+
+    def port_checks():
+        for lo, hi in ranges:
+            if lo == hi:
+                asm.emit(BPF_JEQ_K, lo, 0, 1)
+            else:
+                asm.emit(BPF_JGE_K, lo, 0, 2)
+                asm.emit(BPF_JGT_K, hi, 1, 0)
+            asm.emit(BPF_RET_K, snaplen)
+
+    asm.emit(BPF_LD_H_ABS, 12)
+    asm.emit(BPF_JEQ_K, 0x0800, 0, 'not_ipv4')
+
+    # IPv4
+    asm.emit(BPF_LD_B_ABS, _ETH_HLEN + 9)
+    for number in proto_numbers:
+        asm.emit(BPF_JEQ_K, number, f"ipv4_{number}", 0)
+    asm.emit(BPF_RET_K, 0)
+    for number in proto_numbers:
+        asm.label(f"ipv4_{number}")
+        # قطعه‌های غیر اول هدر لایه انتقال ندارند
+        asm.emit(BPF_LD_H_ABS, _ETH_HLEN + 6)
+        asm.emit(BPF_JSET_K, 0x1FFF, 0, 1)
+        asm.emit(BPF_RET_K, 0)
+        asm.emit(BPF_LDX_B_MSH, _ETH_HLEN)
+        for field in (0, 2):
+            asm.emit(BPF_LD_H_IND, _ETH_HLEN + field)
+            port_checks()
+        if number == _PROTOCOLS['tcp'] and payload_prefixes:
+            # X = طول هدر IP + طول هدر TCP
+            asm.emit(BPF_LD_B_IND, _ETH_HLEN + 12)
+            asm.emit(BPF_ALU_AND_K, 0xF0)
+            asm.emit(BPF_ALU_RSH_K, 2)
+            asm.emit(BPF_ALU_ADD_X)
+            asm.emit(BPF_MISC_TAX)
+            for prefix in payload_prefixes:
+                size, value, mask = _prefix_word(prefix)
+                asm.emit({1: BPF_LD_B_IND, 2: BPF_LD_H_IND, 4: BPF_LD_W_IND}[size], _ETH_HLEN)
+                if mask is not None:
+                    asm.emit(BPF_ALU_AND_K, mask)
+                asm.emit(BPF_JEQ_K, value, 0, 1)
+                asm.emit(BPF_RET_K, snaplen)
+        asm.emit(BPF_RET_K, 0)
+
+    # IPv6 (هدر ثابت ۴۰ بایتی)
+    asm.label('not_ipv4')
+    asm.emit(BPF_JEQ_K, 0x86DD, 1, 0)
+    asm.emit(BPF_RET_K, 0)
+    asm.emit(BPF_LD_B_ABS, _ETH_HLEN + 6)
+    for number in proto_numbers:
+        asm.emit(BPF_JEQ_K, number, 'ipv6_l4', 0)
+    asm.emit(BPF_RET_K, 0)
+    asm.label('ipv6_l4')
+    for field in (0, 2):
+        asm.emit(BPF_LD_H_ABS, _ETH_HLEN + 40 + field)
+        port_checks()
+    asm.emit(BPF_RET_K, 0)
+    return asm.assemble()
+
+
+def compile_with_tcpdump(expression: str, interface: Optional[str] = None) -> List[Instruction]:
+    """کامپایل عبارت pcap با tcpdump -ddd (برای عبارات خارج از توان مولد داخلی)"""
+    tcpdump = shutil.which('tcpdump')
+    if not tcpdump:
+        raise RuntimeError("tcpdump not available")
+    cmd = [tcpdump, '-ddd']
+    if interface and interface != 'any':
+        cmd += ['-i', interface]
+    result = subprocess.run(cmd + [expression], capture_output=True, text=True, timeout=10, check=True)
+    lines = result.stdout.split('\n')
+    count = int(lines[0])
+    return [tuple(int(v) for v in line.split()) for line in lines[1:count + 1]]
+
+
+def run_filter(program: List[Instruction], frame: bytes) -> int:
+    """
+    مفسر BPF در فضای کاربر برای بررسی برنامه‌های تولیدشده (زیرمجموعه دستورات مولد داخلی).
+    مقدار بازگشتی برنامه؛ صفر یعنی رد پکت.
+    """
+    a = x = pc = 0
+    n = len(frame)
+
+    def load(offset: int, size: int) -> Optional[int]:
+        if offset < 0 or offset + size > n:
+            return None
+        return int.from_bytes(frame[offset:offset + size], 'big')
+
+    while pc < len(program):
+        op, jt, jf, k = program[pc]
+        pc += 1
+        if op in (BPF_LD_W_ABS, BPF_LD_H_ABS, BPF_LD_B_ABS, BPF_LD_W_IND, BPF_LD_H_IND, BPF_LD_B_IND):
+            size = {0x00: 4, 0x08: 2, 0x10: 1}[op & 0x18]
+            value = load(k + (x if op & 0x40 else 0), size)
+            if value is None:
+                return 0
+            a = value
+        elif op == BPF_LDX_B_MSH:
+            value = load(k, 1)
+            if value is None:
+                return 0
+            x = (value & 0x0F) * 4
+        elif op == BPF_ALU_AND_K:
+            a &= k
+        elif op == BPF_ALU_RSH_K:
+            a >>= k
+        elif op == BPF_ALU_ADD_X:
+            a = (a + x) & 0xFFFFFFFF
+        elif op == BPF_MISC_TAX:
+            x = a
+        elif op in (BPF_JEQ_K, BPF_JGT_K, BPF_JGE_K, BPF_JSET_K):
+            taken = {BPF_JEQ_K: a == k, BPF_JGT_K: a > k, BPF_JGE_K: a >= k, BPF_JSET_K: bool(a & k)}[op]
+            pc += jt if taken else jf
+        elif op == BPF_RET_K:
+            return k
+        else:
+            raise ValueError(f"unsupported BPF opcode 0x{op:x}")
+    return 0
+
+
+@dataclass
+class CaptureStats:
+    """نتیجه حالت اندازه‌گیری ضبط"""
+    interface: str
+    seconds: float
+    interface_packets: int
+    interface_bytes: int
+    delivered_packets: int
+    delivered_bytes: int
+    kernel_drops: int
+    accept_rate: float
+    link_mbps: float
+    cpu_seconds: float
+    cpu_per_mbps: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _interface_counters(interface: str) -> Tuple[int, int]:
+    """مجموع بسته‌ها و بایت‌های دریافتی رابط (یا همه رابط‌ها) از /proc/net/dev"""
+    packets = bytes_ = 0
+    try:
+        with open('/proc/net/dev') as f:
+            for line in f.readlines()[2:]:
+                name, data = line.split(':', 1)
+                if interface in ('any', name.strip()):
+                    fields = data.split()
+                    bytes_ += int(fields[0])
+                    packets += int(fields[1])
+    except OSError:
+        pass
+    return packets, bytes_
+
+
+class FilteredCapture:
+    """
+    ضبط از سوکت AF_PACKET با فیلتر BPF متصل‌شده در کرنل؛
+    فقط پکت‌های کاندید به فضای کاربر منتقل و به صورت PacketView تحویل داده می‌شوند.
+    """
+
+    def __init__(self, interface: str = 'any', ports: Iterable[int] = (), payload_prefixes: Sequence[bytes] = (),
+                 protocols: Sequence[str] = ('tcp',), snaplen: int = 65535, buffer_size: int = 4 * 1024 * 1024):
+        self.interface = interface
+        self.ports = sorted(set(ports))
+        self.payload_prefixes = list(payload_prefixes)
+        self.protocols = list(protocols)
+        self.snaplen = snaplen
+        self.buffer_size = buffer_size
+        self.expression = build_bpf_expression(self.ports, self.payload_prefixes, self.protocols)
+        self.program: List[Instruction] = []
+        self._sock: Optional[socket.socket] = None
+        self._filter_buffer = None
+        self.delivered_packets = 0
+        self.delivered_bytes = 0
+        self.kernel_drops = 0
+
+    @staticmethod
+    def supported() -> bool:
+        """AF_PACKET فقط روی لینوکس و با دسترسی CAP_NET_RAW در دسترس است"""
+        return hasattr(socket, 'AF_PACKET') and (not hasattr(os, 'geteuid') or os.geteuid() == 0)
+
+    def _compile(self) -> List[Instruction]:
+        try:
+            return build_filter_program(self.ports, self.payload_prefixes, self.protocols, self.snaplen)
+        except ValueError as e:
+            logger.info(f"Built-in BPF generator declined ({e}); compiling with tcpdump")
+            return compile_with_tcpdump(self.expression, self.interface)
+
+    def _attach(self, program: List[Instruction]):
+        blob = b''.join(struct.pack('HBBI', *instruction) for instruction in program)
+        self._filter_buffer = ctypes.create_string_buffer(blob)
+        fprog = struct.pack('HL', len(program), ctypes.addressof(self._filter_buffer))
+        self._sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def open(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self._sock = sock
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+            # پیش از bind همه چیز را رد کن تا پکت‌های فیلترنشده در صف نمانند
+            self._attach([(BPF_RET_K, 0, 0, 0)])
+            if self.interface != 'any':
+                sock.bind((self.interface, 0))
+            sock.setblocking(False)
+            try:
+                while sock.recv(1):
+                    pass
+            except (BlockingIOError, InterruptedError):
+                pass
+            self.program = self._compile()
+            self._attach(self.program)
+            self.read_kernel_stats()
+        except Exception:
+            self.close()
+            raise
+        logger.info(f"BPF capture on {self.interface}: {len(self.program)} instructions for '{self.expression}'")
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self) -> 'FilteredCapture':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def read_kernel_stats(self) -> Tuple[int, int]:
+        """(پکت‌های پذیرفته‌شده، پکت‌های حذف‌شده) از زمان آخرین خواندن؛ کرنل شمارنده‌ها را صفر می‌کند"""
+        packets, drops = struct.unpack('II', self._sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+        self.kernel_drops += drops
+        return packets, drops
+
+    def packets(self, duration: Optional[float] = None, poll_timeout: float = 1.0) -> Iterator[PacketView]:
+        """تحویل پکت‌های عبوری از فیلتر تا پایان مدت (یا بی‌پایان)"""
+        if self._sock is None:
+            self.open()
+        self._sock.settimeout(poll_timeout)
+        deadline = time.monotonic() + duration if duration is not None else None
+        buffer = bytearray(self.snaplen)
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                size = self._sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            self.delivered_packets += 1
+            self.delivered_bytes += size
+            # کپی لازم است چون بافر برای پکت بعدی بازنویسی می‌شود
+            yield PacketView(time.time(), LINKTYPE_ETHERNET, memoryview(bytes(buffer[:size])))
+
+    def measure(self, duration: float = 10.0) -> CaptureStats:
+        """حالت اندازه‌گیری: نرخ پذیرش فیلتر، حذف در کرنل و CPU به ازای هر Mbps ترافیک رابط"""
+        start_packets, start_bytes = _interface_counters(self.interface)
+        start_cpu = time.process_time()
+        start = time.monotonic()
+        for _ in self.packets(duration):
+            pass
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - start_cpu
+        self.read_kernel_stats()
+        end_packets, end_bytes = _interface_counters(self.interface)
+
+        interface_packets = max(end_packets - start_packets, 0)
+        interface_bytes = max(end_bytes - start_bytes, 0)
+        link_mbps = interface_bytes * 8 / 1e6 / elapsed if elapsed else 0.0
+        return CaptureStats(
+            interface=self.interface,
+            seconds=elapsed,
+            interface_packets=interface_packets,
+            interface_bytes=interface_bytes,
+            delivered_packets=self.delivered_packets,
+            delivered_bytes=self.delivered_bytes,
+            kernel_drops=self.kernel_drops,
+            accept_rate=self.delivered_packets / interface_packets if interface_packets else 0.0,
+            link_mbps=link_mbps,
+            cpu_seconds=cpu,
+            cpu_per_mbps=cpu / link_mbps if link_mbps else 0.0
+        )
+
+
+def main():
+    """چاپ فیلتر تولیدشده یا اجرای حالت اندازه‌گیری"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Kernel-side BPF capture front-end")
+    parser.add_argument('--interface', default='any')
+    parser.add_argument('--ports', default='3333,3334,3335,3336,4028,4029,4030,8333,8332,9999,14444')
+    parser.add_argument('--prefix', action='append', default=[], help="payload prefix, e.g. '{\"'")
+    parser.add_argument('--measure', type=float, metavar='SECONDS', help="capture and report filter statistics")
+    args = parser.parse_args()
+
+    ports = [int(p) for p in args.ports.split(',') if p]
+    prefixes = [p.encode() for p in args.prefix]
+    logger.info(f"Expression: {build_bpf_expression(ports, prefixes)}")
+    program = build_filter_program(ports, prefixes)
+    for op, jt, jf, k in program:
+        print(f"{{ 0x{op:02x}, {jt}, {jf}, 0x{k:08x} }},")
+    if args.measure:
+        with FilteredCapture(args.interface, ports, prefixes) as capture:
+            stats = capture.measure(args.measure)
+        logger.info(f"Capture statistics: {stats.to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded Capture Ring and Rotating Spill Files
+بافر حلقوی پکت‌های اخیر، فایل‌های فشرده چرخشی و ذخیره شواهد پیرامون جریان‌های مشکوک
+"""
+
+import gzip
+import logging
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, BinaryIO, Deque, Dict, List, Optional, Tuple
+
+try:
+    from .pcap_reader import LINKTYPE_ETHERNET, PcapWriter
+except ImportError:
+    from pcap_reader import LINKTYPE_ETHERNET, PcapWriter
+
+logger = logging.getLogger(__name__)
+
+# سربار تقریبی هر پکت در حافظه (tuple، شیء bytes و رشته‌های آدرس)
+_PACKET_OVERHEAD = 160
+
+RingPacket = Tuple[float, bytes, int, Optional[str], Optional[str]]
+
+
+class PacketRing:
+    """
+    بافر حلقوی پکت‌های اخیر با سقف حجم؛ قدیمی‌ترین پکت‌ها با رسیدن به سقف کنار گذاشته می‌شوند.
+    آدرس‌ها همراه پکت نگه داشته می‌شوند تا استخراج شواهد نیازی به رمزگشایی دوباره نداشته باشد.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_packets: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_packets = max_packets
+        self._packets: Deque[RingPacket] = deque()
+        self.bytes = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    @property
+    def oldest(self) -> Optional[float]:
+        return self._packets[0][0] if self._packets else None
+
+    def append(self, ts: float, data: bytes, orig_len: Optional[int] = None,
+               src: Optional[str] = None, dst: Optional[str] = None):
+        self._packets.append((ts, data, len(data) if orig_len is None else orig_len, src, dst))
+        self.bytes += len(data) + _PACKET_OVERHEAD
+        while self._packets and (self.bytes > self.max_bytes
+                                 or (self.max_packets is not None and len(self._packets) > self.max_packets)):
+            _, old, _, _, _ = self._packets.popleft()
+            self.bytes -= len(old) + _PACKET_OVERHEAD
+            self.evicted += 1
+
+    def between(self, start: float, end: float, hosts: Optional[Tuple[str, str]] = None) -> List[RingPacket]:
+        """پکت‌های بازه زمانی؛ با hosts فقط پکت‌های بین همان دو میزبان (در هر جهت)"""
+        pair = set(hosts) if hosts else None
+        return [packet for packet in self._packets
+                if start <= packet[0] <= end and (pair is None or {packet[3], packet[4]} == pair)]
+
+
+class RotatingSpill:
+    """
+    نوشتن پیوسته پکت‌ها در فایل‌های pcap فشرده (gzip) با سقف حجم و زمان برای هر فایل.
+    فقط max_files فایل آخر نگه داشته می‌شوند، بنابراین فضای دیسک هم محدود است.
+    """
+
+    def __init__(self, directory: str, prefix: str = 'mining_traffic', max_file_bytes: int = 256 * 1024 * 1024,
+                 max_file_seconds: float = 3600.0, max_files: int = 48, linktype: int = LINKTYPE_ETHERNET,
+                 compresslevel: int = 1):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.max_file_seconds = max_file_seconds
+        self.max_files = max_files
+        self.linktype = linktype
+        self.compresslevel = compresslevel
+
+        self.files: Deque[str] = deque()
+        self._raw: Optional[BinaryIO] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._writer: Optional[PcapWriter] = None
+        self._opened_at = 0.0
+        self._sequence = 0
+        self.packets_written = 0
+        self.files_rotated = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # فایل‌های باقی‌مانده از اجرای قبلی هم در سهمیه حساب می‌شوند
+        pattern = re.compile(rf'^{re.escape(prefix)}_\d{{8}}_\d{{6}}_\d+\.pcap\.gz$')
+        for name in sorted(os.listdir(directory)):
+            if pattern.match(name):
+                self.files.append(os.path.join(directory, name))
+
+    @property
+    def current_file(self) -> Optional[str]:
+        return self.files[-1] if self._writer is not None else None
+
+    def _open(self, ts: float):
+        self._sequence += 1
+        stamp = datetime.fromtimestamp(ts).strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.directory, f"{self.prefix}_{stamp}_{self._sequence:04d}.pcap.gz")
+        self._raw = open(path, 'wb')
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=self.compresslevel)
+        self._writer = PcapWriter(self._gzip, linktype=self.linktype)
+        self._opened_at = ts
+        self.files.append(path)
+        self._prune()
+
+    def _close_current(self):
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.close()
+        self._raw = self._gzip = self._writer = None
+
+    def _prune(self):
+        while len(self.files) > self.max_files:
+            old = self.files.popleft()
+            try:
+                os.unlink(old)
+            except OSError as e:
+                logger.warning(f"Could not remove spill file {old}: {e}")
+
+    def write(self, ts: float, data: bytes, orig_len: Optional[int] = None):
+        if self._writer is not None and (self._raw.tell() >= self.max_file_bytes
+                                         or ts - self._opened_at >= self.max_file_seconds):
+            self._close_current()
+            self.files_rotated += 1
+        if self._writer is None:
+            self._open(ts)
+        self._writer.write(ts, data, orig_len)
+        self.packets_written += 1
+
+    def close(self):
+        self._close_current()
+
+
+@dataclass
+class EvidenceRequest:
+    """درخواست ذخیره شواهد یک جفت میزبان"""
+    hosts: Tuple[str, str]
+    trigger_ts: float
+    label: str
+    deadline: float
+    info: Dict[str, Any] = field(default_factory=dict)
+
+
+class EvidenceRecorder:
+    """
+    ذخیره بافت پیش و پس از یک رخداد به صورت فایل pcap کوچک.
+    پکت‌های پس از رخداد هم وارد همان بافر حلقوی می‌شوند؛ پس از گذشت post_seconds، پکت‌های
+    [trigger - pre_seconds, trigger + post_seconds] بین دو میزبان از بافر استخراج می‌شوند.
+    """
+
+    def __init__(self, ring: PacketRing, directory: str, pre_seconds: float = 30.0, post_seconds: float = 30.0,
+                 cooldown: float = 600.0, linktype: int = LINKTYPE_ETHERNET, max_history: int = 1000):
+        self.ring = ring
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.cooldown = cooldown
+        self.linktype = linktype
+        self._pending: Deque[EvidenceRequest] = deque()
+        self._last_trigger: Dict[Tuple[str, str], float] = {}
+        self.snippets: Deque[Dict[str, Any]] = deque(maxlen=max_history)
+        os.makedirs(directory, exist_ok=True)
+
+    def trigger(self, ts: float, hosts: Tuple[str, str], label: str, **info) -> bool:
+        """ثبت رخداد؛ رخدادهای تکراری همان جفت میزبان در بازه cooldown نادیده گرفته می‌شوند"""
+        pair = tuple(sorted(hosts))
+        last = self._last_trigger.get(pair)
+        if last is not None and ts - last < self.cooldown:
+            return False
+        self._last_trigger[pair] = ts
+        if len(self._last_trigger) > 4 * self.snippets.maxlen:
+            horizon = ts - self.cooldown
+            self._last_trigger = {key: value for key, value in self._last_trigger.items() if value >= horizon}
+        self._pending.append(EvidenceRequest(pair, ts, label, ts + self.post_seconds, info))
+        return True
+
+    def poll(self, now: float) -> List[Dict[str, Any]]:
+        """نوشتن شواهدی که مهلت پس از رخدادشان گذشته است"""
+        written = []
+        while self._pending and self._pending[0].deadline <= now:
+            written.append(self._write(self._pending.popleft()))
+        return written
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """نوشتن همه شواهد در انتظار با بافت موجود (مثلاً در پایان ضبط)"""
+        written = [self._write(request) for request in self._pending]
+        self._pending.clear()
+        return written
+
+    def _write(self, request: EvidenceRequest) -> Dict[str, Any]:
+        start = request.trigger_ts - self.pre_seconds
+        packets = self.ring.between(start, request.deadline, request.hosts)
+        oldest = self.ring.oldest
+        stamp = datetime.fromtimestamp(request.trigger_ts).strftime('%Y%m%d_%H%M%S')
+        label = re.sub(r'[^A-Za-z0-9_-]', '_', request.label)
+        path = os.path.join(self.directory,
+                            f"evidence_{stamp}_{request.hosts[0]}_{request.hosts[1]}_{label}.pcap".replace(':', '-'))
+        try:
+            with open(path, 'wb') as f:
+                writer = PcapWriter(f, linktype=self.linktype)
+                for ts, data, orig_len, _, _ in packets:
+                    writer.write(ts, data, orig_len)
+        except OSError as e:
+            logger.error(f"Error writing evidence snippet {path}: {e}")
+            path = None
+
+        snippet = {
+            'path': path,
+            'hosts': list(request.hosts),
+            'label': request.label,
+            'trigger_ts': request.trigger_ts,
+            'packets': len(packets),
+            # اگر بافر پیش از شروع بازه پر و تخلیه شده باشد بخشی از بافت قبلی از دست رفته است
+            'pre_context_complete': oldest is not None and oldest <= start,
+            **request.info
+        }
+        self.snippets.append(snippet)
+        logger.info(f"🗂️ Evidence snippet {path}: {len(packets)} packets around {request.label}")
+        return snippet
+
+
+class CaptureRing:
+    """
+    خط لوله ضبط با حافظه ثابت: هر پکت در بافر حلقوی و فایل‌های چرخشی نوشته می‌شود و
+    برای جریان‌های علامت‌خورده فایل شواهد ساخته می‌شود.
+    """
+
+    def __init__(self, directory: str = 'captures', ring_bytes: int = 64 * 1024 * 1024,
+                 max_file_bytes: int = 256 * 1024 * 1024, max_file_seconds: float = 3600.0,
+                 max_files: int = 48, pre_seconds: float = 30.0, post_seconds: float = 30.0,
+                 linktype: int = LINKTYPE_ETHERNET, spill: bool = True):
+        self.ring = PacketRing(ring_bytes)
+        self.spill = RotatingSpill(os.path.join(directory, 'spill'), max_file_bytes=max_file_bytes,
+                                   max_file_seconds=max_file_seconds, max_files=max_files,
+                                   linktype=linktype) if spill else None
+        self.evidence = EvidenceRecorder(self.ring, os.path.join(directory, 'evidence'), pre_seconds,
+                                         post_seconds, linktype=linktype)
+        self.packets = 0
+
+    def add(self, ts: float, data: bytes, orig_len: Optional[int] = None,
+            src: Optional[str] = None, dst: Optional[str] = None) -> List[Dict[str, Any]]:
+        """افزودن یک پکت؛ شواهد تکمیل‌شده برگردانده می‌شوند"""
+        self.packets += 1
+        self.ring.append(ts, data, orig_len, src, dst)
+        if self.spill is not None:
+            try:
+                self.spill.write(ts, data, orig_len)
+            except OSError as e:
+                logger.error(f"Spill write failed, continuing in memory only: {e}")
+                self.spill.close()
+                self.spill = None
+        return self.evidence.poll(ts)
+
+    def add_view(self, view) -> List[Dict[str, Any]]:
+        return self.add(view.ts, bytes(view.data), view.orig_len, view.src, view.dst)
+
+    def flag(self, ts: float, src: str, dst: str, label: str, **info) -> bool:
+        """علامت‌گذاری یک جریان برای ذخیره شواهد"""
+        return self.evidence.trigger(ts, (src, dst), label, **info)
+
+    def close(self) -> List[Dict[str, Any]]:
+        if self.spill is not None:
+            self.spill.close()
+        return self.evidence.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'packets': self.packets,
+            'ring_packets': len(self.ring),
+            'ring_bytes': self.ring.bytes,
+            'ring_evicted': self.ring.evicted,
+            'spill_files': list(self.spill.files) if self.spill else [],
+            'spill_rotations': self.spill.files_rotated if self.spill else 0,
+            'evidence_snippets': len(self.evidence.snippets)
+        }
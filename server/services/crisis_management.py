@@ -6,6 +6,7 @@ Crisis Management and Emergency Operations System
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import time
@@ -18,12 +19,18 @@ import sqlite3
 import threading
 from concurrent.futures import ThreadPoolExecutor
 import requests
-from geopy.distance import geodesic
 import folium
 from folium import plugins
 import webbrowser
 import os
 
+try:
+    from .geo_math import bearing_deg, haversine_km
+    from .heatmap_tiles import CELL_BITS, THREAT_LEVELS, THREAT_RANK, aggregate_cells, cell_bounds, get_heatmap_tiles
+except ImportError:
+    from geo_math import bearing_deg, haversine_km
+    from heatmap_tiles import CELL_BITS, THREAT_LEVELS, THREAT_RANK, aggregate_cells, cell_bounds, get_heatmap_tiles
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -73,6 +80,9 @@ class CrisisManagementSystem:
             "ilam_center": {"lat": 33.6374, "lng": 46.4227},
             "emergency_radius_km": 50
         }
+        # Alerts beyond this many get aggregated into grid cells on the crisis map
+        self.map_detail_limit = 100
+        self.map_cell_zoom = 12
         
         # Initialize database
         self._init_database()
@@ -431,6 +441,15 @@ class CrisisManagementSystem:
         # Add to active alerts
         self.active_alerts[alert_id] = alert
         
+        # Update pre-aggregated heatmap tiles
+        get_heatmap_tiles().add([{
+            "lat": alert.location["lat"],
+            "lng": alert.location["lng"],
+            "severity": severity,
+            "power_consumption": alert.estimated_power_consumption,
+            "confidence": detection_result.get("confidence")
+        }])
+        
         # Assign emergency team
         await self._assign_emergency_team(alert)
         
@@ -459,13 +478,20 @@ class CrisisManagementSystem:
         ]
         
         if available_teams:
-            # Assign based on team capabilities and current workload
-            best_team = min(available_teams, key=lambda t: len(t.assigned_alerts))
+            # Assign based on current workload, then distance to the alert (one vectorized haversine)
+            distances = haversine_km(
+                alert.location["lat"], alert.location["lng"],
+                [t.current_location["lat"] for t in available_teams],
+                [t.current_location["lng"] for t in available_teams]
+            )
+            best = min(range(len(available_teams)),
+                       key=lambda i: (len(available_teams[i].assigned_alerts), distances[i]))
+            best_team = available_teams[best]
             alert.assigned_team = best_team.id
             best_team.assigned_alerts.append(alert.id)
             best_team.status = "busy"
             
-            logger.info(f"Team {best_team.name} assigned to alert {alert.id}")
+            logger.info(f"Team {best_team.name} assigned to alert {alert.id} ({distances[best]:.1f} km away)")
     
     async def generate_crisis_map(self) -> str:
         """Generate interactive crisis map with all active alerts"""
@@ -492,7 +518,24 @@ class CrisisManagementSystem:
             "critical": "red"
         }
         
-        for alert in self.active_alerts.values():
+        # Detailed markers only for the most severe/recent alerts; the rest are aggregated per cell
+        ranked = sorted(
+            self.active_alerts.values(),
+            key=lambda a: (THREAT_RANK.get(a.severity, 0), a.timestamp),
+            reverse=True
+        )
+        detailed, aggregated = ranked[:self.map_detail_limit], ranked[self.map_detail_limit:]
+        
+        # Identical alert/team state produces an identical map file, so reuse it
+        state = hashlib.sha1(json.dumps([
+            [(a.id, a.status, a.assigned_team) for a in ranked],
+            [(t.id, t.status, t.current_location) for t in self.emergency_teams.values()]
+        ], sort_keys=True, default=str).encode()).hexdigest()[:16]
+        map_filename = f"crisis_map_{state}.html"
+        if os.path.exists(map_filename):
+            return map_filename
+        
+        for alert in detailed:
             color = severity_colors.get(alert.severity, "gray")
             
             # Create detailed popup content
@@ -533,12 +576,52 @@ class CrisisManagementSystem:
                 icon=folium.Icon(color=color, icon='warning-sign')
             ).add_to(crisis_map)
         
+        if aggregated:
+            cx, cy, count, power, max_threat, _ = aggregate_cells(
+                [a.location["lat"] for a in aggregated],
+                [a.location["lng"] for a in aggregated],
+                [a.estimated_power_consumption or 0.0 for a in aggregated],
+                [THREAT_RANK.get(a.severity, 0) for a in aggregated],
+                zooms=[self.map_cell_zoom]
+            )[self.map_cell_zoom]
+            south, west, north, east = cell_bounds(cx, cy, self.map_cell_zoom + CELL_BITS)
+            for i in range(len(cx)):
+                folium.CircleMarker(
+                    [float((south[i] + north[i]) / 2), float((west[i] + east[i]) / 2)],
+                    radius=float(min(4 + 2 * np.log2(count[i]), 20)),
+                    tooltip=f"Alerts: {count[i]}, power: {power[i]:.0f} W, "
+                            f"max severity: {THREAT_LEVELS[max_threat[i]]}",
+                    color=severity_colors.get(THREAT_LEVELS[max_threat[i]], "gray"),
+                    fill=True
+                ).add_to(crisis_map)
+        
+        # Draw team-to-alert routes with great-circle distance and bearing
+        routed = [
+            (alert, self.emergency_teams[alert.assigned_team])
+            for alert in detailed
+            if alert.assigned_team in self.emergency_teams
+        ]
+        if routed:
+            team_lat = [team.current_location["lat"] for _, team in routed]
+            team_lng = [team.current_location["lng"] for _, team in routed]
+            alert_lat = [alert.location["lat"] for alert, _ in routed]
+            alert_lng = [alert.location["lng"] for alert, _ in routed]
+            distances = haversine_km(team_lat, team_lng, alert_lat, alert_lng)
+            bearings = bearing_deg(team_lat, team_lng, alert_lat, alert_lng)
+            for i, (alert, team) in enumerate(routed):
+                folium.PolyLine(
+                    [[team_lat[i], team_lng[i]], [alert_lat[i], alert_lng[i]]],
+                    tooltip=f"{team.name} → {alert.id}: {distances[i]:.1f} km, {bearings[i]:.0f}°",
+                    color='blue',
+                    weight=2,
+                    dash_array='6'
+                ).add_to(crisis_map)
+        
         # Add routing capabilities
         plugins.Fullscreen().add_to(crisis_map)
         plugins.MousePosition().add_to(crisis_map)
         
         # Save map
-        map_filename = f"crisis_map_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
         crisis_map.save(map_filename)
         
         logger.info(f"Crisis map generated: {map_filename}")
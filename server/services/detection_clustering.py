@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detection Clustering Engine
+خوشه‌بندی جغرافیایی تشخیص‌ها با DBSCAN هاورسین روی درخت، آمار برداری خوشه‌ها و به‌روزرسانی تدریجی
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .geo_math import (EARTH_RADIUS_KM, ILAM_CENTER, GeoTree, detection_coordinates, haversine_km,
+                           km_to_chord, unit_vectors)
+except ImportError:
+    from geo_math import (EARTH_RADIUS_KM, ILAM_CENTER, GeoTree, detection_coordinates, haversine_km,
+                          km_to_chord, unit_vectors)
+
+try:
+    from sklearn.cluster import HDBSCAN
+except ImportError:
+    HDBSCAN = None
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('dbscan', 'hdbscan')
+# تعداد پرس‌وجوی شعاعی در هر تکه؛ جفت‌های همسایه هر تکه پس از مصرف دور ریخته می‌شوند
+QUERY_CHUNK = 16384
+
+
+def _compress(parent: np.ndarray):
+    """فشرده‌سازی کامل مسیرها: هر عنصر مستقیم به ریشه‌اش اشاره می‌کند"""
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            return
+        parent[:] = grand
+
+
+def _union(parent: np.ndarray, a: np.ndarray, b: np.ndarray):
+    """اتصال برداری یال‌های (a, b)؛ ریشه بزرگ‌تر به کوچک‌تر قلاب می‌شود تا همگرایی"""
+    while len(a):
+        _compress(parent)
+        ra, rb = parent[a], parent[b]
+        differ = ra != rb
+        if not differ.any():
+            return
+        a, b, ra, rb = a[differ], b[differ], ra[differ], rb[differ]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+
+
+def dbscan_haversine(lats: Sequence[float], lons: Sequence[float], eps_km: float, min_samples: int,
+                     tree: Optional[GeoTree] = None, chunk: int = QUERY_CHUNK) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    DBSCAN با فاصله هاورسین: (برچسب خوشه یا -1 برای نویز، ماسک نقاط هسته).
+
+    نقاط در سلول‌های مکعبی به ضلع eps/√3 (روی بردارهای یکه) دسته می‌شوند؛ هر دو نقطه یک سلول
+    همسایه‌اند، پس سلولی با دست‌کم min_samples نقطه بی‌پرس‌وجو هسته است و فقط بقیه شمرده می‌شوند.
+    گذر دوم تکه‌ای روی درخت هسته‌های همسایه را با union-find برداری وصل و نقاط مرزی را به نزدیک‌ترین
+    هسته نسبت می‌دهد. حافظه به اندازه یک تکه است، نه همه همسایگی‌ها.
+    """
+    lats = np.asarray(lats, dtype=np.float64).ravel()
+    lons = np.asarray(lons, dtype=np.float64).ravel()
+    n = len(lats)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    tree = tree if tree is not None else GeoTree(lats, lons)
+
+    side = km_to_chord(eps_km) / np.sqrt(3) * (1 - 1e-9)
+    cells = np.floor(unit_vectors(lats, lons) / side).astype(np.int64)
+    _, cell_of, cell_size = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    core = cell_size[cell_of.ravel()] >= min_samples
+    sparse = np.nonzero(~core)[0]
+    for start in range(0, len(sparse), chunk):
+        rows = sparse[start:start + chunk]
+        q, _, _ = tree.radius_pairs(lats[rows], lons[rows], eps_km, sort=False)
+        core[rows] = np.bincount(q, minlength=len(rows)) >= min_samples
+
+    parent = np.arange(n)
+    border_of = np.full(n, -1, dtype=np.int64)
+    for start in range(0, n, chunk):
+        q, i, d = tree.radius_pairs(lats[start:start + chunk], lons[start:start + chunk], eps_km, sort=False)
+        q += start
+        linked = core[q] & core[i] & (q < i)
+        _union(parent, q[linked], i[linked])
+        # نقطه مرزی به نزدیک‌ترین هسته همسایه‌اش می‌پیوندد
+        border = np.nonzero(~core[q] & core[i])[0]
+        border = border[np.lexsort((d[border], q[border]))]
+        rows, first = np.unique(q[border], return_index=True)
+        border_of[rows] = i[border[first]]
+    _compress(parent)
+
+    roots = np.full(n, -1, dtype=np.int64)
+    roots[core] = parent[core]
+    has_core = border_of >= 0
+    roots[has_core] = parent[border_of[has_core]]
+    labels = np.full(n, -1, dtype=np.int64)
+    clustered = roots >= 0
+    # شماره‌گذاری پیوسته خوشه‌ها به ترتیب اولین ظهور
+    unique_roots, inverse = np.unique(roots[clustered], return_inverse=True)
+    first_seen = np.full(len(unique_roots), n, dtype=np.int64)
+    np.minimum.at(first_seen, inverse, np.nonzero(clustered)[0])
+    rank = np.empty(len(unique_roots), dtype=np.int64)
+    rank[np.argsort(first_seen)] = np.arange(len(unique_roots))
+    labels[clustered] = rank[inverse]
+    return labels, core
+
+
+class DetectionClusterer:
+    """
+    موتور خوشه‌بندی تدریجی تشخیص‌ها.
+
+    fit همه تشخیص‌ها را از نو خوشه‌بندی می‌کند (DBSCAN هاورسین، یا HDBSCAN در صورت وجود sklearn).
+    add تشخیص‌های جدید را با یک پرس‌وجوی نزدیک‌ترین همسایه روی درخت نقاط هسته به خوشه موجود
+    (در فاصله eps) نسبت می‌دهد و بقیه را موقتا نویز می‌گذارد. وقتی نسبت تشخیص‌های جذب‌نشده از
+    drift_threshold، یا رشد داده از max_growth آخرین خوشه‌بندی کامل بیشتر شود، خوشه‌بندی کامل
+    دوباره اجرا می‌شود؛ با background روی یک نخ جدا، در حالی که add با خوشه‌های قبلی ادامه می‌دهد.
+    آمار خوشه‌ها با group-by برداری (bincount) روی آرایه‌ها حساب می‌شود.
+    """
+
+    def __init__(self, eps_km: float = 1.0, min_samples: int = 2, method: str = 'dbscan',
+                 drift_threshold: float = 0.05, max_growth: float = 0.5, keep_detections: bool = True,
+                 background: bool = False):
+        if method not in METHODS:
+            raise ValueError(f"Unknown clustering method: {method}")
+        if method == 'hdbscan' and HDBSCAN is None:
+            logger.warning("HDBSCAN requires scikit-learn >= 1.3; falling back to DBSCAN")
+            method = 'dbscan'
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.method = method
+        self.drift_threshold = drift_threshold
+        self.max_growth = max_growth
+        self.keep_detections = keep_detections
+        self.background = background
+        self._lock = threading.RLock()
+        self._recluster_thread: Optional[threading.Thread] = None
+        self._generation = 0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._generation += 1
+            self.lat = np.empty(0)
+            self.lon = np.empty(0)
+            self.confidence = np.empty(0)
+            self.threat = np.empty(0, dtype=np.int32)
+            self.labels = np.empty(0, dtype=np.int64)
+            self.core = np.zeros(0, dtype=bool)
+            self.detections: List[Dict] = []
+            self.threat_names: List[str] = []
+            self._threat_codes: Dict[str, int] = {}
+            self._anchor_tree: Optional[GeoTree] = None
+            self._anchor_labels = np.empty(0, dtype=np.int64)
+            self.fitted_count = 0
+            self.absorbed_since_fit = 0
+            self.outside_since_fit = 0
+            self.reclusters = 0
+            self.last_recluster_s = 0.0
+            self.last_add_s = 0.0
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ─── ورودی ──────────────────────────────────────────────────────────────
+    def _threat_code(self, level: str) -> int:
+        code = self._threat_codes.get(level)
+        if code is None:
+            code = self._threat_codes[level] = len(self.threat_names)
+            self.threat_names.append(level)
+        return code
+
+    def _append(self, detections: Iterable[Dict]) -> int:
+        """افزودن تشخیص‌های دارای مختصات به آرایه‌ها؛ تعداد افزوده‌شده"""
+        lats, lons, conf, threat, kept = [], [], [], [], []
+        for detection in detections:
+            lat, lon = detection_coordinates(detection)
+            if lat is None:
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            conf.append(float(detection.get('confidence_score', detection.get('confidence', 0)) or 0))
+            threat.append(self._threat_code(str(detection.get('threat_level', 'unknown'))))
+            kept.append(detection)
+        return self._append_arrays(lats, lons, conf, threat, kept)
+
+    def _append_arrays(self, lats, lons, conf, threat, kept: Optional[List[Dict]] = None) -> int:
+        count = len(lats)
+        if not count:
+            return 0
+        self.lat = np.concatenate([self.lat, np.asarray(lats, dtype=np.float64)])
+        self.lon = np.concatenate([self.lon, np.asarray(lons, dtype=np.float64)])
+        self.confidence = np.concatenate([self.confidence, np.asarray(conf, dtype=np.float64)])
+        self.threat = np.concatenate([self.threat, np.asarray(threat, dtype=np.int32)])
+        self.labels = np.concatenate([self.labels, np.full(count, -1, dtype=np.int64)])
+        self.core = np.concatenate([self.core, np.zeros(count, dtype=bool)])
+        if self.keep_detections and kept is not None:
+            self.detections.extend(kept)
+        return count
+
+    # ─── خوشه‌بندی ──────────────────────────────────────────────────────────
+    def fit(self, detections: Iterable[Dict]) -> np.ndarray:
+        """خوشه‌بندی کامل از صفر؛ برچسب هر تشخیص دارای مختصات"""
+        with self._lock:
+            self.reset()
+            self._append(detections)
+            self.recluster(background=False)
+            return self.labels.copy()
+
+    def _cluster(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.method == 'hdbscan' and len(lat) > self.min_samples:
+            model = HDBSCAN(min_cluster_size=max(self.min_samples, 2), metric='haversine')
+            labels = model.fit(np.radians(np.column_stack([lat, lon]))).labels_.astype(np.int64)
+            # HDBSCAN هسته صریح ندارد؛ همه نقاط خوشه‌دار لنگر نسبت‌دهی‌اند
+            return labels, labels >= 0
+        return dbscan_haversine(lat, lon, self.eps_km, self.min_samples)
+
+    def recluster(self, background: Optional[bool] = None):
+        """خوشه‌بندی کامل همه نقاط و ساخت درخت نقاط هسته برای نسبت‌دهی تدریجی"""
+        background = self.background if background is None else background
+        with self._lock:
+            if self._recluster_thread is not None and self._recluster_thread.is_alive():
+                return
+            # آرایه‌ها با افزودن جایگزین می‌شوند، پس این ارجاع‌ها تصویر ثابت همین لحظه است
+            snapshot = (self.lat, self.lon, len(self.lat), self._generation)
+            if not background:
+                self._install(*self._cluster(snapshot[0], snapshot[1]), *snapshot[2:], time.perf_counter())
+                return
+            self._recluster_thread = threading.Thread(target=self._recluster_worker, args=snapshot, daemon=True)
+            self._recluster_thread.start()
+
+    def _recluster_worker(self, lat: np.ndarray, lon: np.ndarray, count: int, generation: int):
+        started = time.perf_counter()
+        try:
+            labels, core = self._cluster(lat, lon)
+        except Exception as e:
+            logger.error(f"Background reclustering failed: {e}")
+            return
+        with self._lock:
+            self._install(labels, core, count, generation, started)
+
+    def _install(self, labels: np.ndarray, core: np.ndarray, count: int, generation: int, started: float):
+        if generation != self._generation:
+            return
+        self.labels[:count] = labels
+        self.core[:count] = core
+        anchors = np.nonzero(core & (labels >= 0))[0]
+        self._anchor_tree = GeoTree(self.lat[anchors], self.lon[anchors]) if len(anchors) else None
+        self._anchor_labels = labels[anchors]
+        self.fitted_count = count
+        self.absorbed_since_fit = 0
+        self.outside_since_fit = 0
+        self.reclusters += 1
+        self.last_recluster_s = time.perf_counter() - started
+        logger.info(f"🧭 Reclustered {count} detections into {self.cluster_count} clusters "
+                    f"in {self.last_recluster_s:.2f}s")
+        # تشخیص‌هایی که هنگام خوشه‌بندی پس‌زمینه رسیدند با خوشه‌های تازه نسبت داده می‌شوند
+        if len(self.lat) > count:
+            self._assign_new(count)
+
+    def add(self, detections: Iterable[Dict]) -> np.ndarray:
+        """افزودن تدریجی؛ برچسب تشخیص‌های جدید (پس از خوشه‌بندی کامل احتمالی)"""
+        with self._lock:
+            start = len(self.lat)
+            self._append(detections)
+            return self._assign_new(start)
+
+    def add_points(self, lats: Sequence[float], lons: Sequence[float],
+                   confidence: Optional[Sequence[float]] = None) -> np.ndarray:
+        """نسخه آرایه‌ای add برای جریان‌های انبوه بدون دیکشنری تشخیص"""
+        with self._lock:
+            start = len(self.lat)
+            count = len(lats)
+            conf = np.zeros(count) if confidence is None else confidence
+            self._append_arrays(lats, lons, conf, np.full(count, self._threat_code('unknown')))
+            return self._assign_new(start)
+
+    def _assign_new(self, start: int) -> np.ndarray:
+        started = time.perf_counter()
+        new = slice(start, len(self.lat))
+        added = len(self.lat) - start
+        if not added:
+            return np.empty(0, dtype=np.int64)
+        outside = added
+        if self._anchor_tree is not None:
+            distance, index = self._anchor_tree.query(self.lat[new], self.lon[new], k=1)
+            labels = np.where(distance[:, 0] <= self.eps_km, self._anchor_labels[np.maximum(index[:, 0], 0)], -1)
+            self.labels[new] = labels
+            outside = int((labels < 0).sum())
+        self.absorbed_since_fit += added - outside
+        self.outside_since_fit += outside
+        if self.fitted_count == 0 or self._drifted():
+            self.recluster()
+        self.last_add_s = time.perf_counter() - started
+        return self.labels[new].copy()
+
+    def _drifted(self) -> bool:
+        growth = (self.absorbed_since_fit + self.outside_since_fit) / max(self.fitted_count, 1)
+        return self.drift > self.drift_threshold or growth > self.max_growth
+
+    @property
+    def drift(self) -> float:
+        """نسبت تشخیص‌های جذب‌نشده از آخرین خوشه‌بندی کامل"""
+        return self.outside_since_fit / max(self.fitted_count, 1)
+
+    @property
+    def cluster_count(self) -> int:
+        return int(self.labels.max()) + 1 if len(self.labels) and self.labels.max() >= 0 else 0
+
+    # ─── آمار ───────────────────────────────────────────────────────────────
+    def cluster_stats(self) -> Dict[str, np.ndarray]:
+        """آمار برداری هر خوشه: تعداد، مرکز کروی، شعاع، میانگین اطمینان و شمارش سطح تهدید"""
+        with self._lock:
+            k = self.cluster_count
+            member = self.labels >= 0
+            labels = self.labels[member]
+            lat, lon = self.lat[member], self.lon[member]
+            counts = np.bincount(labels, minlength=k)
+            xyz = unit_vectors(lat, lon)
+            sums = np.stack([np.bincount(labels, weights=xyz[:, d], minlength=k) for d in range(3)], axis=1)
+            center_lat = np.degrees(np.arctan2(sums[:, 2], np.hypot(sums[:, 0], sums[:, 1])))
+            center_lon = np.degrees(np.arctan2(sums[:, 1], sums[:, 0]))
+            radius = np.zeros(k)
+            if k:
+                np.maximum.at(radius, labels, haversine_km(lat, lon, center_lat[labels], center_lon[labels]))
+            levels = max(len(self.threat_names), 1)
+            threats = np.bincount(labels * levels + self.threat[member], minlength=k * levels).reshape(k, levels)
+            return {
+                'count': counts,
+                'center_lat': center_lat,
+                'center_lon': center_lon,
+                'radius_km': radius,
+                'average_confidence': np.bincount(labels, weights=self.confidence[member], minlength=k)
+                                      / np.maximum(counts, 1),
+                'threat_counts': threats
+            }
+
+    def summary(self, include_detections: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+        """خلاصه خوشه‌ها به شکل خروجی قبلی analyze_detection_clusters (بزرگ‌ترها اول)"""
+        with self._lock:
+            stats = self.cluster_stats()
+            order = np.argsort(-stats['count'], kind='stable')[:limit]
+            members: Dict[int, List[Dict]] = {}
+            if include_detections and self.detections:
+                clustered = np.nonzero(self.labels >= 0)[0]
+                by_label = clustered[np.argsort(self.labels[clustered], kind='stable')]
+                bounds = np.concatenate([[0], np.cumsum(stats['count'])])
+                for c in order:
+                    members[int(c)] = [self.detections[i] for i in by_label[bounds[c]:bounds[c + 1]]]
+            clusters = []
+            for c in order:
+                c = int(c)
+                cluster = {
+                    'cluster_id': c,
+                    'center': {'latitude': float(stats['center_lat'][c]), 'longitude': float(stats['center_lon'][c])},
+                    'radius_km': float(stats['radius_km'][c]),
+                    'detection_count': int(stats['count'][c]),
+                    'average_confidence': float(stats['average_confidence'][c]),
+                    'threat_levels': {name: int(n) for name, n in zip(self.threat_names, stats['threat_counts'][c])
+                                      if n}
+                }
+                if include_detections:
+                    cluster['detections'] = members.get(c, [])
+                clusters.append(cluster)
+            clustered_count = int((self.labels >= 0).sum())
+            return {
+                'clusters': clusters,
+                'total_clusters': self.cluster_count,
+                'total_detections': len(self.lat),
+                'clustered_detections': clustered_count,
+                'noise_detections': len(self.lat) - clustered_count,
+                'method': self.method,
+                'eps_km': self.eps_km,
+                'min_samples': self.min_samples
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'detections': len(self.lat),
+            'clusters': self.cluster_count,
+            'method': self.method,
+            'eps_km': self.eps_km,
+            'fitted_count': self.fitted_count,
+            'absorbed_since_fit': self.absorbed_since_fit,
+            'outside_since_fit': self.outside_since_fit,
+            'drift': self.drift,
+            'reclusters': self.reclusters,
+            'last_recluster_s': self.last_recluster_s,
+            'reclustering': self._recluster_thread is not None and self._recluster_thread.is_alive(),
+            'last_add_s': self.last_add_s
+        }
+
+
+# Global detection clusterer instance
+_detection_clusterer: Optional[DetectionClusterer] = None
+_detection_clusterer_lock = threading.Lock()
+
+
+def get_detection_clusterer() -> DetectionClusterer:
+    """دریافت instance خوشه‌بند تدریجی مشترک"""
+    global _detection_clusterer
+    with _detection_clusterer_lock:
+        if _detection_clusterer is None:
+            _detection_clusterer = DetectionClusterer(background=True)
+        return _detection_clusterer
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# سنجش با کانون‌های مصنوعی
+# ─────────────────────────────────────────────────────────────────────────────
+
+def synthetic_detections(points: int, hotspots: Optional[int] = None, noise: float = 0.1,
+                         spread_km: float = 0.4, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    نقاط اطراف hotspots کانون تصادفی در استان (پیش‌فرض یکی به ازای هر ۲۵۰ نقطه، هم‌مرتبه
+    آبادی‌های استان در مقیاس میلیون) به‌علاوه سهم noise نقطه پراکنده
+    """
+    rng = np.random.default_rng(seed)
+    hotspots = hotspots or max(20, points // 250)
+    centers_lat = ILAM_CENTER[0] + rng.uniform(-1.2, 1.2, hotspots)
+    centers_lon = ILAM_CENTER[1] + rng.uniform(-1.2, 1.2, hotspots)
+    scattered = int(points * noise)
+    pick = rng.integers(0, hotspots, points - scattered)
+    deg = spread_km / EARTH_RADIUS_KM * 180 / np.pi
+    lat = np.concatenate([centers_lat[pick] + rng.normal(0, deg, len(pick)),
+                          ILAM_CENTER[0] + rng.uniform(-1.3, 1.3, scattered)])
+    lon = np.concatenate([centers_lon[pick] + rng.normal(0, deg / np.cos(np.radians(ILAM_CENTER[0])), len(pick)),
+                          ILAM_CENTER[1] + rng.uniform(-1.3, 1.3, scattered)])
+    order = rng.permutation(points)
+    return lat[order], lon[order]
+
+
+def _brute_dbscan(lat: np.ndarray, lon: np.ndarray, eps_km: float, min_samples: int) -> np.ndarray:
+    """DBSCAN مرجع با ماتریس کامل فاصله و BFS برای بررسی درستی روی نمونه کوچک"""
+    within = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) <= eps_km
+    core = within.sum(axis=1) >= min_samples
+    labels = np.full(len(lat), -1)
+    cluster = 0
+    for seed in range(len(lat)):
+        if not core[seed] or labels[seed] >= 0:
+            continue
+        labels[seed] = cluster
+        frontier = [seed]
+        while frontier:
+            point = frontier.pop()
+            for j in np.nonzero(within[point] & (labels < 0))[0]:
+                labels[j] = cluster
+                if core[j]:
+                    frontier.append(j)
+        cluster += 1
+    return labels
+
+
+def _same_partition(a: np.ndarray, b: np.ndarray) -> bool:
+    pairs = set(zip(a.tolist(), b.tolist()))
+    return len(pairs) == len({x for x, _ in pairs}) == len({y for _, y in pairs})
+
+
+def benchmark(points: int = 1_000_000, eps_km: float = 0.5, min_samples: int = 5, batches: int = 20,
+              batch_size: int = 1000, verify: int = 3000, seed: int = 0) -> Dict[str, Any]:
+    """
+    خوشه‌بندی کامل points نقطه، سپس batches دسته تدریجی batch_size تایی و آمار خوشه‌ها.
+    درستی روی verify نقطه با DBSCAN مرجع مقایسه می‌شود (افراز نقاط هسته باید یکسان باشد).
+    """
+    lat, lon = synthetic_detections(points + 2 * batches * batch_size, seed=seed)
+    clusterer = DetectionClusterer(eps_km=eps_km, min_samples=min_samples, keep_detections=False)
+    started = time.perf_counter()
+    clusterer.add_points(lat[:points], lon[:points])
+    fit_s = time.perf_counter() - started
+
+    add_times = []
+    for b in range(batches):
+        chunk = slice(points + b * batch_size, points + (b + 1) * batch_size)
+        started = time.perf_counter()
+        clusterer.add_points(lat[chunk], lon[chunk])
+        add_times.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    summary = clusterer.summary(limit=10)
+    stats_s = time.perf_counter() - started
+
+    # افزودن هم‌زمان با خوشه‌بندی کامل پس‌زمینه
+    clusterer.background = True
+    clusterer.recluster()
+    during = []
+    for b in range(batches, 2 * batches):
+        chunk = slice(points + b * batch_size, points + (b + 1) * batch_size)
+        started = time.perf_counter()
+        clusterer.add_points(lat[chunk], lon[chunk])
+        during.append(time.perf_counter() - started)
+    clusterer._recluster_thread.join()
+
+    v_lat, v_lon = synthetic_detections(verify, hotspots=20, seed=seed + 1)
+    labels, core = dbscan_haversine(v_lat, v_lon, eps_km, min_samples)
+    expected = _brute_dbscan(v_lat, v_lon, eps_km, min_samples)
+    return {
+        'points': points,
+        'full_cluster_s': fit_s,
+        'clusters': summary['total_clusters'],
+        'noise': summary['noise_detections'],
+        'incremental_batch': batch_size,
+        'incremental_add_ms_mean': float(np.mean(add_times) * 1000),
+        'incremental_add_ms_max': float(np.max(add_times) * 1000),
+        'add_during_background_recluster_ms_max': float(np.max(during) * 1000),
+        'stats_ms': stats_s * 1000,
+        'largest_clusters': [{k: c[k] for k in ('cluster_id', 'detection_count', 'radius_km')}
+                             for c in summary['clusters'][:3]],
+        'engine': clusterer.get_stats(),
+        'verified': verify,
+        'core_partition_matches': _same_partition(labels[core], expected[core]),
+        'noise_matches': bool(np.array_equal(labels < 0, expected < 0))
+    }
+
+
+def main():
+    """سنجش خوشه‌بندی"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Haversine DBSCAN detection clustering benchmark")
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--eps', type=float, default=0.5)
+    parser.add_argument('--min-samples', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.points, args.eps, args.min_samples), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asyncio Detection Orchestrator
+هماهنگ‌کننده ناهمگام آشکارسازها با مهلت، لغو و بازگشت نتایج جزئی
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# آشکارساز فهرستی را دریافت می‌کند و نتایج را به محض تولید به آن اضافه می‌کند
+DetectorFn = Callable[[List[Dict]], Awaitable[Any]]
+
+
+@dataclass
+class DetectorSpec:
+    """تعریف یک آشکارساز برای اجرای هماهنگ"""
+    name: str
+    run: DetectorFn
+    deadline_seconds: Optional[float] = None
+
+
+@dataclass
+class DetectorOutcome:
+    """نتیجه اجرای یک آشکارساز"""
+    name: str
+    status: str = 'pending'  # completed | timeout | failed | cancelled
+    results: List[Dict] = field(default_factory=list)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def partial(self) -> bool:
+        return self.status != 'completed' and bool(self.results)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'status': self.status,
+            'results': len(self.results),
+            'partial': self.partial,
+            'elapsed': self.elapsed,
+            'error': self.error
+        }
+
+
+class DetectionOrchestrator:
+    """
+    اجرای هم‌زمان واقعی آشکارسازها روی asyncio.TaskGroup.
+    هر آشکارساز مهلت جداگانه دارد؛ با پایان مهلت یا لغو، نتایج تولیدشده تا آن لحظه برگردانده می‌شود.
+    """
+
+    def __init__(self, default_deadline: float = 120.0):
+        self.default_deadline = default_deadline
+        self._tasks: List[asyncio.Task] = []
+        self.last_outcomes: List[DetectorOutcome] = []
+
+    async def run(self, specs: List[DetectorSpec], overall_deadline: Optional[float] = None) -> List[DetectorOutcome]:
+        """اجرای همه آشکارسازها و بازگرداندن نتیجه هر کدام (به ترتیب specs)"""
+        outcomes = [DetectorOutcome(name=spec.name) for spec in specs]
+        self.last_outcomes = outcomes
+
+        try:
+            async with asyncio.timeout(overall_deadline):
+                async with asyncio.TaskGroup() as tg:
+                    self._tasks = [
+                        tg.create_task(self._run_detector(spec, outcome), name=f"detector:{spec.name}")
+                        for spec, outcome in zip(specs, outcomes)
+                    ]
+        except TimeoutError:
+            logger.warning(f"Detection cycle exceeded overall deadline of {overall_deadline}s")
+        except asyncio.CancelledError:
+            # نتایج جزئی در last_outcomes باقی می‌ماند
+            self._mark_unfinished(outcomes, 'cancelled')
+            raise
+        finally:
+            self._tasks = []
+
+        self._mark_unfinished(outcomes, 'cancelled')
+        for outcome in outcomes:
+            if outcome.status != 'completed':
+                logger.warning(f"Detector {outcome.name} {outcome.status} after {outcome.elapsed:.2f}s "
+                               f"with {len(outcome.results)} partial results")
+        return outcomes
+
+    def cancel(self):
+        """لغو آشکارسازهای در حال اجرا؛ run با نتایج جزئی برمی‌گردد"""
+        for task in self._tasks:
+            task.cancel()
+
+    @staticmethod
+    def _mark_unfinished(outcomes: List[DetectorOutcome], status: str):
+        for outcome in outcomes:
+            if outcome.status == 'pending':
+                outcome.status = status
+
+    async def _run_detector(self, spec: DetectorSpec, outcome: DetectorOutcome):
+        deadline = spec.deadline_seconds if spec.deadline_seconds is not None else self.default_deadline
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(deadline):
+                returned = await spec.run(outcome.results)
+            # آشکارسازهایی که فهرست جدید برمی‌گردانند
+            if isinstance(returned, list) and returned is not outcome.results:
+                outcome.results.extend(returned)
+            outcome.status = 'completed'
+        except TimeoutError:
+            outcome.status = 'timeout'
+            outcome.error = f"deadline of {deadline}s exceeded"
+        except asyncio.CancelledError:
+            outcome.status = 'cancelled'
+            raise
+        except Exception as e:
+            # خطای یک آشکارساز نباید سایرین را لغو کند
+            outcome.status = 'failed'
+            outcome.error = str(e)
+            logger.error(f"Detector {spec.name} failed: {e}")
+        finally:
+            outcome.elapsed = time.perf_counter() - start
+
+
+async def run_bounded(items: Iterable[T], worker: Callable[[T], Awaitable[R]], concurrency: int,
+                      on_result: Callable[[R], None]) -> int:
+    """
+    پردازش تنبل یک تولیدکننده با تعداد ثابت کارگر.
+    کارگرها آیتم بعدی را از همان iterator می‌کشند، پس در هر لحظه حداکثر
+    concurrency کوروتین زنده است و حافظه مستقل از اندازه ورودی ثابت می‌ماند.
+    """
+    iterator = iter(items)
+    processed = 0
+
+    async def pump():
+        nonlocal processed
+        for item in iterator:
+            try:
+                result = await worker(item)
+            except Exception as e:
+                logger.debug(f"Worker failed for {item}: {e}")
+                continue
+            processed += 1
+            on_result(result)
+
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(max(1, concurrency)):
+            tg.create_task(pump())
+    return processed
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared External Enrichment Client
+کلاینت مشترک غنی‌سازی خارجی IP: نشست aiohttp مشترک برای هر سرویس، درخواست دسته‌ای،
+زمان‌بندی سهمیه با سطل توکن برای هر کلید API، تلاش مجدد با تأخیر تصادفی و کش پایدار
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+
+try:
+    from .geo_cache import GeoCache, get_geo_cache
+except ImportError:
+    from geo_cache import GeoCache, get_geo_cache
+
+logger = logging.getLogger(__name__)
+
+# پاسخ‌هایی که ارزش تلاش مجدد دارند
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class EnrichmentError(Exception):
+    """پاسخ خطای سرویس (کلید نامعتبر، سهمیه تمام‌شده و ...) که تلاش مجدد ندارد"""
+
+
+class _RetryableResponse(Exception):
+    def __init__(self, status: int, retry_after: float = 0.0):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    سطل توکن با رزرو: هر درخواست هزینه‌اش را فوراً کم می‌کند (موجودی می‌تواند منفی شود)
+    و تا زمان تأمین آن صبر می‌کند؛ بنابراین ترتیب درخواست‌ها حفظ می‌شود و سطل به حلقه
+    رویداد خاصی وابسته نیست (بین فراخوانی‌های asyncio.run مشترک می‌ماند).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """کم کردن هزینه و برگرداندن زمان انتظار (ثانیه)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= cost
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self, cost: float = 1.0):
+        wait = self.reserve(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """پس از 429 سرویس: درخواست‌های بعدی حداقل seconds صبر می‌کنند"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str, key: str, rate: float, capacity: float) -> TokenBucket:
+    """سطل سهمیه مشترک هر (سرویس، کلید API) در کل فرایند"""
+    with _buckets_lock:
+        bucket = _buckets.get((provider, key))
+        if bucket is None:
+            bucket = _buckets[(provider, key)] = TokenBucket(rate, capacity)
+        return bucket
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# تجزیه پاسخ سرویس‌ها: (IPهای درخواست، بدنه JSON) -> IP به رکورد (None یعنی داده‌ای ندارد)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _parse_ipapi(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    records = payload if isinstance(payload, list) else [payload]
+    found = {r.get('query'): r for r in records if isinstance(r, dict) and r.get('status') == 'success'}
+    if len(ips) == 1 and not isinstance(payload, list) and ips[0] not in found and found:
+        found = {ips[0]: next(iter(found.values()))}
+    return {ip: found.get(ip) for ip in ips}
+
+
+def _parse_ipapi_co(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    if payload.get('reason') == 'RateLimited':
+        raise EnrichmentError(payload.get('reason'))
+    return {ips[0]: None if payload.get('error') else payload}
+
+
+def _parse_ipinfo(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    if len(ips) == 1 and 'ip' in payload:
+        payload = {ips[0]: payload}
+    if 'error' in payload and not any(ip in payload for ip in ips):
+        raise EnrichmentError(str(payload['error']))
+    return {ip: payload.get(ip) if isinstance(payload.get(ip), dict) else None for ip in ips}
+
+
+def _parse_proxycheck(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    if payload.get('status') in ('denied', 'error'):
+        raise EnrichmentError(payload.get('message', payload.get('status')))
+    return {ip: payload.get(ip) for ip in ips}
+
+
+def _parse_abuseipdb(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    if payload.get('errors'):
+        raise EnrichmentError(payload['errors'][0].get('detail', 'error'))
+    return {ips[0]: payload if 'data' in payload else None}
+
+
+def _parse_shodan(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    return {ips[0]: None if 'error' in payload else payload}
+
+
+def _parse_ipstack(ips: Sequence[str], payload: Any) -> Dict[str, Optional[Dict]]:
+    if isinstance(payload, dict) and payload.get('success') is False:
+        raise EnrichmentError(payload.get('error', {}).get('info', 'error'))
+    records = payload if isinstance(payload, list) else [payload]
+    found = {r.get('ip'): r for r in records if isinstance(r, dict) and r.get('latitude') is not None}
+    return {ip: found.get(ip) for ip in ips}
+
+
+@dataclass
+class EnrichmentProvider:
+    """
+    تعریف یک سرویس غنی‌سازی.
+    path با {ip} (درخواست تکی) یا {ips} (فهرست جداشده با کاما) پر می‌شود؛ body برای دسته‌ها
+    'json' (فهرست IP) یا 'form' (ips=...) است. rate/burst سهمیه هر کلید است و با
+    cost_per_ip هزینه هر درخواست دسته‌ای برابر تعداد IPها حساب می‌شود.
+    """
+    name: str
+    base_url: str
+    path: str
+    parser: Callable[[Sequence[str], Any], Dict[str, Optional[Dict]]]
+    method: str = 'GET'
+    batch_size: int = 1
+    body: Optional[str] = None
+    params: Dict[str, str] = field(default_factory=dict)
+    key_env: Optional[str] = None
+    key_param: Optional[str] = None
+    key_header: Optional[str] = None
+    rate: float = 1.0
+    burst: float = 1.0
+    cost_per_ip: bool = False
+    concurrency: int = 4
+    timeout: float = 10.0
+    ttl: float = 24 * 3600
+
+    @property
+    def needs_key(self) -> bool:
+        return bool(self.key_param or self.key_header)
+
+
+PROVIDERS: Dict[str, EnrichmentProvider] = {
+    # دسته ۱۰۰تایی؛ سهمیه رایگان ۱۵ درخواست دسته‌ای در دقیقه
+    'ip-api': EnrichmentProvider(
+        'ip-api', 'http://ip-api.com', '/batch', _parse_ipapi, method='POST', batch_size=100, body='json',
+        params={'fields': 'status,message,country,countryCode,region,regionName,city,zip,lat,lon,timezone,'
+                          'isp,org,as,mobile,proxy,hosting,query'},
+        rate=15 / 60, burst=15),
+    'ipapi': EnrichmentProvider(
+        'ipapi', 'https://ipapi.co', '/{ip}/json/', _parse_ipapi_co, rate=1.0, burst=5),
+    'ipinfo': EnrichmentProvider(
+        'ipinfo', 'https://ipinfo.io', '/batch', _parse_ipinfo, method='POST', batch_size=1000, body='json',
+        key_env='IPINFO_KEY', key_param='token', rate=50, burst=1000, cost_per_ip=True),
+    'proxycheck': EnrichmentProvider(
+        'proxycheck', 'https://proxycheck.io', '/v2/', _parse_proxycheck, method='POST', batch_size=1000,
+        body='form', params={'vpn': '1', 'asn': '1'}, key_env='PROXYCHECK_KEY', key_param='key',
+        rate=10, burst=1000, cost_per_ip=True),
+    'abuseipdb': EnrichmentProvider(
+        'abuseipdb', 'https://api.abuseipdb.com', '/api/v2/check', _parse_abuseipdb,
+        params={'ipAddress': '{ip}', 'maxAgeInDays': '90'}, key_env='ABUSEIPDB_KEY', key_header='Key',
+        rate=1.0, burst=5),
+    'shodan': EnrichmentProvider(
+        'shodan', 'https://api.shodan.io', '/shodan/host/{ip}', _parse_shodan,
+        key_env='SHODAN_KEY', key_param='key', rate=1.0, burst=1, concurrency=1),
+    'ipstack': EnrichmentProvider(
+        'ipstack', 'http://api.ipstack.com', '/{ips}', _parse_ipstack, batch_size=50,
+        key_env='IPSTACK_API_KEY', key_param='access_key', rate=1.0, burst=5),
+}
+
+
+@dataclass
+class ProviderCounters:
+    """شمارنده‌های هر سرویس"""
+    requests: int = 0
+    ips_requested: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class EnrichmentClient:
+    """
+    کلاینت ناهمگام غنی‌سازی؛ به صورت async with استفاده می‌شود تا نشست‌ها بسته شوند.
+
+    خروجی enrich برای هر IP رکورد سرویس، یا None وقتی سرویس داده‌ای ندارد؛ IPهایی که
+    پس از همه تلاش‌ها ناموفق ماندند در خروجی نیستند (و در کش هم ثبت نمی‌شوند).
+    """
+
+    def __init__(self, keys: Optional[Dict[str, str]] = None,
+                 providers: Optional[Dict[str, EnrichmentProvider]] = None,
+                 base_urls: Optional[Dict[str, str]] = None, cache: Optional[GeoCache] = None,
+                 use_cache: bool = True, max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_cap: float = 30.0):
+        self.providers = dict(providers or PROVIDERS)
+        for name, url in (base_urls or {}).items():
+            if name in self.providers:
+                self.providers[name] = replace(self.providers[name], base_url=url)
+        self.keys = {name: (keys or {}).get(name) or (os.getenv(p.key_env) if p.key_env else None)
+                     for name, p in self.providers.items()}
+        self.cache = (cache or get_geo_cache()) if use_cache else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.counters = {name: ProviderCounters() for name in self.providers}
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    async def __aenter__(self) -> 'EnrichmentClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+    def _session(self, provider: EnrichmentProvider) -> aiohttp.ClientSession:
+        """یک نشست (و مخزن اتصال keep-alive) برای هر سرویس"""
+        session = self._sessions.get(provider.name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=provider.concurrency, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=provider.timeout),
+                headers={'Accept': 'application/json', 'User-Agent': 'NationalMinerDetectionSystem/1.0'})
+            self._sessions[provider.name] = session
+        return session
+
+    def _request(self, provider: EnrichmentProvider, ips: Sequence[str], key: Optional[str]) -> Tuple[str, Dict]:
+        url = provider.base_url + provider.path.format(ip=ips[0], ips=','.join(ips))
+        kwargs: Dict[str, Any] = {'params': {k: v.format(ip=ips[0]) for k, v in provider.params.items()}}
+        if provider.key_param:
+            kwargs['params'][provider.key_param] = key
+        if provider.key_header:
+            kwargs['headers'] = {provider.key_header: key}
+        if provider.body == 'json':
+            kwargs['json'] = list(ips)
+        elif provider.body == 'form':
+            kwargs['data'] = {'ips': ','.join(ips)}
+        return url, kwargs
+
+    def _backoff(self, attempt: int, retry_after: float = 0.0) -> float:
+        """تأخیر نمایی با نیمه تصادفی (equal jitter)؛ حداقل به اندازه Retry-After"""
+        ceiling = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        return max(retry_after, ceiling / 2 + random.uniform(0, ceiling / 2))
+
+    async def _fetch(self, provider: EnrichmentProvider, ips: Sequence[str]) -> Optional[Dict[str, Optional[Dict]]]:
+        """یک درخواست (تکی یا دسته‌ای) با سهمیه و تلاش مجدد"""
+        key = self.keys.get(provider.name)
+        counters = self.counters[provider.name]
+        bucket = get_bucket(provider.name, key or '', provider.rate, provider.burst)
+        cost = len(ips) if provider.cost_per_ip else 1
+        url, kwargs = self._request(provider, ips, key)
+        session = self._session(provider)
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire(cost)
+            counters.requests += 1
+            try:
+                async with session.request(provider.method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUS:
+                        retry_after = response.headers.get('Retry-After', '')
+                        raise _RetryableResponse(response.status,
+                                                 float(retry_after) if retry_after.isdigit() else 0.0)
+                    if response.status == 404 and len(ips) == 1:
+                        return {ips[0]: None}
+                    if response.status >= 400:
+                        raise EnrichmentError(f"HTTP {response.status}")
+                    payload = await response.json(content_type=None)
+                return provider.parser(ips, payload)
+            except EnrichmentError as e:
+                counters.errors += 1
+                logger.warning(f"{provider.name} rejected request for {len(ips)} IPs: {e}")
+                return None
+            except (_RetryableResponse, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                retry_after = getattr(e, 'retry_after', 0.0)
+                if getattr(e, 'status', None) == 429:
+                    counters.rate_limited += 1
+                    bucket.pause(retry_after or self._backoff(attempt))
+                if attempt == self.max_retries:
+                    counters.errors += 1
+                    logger.warning(f"{provider.name} failed for {len(ips)} IPs after {attempt + 1} attempts: {e}")
+                    return None
+                counters.retries += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        return None
+
+    async def enrich(self, provider_name: str, ips: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """غنی‌سازی IPها از یک سرویس (ابتدا کش، سپس درخواست‌های دسته‌ای موازی)"""
+        provider = self.providers[provider_name]
+        ips = list(dict.fromkeys(ips))
+        if provider.needs_key and not self.keys.get(provider_name):
+            logger.debug(f"No API key for {provider_name}; skipping")
+            return {}
+        namespace = f'enrichment:{provider_name}'
+        results: Dict[str, Optional[Dict]] = self.cache.get_many(namespace, ips) if self.cache else {}
+        self.counters[provider_name].cache_hits += len(results)
+        remaining = [ip for ip in ips if ip not in results]
+        self.counters[provider_name].ips_requested += len(remaining)
+
+        async def run(chunk: List[str]):
+            fetched = await self._fetch(provider, chunk)
+            if fetched is None:
+                return
+            for ip in chunk:
+                value = fetched.get(ip)
+                results[ip] = value
+                if self.cache is None:
+                    continue
+                if value is None:
+                    self.cache.put_negative(namespace, ip)
+                else:
+                    self.cache.put(namespace, ip, value, ttl=provider.ttl)
+
+        await asyncio.gather(*(run(remaining[i:i + provider.batch_size])
+                               for i in range(0, len(remaining), provider.batch_size)))
+        return results
+
+    async def enrich_many(self, ips: Iterable[str], providers: Sequence[str]) -> Dict[str, Dict[str, Optional[Dict]]]:
+        """غنی‌سازی هم‌زمان از چند سرویس: IP -> سرویس -> رکورد"""
+        ips = list(dict.fromkeys(ips))
+        per_provider = await asyncio.gather(*(self.enrich(name, ips) for name in providers))
+        merged: Dict[str, Dict[str, Optional[Dict]]] = {ip: {} for ip in ips}
+        for name, results in zip(providers, per_provider):
+            for ip, value in results.items():
+                merged[ip][name] = value
+        return merged
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: counters.to_dict() for name, counters in self.counters.items() if counters.requests
+                or counters.cache_hits}
+
+
+def run_sync(factory: Callable[[], Awaitable[Any]]) -> Any:
+    """اجرای coroutine از کد همگام (در صورت وجود حلقه فعال، در یک نخ جدا)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(factory())
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: asyncio.run(factory())).result()
+
+
+def enrich_hosts(ips: Iterable[str], providers: Sequence[str], keys: Optional[Dict[str, str]] = None,
+                 **kwargs) -> Dict[str, Dict[str, Optional[Dict]]]:
+    """نسخه همگام enrich_many برای اسکریپت‌ها"""
+    ips = list(ips)
+
+    async def run():
+        async with EnrichmentClient(keys=keys, **kwargs) as client:
+            return await client.enrich_many(ips, providers)
+    return run_sync(run)
+
+
+class RangeEnricher:
+    """
+    غنی‌سازی همگام یک رنج IP برای اسکریپت‌ها: تکه‌های chunk تایی با یک کلاینت و نشست‌های مشترک
+    روی یک حلقه رویداد. خروجی هر میزبان به ترتیب names و در قالب پاسخ اصلی هر سرویس است
+    (proxycheck به صورت {"status": ..., ip: {...}})؛ سرویس بدون پاسخ مقدار missing می‌گیرد.
+    """
+
+    def __init__(self, names: Sequence[str], keys: Optional[Dict[str, str]] = None, chunk: int = 256,
+                 missing: Any = None, **kwargs):
+        self.names = list(names)
+        self.chunk = max(1, chunk)
+        self.missing = missing
+        self._loop = asyncio.new_event_loop()
+        self.client = EnrichmentClient(keys=keys, **kwargs)
+
+    def __enter__(self) -> 'RangeEnricher':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._loop.run_until_complete(self.client.close())
+        self._loop.close()
+
+    def _legacy(self, provider: str, ip: str, res: Dict[str, Optional[Dict]]) -> Any:
+        if provider not in res:
+            return self.missing
+        if provider == 'proxycheck':
+            return {'status': 'ok', ip: res[provider]} if res[provider] else {'status': 'ok'}
+        return res[provider] or self.missing
+
+    def enrich(self, ips: Sequence[str]) -> Dict[str, Tuple[Any, ...]]:
+        """غنی‌سازی یک تکه: IP -> پاسخ سرویس‌ها به ترتیب names"""
+        results = self._loop.run_until_complete(self.client.enrich_many(ips, self.names))
+        return {ip: tuple(self._legacy(name, ip, results.get(ip, {})) for name in self.names) for ip in ips}
+
+    def hosts(self, start_ip: str, end_ip: str) -> Iterator[Tuple[str, Tuple[Any, ...]]]:
+        """پیمایش رنج (شامل دو سر) با پرس‌وجوی دسته‌ای هر تکه پیش از رسیدن به آن"""
+        current, last = int(ipaddress.IPv4Address(start_ip)), int(ipaddress.IPv4Address(end_ip))
+        while current <= last:
+            chunk = [str(ipaddress.IPv4Address(i)) for i in range(current, min(last, current + self.chunk - 1) + 1)]
+            enriched = self.enrich(chunk)
+            for ip in chunk:
+                yield ip, enriched[ip]
+            current += len(chunk)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# سرویس جعلی محلی برای آزمون و سنجش
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _mock_record(provider: str, ip: str) -> Optional[Dict[str, Any]]:
+    """رکورد قطعی بر اساس IP؛ IPهای با بایت آخر مضرب ۱۳ جز در AbuseIPDB داده ندارند"""
+    last = int(ip.rsplit('.', 1)[-1])
+    if provider == 'abuseipdb':
+        return {'data': {'ipAddress': ip, 'abuseConfidenceScore': (last * 37) % 100}}
+    if last % 13 == 0:
+        return None
+    lat, lon = 32.0 + (last % 250) / 100, 45.5 + (last % 300) / 100
+    if provider == 'ip-api':
+        return {'status': 'success', 'query': ip, 'lat': lat, 'lon': lon, 'city': f'city-{last % 9}',
+                'regionName': 'Ilam', 'country': 'Iran', 'isp': 'Mock ISP'}
+    if provider == 'ipapi':
+        return {'ip': ip, 'latitude': lat, 'longitude': lon, 'city': f'city-{last % 9}', 'region': 'Ilam',
+                'country_name': 'Iran', 'org': 'Mock ISP'}
+    if provider == 'ipinfo':
+        return {'ip': ip, 'loc': f'{lat},{lon}', 'city': f'city-{last % 9}', 'country': 'IR', 'org': 'AS0 Mock'}
+    if provider == 'proxycheck':
+        return {'proxy': 'yes' if last % 7 == 0 else 'no', 'type': 'VPN' if last % 7 == 0 else 'Business'}
+    if provider == 'shodan':
+        return {'ip_str': ip, 'ports': [3333] if last % 11 == 0 else [80]}
+    if provider == 'ipstack':
+        return {'ip': ip, 'latitude': lat, 'longitude': lon, 'city': f'city-{last % 9}', 'region_name': 'Ilam'}
+    return {'ip': ip}
+
+
+class MockProviderServer:
+    """
+    سرور HTTP محلی (فقط asyncio) که نقاط پایانی همه سرویس‌ها را زیر /{provider}/ شبیه‌سازی
+    می‌کند؛ با rate_limit درخواست‌های بیشتر از حد (در ثانیه) پاسخ 429 و با failure_rate خطای
+    503 تصادفی می‌گیرند.
+    """
+
+    def __init__(self, latency: float = 0.005, failure_rate: float = 0.0, rate_limit: Optional[float] = None,
+                 seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self.ips: Dict[str, int] = {}
+        self.rejected = 0
+        self._window: List[float] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.base_url = ''
+
+    async def start(self) -> Dict[str, str]:
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.base_url = f'http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}'
+        return {name: f'{self.base_url}/{name}' for name in PROVIDERS}
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _respond(self, provider: str, path: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+        if provider in ('ip-api', 'ipinfo'):
+            ips = json.loads(body)
+        elif provider == 'proxycheck':
+            ips = parse_qs(body.decode()).get('ips', [''])[0].split(',')
+        elif provider == 'abuseipdb':
+            ips = query['ipAddress']
+        elif provider in ('ipstack', 'ipapi'):
+            ips = path.split('/')[2].split(',')
+        else:
+            ips = [path.rstrip('/').rsplit('/', 1)[-1]]
+        self.ips[provider] = self.ips.get(provider, 0) + len(ips)
+        records = {ip: _mock_record(provider, ip) for ip in ips}
+
+        if provider == 'ip-api':
+            return 200, [records[ip] or {'status': 'fail', 'query': ip} for ip in ips]
+        if provider in ('ipinfo', 'proxycheck'):
+            payload = {ip: record for ip, record in records.items() if record}
+            if provider == 'proxycheck':
+                payload['status'] = 'ok'
+            return 200, payload
+        if provider == 'abuseipdb':
+            return 200, records[ips[0]]
+        if provider == 'ipapi':
+            return 200, records[ips[0]] or {'ip': ips[0], 'error': True, 'reason': 'Reserved IP Address'}
+        if provider == 'shodan':
+            return (200, records[ips[0]]) if records[ips[0]] else (404, {'error': 'No information available'})
+        if provider == 'ipstack':
+            found = [records[ip] or {'ip': ip, 'latitude': None} for ip in ips]
+            return 200, found if len(ips) > 1 else found[0]
+        return 404, {'error': 'unknown provider'}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                target = lines[0].split(' ')[1]
+                headers = {k.lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                url = urlsplit(target)
+                provider = url.path.split('/')[1]
+                self.requests[provider] = self.requests.get(provider, 0) + 1
+                await asyncio.sleep(self.latency)
+
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                extra = b''
+                if self.rate_limit is not None and len(self._window) >= self.rate_limit:
+                    self.rejected += 1
+                    status, payload, extra = 429, {'error': 'rate limited'}, b'Retry-After: 1\r\n'
+                elif self.rng.random() < self.failure_rate:
+                    self.rejected += 1
+                    status, payload = 503, {'error': 'unavailable'}
+                else:
+                    self._window.append(now)
+                    status, payload = self._respond(provider, url.path, parse_qs(url.query), body)
+                data = json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\n'.encode() + extra + b'\r\n' + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def _fast(providers: Dict[str, EnrichmentProvider], rate: float = 1000.0) -> Dict[str, EnrichmentProvider]:
+    """سهمیه بالا برای آزمون محلی"""
+    return {name: replace(p, rate=rate, burst=max(p.burst, rate)) for name, p in providers.items()}
+
+
+MOCK_KEYS = {'ipinfo': 'mock', 'proxycheck': 'mock', 'abuseipdb': 'mock', 'shodan': 'mock', 'ipstack': 'mock'}
+
+
+async def benchmark(hosts: int = 1000, latency: float = 0.02) -> Dict[str, Any]:
+    """مقایسه درخواست تکی ترتیبی (روش اسکریپت‌های قبلی) با کلاینت دسته‌ای روی سرویس جعلی"""
+    ips = [f'10.1.{i // 250}.{i % 250 + 1}' for i in range(hosts)]
+    names = ['ip-api', 'ipinfo', 'proxycheck']
+    mock = MockProviderServer(latency=latency)
+    urls = await mock.start()
+    report: Dict[str, Any] = {'hosts': hosts, 'latency_ms': latency * 1e3}
+    try:
+        single = {name: replace(p, batch_size=1, concurrency=1) for name, p in _fast(PROVIDERS).items()}
+        async with EnrichmentClient(keys=MOCK_KEYS, providers=single, base_urls=urls, use_cache=False) as client:
+            started = time.perf_counter()
+            for ip in ips[:100]:
+                for name in names:
+                    await client.enrich(name, [ip])
+            report['sequential_s_per_100'] = time.perf_counter() - started
+        async with EnrichmentClient(keys=MOCK_KEYS, providers=_fast(PROVIDERS), base_urls=urls,
+                                    use_cache=False) as client:
+            started = time.perf_counter()
+            await client.enrich_many(ips, names)
+            report['batched_s'] = time.perf_counter() - started
+            report['batched_stats'] = client.get_stats()
+        report['sequential_s_estimated'] = report['sequential_s_per_100'] * hosts / 100
+    finally:
+        await mock.stop()
+    return report
+
+
+def main():
+    """سنجش روی سرویس جعلی محلی"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="External enrichment client benchmark against a local mock provider")
+    parser.add_argument('--hosts', type=int, default=1000)
+    args = parser.parse_args()
+    result = asyncio.run(benchmark(args.hosts))
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
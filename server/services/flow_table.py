@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flow Table Aggregation
+تجمیع پکت‌ها در جریان‌های دوطرفه (5-tuple) با مهلت بیکاری و مهلت فعال
+"""
+
+import logging
+import math
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TCP_FIN = 0x01
+TCP_RST = 0x04
+
+FlowKey = Tuple[int, str, int, str, int]
+
+
+@dataclass
+class FlowRecord:
+    """رکورد یک جریان؛ مبدأ، طرفی است که اولین پکت را فرستاده"""
+    protocol: int
+    src_ip: str
+    src_port: int
+    dst_ip: str
+    dst_port: int
+    first_seen: float
+    last_seen: float
+    packets: int = 0
+    bytes: int = 0
+    fwd_packets: int = 0
+    rev_packets: int = 0
+    # آمار فاصله بین پکت‌ها به روش Welford (بدون نگهداری فهرست زمان‌ها)
+    iat_count: int = 0
+    iat_mean: float = 0.0
+    iat_m2: float = 0.0
+    iat_min: float = math.inf
+    iat_max: float = 0.0
+    categories: Dict[str, int] = field(default_factory=dict)
+    max_confidence: float = 0.0
+    payload_preview: str = ''
+    fin_flags: int = 0
+    end_reason: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.last_seen - self.first_seen
+
+    @property
+    def iat_std(self) -> float:
+        return math.sqrt(self.iat_m2 / (self.iat_count - 1)) if self.iat_count > 1 else 0.0
+
+    @property
+    def matched(self) -> bool:
+        return bool(self.categories)
+
+    @property
+    def dominant_category(self) -> Optional[str]:
+        if not self.categories:
+            return None
+        return max(self.categories.items(), key=lambda item: item[1])[0]
+
+    def _add_iat(self, iat: float):
+        self.iat_count += 1
+        delta = iat - self.iat_mean
+        self.iat_mean += delta / self.iat_count
+        self.iat_m2 += delta * (iat - self.iat_mean)
+        self.iat_min = min(self.iat_min, iat)
+        self.iat_max = max(self.iat_max, iat)
+
+    def add(self, ts: float, length: int, forward: bool):
+        if self.packets:
+            iat = ts - self.last_seen
+            if iat >= 0:
+                self._add_iat(iat)
+        self.last_seen = max(self.last_seen, ts)
+        self.packets += 1
+        self.bytes += length
+        if forward:
+            self.fwd_packets += 1
+        else:
+            self.rev_packets += 1
+
+    def merge(self, other: 'FlowRecord'):
+        """
+        الحاق قطعه بعدی همین جریان (مثلاً از بازه دیگری از فایل ضبط).
+        فاصله بین دو قطعه یک نمونه فاصله بین پکت‌هاست و آمار Welford دو قطعه
+        به روش موازی Chan ترکیب می‌شود؛ نتیجه با پردازش پیوسته پکت‌ها یکسان است.
+        """
+        forward = other.src_ip == self.src_ip and other.src_port == self.src_port
+        if self.packets and other.packets and other.first_seen >= self.last_seen:
+            self._add_iat(other.first_seen - self.last_seen)
+        if other.iat_count:
+            count = self.iat_count + other.iat_count
+            delta = other.iat_mean - self.iat_mean
+            self.iat_m2 += other.iat_m2 + delta * delta * self.iat_count * other.iat_count / count
+            self.iat_mean += delta * other.iat_count / count
+            self.iat_count = count
+            self.iat_min = min(self.iat_min, other.iat_min)
+            self.iat_max = max(self.iat_max, other.iat_max)
+
+        self.first_seen = min(self.first_seen, other.first_seen)
+        self.last_seen = max(self.last_seen, other.last_seen)
+        self.packets += other.packets
+        self.bytes += other.bytes
+        self.fwd_packets += other.fwd_packets if forward else other.rev_packets
+        self.rev_packets += other.rev_packets if forward else other.fwd_packets
+        for category, count in other.categories.items():
+            self.categories[category] = self.categories.get(category, 0) + count
+        self.max_confidence = max(self.max_confidence, other.max_confidence)
+        if not self.payload_preview:
+            self.payload_preview = other.payload_preview
+        fin_flags = other.fin_flags if forward else ((other.fin_flags & 1) << 1) | ((other.fin_flags & 2) >> 1)
+        self.fin_flags |= fin_flags
+        self.end_reason = 'fin' if self.fin_flags == 3 and other.end_reason == 'flush' else other.end_reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'protocol': self.protocol,
+            'src_ip': self.src_ip,
+            'src_port': self.src_port,
+            'dst_ip': self.dst_ip,
+            'dst_port': self.dst_port,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'duration': self.duration,
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'fwd_packets': self.fwd_packets,
+            'rev_packets': self.rev_packets,
+            'iat_mean': self.iat_mean,
+            'iat_std': self.iat_std,
+            'iat_min': self.iat_min if self.iat_count else 0.0,
+            'iat_max': self.iat_max,
+            'categories': dict(self.categories),
+            'max_confidence': self.max_confidence,
+            'end_reason': self.end_reason
+        }
+
+
+class FlowTable:
+    """
+    جدول جریان‌ها در یک dict مرتب بر اساس آخرین فعالیت.
+    جریان‌ها با مهلت بیکاری، مهلت فعال (گزارش دوره‌ای جریان‌های طولانی مانند NetFlow)،
+    FIN دوطرفه یا RST، یا پر شدن جدول پایان می‌یابند و از drain() تحویل داده می‌شوند.
+    """
+
+    def __init__(self, idle_timeout: float = 60.0, active_timeout: float = 300.0,
+                 max_flows: int = 100000, sweep_interval: float = 1.0):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.sweep_interval = sweep_interval
+
+        self._flows: 'OrderedDict[FlowKey, FlowRecord]' = OrderedDict()
+        self._completed: List[FlowRecord] = []
+        self._last_sweep = -math.inf
+        self.now = 0.0
+
+        self.packets_seen = 0
+        self.flows_created = 0
+        self.flows_emitted = 0
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    @staticmethod
+    def _key(protocol: int, src: str, sport: int, dst: str, dport: int) -> Tuple[FlowKey, bool]:
+        """کلید متقارن و اینکه پکت هم‌جهت با ترتیب کلید است یا نه"""
+        if (src, sport) <= (dst, dport):
+            return (protocol, src, sport, dst, dport), True
+        return (protocol, dst, dport, src, sport), False
+
+    def update(self, ts: float, protocol: int, src: str, sport: int, dst: str, dport: int,
+               length: int, tcp_flags: int = 0, category: Optional[str] = None,
+               confidence: float = 0.0, preview: Optional[str] = None) -> FlowRecord:
+        """افزودن یک پکت به جریان مربوطه"""
+        self.packets_seen += 1
+        self.now = max(self.now, ts)
+        key, _ = self._key(protocol, src, sport, dst, dport)
+
+        flow = self._flows.get(key)
+        if flow is None:
+            if len(self._flows) >= self.max_flows:
+                _, oldest = self._flows.popitem(last=False)
+                self._complete(oldest, 'evicted')
+            flow = FlowRecord(protocol=protocol, src_ip=src, src_port=sport, dst_ip=dst, dst_port=dport,
+                              first_seen=ts, last_seen=ts)
+            self._flows[key] = flow
+            self.flows_created += 1
+        else:
+            self._flows.move_to_end(key)
+
+        flow.add(ts, length, forward=(src == flow.src_ip and sport == flow.src_port))
+        if category:
+            flow.categories[category] = flow.categories.get(category, 0) + 1
+            flow.max_confidence = max(flow.max_confidence, confidence)
+            if preview and not flow.payload_preview:
+                flow.payload_preview = preview
+
+        if tcp_flags & TCP_RST:
+            self._end(key, 'rst')
+        elif tcp_flags & TCP_FIN:
+            flow.fin_flags |= 1 if src == flow.src_ip and sport == flow.src_port else 2
+            if flow.fin_flags == 3:
+                self._end(key, 'fin')
+
+        if ts - self._last_sweep >= self.sweep_interval:
+            self.expire(ts)
+        return flow
+
+    def _end(self, key: FlowKey, reason: str):
+        flow = self._flows.pop(key, None)
+        if flow is not None:
+            self._complete(flow, reason)
+
+    def _complete(self, flow: FlowRecord, reason: str):
+        flow.end_reason = reason
+        self._completed.append(flow)
+
+    def expire(self, now: Optional[float] = None):
+        """پایان جریان‌های بیکار و گزارش جریان‌هایی که از مهلت فعال گذشته‌اند"""
+        now = self.now if now is None else now
+        self._last_sweep = now
+
+        # ترتیب dict بر اساس آخرین فعالیت است؛ جریان‌های بیکار در ابتدای آن قرار دارند
+        idle_before = now - self.idle_timeout
+        while self._flows:
+            key, flow = next(iter(self._flows.items()))
+            if flow.last_seen >= idle_before:
+                break
+            del self._flows[key]
+            self._complete(flow, 'idle')
+
+        active_before = now - self.active_timeout
+        for key in [k for k, f in self._flows.items() if f.first_seen < active_before]:
+            self._end(key, 'active')
+
+    def drain(self, now: Optional[float] = None, matched_only: bool = False) -> List[FlowRecord]:
+        """
+        تحویل جریان‌های پایان‌یافته (و حذف آن‌ها از صف).
+        انقضا در update به صورت دوره‌ای انجام می‌شود؛ با now، انقضا همین حالا هم اجرا می‌شود.
+        """
+        if now is not None:
+            self.expire(now)
+        completed, self._completed = self._completed, []
+        self.flows_emitted += len(completed)
+        if matched_only:
+            completed = [flow for flow in completed if flow.matched]
+        return completed
+
+    def flush(self, matched_only: bool = False) -> List[FlowRecord]:
+        """پایان همه جریان‌های باز (مثلاً در انتهای ضبط)"""
+        for key in list(self._flows):
+            self._end(key, 'flush')
+        return self.drain(matched_only=matched_only)
+
+    def active_flows(self) -> List[FlowRecord]:
+        return list(self._flows.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active_flows': len(self._flows),
+            'pending_completed': len(self._completed),
+            'packets_seen': self.packets_seen,
+            'flows_created': self.flows_created,
+            'flows_emitted': self.flows_emitted,
+            'packets_per_flow': self.packets_seen / self.flows_created if self.flows_created else 0.0
+        }
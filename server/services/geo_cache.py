@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared Geolocation Cache
+کش مشترک نتایج مکان‌یابی: LRU حافظه با TTL جلوی جدول SQLite با نوشتن دسته‌ای
+"""
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# نتیجه منفی (هیچ سرویسی پاسخ نداد) با این مقدار در حافظه نگه داشته می‌شود
+NEGATIVE = object()
+
+# فضای نام رکورد مکان‌یابی مشترک همه مکان‌یاب‌ها، در قالب پاسخ سرویس‌های IPGeolocator و موتور آفلاین
+# (ip، latitude، longitude، city، region، country، isp، accuracy، service و ...)؛ هر کلاس خروجی
+# خودش را هنگام خواندن از همین رکورد می‌سازد تا یک IP فقط یک بار پرسیده شود
+LOCATION_NAMESPACE = 'ip_location'
+
+
+@dataclass
+class GeoCacheCounters:
+    """شمارنده‌های کش"""
+    memory_hits: int = 0
+    db_hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    flushes: int = 0
+    evictions: int = 0
+    expired: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.db_hits + self.negative_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.lookups:
+            return 0.0
+        return (self.lookups - self.misses) / self.lookups
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'flushes': self.flushes,
+            'evictions': self.evictions,
+            'expired': self.expired,
+            'hit_rate': self.hit_rate
+        }
+
+
+class GeoCache:
+    """
+    کش مکان‌یابی مشترک همه کلاس‌های مکان‌یاب.
+
+    مکان‌یاب‌ها رکورد مشترک LOCATION_NAMESPACE را می‌خوانند و می‌نویسند؛ داده‌هایی با قالب واقعاً
+    متفاوت (مثلاً پاسخ خام سرویس‌های غنی‌سازی) فضای نام خودشان را دارند، پس کلید (فضای نام، IP) است.
+    خواندن ابتدا از LRU حافظه و سپس با کلید اصلی جدول SQLite انجام می‌شود؛ نوشتن‌ها در حافظه جمع و با یک UPSERT دسته‌ای
+    در flush ذخیره می‌شوند (با رسیدن به batch_size، گذشت flush_interval یا خروج برنامه).
+    نتایج منفی با TTL کوتاه‌تر ذخیره می‌شوند تا IPهای بدون پاسخ هر بار دوباره پرسیده نشوند.
+    """
+
+    def __init__(self, db_path: str = "ilam_mining.db", max_entries: int = 100000,
+                 ttl: float = 24 * 3600, negative_ttl: float = 3600,
+                 batch_size: int = 500, flush_interval: float = 5.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Any, float]]' = OrderedDict()
+        self._dirty: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.counters = GeoCacheCounters()
+
+        self._init_database()
+        atexit.register(self.flush)
+
+    def _init_database(self):
+        """ایجاد جدول کش مکان‌یابی"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS geo_cache (
+                    namespace TEXT NOT NULL,
+                    ip_address TEXT NOT NULL,
+                    data TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, ip_address)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_geo_cache_expires ON geo_cache (expires_at)')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error initializing geolocation cache table: {e}")
+
+    def _remember(self, key: Tuple[str, str], value: Any, expires_at: float):
+        """افزودن به LRU (باید داخل قفل فراخوانی شود)"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters.evictions += 1
+
+    def _from_memory(self, key: Tuple[str, str], now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < now:
+            del self._entries[key]
+            self.counters.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _load_rows(self, namespace: str, ips: List[str], now: float) -> Dict[str, Tuple[Any, float]]:
+        rows: Dict[str, Tuple[Any, float]] = {}
+        try:
+            conn = sqlite3.connect(self.db_path)
+            for i in range(0, len(ips), 500):
+                chunk = ips[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for ip, data, expires_at in conn.execute(
+                        f'SELECT ip_address, data, expires_at FROM geo_cache '
+                        f'WHERE namespace = ? AND ip_address IN ({placeholders}) AND expires_at >= ?',
+                        (namespace, *chunk, now)):
+                    rows[ip] = (NEGATIVE if data is None else json.loads(data), expires_at)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading geolocation cache: {e}")
+        return rows
+
+    def get_many(self, namespace: str, ips: Iterable[str]) -> Dict[str, Any]:
+        """
+        مقادیر کش‌شده برای چند IP با یک پرس‌وجوی SQLite برای همه IPهای غایب از حافظه.
+        خروجی فقط IPهای موجود را دارد؛ نتیجه منفی با مقدار None برگردانده می‌شود.
+        """
+        now = time.time()
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        with self._lock:
+            for ip in ips:
+                key = (namespace, ip)
+                entry = self._from_memory(key, now)
+                if entry is None and key in self._dirty:
+                    # از LRU خارج شده ولی هنوز در SQLite نوشته نشده
+                    data, expires_at = self._dirty[key]
+                    if expires_at >= now:
+                        entry = (NEGATIVE if data is None else json.loads(data), expires_at)
+                        self._remember(key, *entry)
+                if entry is None:
+                    missing.append(ip)
+                elif entry[0] is NEGATIVE:
+                    self.counters.negative_hits += 1
+                    found[ip] = None
+                else:
+                    self.counters.memory_hits += 1
+                    found[ip] = entry[0]
+        if not missing:
+            return found
+
+        rows = self._load_rows(namespace, missing, now)
+        with self._lock:
+            for ip in missing:
+                entry = rows.get(ip)
+                if entry is None:
+                    self.counters.misses += 1
+                    continue
+                self._remember((namespace, ip), *entry)
+                if entry[0] is NEGATIVE:
+                    self.counters.negative_hits += 1
+                    found[ip] = None
+                else:
+                    self.counters.db_hits += 1
+                    found[ip] = entry[0]
+        return found
+
+    def get(self, namespace: str, ip: str) -> Tuple[bool, Any]:
+        """(موجود بودن، مقدار)؛ برای نتیجه منفی (True, None)"""
+        found = self.get_many(namespace, (ip,))
+        if ip in found:
+            return True, found[ip]
+        return False, None
+
+    def put(self, namespace: str, ip: str, value: Any, ttl: Optional[float] = None):
+        """ثبت نتیجه؛ مقدار باید قابل تبدیل به JSON باشد"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._stage(namespace, ip, value, json.dumps(value, ensure_ascii=False, default=str), expires_at)
+
+    def put_negative(self, namespace: str, ip: str, ttl: Optional[float] = None):
+        """ثبت «یافت نشد» با TTL کوتاه"""
+        expires_at = time.time() + (self.negative_ttl if ttl is None else ttl)
+        self._stage(namespace, ip, NEGATIVE, None, expires_at)
+
+    def _stage(self, namespace: str, ip: str, value: Any, data: Optional[str], expires_at: float):
+        """ثبت در حافظه و صف نوشتن؛ flush با رسیدن به batch_size یا گذشت flush_interval"""
+        with self._lock:
+            self._remember((namespace, ip), value, expires_at)
+            self._dirty[(namespace, ip)] = (data, expires_at)
+            self.counters.writes += 1
+            due = len(self._dirty) >= self.batch_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """نوشتن تغییرات در SQLite (UPSERT دسته‌ای)"""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                self._last_flush = time.monotonic()
+            if not dirty:
+                return
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.executemany('''
+                    INSERT INTO geo_cache (namespace, ip_address, data, expires_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(namespace, ip_address) DO UPDATE SET
+                        data = excluded.data,
+                        expires_at = excluded.expires_at
+                ''', [(namespace, ip, data, expires_at) for (namespace, ip), (data, expires_at) in dirty.items()])
+                conn.commit()
+                conn.close()
+                self.counters.flushes += 1
+            except Exception as e:
+                logger.error(f"Error saving geolocation cache: {e}")
+
+    def invalidate(self, namespace: str, ip: Optional[str] = None):
+        """حذف یک IP یا کل فضای نام از حافظه و SQLite"""
+        self.flush()
+        with self._lock:
+            if ip is None:
+                for key in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[key]
+            else:
+                self._entries.pop((namespace, ip), None)
+        try:
+            conn = sqlite3.connect(self.db_path)
+            if ip is None:
+                conn.execute('DELETE FROM geo_cache WHERE namespace = ?', (namespace,))
+            else:
+                conn.execute('DELETE FROM geo_cache WHERE namespace = ? AND ip_address = ?', (namespace, ip))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error invalidating geolocation cache: {e}")
+
+    def purge_expired(self) -> int:
+        """حذف ردیف‌های منقضی از SQLite (با شاخص expires_at)"""
+        self.flush()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            removed = conn.execute('DELETE FROM geo_cache WHERE expires_at < ?', (time.time(),)).rowcount
+            conn.commit()
+            conn.close()
+            return removed
+        except Exception as e:
+            logger.error(f"Error purging geolocation cache: {e}")
+            return 0
+
+    def import_json(self, namespace: str, path: str,
+                    transform: Optional[Callable[[str, Any], Any]] = None) -> int:
+        """انتقال کش JSON قدیمی (IP -> نتیجه) به جدول مشترک؛ transform قالب قدیمی را تبدیل می‌کند (None = رد)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading legacy geolocation cache {path}: {e}")
+            return 0
+        for ip, value in entries.items():
+            if value and transform is not None:
+                value = transform(ip, value)
+            if value:
+                self.put(namespace, ip, value)
+        self.flush()
+        logger.info(f"📦 Imported {len(entries)} cached locations from {path}")
+        return len(entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters.to_dict(), 'entries': len(self._entries), 'pending_writes': len(self._dirty)}
+
+
+# Global cache instance
+_geo_cache: Optional[GeoCache] = None
+_geo_cache_lock = threading.Lock()
+
+
+def get_geo_cache() -> GeoCache:
+    """دریافت instance کش مشترک مکان‌یابی"""
+    global _geo_cache
+    with _geo_cache_lock:
+        if _geo_cache is None:
+            _geo_cache = GeoCache()
+        return _geo_cache
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geolocation Front End: Single-flight, Hedged Fan-out and Consensus
+جلوی سرویس‌های مکان‌یابی: ادغام درخواست‌های هم‌زمان، ارسال موازی با پشتیبان (hedging) و اجماع
+"""
+
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+
+try:
+    from .geo_cache import get_geo_cache
+    from .geo_math import haversine_km
+except ImportError:
+    from geo_cache import get_geo_cache
+    from geo_math import haversine_km
+
+logger = logging.getLogger(__name__)
+
+
+def _coordinates(result: Any) -> Optional[Tuple[float, float]]:
+    """مختصات نتیجه (dict یا dataclass مانند LocationData)"""
+    if isinstance(result, dict):
+        lat, lon = result.get('latitude', result.get('lat')), result.get('longitude', result.get('lon'))
+    else:
+        lat, lon = getattr(result, 'latitude', None), getattr(result, 'longitude', None)
+    if lat is None or lon is None:
+        return None
+    return float(lat), float(lon)
+
+
+@dataclass
+class GeoProvider:
+    """
+    یک سرویس مکان‌یابی برای جلوی سرویس‌ها.
+    fetch یک coroutine است که نتیجه (یا None) برمی‌گرداند؛ weight کیفیت نسبی سرویس است و
+    پاسخ سرویسی با weight حداقل authoritative_weight به تنهایی کافی است (مثلاً پایگاه محلی).
+    """
+    name: str
+    fetch: Callable[[str], Awaitable[Any]]
+    deadline: float = 3.0
+    weight: float = 1.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=200))
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+
+    def latency_quantile(self, q: float, default: float) -> float:
+        if len(self.latencies) < 20:
+            return default
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'p50_ms': self.latency_quantile(0.5, float('nan')) * 1e3,
+            'p95_ms': self.latency_quantile(0.95, float('nan')) * 1e3
+        }
+
+
+@dataclass
+class GeoAnswer:
+    """نتیجه جلوی سرویس‌ها برای یک IP"""
+    ip: str
+    answers: List[Tuple[str, Any]]
+    consensus: bool
+    elapsed: float
+    cached: bool = False
+    coalesced: bool = False
+    agreeing: int = 0
+
+    @property
+    def best(self) -> Optional[Any]:
+        return self.answers[0][1] if self.answers else None
+
+    @property
+    def results(self) -> List[Any]:
+        """پاسخ‌های هم‌نظر در صورت اجماع، وگرنه همه پاسخ‌ها به ترتیب وزن سرویس"""
+        return [result for _, result in (self.answers[:self.agreeing] if self.consensus else self.answers)]
+
+
+class GeoFrontend:
+    """
+    جلوی سرویس‌های مکان‌یابی.
+
+    - single-flight: درخواست‌های هم‌زمان یک IP به یک وظیفه در حال اجرا متصل می‌شوند.
+    - fan-out: fanout سرویس اول هم‌زمان شروع می‌شوند و هر سرویس مهلت خودش را دارد.
+    - hedging: اگر تا hedge_delay (یا صدک ۹۵ تأخیر سرویس‌های در حال اجرا، هر کدام کمتر) پاسخی
+      نیامد، سرویس بعدی به عنوان پشتیبان شروع می‌شود.
+    - اجماع: به محض اینکه quorum پاسخ در فاصله agreement_km از هم باشند (یا یک پاسخ معتبر
+      authoritative برسد)، نتیجه برگردانده و بقیه درخواست‌ها لغو می‌شوند.
+    """
+
+    def __init__(self, providers: Sequence[GeoProvider], fanout: int = 2, hedge_delay: float = 0.3,
+                 quorum: int = 2, agreement_km: float = 50.0, authoritative_weight: float = 2.0,
+                 overall_deadline: float = 5.0, cache_namespace: Optional[str] = 'geo_frontend'):
+        self.providers = list(providers)
+        self.fanout = max(1, fanout)
+        self.hedge_delay = hedge_delay
+        self.quorum = quorum
+        self.agreement_km = agreement_km
+        self.authoritative_weight = authoritative_weight
+        self.overall_deadline = overall_deadline
+        self.cache_namespace = cache_namespace
+        self.cache = get_geo_cache() if cache_namespace else None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'coalesced': 0, 'cache_hits': 0, 'hedges': 0, 'consensus': 0, 'failed': 0}
+
+    def _claim(self, ip: str) -> Tuple[Optional[GeoAnswer], Optional[Future], bool]:
+        """نتیجه کش‌شده، یا future در حال اجرا و اینکه آیا فراخواننده باید مکان‌یابی کند"""
+        if self.cache is not None:
+            hit, cached = self.cache.get(self.cache_namespace, ip)
+            if hit:
+                with self._lock:
+                    self.stats['lookups'] += 1
+                    self.stats['cache_hits'] += 1
+                if cached is None:
+                    return GeoAnswer(ip, [], False, 0.0, cached=True), None, False
+                return GeoAnswer(ip, [tuple(item) for item in cached['answers']], bool(cached['agreeing']), 0.0,
+                                 cached=True, agreeing=cached['agreeing']), None, False
+        with self._lock:
+            self.stats['lookups'] += 1
+            future = self._inflight.get(ip)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return None, future, False
+            future = Future()
+            self._inflight[ip] = future
+            return None, future, True
+
+    async def lookup(self, ip: str) -> GeoAnswer:
+        """مکان‌یابی یک IP؛ فراخواننده‌های هم‌زمان یک IP (حتی از نخ‌های دیگر) نتیجه مشترک می‌گیرند"""
+        cached, future, leader = self._claim(ip)
+        if future is None:
+            return cached
+        if not leader:
+            # لغو یک فراخواننده نباید future مشترک را برای بقیه لغو کند
+            answer = await asyncio.shield(asyncio.wrap_future(future))
+            return GeoAnswer(ip, answer.answers, answer.consensus, answer.elapsed, coalesced=True,
+                             agreeing=answer.agreeing)
+        # مکان‌یابی در وظیفه جداگانه اجرا می‌شود تا لغو فراخواننده اول، پیروانش را لغو نکند
+        return await asyncio.shield(asyncio.ensure_future(self._resolve_shared(ip, future)))
+
+    async def _resolve_shared(self, ip: str, future: Future) -> GeoAnswer:
+        try:
+            answer = await self._resolve(ip)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(ip, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(ip, None)
+        future.set_result(answer)
+        return answer
+
+    async def lookup_many(self, ips: Sequence[str], concurrency: int = 50) -> Dict[str, GeoAnswer]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(ip: str) -> Tuple[str, GeoAnswer]:
+            async with semaphore:
+                return ip, await self.lookup(ip)
+
+        return dict(await asyncio.gather(*(one(ip) for ip in dict.fromkeys(ips))))
+
+    async def _call(self, provider: GeoProvider, ip: str) -> Any:
+        provider.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(provider.fetch(ip), provider.deadline)
+        except asyncio.TimeoutError:
+            provider.timeouts += 1
+            provider.latencies.append(provider.deadline)
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.failures += 1
+            logger.debug(f"Geolocation provider {provider.name} failed for {ip}: {e}")
+            return None
+        provider.latencies.append(time.perf_counter() - started)
+        return result
+
+    def _agreeing(self, answers: List[Tuple[GeoProvider, Any]]) -> Optional[List[Tuple[GeoProvider, Any]]]:
+        """بزرگ‌ترین گروه پاسخ‌های نزدیک به هم اگر به quorum برسد، یا پاسخ authoritative"""
+        for provider, result in answers:
+            if provider.weight >= self.authoritative_weight:
+                return [(provider, result)]
+        located = [(p, r, _coordinates(r)) for p, r in answers]
+        located = [(p, r, c) for p, r, c in located if c is not None]
+        best: List[Tuple[GeoProvider, Any]] = []
+        for _, _, center in located:
+            group = [(p, r) for p, r, c in located if float(haversine_km(*center, *c)) <= self.agreement_km]
+            if len(group) > len(best):
+                best = group
+        return best if len(best) >= self.quorum else None
+
+    async def _resolve(self, ip: str) -> GeoAnswer:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pending: Dict[asyncio.Task, GeoProvider] = {}
+        answers: List[Tuple[GeoProvider, Any]] = []
+        queue = list(self.providers)
+        consensus: Optional[List[Tuple[GeoProvider, Any]]] = None
+
+        def launch():
+            provider = queue.pop(0)
+            pending[asyncio.ensure_future(self._call(provider, ip))] = provider
+
+        while queue and len(pending) < self.fanout:
+            launch()
+        deadline = loop.time() + self.overall_deadline
+        try:
+            while pending or queue:
+                if not pending:
+                    launch()
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                # زمان شروع پشتیبان بعدی: صدک ۹۵ سرویس‌های در حال اجرا، حداکثر hedge_delay
+                hedge = min([self.hedge_delay] + [p.latency_quantile(0.95, self.hedge_delay)
+                                                  for p in pending.values()])
+                # بدون سرویس باقی‌مانده، با داشتن پاسخ فقط یک بازه hedge دیگر برای اجماع صبر می‌شود
+                timeout = min(remaining, hedge) if queue or answers else remaining
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not queue:
+                        break
+                    self.stats['hedges'] += 1
+                    launch()
+                    continue
+                failed = 0
+                for task in done:
+                    provider = pending.pop(task)
+                    result = task.result()
+                    if result is not None:
+                        answers.append((provider, result))
+                    else:
+                        failed += 1
+                consensus = self._agreeing(answers)
+                if consensus:
+                    break
+                # فقط سرویس ناموفق جای خودش را بلافاصله به سرویس بعدی می‌دهد؛ پس از پاسخ موفق
+                # سرویس بعدی تنها با hedge (یا نبود درخواست در حال اجرا) شروع می‌شود
+                while queue and failed and len(pending) < self.fanout:
+                    launch()
+                    failed -= 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if consensus:
+            self.stats['consensus'] += 1
+            chosen = consensus + [(p, r) for p, r in answers if all(r is not c for _, c in consensus)]
+        else:
+            chosen = sorted(answers, key=lambda item: -item[0].weight)
+        if not chosen:
+            self.stats['failed'] += 1
+        answer = GeoAnswer(ip, [(p.name, r) for p, r in chosen], consensus is not None,
+                           time.perf_counter() - started, agreeing=len(consensus or ()))
+        if self.cache is not None:
+            if answer.answers and all(isinstance(r, dict) for _, r in answer.answers):
+                self.cache.put(self.cache_namespace, ip, {'answers': [[name, r] for name, r in answer.answers],
+                                                          'agreeing': answer.agreeing})
+            elif not answer.answers:
+                self.cache.put_negative(self.cache_namespace, ip)
+        return answer
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'inflight': len(self._inflight),
+                'providers': [provider.to_dict() for provider in self.providers]}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# سرویس‌های جایگزین محلی برای سنجش تأخیر انتهایی
+# ─────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class LatencyModel:
+    """تأخیر لگ‌نرمال با دم سنگین: درصدی از درخواست‌ها slow_seconds طول می‌کشند"""
+    median: float
+    sigma: float = 0.4
+    slow_fraction: float = 0.05
+    slow_seconds: float = 2.0
+    error_fraction: float = 0.01
+
+    def sample(self, rng: random.Random) -> Tuple[float, bool]:
+        if rng.random() < self.slow_fraction:
+            return self.slow_seconds, False
+        return self.median * math.exp(rng.gauss(0, self.sigma)), rng.random() < self.error_fraction
+
+
+STANDIN_MODELS = {
+    'ip-api': LatencyModel(median=0.08),
+    'ipapi.co': LatencyModel(median=0.12, slow_fraction=0.08),
+    'ipinfo.io': LatencyModel(median=0.10, slow_fraction=0.03, slow_seconds=3.0),
+}
+
+
+def _standin_location(ip: str, provider: str) -> Dict[str, Any]:
+    """پاسخ قطعی بر اساس IP؛ سرویس‌ها چند کیلومتر با هم اختلاف دارند"""
+    seed = sum(int(part) << (8 * i) for i, part in enumerate(reversed(ip.split('.'))))
+    offset = (sum(map(ord, provider)) % 7) * 0.01
+    return {'latitude': 32.0 + (seed % 250) / 100 + offset, 'longitude': 45.5 + (seed % 300) / 100 + offset,
+            'city': f'city-{seed % 40}', 'service': provider}
+
+
+async def start_standin_servers(models: Dict[str, LatencyModel] = STANDIN_MODELS, seed: int = 0,
+                                host: str = '127.0.0.1') -> Tuple[List[asyncio.AbstractServer], Dict[str, str]]:
+    """
+    سرورهای HTTP محلی (فقط asyncio) که /json/{ip} را با تأخیر مدل‌شده پاسخ می‌دهند.
+    خروجی: سرورها و آدرس پایه هر سرویس.
+    """
+    servers, urls = [], {}
+    for name, model in models.items():
+        rng = random.Random(f'{seed}:{name}')
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name=name, model=model,
+                         rng=rng):
+            try:
+                while True:
+                    request = await reader.readuntil(b'\r\n\r\n')
+                    path = request.split(b' ', 2)[1].decode('ascii')
+                    delay, error = model.sample(rng)
+                    await asyncio.sleep(delay)
+                    if error:
+                        body, code = b'{"error": "rate limited"}', b'429 Too Many Requests'
+                    else:
+                        body = json.dumps(_standin_location(path.rsplit('/', 1)[-1], name)).encode()
+                        code = b'200 OK'
+                    writer.write(b'HTTP/1.1 ' + code + b'\r\nContent-Type: application/json\r\n'
+                                 b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError, IndexError, asyncio.CancelledError):
+                # اتصال بسته شد یا سرور در پایان سنجش متوقف شد
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, 0)
+        servers.append(server)
+        urls[name] = f'http://{host}:{server.sockets[0].getsockname()[1]}/json/'
+    return servers, urls
+
+
+def http_provider(name: str, base_url: str, session, deadline: float = 3.0, weight: float = 1.0) -> GeoProvider:
+    """سرویس JSON روی HTTP با نشست aiohttp مشترک (اتصال‌های keep-alive)"""
+    async def fetch(ip: str) -> Optional[Dict[str, Any]]:
+        async with session.get(base_url + ip) as response:
+            if response.status != 200:
+                return None
+            return await response.json()
+    return GeoProvider(name, fetch, deadline=deadline, weight=weight)
+
+
+def inprocess_provider(name: str, model: LatencyModel, seed: int = 0, deadline: float = 3.0) -> GeoProvider:
+    """همان مدل تأخیر بدون شبکه (برای محیط‌های بدون aiohttp)"""
+    rng = random.Random(f'{seed}:{name}')
+
+    async def fetch(ip: str) -> Optional[Dict[str, Any]]:
+        delay, error = model.sample(rng)
+        await asyncio.sleep(delay)
+        return None if error else _standin_location(ip, name)
+    return GeoProvider(name, fetch, deadline=deadline)
+
+
+async def _sequential(providers: Sequence[GeoProvider], ip: str) -> Optional[Any]:
+    """زنجیره ترتیبی قبلی: سرویس بعدی فقط پس از شکست یا پایان مهلت قبلی"""
+    for provider in providers:
+        try:
+            result = await asyncio.wait_for(provider.fetch(ip), provider.deadline)
+        except Exception:
+            result = None
+        if result is not None:
+            return result
+    return None
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3
+    return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': ordered[-1] * 1e3}
+
+
+async def benchmark_frontend(requests: int = 2000, distinct_ips: int = 1500, concurrency: int = 100,
+                             transport: str = 'http', seed: int = 0) -> Dict[str, Any]:
+    """
+    مقایسه تأخیر انتهایی زنجیره ترتیبی با جلوی سرویس (fan-out + hedging + single-flight)
+    روی سرویس‌های جایگزین محلی. transport='http' سرورهای محلی و aiohttp، 'inprocess' بدون شبکه.
+    """
+    rng = random.Random(seed)
+    pool = [f'5.{rng.randrange(160, 200)}.{rng.randrange(256)}.{rng.randrange(1, 255)}' for _ in range(distinct_ips)]
+    workload = [rng.choice(pool) for _ in range(requests)]
+    servers, sessions = [], []
+
+    def build() -> List[GeoProvider]:
+        if transport == 'inprocess':
+            return [inprocess_provider(name, model, seed) for name, model in STANDIN_MODELS.items()]
+        import aiohttp
+        providers = []
+        for name, url in urls.items():
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency))
+            sessions.append(session)
+            providers.append(http_provider(name, url, session))
+        return providers
+
+    if transport != 'inprocess':
+        servers, urls = await start_standin_servers(seed=seed)
+    results: Dict[str, Any] = {'requests': requests, 'distinct_ips': distinct_ips, 'transport': transport}
+    try:
+        async def run(call: Callable[[str], Awaitable[Any]]) -> Tuple[List[float], float]:
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies: List[float] = []
+
+            async def one(ip: str):
+                async with semaphore:
+                    started = time.perf_counter()
+                    await call(ip)
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(ip) for ip in workload))
+            return latencies, time.perf_counter() - started
+
+        providers = build()
+        latencies, wall = await run(lambda ip: _sequential(providers, ip))
+        results['sequential'] = {**_percentiles(latencies), 'wall_s': wall}
+
+        frontend = GeoFrontend(build(), cache_namespace=None)
+        latencies, wall = await run(frontend.lookup)
+        results['frontend'] = {**_percentiles(latencies), 'wall_s': wall, 'stats': frontend.get_stats()}
+    finally:
+        for session in sessions:
+            await session.close()
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+    return results
+
+
+def main():
+    """اجرای سنجش تأخیر انتهایی"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark hedged geolocation fan-out against local stand-ins")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--transport', choices=('http', 'inprocess'), default='http')
+    args = parser.parse_args()
+    results = asyncio.run(benchmark_frontend(args.requests, concurrency=args.concurrency, transport=args.transport))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
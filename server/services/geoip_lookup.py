@@ -6,12 +6,19 @@ Provides geolocation services for IP addresses with multiple provider support
 """
 
 import logging
-import requests
-from typing import Dict, Optional, Any
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any
 import json
 import os
 
+try:
+    from .enrichment_client import EnrichmentClient, run_sync
+    from .geo_cache import LOCATION_NAMESPACE, get_geo_cache
+    from .geoip_offline import get_offline_geoip
+except ImportError:
+    from enrichment_client import EnrichmentClient, run_sync
+    from geo_cache import LOCATION_NAMESPACE, get_geo_cache
+    from geoip_offline import get_offline_geoip
+
 logger = logging.getLogger(__name__)
 
 class GeoIPLookup:
@@ -25,68 +32,51 @@ class GeoIPLookup:
             'center': (33.63, 46.42)
         }
         
-        # سرویس‌های مکان‌یابی IP
-        self.providers = {
-            'ip-api': {
-                'url': 'http://ip-api.com/json/{ip}',
-                'fields': ['lat', 'lon', 'city', 'regionName', 'country', 'isp'],
-                'success_key': 'status',
-                'success_value': 'success'
-            },
-            'ipapi': {
-                'url': 'http://ipapi.co/{ip}/json/',
-                'fields': ['latitude', 'longitude', 'city', 'region', 'country_name', 'org'],
-                'error_key': 'error'
-            }
-        }
+        # سرویس‌های مکان‌یابی IP (تعریف، دسته‌بندی و سهمیه در enrichment_client)
+        self.providers = ['ip-api', 'ipapi']
         
-        # بارگذاری کش محلی برای کاهش درخواست‌ها
+        # رکورد مکان‌یابی مشترک با سایر مکان‌یاب‌ها (LRU + SQLite)؛ کش JSON قدیمی یک بار منتقل می‌شود
+        self.cache_namespace = LOCATION_NAMESPACE
+        self.cache = get_geo_cache()
         self.cache_file = 'geoip_cache.json'
-        self.cache = self._load_cache()
+        self._migrate_json_cache()
+
+        # موتور آفلاین بازه‌ها (در صورت وجود فایل کامپایل‌شده)
+        self.offline = get_offline_geoip()
         
-    def _load_cache(self) -> Dict:
-        """بارگذاری کش از فایل"""
+    def _migrate_json_cache(self):
+        """انتقال کش JSON قدیمی به کش مشترک و کنار گذاشتن فایل"""
         if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading cache: {e}")
-        return {}
-
-    def _save_cache(self):
-        """ذخیره کش در فایل"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving cache: {e}")
+            if self.cache.import_json(self.cache_namespace, self.cache_file, self._to_record):
+                try:
+                    os.replace(self.cache_file, self.cache_file + '.migrated')
+                except OSError as e:
+                    logger.error(f"Error renaming legacy cache: {e}")
+
+    def _query_online(self, ips: List[str]) -> Dict[str, Dict[str, Any]]:
+        """درخواست دسته‌ای همزمان به همه سرویس‌ها با نشست‌های مشترک و سهمیه هر سرویس"""
+        async def run():
+            async with EnrichmentClient(cache=self.cache) as client:
+                return await client.enrich_many(ips, self.providers)
 
-    def _query_provider(self, provider: str, ip: str) -> Optional[Dict[str, Any]]:
-        """درخواست به یک سرویس مکان‌یابی"""
-        config = self.providers[provider]
         try:
-            response = requests.get(
-                config['url'].format(ip=ip),
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                
-                # بررسی خطا
-                if config.get('error_key') and data.get(config['error_key']):
-                    return None
-                
-                # بررسی موفقیت
-                if config.get('success_key'):
-                    if data.get(config['success_key']) != config['success_value']:
-                        return None
-                
-                return self._normalize_response(provider, data)
-                
+            raw = run_sync(run)
         except Exception as e:
-            logger.warning(f"Error querying {provider} for {ip}: {e}")
-        return None
+            logger.error(f"Error querying geolocation providers: {e}")
+            return {}
+
+        results = {}
+        for ip, by_provider in raw.items():
+            results[ip] = {}
+            for provider, data in by_provider.items():
+                if not data:
+                    continue
+                result = self._normalize_response(provider, data)
+                # اضافه کردن وضعیت قرارگیری در ایلام
+                if result.get('lat') and result.get('lon'):
+                    result['in_ilam'] = self._is_in_ilam(result['lat'], result['lon'])
+                results[ip][provider] = result
+        return results
 
     def _normalize_response(self, provider: str, data: Dict) -> Dict[str, Any]:
         """استانداردسازی خروجی سرویس‌های مختلف"""
@@ -110,6 +100,62 @@ class GeoIPLookup:
             }
         return data
 
+    def _normalize_record(self, location: Dict[str, Any]) -> Dict[str, Any]:
+        """رکورد مشترک مکان‌یابی (یا خروجی موتور آفلاین) در قالب سرویس‌های آنلاین"""
+        result = {
+            'lat': location['latitude'],
+            'lon': location['longitude'],
+            'city': location['city'],
+            'region': location['region'],
+            'country': location['country'],
+            'isp': location['isp']
+        }
+        if result['lat'] is not None and result['lon'] is not None:
+            result['in_ilam'] = self._is_in_ilam(result['lat'], result['lon'])
+        return result
+
+    def _from_record(self, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        نتیجه سرویس -> داده از روی رکورد مشترک؛ هم برای کش و هم برای پاسخ تازه استفاده می‌شود
+        تا خروجی lookup در هر دو مسیر یک قالب داشته باشد
+        """
+        if not record:
+            return {}
+        return {record.get('service') or 'cache': self._normalize_record(record)}
+
+    @staticmethod
+    def _to_record(ip: str, results: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """رکورد مشترک از اولین سرویس دارای مختصات؛ None اگر هیچ سرویسی مختصات نداد"""
+        for provider, result in results.items():
+            if result and result.get('lat') is not None and result.get('lon') is not None:
+                return {
+                    'ip': ip,
+                    'status': 'success',
+                    'latitude': result['lat'],
+                    'longitude': result['lon'],
+                    'city': result.get('city') or '',
+                    'region': result.get('region') or '',
+                    'country': result.get('country') or '',
+                    'isp': result.get('isp') or '',
+                    'accuracy': 'city',
+                    'service': provider
+                }
+        return None
+
+    def _store(self, ip: str, results: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        record = self._to_record(ip, results)
+        if record:
+            self.cache.put(self.cache_namespace, ip, record)
+        else:
+            self.cache.put_negative(self.cache_namespace, ip)
+        return record
+
+    def _store_offline(self, ip: str, location: Dict[str, Any]) -> Dict[str, Any]:
+        """ذخیره نتیجه موتور آفلاین با نام سرویس، مانند رکورد سرویس‌های آنلاین"""
+        record = {**location, 'service': 'offline'}
+        self.cache.put(self.cache_namespace, ip, record)
+        return record
+
     def _is_in_ilam(self, lat: float, lon: float) -> bool:
         """بررسی قرارگیری نقطه در محدوده استان ایلام"""
         if not (lat and lon):
@@ -119,52 +165,45 @@ class GeoIPLookup:
 
     def lookup(self, ip: str, use_cache: bool = True) -> Dict[str, Any]:
         """جستجوی موقعیت جغرافیایی IP"""
-        # بررسی کش
-        if use_cache and ip in self.cache:
-            return self.cache[ip]
+        # بررسی کش (نتیجه منفی یعنی هیچ سرویسی پاسخ نداده است)
+        if use_cache:
+            hit, cached = self.cache.get(self.cache_namespace, ip)
+            if hit:
+                return self._from_record(cached)
             
         results = {}
-        
+
+        # بازه‌های آفلاین؛ اگر مختصات داشته باشد درخواست HTTP لازم نیست
+        if self.offline is not None:
+            location = self.offline.lookup(ip)
+            if location:
+                results['offline'] = self._normalize_record(location)
+                if location['latitude'] is not None:
+                    return self._from_record(self._store_offline(ip, location))
+
         # درخواست همزمان به همه سرویس‌ها
-        with ThreadPoolExecutor(max_workers=len(self.providers)) as executor:
-            futures = {
-                provider: executor.submit(self._query_provider, provider, ip)
-                for provider in self.providers
-            }
-            
-            # جمع‌آوری نتایج
-            for provider, future in futures.items():
-                try:
-                    result = future.result(timeout=10)
-                    if result:
-                        results[provider] = result
-                        # اضافه کردن وضعیت قرارگیری در ایلام
-                        if result.get('lat') and result.get('lon'):
-                            results[provider]['in_ilam'] = self._is_in_ilam(
-                                result['lat'], result['lon']
-                            )
-                except Exception as e:
-                    logger.error(f"Error getting result from {provider}: {e}")
+        results.update(self._query_online([ip]).get(ip, {}))
                     
-        # ذخیره در کش
-        if results:
-            self.cache[ip] = results
-            self._save_cache()
-            
-        return results
+        # ذخیره رکورد مشترک در کش؛ خروجی همان قالب برخورد کش است
+        return self._from_record(self._store(ip, results))
 
     def batch_lookup(self, ips: list) -> Dict[str, Dict]:
         """جستجوی همزمان چند IP"""
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {
-                ip: executor.submit(self.lookup, ip)
-                for ip in ips
-            }
-            
-            return {
-                ip: future.result()
-                for ip, future in futures.items()
-            }
+        results = {ip: self._from_record(cached) for ip, cached in self.cache.get_many(self.cache_namespace, ips).items()}
+        if self.offline is not None:
+            # جستجوی برداری همه IPها؛ فقط IPهای بدون مختصات به سرویس‌های آنلاین می‌روند
+            for ip, location in self.offline.lookup_many(ips).to_dicts().items():
+                if ip not in results and location and location['latitude'] is not None:
+                    results[ip] = self._from_record(self._store_offline(ip, location))
+        remaining = [ip for ip in ips if ip not in results]
+        if not remaining:
+            return results
+
+        # یک درخواست دسته‌ای برای هر ۱۰۰ IP در ip-api به جای یک درخواست برای هر IP
+        online = self._query_online(remaining)
+        for ip in remaining:
+            results[ip] = self._from_record(self._store(ip, online.get(ip, {})))
+        return results
 
 # مثال استفاده
 if __name__ == "__main__":
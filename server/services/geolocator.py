@@ -6,9 +6,8 @@ IP Geolocation Service for Miner Detection System
 
 import json
 import logging
-import math
 import time
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Dict, List, Optional, Tuple, Any
 from urllib.parse import urljoin
 
@@ -16,6 +15,19 @@ import requests
 import aiohttp
 import asyncio
 
+try:
+    from .enrichment_client import EnrichmentClient
+    from .geo_cache import LOCATION_NAMESPACE, get_geo_cache
+    from .geo_math import haversine_km
+    from .geoip_offline import get_offline_geoip
+    from .region_service import get_region_service
+except ImportError:
+    from enrichment_client import EnrichmentClient
+    from geo_cache import LOCATION_NAMESPACE, get_geo_cache
+    from geo_math import haversine_km
+    from geoip_offline import get_offline_geoip
+    from region_service import get_region_service
+
 logger = logging.getLogger(__name__)
 
 class IPGeolocator:
@@ -29,25 +41,13 @@ class IPGeolocator:
             'center': (33.63, 46.42)
         }
         
-        # Major cities in Ilam province with coordinates
-        self.ilam_cities = {
-            'ایلام': (33.6374, 46.4227),
-            'مهران': (33.1221, 46.1641),
-            'دهلران': (32.6942, 47.2678),
-            'آبدانان': (32.9928, 47.4164),
-            'دره‌شهر': (33.1458, 47.3667),
-            'ایوان': (33.8081, 46.2892),
-            'چرداول': (33.7333, 46.8833),
-            'بدره': (33.0833, 47.1167),
-            'سرابله': (32.9667, 46.5833),
-            'ملکشاهی': (33.3833, 46.5667),
-            'شیروان چرداول': (33.9, 46.95),
-            'ارکواز': (33.4167, 46.6833),
-            'زرنه': (33.2833, 46.8167)
-        }
+        # Province/county/district polygons and settlements (ILAM_DIVISIONS)
+        self.regions = get_region_service()
         
-        # Cache for geolocation results
-        self.location_cache = {}
+        # Shared geolocation cache (in-memory LRU in front of SQLite); the cached record is the
+        # service-shaped location shared by all geolocators, Ilam fields are added on every read
+        self.location_cache = get_geo_cache()
+        self.cache_namespace = LOCATION_NAMESPACE
         self.cache_expiry = timedelta(hours=24)
         
         # Rate limiting
@@ -56,11 +56,11 @@ class IPGeolocator:
         
     def geolocate_ip(self, ip_address: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
         """Geolocate IP address using multiple services"""
-        # Check cache first
-        if use_cache and ip_address in self.location_cache:
-            cached_data = self.location_cache[ip_address]
-            if datetime.now() - cached_data['cached_at'] < self.cache_expiry:
-                return cached_data['data']
+        # Check cache first (a cached None means every service failed recently)
+        if use_cache:
+            hit, cached_data = self.location_cache.get(self.cache_namespace, ip_address)
+            if hit:
+                return self._enhance_with_ilam_data(dict(cached_data)) if cached_data else None
         
         # Skip private IP addresses
         if self._is_private_ip(ip_address):
@@ -76,6 +76,14 @@ class IPGeolocator:
                 'accuracy': 'network'
             }
         
+        # Local range database answers without any HTTP request
+        offline = get_offline_geoip()
+        if offline is not None:
+            location = offline.lookup(ip_address)
+            if location and location['latitude'] is not None:
+                self._cache_location(ip_address, location)
+                return self._enhance_with_ilam_data(dict(location))
+
         # Try multiple geolocation services
         services = [
             {
@@ -118,14 +126,9 @@ class IPGeolocator:
                     parsed_data = service['parser'](data, ip_address)
                     
                     if parsed_data and parsed_data.get('latitude') and parsed_data.get('longitude'):
-                        # Enhance data with Ilam-specific information
-                        enhanced_data = self._enhance_with_ilam_data(parsed_data)
-                        
-                        # Cache the result
-                        self.location_cache[ip_address] = {
-                            'data': enhanced_data,
-                            'cached_at': datetime.now()
-                        }
+                        # Cache the service record, then enhance a copy with Ilam-specific information
+                        self._cache_location(ip_address, parsed_data)
+                        enhanced_data = self._enhance_with_ilam_data(dict(parsed_data))
                         
                         logger.info(f"Successfully geolocated {ip_address} using {service_name}")
                         return enhanced_data
@@ -135,7 +138,13 @@ class IPGeolocator:
                 continue
         
         logger.error(f"All geolocation services failed for {ip_address}")
+        self.location_cache.put_negative(self.cache_namespace, ip_address)
         return None
+
+    def _cache_location(self, ip_address: str, data: Dict[str, Any]):
+        """Store a service-shaped location record (without Ilam fields) in the shared cache"""
+        self.location_cache.put(self.cache_namespace, ip_address, data,
+                                ttl=self.cache_expiry.total_seconds())
     
     def _is_private_ip(self, ip: str) -> bool:
         """Check if IP address is private/local"""
@@ -228,6 +237,10 @@ class IPGeolocator:
         location_data['in_ilam'] = in_ilam
         
         if in_ilam:
+            regions = self.regions.assign([lat], [lon]).to_dicts()[0]
+            location_data['county'] = regions['county']
+            location_data['district'] = regions['district']
+            
             # Find closest city in Ilam
             closest_city_info = self._find_closest_ilam_city(lat, lon)
             location_data['closest_ilam_city'] = closest_city_info['city']
@@ -250,47 +263,37 @@ class IPGeolocator:
         return location_data
     
     def _is_in_ilam_bounds(self, lat: float, lon: float) -> bool:
-        """Check if coordinates are within Ilam province boundaries"""
-        return (self.ilam_bounds['south'] <= lat <= self.ilam_bounds['north'] and
-                self.ilam_bounds['west'] <= lon <= self.ilam_bounds['east'])
+        """Check if coordinates are within the Ilam province polygon"""
+        return bool(self.regions.in_province([lat], [lon])[0])
     
     def _find_closest_ilam_city(self, lat: float, lon: float) -> Dict[str, Any]:
-        """Find the closest city in Ilam province"""
-        min_distance = float('inf')
-        closest_city = None
-        
-        for city, (city_lat, city_lon) in self.ilam_cities.items():
-            distance = self._calculate_distance(lat, lon, city_lat, city_lon)
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city
-        
+        """Find the closest settlement in Ilam province"""
+        index, distance = self.regions.nearest_settlement([lat], [lon])
         return {
-            'city': closest_city,
-            'distance_km': min_distance
+            'city': self.regions.settlement_names[index[0]] if index[0] >= 0 else None,
+            'distance_km': float(distance[0])
         }
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two points using Haversine formula"""
-        # Convert latitude and longitude from degrees to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Earth's radius in kilometers
-        r = 6371
-        
-        return c * r
+        """Calculate distance between two points using Haversine formula (km)"""
+        return float(haversine_km(lat1, lon1, lat2, lon2))
     
     def geolocate_multiple(self, ip_addresses: List[str]) -> Dict[str, Dict[str, Any]]:
         """Geolocate multiple IP addresses"""
-        results = {}
-        
+        results = {ip: self._enhance_with_ilam_data(dict(record)) if record else None
+                   for ip, record in self.location_cache.get_many(self.cache_namespace, ip_addresses).items()}
+
+        # Vectorized offline lookup first; only unresolved addresses go to the online services
+        offline = get_offline_geoip()
+        if offline is not None:
+            for ip, location in offline.lookup_many(ip_addresses).to_dicts().items():
+                if ip not in results and location and location['latitude'] is not None:
+                    self._cache_location(ip, location)
+                    results[ip] = self._enhance_with_ilam_data(dict(location))
+
         for ip in ip_addresses:
+            if ip in results:
+                continue
             try:
                 location = self.geolocate_ip(ip)
                 results[ip] = location
@@ -347,23 +350,28 @@ class IPGeolocator:
     
     def clear_cache(self):
         """Clear the location cache"""
-        self.location_cache.clear()
+        self.location_cache.invalidate(self.cache_namespace)
         logger.info("Location cache cleared")
 
 class GeolocatorService:
     def __init__(self):
-        self.cache: Dict[str, Dict] = {}
-        self.ilam_bounds = {
-            'min_lat': 32.5,
-            'max_lat': 34.5,
-            'min_lon': 45.5,
-            'max_lon': 47.5
-        }
+        # Shared location record; the Ilam check runs on read, so records located outside
+        # Ilam stay useful to the other geolocators
+        self.cache = get_geo_cache()
+        self.cache_namespace = LOCATION_NAMESPACE
 
     async def get_location(self, ip_address: str) -> Optional[Dict]:
         """Get location data for an IP address with Ilam province validation"""
-        if ip_address in self.cache:
-            return self.cache[ip_address]
+        hit, cached = self.cache.get(self.cache_namespace, ip_address)
+        if hit:
+            return self._ilam_location(cached)
+
+        offline = get_offline_geoip()
+        if offline is not None:
+            location = offline.lookup(ip_address)
+            if location and location['latitude'] is not None:
+                self.cache.put(self.cache_namespace, ip_address, location)
+                return self._ilam_location(location)
 
         try:
             async with aiohttp.ClientSession() as session:
@@ -374,28 +382,67 @@ class GeolocatorService:
                 if not location:
                     location = await self._try_maxmind(session, ip_address)
 
-                if location and self._is_in_ilam(location):
-                    self.cache[ip_address] = location
-                    return location
-                
-                return None
+                return self._store(ip_address, location)
 
         except Exception as e:
             logger.error(f"Error getting location for IP {ip_address}: {str(e)}")
             return None
 
+    @staticmethod
+    def _to_record(ip: str, location: Dict) -> Dict[str, Any]:
+        """Shared location record from this service's {latitude, longitude, city, province} shape"""
+        return {
+            'ip': ip,
+            'status': 'success',
+            'latitude': location.get('latitude'),
+            'longitude': location.get('longitude'),
+            'city': location.get('city') or '',
+            'region': location.get('province') or '',
+            'country': '',
+            'isp': '',
+            'accuracy': 'city',
+            'service': 'geolocator_service'
+        }
+
+    def _ilam_location(self, record: Optional[Dict]) -> Optional[Dict]:
+        """This service's shape from a shared record, or None when missing or outside Ilam"""
+        if not record:
+            return None
+        location = {
+            'latitude': record.get('latitude'),
+            'longitude': record.get('longitude'),
+            'city': record.get('city'),
+            'province': record.get('region')
+        }
+        return location if self._is_in_ilam(location) else None
+
     def _is_in_ilam(self, location: Dict) -> bool:
-        """Check if coordinates are within Ilam province bounds"""
+        """Check if coordinates are within the Ilam province polygon"""
         lat = location.get('latitude')
         lon = location.get('longitude')
         
         if not lat or not lon:
             return False
 
-        return (
-            self.ilam_bounds['min_lat'] <= lat <= self.ilam_bounds['max_lat'] and
-            self.ilam_bounds['min_lon'] <= lon <= self.ilam_bounds['max_lon']
-        )
+        return bool(get_region_service().in_province([lat], [lon])[0])
+
+    @staticmethod
+    def _from_ipapi(data: Dict) -> Dict:
+        return {
+            'latitude': data.get('lat'),
+            'longitude': data.get('lon'),
+            'city': data.get('city'),
+            'province': data.get('regionName')
+        }
+
+    @staticmethod
+    def _from_ipstack(data: Dict) -> Dict:
+        return {
+            'latitude': data.get('latitude'),
+            'longitude': data.get('longitude'),
+            'city': data.get('city'),
+            'province': data.get('region_name')
+        }
 
     async def _try_ipapi(self, session: aiohttp.ClientSession, ip: str) -> Optional[Dict]:
         """Try to get location from ip-api.com"""
@@ -404,12 +451,7 @@ class GeolocatorService:
                 if response.status == 200:
                     data = await response.json()
                     if data.get('status') == 'success':
-                        return {
-                            'latitude': data.get('lat'),
-                            'longitude': data.get('lon'),
-                            'city': data.get('city'),
-                            'province': data.get('regionName')
-                        }
+                        return self._from_ipapi(data)
         except Exception as e:
             logger.warning(f"IP-API request failed for {ip}: {str(e)}")
         return None
@@ -422,12 +464,7 @@ class GeolocatorService:
             async with session.get(url) as response:
                 if response.status == 200:
                     data = await response.json()
-                    return {
-                        'latitude': data.get('latitude'),
-                        'longitude': data.get('longitude'),
-                        'city': data.get('city'),
-                        'province': data.get('region_name')
-                    }
+                    return self._from_ipstack(data)
         except Exception as e:
             logger.warning(f"IPStack request failed for {ip}: {str(e)}")
         return None
@@ -450,17 +487,58 @@ class GeolocatorService:
         return None
 
     def bulk_lookup(self, ip_addresses: list[str]) -> Dict[str, Dict]:
-        """Look up multiple IP addresses in parallel"""
+        """
+        Look up multiple IP addresses: cache and offline ranges first, then batched
+        ip-api / ipstack requests through the shared enrichment client, then MaxMind per IP
+        """
         async def _bulk_lookup():
-            tasks = [self.get_location(ip) for ip in ip_addresses]
-            results = await asyncio.gather(*tasks)
-            return {ip: loc for ip, loc in zip(ip_addresses, results) if loc}
+            ips = list(dict.fromkeys(ip_addresses))
+            cached = self.cache.get_many(self.cache_namespace, ips)
+            results = {ip: self._ilam_location(record) for ip, record in cached.items()}
+            results = {ip: location for ip, location in results.items() if location}
+            remaining = [ip for ip in ips if ip not in cached]
+
+            offline = get_offline_geoip()
+            if offline is not None and remaining:
+                located = set()
+                for ip, location in offline.lookup_many(remaining).to_dicts().items():
+                    if location and location['latitude'] is not None:
+                        located.add(ip)
+                        self.cache.put(self.cache_namespace, ip, location)
+                        ilam_location = self._ilam_location(location)
+                        if ilam_location:
+                            results[ip] = ilam_location
+                remaining = [ip for ip in remaining if ip not in located]
+
+            found: Dict[str, Dict] = {}
+            async with EnrichmentClient(cache=self.cache) as client:
+                for provider, normalize in (('ip-api', self._from_ipapi), ('ipstack', self._from_ipstack)):
+                    pending = [ip for ip in remaining if ip not in found]
+                    if not pending:
+                        break
+                    for ip, data in (await client.enrich(provider, pending)).items():
+                        if data:
+                            found[ip] = normalize(data)
+            for ip in remaining:
+                location = self._store(ip, found.get(ip) or await self._try_maxmind(None, ip))
+                if location:
+                    results[ip] = location
+            return results
 
         return asyncio.run(_bulk_lookup())
 
+    def _store(self, ip: str, location: Optional[Dict]) -> Optional[Dict]:
+        """Cache an online result as the shared record; the location if it lies in Ilam"""
+        if not location or location.get('latitude') is None or location.get('longitude') is None:
+            self.cache.put_negative(self.cache_namespace, ip)
+            return None
+        record = self._to_record(ip, location)
+        self.cache.put(self.cache_namespace, ip, record)
+        return self._ilam_location(record)
+
     def clear_cache(self):
         """Clear the location cache"""
-        self.cache.clear()
+        self.cache.invalidate(self.cache_namespace)
 
 # Global geolocator instance
 geolocator = IPGeolocator()
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Heatmap Tile Service
+کاشی‌های نقشه حرارتی: تجمیع تشخیص‌ها در خانه‌های شبکه مرکاتور هر سطح بزرگنمایی با به‌روزرسانی تدریجی و ETag
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .geo_math import detection_coordinates
+except ImportError:
+    from geo_math import detection_coordinates
+
+logger = logging.getLogger(__name__)
+
+# بیشترین بزرگنمایی ذخیره‌شده؛ کاشی‌های ریزتر از خانه‌های همین سطح ساخته می‌شوند
+MAX_ZOOM = 16
+# بیشترین بزرگنمایی قابل درخواست (مطابق maxZoom رایج Leaflet)
+MAX_REQUEST_ZOOM = 22
+# هر کاشی به 2^CELL_BITS × 2^CELL_BITS خانه تقسیم می‌شود (۳۲×۳۲)
+CELL_BITS = 5
+MAX_LATITUDE = 85.05112878
+
+THREAT_LEVELS = ('unknown', 'low', 'medium', 'high', 'critical')
+THREAT_RANK = {name: rank for rank, name in enumerate(THREAT_LEVELS)}
+
+
+def threat_rank(detection: Dict) -> int:
+    """رتبه تهدید از threat_level یا severity (unknown=0 تا critical=4)"""
+    level = detection.get('threat_level', detection.get('severity'))
+    if isinstance(level, (int, np.integer)):
+        return int(min(max(level, 0), len(THREAT_LEVELS) - 1))
+    return THREAT_RANK.get(str(level).lower(), 0) if level else 0
+
+
+def detection_power(detection: Dict) -> float:
+    value = detection.get('power_consumption',
+                          detection.get('estimated_power_consumption', detection.get('power_w')))
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def detection_confidence(detection: Dict) -> float:
+    value = detection.get('confidence_score', detection.get('confidence'))
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# ─── هندسه کاشی ─────────────────────────────────────────────────────────────
+
+def mercator_cells(lats: Sequence[float], lons: Sequence[float], level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """شماره خانه صحیح (x, y) نقاط در شبکه 2^level × 2^level مرکاتور وب"""
+    lat = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    lon = np.asarray(lons, dtype=np.float64)
+    n = float(1 << level)
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * n
+    top = (1 << level) - 1
+    return (np.clip(np.floor(x), 0, top).astype(np.int64),
+            np.clip(np.floor(y), 0, top).astype(np.int64))
+
+
+def cell_bounds(cx: np.ndarray, cy: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(جنوب، غرب، شمال، شرق) خانه‌ها به درجه"""
+    n = float(1 << level)
+    cx = np.asarray(cx, dtype=np.float64)
+    cy = np.asarray(cy, dtype=np.float64)
+    west = cx / n * 360.0 - 180.0
+    east = (cx + 1) / n * 360.0 - 180.0
+    north = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * cy / n))))
+    south = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (cy + 1) / n))))
+    return south, west, north, east
+
+
+def quadkey(x: int, y: int, level: int) -> str:
+    """کلید چهارتایی (quadkey) خانه یا کاشی"""
+    digits = []
+    for i in range(level, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def tile_cell_range(z: int, x: int, y: int) -> Tuple[int, int, int, int, int, int]:
+    """
+    (بزرگنمایی ذخیره‌شده، سطح خانه، x0، x1، y0، y1) خانه‌های ذخیره‌شده‌ای که کاشی را می‌پوشانند.
+    برای z بیشتر از سطح خانه، یک خانه بزرگ‌تر از کاشی است و همان یک خانه برگردانده می‌شود.
+    """
+    stored = min(z, MAX_ZOOM)
+    level = stored + CELL_BITS
+    if z <= level:
+        shift = level - z
+        return stored, level, x << shift, ((x + 1) << shift) - 1, y << shift, ((y + 1) << shift) - 1
+    shift = z - level
+    return stored, level, x >> shift, x >> shift, y >> shift, y >> shift
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_REQUEST_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+# ─── تجمیع برداری ───────────────────────────────────────────────────────────
+
+def _reduce(cx: np.ndarray, cy: np.ndarray, count: np.ndarray, power: np.ndarray,
+            threat: np.ndarray, confidence: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """ادغام ردیف‌های هم‌خانه (جمع شمارش/توان/اطمینان و بیشینه تهدید)"""
+    keys, inverse = np.unique((cx << 32) | cy, return_inverse=True)
+    size = len(keys)
+    max_threat = np.zeros(size, dtype=np.int64)
+    np.maximum.at(max_threat, inverse, threat)
+    return (keys >> 32, keys & 0xFFFFFFFF,
+            np.bincount(inverse, weights=count, minlength=size).astype(np.int64),
+            np.bincount(inverse, weights=power, minlength=size),
+            max_threat,
+            np.bincount(inverse, weights=confidence, minlength=size))
+
+
+def aggregate_cells(lats: Sequence[float], lons: Sequence[float], power: Optional[Sequence[float]] = None,
+                    threat: Optional[Sequence[int]] = None, confidence: Optional[Sequence[float]] = None,
+                    zooms: Iterable[int] = range(MAX_ZOOM + 1)) -> Dict[int, Tuple[np.ndarray, ...]]:
+    """
+    تجمیع نقاط در خانه‌های هر بزرگنمایی: {zoom: (cx, cy, count, power, max_threat, confidence_sum)}.
+    فقط ریزترین سطح از روی نقاط ساخته می‌شود؛ هر سطح درشت‌تر با نصف کردن مختصات خانه‌های سطح قبل
+    به دست می‌آید، پس هزینه سطوح بعدی به تعداد خانه‌های غیرخالی بستگی دارد نه تعداد نقاط.
+    """
+    zooms = sorted(set(zooms), reverse=True)
+    lat = np.asarray(lats, dtype=np.float64)
+    n = len(lat)
+    if not zooms or not n:
+        return {}
+    cx, cy = mercator_cells(lat, lons, zooms[0] + CELL_BITS)
+    current = _reduce(cx, cy, np.ones(n),
+                      np.zeros(n) if power is None else np.asarray(power, dtype=np.float64),
+                      np.zeros(n, dtype=np.int64) if threat is None else np.asarray(threat, dtype=np.int64),
+                      np.zeros(n) if confidence is None else np.asarray(confidence, dtype=np.float64))
+    result = {zooms[0]: current}
+    for previous, zoom in zip(zooms, zooms[1:]):
+        shift = previous - zoom
+        current = _reduce(current[0] >> shift, current[1] >> shift, *current[2:])
+        result[zoom] = current
+    return result
+
+
+@dataclass
+class TileCounters:
+    """شمارنده‌های سرویس کاشی"""
+    detections: int = 0
+    batches: int = 0
+    cell_writes: int = 0
+    tiles_served: int = 0
+    rendered: int = 0
+    not_modified: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'detections': self.detections,
+            'batches': self.batches,
+            'cell_writes': self.cell_writes,
+            'tiles_served': self.tiles_served,
+            'rendered': self.rendered,
+            'not_modified': self.not_modified,
+            'render_hit_rate': 1 - self.rendered / self.tiles_served if self.tiles_served else 0.0
+        }
+
+
+class HeatmapTiles:
+    """
+    ذخیره تجمیعی تشخیص‌ها برای نقشه حرارتی.
+
+    هر تشخیص یک بار در خانه‌های همه بزرگنمایی‌های 0..MAX_ZOOM جمع می‌شود (شمارش، مجموع توان،
+    بیشینه تهدید، مجموع اطمینان) و با یک UPSERT دسته‌ای در SQLite ذخیره می‌شود؛ نسخه هر کاشی
+    متأثر نیز یک واحد بالا می‌رود. پاسخ کاشی JSON کوچکی از خانه‌های غیرخالی است که تا تغییر
+    نسخه در LRU حافظه می‌ماند و ETag آن از نسخه ساخته می‌شود، پس مرورگر با If-None-Match
+    فقط کاشی‌های تغییرکرده را دوباره دریافت می‌کند.
+    """
+
+    def __init__(self, db_path: str = "ilam_mining.db", max_zoom: int = MAX_ZOOM,
+                 max_rendered: int = 4096):
+        self.db_path = db_path
+        self.max_zoom = max_zoom
+        self.max_rendered = max_rendered
+        self._rendered: 'OrderedDict[Tuple[int, int, int], Tuple[int, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.counters = TileCounters()
+        self._init_database()
+
+    def _init_database(self):
+        """ایجاد جداول خانه‌ها و نسخه کاشی‌ها"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS heatmap_cells (
+                    zoom INTEGER NOT NULL,
+                    cx INTEGER NOT NULL,
+                    cy INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    power REAL NOT NULL,
+                    max_threat INTEGER NOT NULL,
+                    confidence_sum REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (zoom, cx, cy)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS heatmap_tiles (
+                    zoom INTEGER NOT NULL,
+                    x INTEGER NOT NULL,
+                    y INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    PRIMARY KEY (zoom, x, y)
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error initializing heatmap tile tables: {e}")
+
+    # ─── ورود داده ──────────────────────────────────────────────────────────
+
+    def add(self, detections: Iterable[Dict]) -> int:
+        """افزودن تشخیص‌های دارای مختصات؛ تعداد تشخیص‌های ثبت‌شده"""
+        lats, lons, power, threat, confidence = [], [], [], [], []
+        for detection in detections:
+            lat, lon = detection_coordinates(detection)
+            if lat is None:
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            power.append(detection_power(detection))
+            threat.append(threat_rank(detection))
+            confidence.append(detection_confidence(detection))
+        return self.add_arrays(lats, lons, power, threat, confidence)
+
+    def add_arrays(self, lats: Sequence[float], lons: Sequence[float], power: Optional[Sequence[float]] = None,
+                   threat: Optional[Sequence[int]] = None, confidence: Optional[Sequence[float]] = None) -> int:
+        """افزودن برداری؛ تجمیع در حافظه و یک تراکنش برای همه سطوح"""
+        levels = aggregate_cells(lats, lons, power, threat, confidence, range(self.max_zoom + 1))
+        if not levels:
+            return 0
+        now = time.time()
+        cells: List[Tuple] = []
+        tiles = set()
+        for zoom, (cx, cy, count, pw, mt, conf) in levels.items():
+            cells.extend(zip([zoom] * len(cx), cx.tolist(), cy.tolist(), count.tolist(), pw.tolist(),
+                             mt.tolist(), conf.tolist(), [now] * len(cx)))
+            tiles.update(zip([zoom] * len(cx), (cx >> CELL_BITS).tolist(), (cy >> CELL_BITS).tolist()))
+        with self._write_lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.executemany('''
+                    INSERT INTO heatmap_cells (zoom, cx, cy, count, power, max_threat, confidence_sum, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(zoom, cx, cy) DO UPDATE SET
+                        count = count + excluded.count,
+                        power = power + excluded.power,
+                        max_threat = MAX(max_threat, excluded.max_threat),
+                        confidence_sum = confidence_sum + excluded.confidence_sum,
+                        updated_at = excluded.updated_at
+                ''', cells)
+                conn.executemany('''
+                    INSERT INTO heatmap_tiles (zoom, x, y, version) VALUES (?, ?, ?, 1)
+                    ON CONFLICT(zoom, x, y) DO UPDATE SET version = version + 1
+                ''', sorted(tiles))
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error saving heatmap cells: {e}")
+                return 0
+        with self._lock:
+            self.counters.detections += len(lats)
+            self.counters.batches += 1
+            self.counters.cell_writes += len(cells)
+        return len(lats)
+
+    # ─── خواندن کاشی ────────────────────────────────────────────────────────
+
+    def _version(self, conn: sqlite3.Connection, z: int, x: int, y: int) -> int:
+        stored = min(z, self.max_zoom)
+        shift = z - stored
+        row = conn.execute('SELECT version FROM heatmap_tiles WHERE zoom = ? AND x = ? AND y = ?',
+                           (stored, x >> shift, y >> shift)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _etag(z: int, x: int, y: int, version: int) -> str:
+        return f'W/"{z}-{x}-{y}-{version}"'
+
+    def tile_etag(self, z: int, x: int, y: int) -> str:
+        """ETag کاشی بدون ساختن بدنه (برای پاسخ 304)"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            version = self._version(conn, z, x, y)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading heatmap tile version: {e}")
+            version = 0
+        return self._etag(z, x, y, version)
+
+    def _render(self, conn: sqlite3.Connection, z: int, x: int, y: int, version: int) -> str:
+        stored, level, x0, x1, y0, y1 = tile_cell_range(z, x, y)
+        rows = conn.execute('''
+            SELECT cx, cy, count, power, max_threat, confidence_sum FROM heatmap_cells
+            WHERE zoom = ? AND cx BETWEEN ? AND ? AND cy BETWEEN ? AND ?
+        ''', (stored, x0, x1, y0, y1)).fetchall()
+        cells = []
+        total = 0
+        if rows:
+            data = np.array(rows, dtype=np.float64)
+            south, west, north, east = cell_bounds(data[:, 0], data[:, 1], level)
+            lat = ((south + north) / 2).round(6).tolist()
+            lon = ((west + east) / 2).round(6).tolist()
+            for (cx, cy, count, power, max_threat, confidence_sum), c_lat, c_lon in zip(rows, lat, lon):
+                total += count
+                cells.append({
+                    'quadkey': quadkey(cx, cy, level),
+                    'lat': c_lat,
+                    'lon': c_lon,
+                    'count': count,
+                    'power': round(power, 2),
+                    'max_threat': THREAT_LEVELS[max_threat],
+                    'avg_confidence': round(confidence_sum / count, 2) if count else 0.0
+                })
+        return json.dumps({
+            'z': z, 'x': x, 'y': y,
+            'version': version,
+            'cell_level': level,
+            'total_detections': total,
+            'cells': cells
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    def get_tile(self, z: int, x: int, y: int) -> Tuple[str, str]:
+        """(ETag، بدنه JSON) کاشی؛ بدنه تا تغییر نسخه از LRU حافظه برمی‌گردد"""
+        key = (z, x, y)
+        try:
+            conn = sqlite3.connect(self.db_path)
+            version = self._version(conn, z, x, y)
+            with self._lock:
+                self.counters.tiles_served += 1
+                cached = self._rendered.get(key)
+                if cached is not None and cached[0] == version:
+                    self._rendered.move_to_end(key)
+                    conn.close()
+                    return self._etag(z, x, y, version), cached[1]
+            body = self._render(conn, z, x, y, version)
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading heatmap tile {z}/{x}/{y}: {e}")
+            raise
+        with self._lock:
+            self.counters.rendered += 1
+            self._rendered[key] = (version, body)
+            self._rendered.move_to_end(key)
+            while len(self._rendered) > self.max_rendered:
+                self._rendered.popitem(last=False)
+        return self._etag(z, x, y, version), body
+
+    def not_modified(self):
+        with self._lock:
+            self.counters.not_modified += 1
+
+    def clear(self):
+        """حذف همه خانه‌ها؛ نسخه کاشی‌ها بالا می‌رود تا ETagهای قبلی نامعتبر شوند"""
+        with self._write_lock:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('DELETE FROM heatmap_cells')
+                conn.execute('UPDATE heatmap_tiles SET version = version + 1')
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error clearing heatmap cells: {e}")
+        with self._lock:
+            self._rendered.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters.to_dict(), 'rendered_cached': len(self._rendered),
+                    'max_zoom': self.max_zoom, 'cell_bits': CELL_BITS}
+
+
+# Global tile service instance
+_heatmap_tiles: Optional[HeatmapTiles] = None
+_heatmap_tiles_lock = threading.Lock()
+
+
+def get_heatmap_tiles() -> HeatmapTiles:
+    """دریافت instance سرویس کاشی نقشه حرارتی"""
+    global _heatmap_tiles
+    with _heatmap_tiles_lock:
+        if _heatmap_tiles is None:
+            _heatmap_tiles = HeatmapTiles()
+        return _heatmap_tiles
+
+
+# ─── سنجش ───────────────────────────────────────────────────────────────────
+
+def benchmark(points: int = 200_000, batches: int = 20, batch_size: int = 500, tiles: int = 200,
+              db_path: str = ":memory:", seed: int = 0) -> Dict[str, Any]:
+    """
+    بارگذاری points تشخیص، افزودن تدریجی دسته‌ها و خواندن کاشی‌های پرتراکم (بار اول، بار دوم از LRU
+    و مسیر ETag). درستی با مقایسه مجموع شمارش خانه‌های هر سطح با تعداد نقاط سنجیده می‌شود.
+    """
+    try:
+        from .detection_clustering import synthetic_detections
+    except ImportError:
+        from detection_clustering import synthetic_detections
+    import os
+    import tempfile
+
+    temp_dir = None
+    if db_path == ":memory:":
+        # هر عملیات اتصال جدیدی باز می‌کند، پس پایگاه موقت روی دیسک لازم است
+        temp_dir = tempfile.mkdtemp()
+        db_path = os.path.join(temp_dir, 'tiles.db')
+    rng = np.random.default_rng(seed)
+    lat, lon = synthetic_detections(points + batches * batch_size, seed=seed)
+    power = rng.uniform(500, 3500, len(lat))
+    threat = rng.integers(0, len(THREAT_LEVELS), len(lat))
+    confidence = rng.uniform(40, 100, len(lat))
+
+    service = HeatmapTiles(db_path=db_path)
+    started = time.perf_counter()
+    service.add_arrays(lat[:points], lon[:points], power[:points], threat[:points], confidence[:points])
+    load_s = time.perf_counter() - started
+
+    add_times = []
+    for b in range(batches):
+        chunk = slice(points + b * batch_size, points + (b + 1) * batch_size)
+        started = time.perf_counter()
+        service.add_arrays(lat[chunk], lon[chunk], power[chunk], threat[chunk], confidence[chunk])
+        add_times.append(time.perf_counter() - started)
+
+    conn = sqlite3.connect(db_path)
+    totals = dict(conn.execute('SELECT zoom, SUM(count) FROM heatmap_cells GROUP BY zoom').fetchall())
+    cell_rows = conn.execute('SELECT COUNT(*) FROM heatmap_cells').fetchone()[0]
+    busiest = conn.execute('SELECT zoom, x, y FROM heatmap_tiles WHERE zoom BETWEEN 8 AND ? '
+                           'ORDER BY version DESC LIMIT ?', (MAX_ZOOM, tiles)).fetchall()
+    conn.close()
+
+    def timed(fn):
+        started = time.perf_counter()
+        for z, x, y in busiest:
+            fn(z, x, y)
+        return (time.perf_counter() - started) / max(len(busiest), 1) * 1000
+
+    first_ms = timed(service.get_tile)
+    cached_ms = timed(service.get_tile)
+    etag_ms = timed(service.tile_etag)
+    sizes = [len(service.get_tile(z, x, y)[1]) for z, x, y in busiest]
+    result = {
+        'points': points + batches * batch_size,
+        'initial_load_s': load_s,
+        'incremental_batch': batch_size,
+        'incremental_add_ms_mean': float(np.mean(add_times) * 1000),
+        'cell_rows': cell_rows,
+        'tiles_sampled': len(busiest),
+        'tile_render_ms': first_ms,
+        'tile_cached_ms': cached_ms,
+        'tile_etag_ms': etag_ms,
+        'tile_json_bytes_mean': float(np.mean(sizes)) if sizes else 0.0,
+        'counts_consistent': all(totals.get(z) == points + batches * batch_size for z in range(MAX_ZOOM + 1)),
+        'engine': service.get_stats()
+    }
+    if temp_dir:
+        os.remove(db_path)
+        os.rmdir(temp_dir)
+    return result
+
+
+def main():
+    """سنجش سرویس کاشی"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Heatmap tile aggregation benchmark")
+    parser.add_argument('--points', type=int, default=200_000)
+    parser.add_argument('--tiles', type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.points, tiles=args.tiles), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared Per-host Fingerprint Cache
+کش مشترک اثر انگشت میزبان‌ها بین ماژول‌های اسکن
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass
+class CacheCounters:
+    """شمارنده‌های کش برای یک نوع ویژگی"""
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses + self.coalesced
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.lookups:
+            return 0.0
+        return (self.hits + self.coalesced) / self.lookups
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'probes': self.misses,
+            'hit_rate': self.hit_rate
+        }
+
+
+@dataclass
+class CacheCycle:
+    """آمار یک چرخه پایش"""
+    label: str
+    start_time: datetime
+    counters: Dict[str, CacheCounters] = field(default_factory=lambda: defaultdict(CacheCounters))
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = CacheCounters()
+        for c in self.counters.values():
+            total.hits += c.hits
+            total.misses += c.misses
+            total.coalesced += c.coalesced
+            total.errors += c.errors
+        return {
+            'label': self.label,
+            'start_time': self.start_time.isoformat(),
+            'total': total.to_dict(),
+            'by_kind': {kind: c.to_dict() for kind, c in self.counters.items()}
+        }
+
+
+class HostFingerprintCache:
+    """
+    کش اثر انگشت میزبان بر اساس IP با TTL جداگانه برای هر نوع ویژگی
+    و حذف درخواست‌های هم‌زمان تکراری (single-flight)
+    """
+
+    # TTL پیش‌فرض هر نوع ویژگی (ثانیه)؛ نوع، بخش قبل از ':' در نام ویژگی است
+    DEFAULT_TTLS = {
+        'ping': 120,
+        'port': 300,
+        'api': 300,
+        'web': 600,
+        'stratum': 300,
+        'banner': 900,
+        'hostname': 3600,
+        'vpn_proxy': 6 * 3600,
+        'ipapi': 24 * 3600,
+        'geolocation': 24 * 3600
+    }
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 300,
+                 max_hosts: int = 200000):
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.max_hosts = max_hosts
+
+        self._entries: Dict[str, Dict[str, Tuple[Any, float]]] = {}
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+        self.counters: Dict[str, CacheCounters] = defaultdict(CacheCounters)
+        self.cycle: Optional[CacheCycle] = None
+
+    @staticmethod
+    def _kind(attribute: str) -> str:
+        return attribute.split(':', 1)[0]
+
+    def _ttl(self, attribute: str) -> float:
+        return self.ttls.get(self._kind(attribute), self.default_ttl)
+
+    def _count(self, attribute: str, name: str):
+        kind = self._kind(attribute)
+        setattr(self.counters[kind], name, getattr(self.counters[kind], name) + 1)
+        if self.cycle is not None:
+            counters = self.cycle.counters[kind]
+            setattr(counters, name, getattr(counters, name) + 1)
+
+    def _lookup(self, ip: str, attribute: str) -> Any:
+        """خواندن مقدار معتبر (باید داخل قفل فراخوانی شود)"""
+        host = self._entries.get(ip)
+        if not host:
+            return _MISSING
+        entry = host.get(attribute)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del host[attribute]
+            return _MISSING
+        return value
+
+    def _store(self, ip: str, attribute: str, value: Any, ttl: Optional[float] = None):
+        """ذخیره مقدار (باید داخل قفل فراخوانی شود)"""
+        host = self._entries.get(ip)
+        if host is None:
+            if len(self._entries) >= self.max_hosts:
+                self._evict()
+            host = self._entries[ip] = {}
+        host[attribute] = (value, time.monotonic() + (self._ttl(attribute) if ttl is None else ttl))
+
+    def _evict(self):
+        """حذف ورودی‌های منقضی و در صورت نیاز قدیمی‌ترین میزبان‌ها"""
+        now = time.monotonic()
+        for ip in list(self._entries):
+            host = self._entries[ip]
+            for attribute in [a for a, (_, exp) in host.items() if exp < now]:
+                del host[attribute]
+            if not host:
+                del self._entries[ip]
+        while len(self._entries) >= self.max_hosts:
+            del self._entries[next(iter(self._entries))]
+
+    def get(self, ip: str, attribute: str, default: Any = None) -> Any:
+        """خواندن ویژگی بدون کاوش"""
+        with self._lock:
+            value = self._lookup(ip, attribute)
+        return default if value is _MISSING else value
+
+    def put(self, ip: str, attribute: str, value: Any, ttl: Optional[float] = None):
+        """ثبت ویژگی کشف‌شده توسط یک ماژول (مثلاً نتیجه اسکن Nmap)"""
+        with self._lock:
+            self._store(ip, attribute, value, ttl)
+
+    def _claim(self, ip: str, attribute: str) -> Tuple[Any, Optional[Future], bool]:
+        """مقدار کش‌شده، یا future در حال اجرا و اینکه آیا فراخواننده باید کاوش کند"""
+        with self._lock:
+            value = self._lookup(ip, attribute)
+            if value is not _MISSING:
+                self._count(attribute, 'hits')
+                return value, None, False
+            key = (ip, attribute)
+            future = self._inflight.get(key)
+            if future is not None:
+                self._count(attribute, 'coalesced')
+                return _MISSING, future, False
+            future = Future()
+            self._inflight[key] = future
+            self._count(attribute, 'misses')
+            return _MISSING, future, True
+
+    def _resolve(self, ip: str, attribute: str, future: Future, value: Any = _MISSING,
+                 error: Optional[BaseException] = None, ttl: Optional[float] = None):
+        with self._lock:
+            self._inflight.pop((ip, attribute), None)
+            if error is None:
+                self._store(ip, attribute, value, ttl)
+            else:
+                self._count(attribute, 'errors')
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_probe(self, ip: str, attribute: str, probe: Callable[[], Any],
+                     ttl: Optional[float] = None) -> Any:
+        """نسخه همگام: در صورت نبود مقدار، فقط یک فراخواننده کاوش را اجرا می‌کند"""
+        value, future, leader = self._claim(ip, attribute)
+        if future is None:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = probe()
+        except BaseException as e:
+            self._resolve(ip, attribute, future, error=e)
+            raise
+        self._resolve(ip, attribute, future, value, ttl=ttl)
+        return value
+
+    async def aget_or_probe(self, ip: str, attribute: str, probe: Callable[[], Awaitable[Any]],
+                            ttl: Optional[float] = None) -> Any:
+        """نسخه ناهمگام با همان کش و single-flight (قابل اشتراک با نخ‌ها)"""
+        value, future, leader = self._claim(ip, attribute)
+        if future is None:
+            return value
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await probe()
+        except BaseException as e:
+            self._resolve(ip, attribute, future, error=e)
+            raise
+        self._resolve(ip, attribute, future, value, ttl=ttl)
+        return value
+
+    def invalidate(self, ip: str, attribute: Optional[str] = None):
+        """حذف یک ویژگی یا کل اثر انگشت میزبان"""
+        with self._lock:
+            if attribute is None:
+                self._entries.pop(ip, None)
+            elif ip in self._entries:
+                self._entries[ip].pop(attribute, None)
+
+    def fingerprint(self, ip: str) -> Dict[str, Any]:
+        """تمام ویژگی‌های معتبر یک میزبان"""
+        now = time.monotonic()
+        with self._lock:
+            host = self._entries.get(ip, {})
+            return {a: v for a, (v, exp) in host.items() if exp >= now}
+
+    def start_cycle(self, label: str = "") -> CacheCycle:
+        """شروع چرخه پایش جدید برای شمارش کاوش‌ها و نرخ برخورد"""
+        with self._lock:
+            previous, self.cycle = self.cycle, CacheCycle(label=label, start_time=datetime.now())
+        if previous is not None:
+            self._log_cycle(previous)
+        return self.cycle
+
+    def end_cycle(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cycle, self.cycle = self.cycle, None
+        if cycle is None:
+            return None
+        return self._log_cycle(cycle)
+
+    def _log_cycle(self, cycle: CacheCycle) -> Dict[str, Any]:
+        report = cycle.to_dict()
+        total = report['total']
+        logger.info(
+            f"Fingerprint cache cycle '{cycle.label}': {total['probes']} probes, "
+            f"{total['hits'] + total['coalesced']} served from cache ({total['hit_rate']:.1%} hit rate)"
+        )
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار کلی کش"""
+        with self._lock:
+            hosts = len(self._entries)
+            inflight = len(self._inflight)
+            by_kind = {kind: c.to_dict() for kind, c in self.counters.items()}
+        return {
+            'hosts': hosts,
+            'inflight': inflight,
+            'by_kind': by_kind,
+            'current_cycle': self.cycle.to_dict() if self.cycle else None
+        }
+
+
+# Global cache instance
+host_fingerprint_cache = HostFingerprintCache()
+
+
+def get_host_fingerprint_cache() -> HostFingerprintCache:
+    """دریافت instance کش اثر انگشت میزبان"""
+    return host_fingerprint_cache
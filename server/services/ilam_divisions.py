@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ilam Administrative Divisions Data
+تقسیمات کشوری استان ایلام با مختصات شهرها/بخش‌ها و بارگذار منابع آفلاین (iran.json یا فایل محلی)
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# لیست تقسیمات کشوری استان ایلام با مختصات هر شهر/بخش (نمونه کامل)
+ILAM_DIVISIONS = {
+    "ایلام": {
+        "مختصات": [33.6386, 46.4227],
+        "شهرستان‌ها": {
+            "ایلام": [
+                {"name": "ایلام", "coords": [33.6386, 46.4227]},
+                {"name": "چوار", "coords": [33.6931, 46.2972]},
+                {"name": "سیوان", "coords": [33.4967, 46.5631]},
+                {"name": "میمه", "coords": [33.7756, 46.1517]}
+            ],
+            "دهلران": [
+                {"name": "دهلران", "coords": [32.6956, 47.2672]},
+                {"name": "موسیان", "coords": [32.4622, 47.2192]},
+                {"name": "پهله", "coords": [32.3822, 47.3772]},
+                {"name": "زرین‌آباد", "coords": [32.7261, 47.4206]}
+            ],
+            "آبدانان": [
+                {"name": "آبدانان", "coords": [32.9931, 47.4192]},
+                {"name": "سراب‌باغ", "coords": [32.8572, 47.6011]},
+                {"name": "مورموری", "coords": [32.7267, 47.6739]}
+            ],
+            "دره‌شهر": [
+                {"name": "دره‌شهر", "coords": [33.1442, 47.3781]},
+                {"name": "ماژین", "coords": [33.0492, 47.5639]},
+                {"name": "بدل‌آباد", "coords": [33.2100, 47.5000]}
+            ],
+            "ملکشاهی": [
+                {"name": "ارکواز", "coords": [33.3881, 46.8281]},
+                {"name": "دلگشا", "coords": [33.3500, 46.9000]}
+            ],
+            "مهران": [
+                {"name": "مهران", "coords": [33.1222, 46.1642]},
+                {"name": "صالح‌آباد", "coords": [33.3833, 46.2333]}
+            ],
+            "چرداول": [
+                {"name": "سرابله", "coords": [33.7631, 46.5631]},
+                {"name": "زنگوان", "coords": [33.8000, 46.6000]},
+                {"name": "شباب", "coords": [33.9000, 46.7000]}
+            ],
+            "ایوان": [
+                {"name": "ایوان", "coords": [33.8272, 46.3092]},
+                {"name": "زرنه", "coords": [33.9000, 46.2000]}
+            ]
+        }
+    }
+}
+
+DIVISIONS_FILE = "ilam_divisions.json"
+IRAN_JSON_PATH = os.path.join(
+    os.path.dirname(__file__),
+    '..', '..', '.config', 'iran', 'iran-1.0.2', 'dist', 'iran.json'
+)
+
+
+def _builtin_coords() -> Dict[str, List[float]]:
+    """نام شهر/بخش -> مختصات پیش‌فرض"""
+    return {place['name']: place['coords']
+            for province in ILAM_DIVISIONS.values()
+            for places in province['شهرستان‌ها'].values()
+            for place in places if place.get('coords')}
+
+
+def _from_iran_json(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        all_cities = json.load(f)
+    divisions = {"ایلام": {"مختصات": [33.6386, 46.4227], "شهرستان‌ها": {}}}
+    for city in all_cities:
+        if city.get("province_name") != "ایلام":
+            continue
+        county = city.get("county_name")
+        city_name = city.get("city_name")
+        if not county or not city_name:
+            continue
+        divisions["ایلام"]["شهرستان‌ها"].setdefault(county, []).append({
+            "name": city_name,
+            "district": city.get("district_name"),
+            "coords": None  # مختصات در این منبع موجود نیست
+        })
+    return divisions
+
+
+def read_ilam_divisions(iran_json_path: str = IRAN_JSON_PATH,
+                        divisions_file: str = DIVISIONS_FILE) -> Tuple[Dict[str, Any], str]:
+    """
+    تقسیمات کشوری از iran.json (آفلاین)، سپس فایل محلی، سپس مقدار پیش‌فرض.
+    مکان‌های بدون مختصات (مثلاً همه مکان‌های iran.json) مختصات پیش‌فرض هم‌نام را می‌گیرند.
+    خروجی: تقسیمات و منبع ('iran.json'، 'file' یا 'builtin').
+    """
+    divisions, source = None, 'builtin'
+    if os.path.exists(iran_json_path):
+        try:
+            divisions, source = _from_iran_json(iran_json_path), 'iran.json'
+        except Exception as e:
+            logger.error(f"Error reading {iran_json_path}: {e}")
+    if divisions is None and os.path.exists(divisions_file):
+        try:
+            with open(divisions_file, "r", encoding="utf-8") as f:
+                divisions, source = json.load(f), 'file'
+        except Exception as e:
+            logger.error(f"Error reading {divisions_file}: {e}")
+    if divisions is None:
+        return ILAM_DIVISIONS, source
+
+    coords = _builtin_coords()
+    for province in divisions.values():
+        for places in province.get('شهرستان‌ها', {}).values():
+            for place in places:
+                if not place.get('coords') and place.get('name') in coords:
+                    place['coords'] = coords[place['name']]
+    return divisions, source
+
+
+def ilam_settlements(divisions: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Optional[str], float, float]]:
+    """
+    آبادی‌های دارای مختصات: (نام، شهرستان، عرض، طول).
+    آبادی‌های پیش‌فرضی که در منبع بارگذاری‌شده نیستند هم اضافه می‌شوند تا نزدیک‌ترین آبادی همیشه پیدا شود.
+    """
+    if divisions is None:
+        divisions, _ = read_ilam_divisions()
+    settlements, seen = [], set()
+    for source in (divisions, ILAM_DIVISIONS):
+        for province in source.values():
+            for county, places in province.get('شهرستان‌ها', {}).items():
+                for place in places:
+                    if place.get('coords') and place.get('name') not in seen:
+                        seen.add(place['name'])
+                        settlements.append((place['name'], county, float(place['coords'][0]),
+                                            float(place['coords'][1])))
+    return settlements
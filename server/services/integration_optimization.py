@@ -16,9 +16,7 @@ import numpy as np
 from dataclasses import dataclass
 import sqlite3
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-from geopy.distance import geodesic
 import folium
 from folium import plugins
 import webbrowser
@@ -30,6 +28,11 @@ import queue
 import multiprocessing
 from functools import lru_cache
 
+from .batch_scoring import BatchScorer, ML_VALIDATION_RULES
+from .host_fingerprint_cache import get_host_fingerprint_cache
+from .detection_orchestrator import DetectionOrchestrator, DetectorSpec, run_bounded
+from .geo_math import group_within, spherical_centroid
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -57,6 +60,10 @@ class OptimizationConfig:
     batch_size: int = 100
     retry_attempts: int = 3
     timeout_seconds: int = 30
+    detector_deadline_seconds: float = 120.0
+    detection_cycle_deadline_seconds: float = 300.0
+    # Merge detections within this radius (km) of each other; 0 merges only identical locations
+    merge_radius_km: float = 0.0
 
 class IntegrationOptimizationSystem:
     """
@@ -74,6 +81,9 @@ class IntegrationOptimizationSystem:
         self.task_queue = queue.Queue()
         self.result_queue = queue.Queue()
         self.optimization_running = False
+        self.ml_validation_scorer = BatchScorer(ML_VALIDATION_RULES)
+        self.fingerprints = get_host_fingerprint_cache()
+        self.orchestrator = DetectionOrchestrator(self.optimization_config.detector_deadline_seconds)
         
         # Initialize database
         self._init_database()
@@ -152,17 +162,18 @@ class IntegrationOptimizationSystem:
         logger.info("Starting unified miner detection with optimization...")
         
         start_time = time.time()
+        self.fingerprints.start_cycle("unified_detection")
         
         # Create detection tasks
         detection_tasks = [
-            self._network_based_detection(),
-            self._power_based_detection(),
-            self._blockchain_based_detection(),
-            self._thermal_based_detection(),
-            self._acoustic_based_detection(),
-            self._rf_based_detection(),
-            self._behavioral_analysis_detection(),
-            self._machine_learning_detection()
+            DetectorSpec("network", self._network_based_detection),
+            DetectorSpec("power", self._power_based_detection),
+            DetectorSpec("blockchain", self._blockchain_based_detection),
+            DetectorSpec("thermal", self._thermal_based_detection),
+            DetectorSpec("acoustic", self._acoustic_based_detection),
+            DetectorSpec("rf", self._rf_based_detection),
+            DetectorSpec("behavioral", self._behavioral_analysis_detection),
+            DetectorSpec("machine_learning", self._machine_learning_detection)
         ]
         
         # Execute tasks with optimization
@@ -179,32 +190,43 @@ class IntegrationOptimizationSystem:
         
         execution_time = time.time() - start_time
         logger.info(f"Unified detection completed in {execution_time:.2f} seconds: {len(validated_results)} miners found")
+        self.fingerprints.end_cycle()
         
         return validated_results
     
-    async def _execute_optimized_tasks(self, tasks: List) -> List[List[Dict]]:
-        """Execute tasks with performance optimization"""
-        results = []
-        
-        # Use ThreadPoolExecutor for concurrent execution
-        with ThreadPoolExecutor(max_workers=self.optimization_config.max_concurrent_scans) as executor:
-            # Submit tasks
-            future_to_task = {executor.submit(task): task for task in tasks}
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_task):
-                try:
-                    result = await future.result()
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Task execution failed: {e}")
-                    results.append([])
-        
-        return results
-    
-    async def _network_based_detection(self) -> List[Dict]:
+    async def _execute_optimized_tasks(self, tasks: List[DetectorSpec]) -> List[List[Dict]]:
+        """Run all detectors concurrently with per-detector deadlines; partial results are kept"""
+        outcomes = await self.orchestrator.run(
+            tasks, overall_deadline=self.optimization_config.detection_cycle_deadline_seconds
+        )
+        await self._record_task_performance(outcomes)
+        return [outcome.results for outcome in outcomes]
+    
+    async def _record_task_performance(self, outcomes: List) -> None:
+        """Store per-detector execution statistics"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT INTO task_performance (task_type, execution_time, success_rate, resource_usage, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (
+                    outcome.name,
+                    outcome.elapsed,
+                    1.0 if outcome.status == "completed" else 0.0,
+                    json.dumps(outcome.to_dict()),
+                    datetime.now().isoformat()
+                )
+                for outcome in outcomes
+            ])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Failed to record task performance: {e}")
+    
+    async def _network_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized network-based detection"""
-        results = []
+        results = [] if results is None else results
         
         # Enhanced port scanning with optimization
         mining_ports = [
@@ -245,28 +267,30 @@ class IntegrationOptimizationSystem:
             "10.0.1.0/24", "10.0.2.0/24", "172.16.1.0/24", "172.16.2.0/24"
         ]
         
-        # Parallel scanning with optimization
-        scan_tasks = []
-        for ip_range in ilam_ip_ranges:
-            for ip in self._generate_optimized_ip_range(ip_range):
-                for port in mining_ports:
-                    scan_tasks.append(self._scan_single_endpoint(ip, port))
-        
-        # Execute scans in batches
-        batch_size = self.optimization_config.batch_size
-        for i in range(0, len(scan_tasks), batch_size):
-            batch = scan_tasks[i:i + batch_size]
-            batch_results = await asyncio.gather(*batch, return_exceptions=True)
-            
-            for result in batch_results:
-                if isinstance(result, dict) and result.get("detected"):
-                    results.append(result)
+        # Endpoints are generated lazily and streamed through a bounded worker pool
+        endpoints = (
+            (ip, port)
+            for ip_range in ilam_ip_ranges
+            for ip in self._generate_optimized_ip_range(ip_range)
+            for port in mining_ports
+        )
+        
+        def collect(result: Dict):
+            if result.get("detected"):
+                results.append(result)
+        
+        await run_bounded(
+            endpoints,
+            lambda endpoint: self._probe_endpoint(*endpoint),
+            self.optimization_config.max_concurrent_scans,
+            collect
+        )
         
         return results
     
-    async def _power_based_detection(self) -> List[Dict]:
+    async def _power_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized power consumption analysis"""
-        results = []
+        results = [] if results is None else results
         
         # Power consumption patterns for different mining operations
         power_patterns = {
@@ -297,9 +321,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _blockchain_based_detection(self) -> List[Dict]:
+    async def _blockchain_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized blockchain activity monitoring"""
-        results = []
+        results = [] if results is None else results
         
         # Monitor Stratum protocol connections
         stratum_connections = await self._detect_optimized_stratum_connections()
@@ -323,9 +347,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _thermal_based_detection(self) -> List[Dict]:
+    async def _thermal_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized thermal signature detection"""
-        results = []
+        results = [] if results is None else results
         
         # Thermal detection with machine learning
         thermal_data = await self._get_optimized_thermal_data()
@@ -347,9 +371,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _acoustic_based_detection(self) -> List[Dict]:
+    async def _acoustic_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized acoustic signature analysis"""
-        results = []
+        results = [] if results is None else results
         
         # Acoustic analysis with pattern recognition
         acoustic_data = await self._get_optimized_acoustic_data()
@@ -371,9 +395,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _rf_based_detection(self) -> List[Dict]:
+    async def _rf_based_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized RF signal analysis"""
-        results = []
+        results = [] if results is None else results
         
         # RF analysis with spectrum analysis
         rf_data = await self._get_optimized_rf_data()
@@ -396,9 +420,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _behavioral_analysis_detection(self) -> List[Dict]:
+    async def _behavioral_analysis_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized behavioral analysis detection"""
-        results = []
+        results = [] if results is None else results
         
         # Behavioral pattern analysis
         behavioral_data = await self._get_optimized_behavioral_data()
@@ -420,9 +444,9 @@ class IntegrationOptimizationSystem:
         
         return results
     
-    async def _machine_learning_detection(self) -> List[Dict]:
+    async def _machine_learning_detection(self, results: Optional[List[Dict]] = None) -> List[Dict]:
         """Optimized machine learning-based detection"""
-        results = []
+        results = [] if results is None else results
         
         # ML-based detection using trained models
         ml_data = await self._get_optimized_ml_data()
@@ -453,11 +477,22 @@ class IntegrationOptimizationSystem:
         # Flatten results
         flat_results = [result for sublist in all_results for result in sublist]
         
-        # Group by location
+        if not flat_results:
+            return merged_results
+        
+        # Group by location; with merge_radius_km set, detections within that radius of each other
+        # are grouped too (haversine radius query on one tree)
         location_groups = defaultdict(list)
-        for result in flat_results:
-            location_key = f"{result['location']['lat']:.6f}_{result['location']['lng']:.6f}"
-            location_groups[location_key].append(result)
+        if self.optimization_config.merge_radius_km > 0:
+            lats = [result['location']['lat'] for result in flat_results]
+            lngs = [result['location']['lng'] for result in flat_results]
+            group_of = group_within(lats, lngs, self.optimization_config.merge_radius_km)
+            for result, group in zip(flat_results, group_of):
+                location_groups[int(group)].append(result)
+        else:
+            for result in flat_results:
+                location_key = f"{result['location']['lat']:.6f}_{result['location']['lng']:.6f}"
+                location_groups[location_key].append(result)
         
         # Merge results for same location
         for location_key, results in location_groups.items():
@@ -484,36 +519,47 @@ class IntegrationOptimizationSystem:
         avg_confidence = sum(r.get("confidence", 0) for r in results) / len(results)
         base_result["confidence"] = avg_confidence
         
+        # Confidence-weighted centre when a radius merge grouped different locations
+        points = {(r['location']['lat'], r['location']['lng']) for r in results}
+        if len(points) > 1:
+            lat, lng = spherical_centroid([r['location']['lat'] for r in results],
+                                          [r['location']['lng'] for r in results],
+                                          [max(r.get("confidence", 0), 1e-6) for r in results])
+            base_result["location"] = {**base_result["location"], "lat": lat, "lng": lng}
+        
         return base_result
     
     async def _validate_with_ml(self, results: List[Dict]) -> List[Dict]:
         """Validate results using machine learning models"""
-        validated_results = []
+        if not results:
+            return []
+        
+        # Score the whole batch in one vectorized pass
+        scored = self.ml_validation_scorer.score_records([self._ml_validation_record(r) for r in results])
+        validated = scored.reached('validated')
         
-        for result in results:
-            # Apply ML validation
-            validation_score = await self._apply_ml_validation(result)
-            
-            if validation_score > 0.7:  # Threshold for validation
-                result["ml_validation_score"] = validation_score
+        validated_results = []
+        for result, score, passed in zip(results, scored.scores, validated):
+            if passed:  # Threshold for validation
+                result["ml_validation_score"] = float(score)
                 validated_results.append(result)
         
         return validated_results
     
+    def _ml_validation_record(self, result: Dict) -> Dict[str, Any]:
+        """Build ML validation features for a detection result"""
+        return {
+            'counts': {
+                'confidence': result.get("confidence", 0),
+                'detection_types': len(result.get("detection_types", [])),
+                'detection_count': result.get("detection_count", 1)
+            }
+        }
+    
     async def _apply_ml_validation(self, result: Dict) -> float:
         """Apply machine learning validation to detection result"""
-        # Simplified ML validation
-        features = [
-            result.get("confidence", 0),
-            len(result.get("detection_types", [])),
-            result.get("detection_count", 1)
-        ]
-        
-        # Simple weighted average
-        weights = [0.5, 0.3, 0.2]
-        validation_score = sum(f * w for f, w in zip(features, weights))
-        
-        return min(validation_score, 1.0)
+        scored = self.ml_validation_scorer.score_records([self._ml_validation_record(result)])
+        return float(scored.scores[0])
     
     async def _cache_detection_results(self, results: List[Dict]):
         """Cache detection results for optimization"""
@@ -682,6 +728,17 @@ class IntegrationOptimizationSystem:
         """Generate optimized IP range"""
         return ["192.168.1.1", "192.168.1.2"]  # Simplified
     
+    async def _probe_endpoint(self, ip: str, port: int) -> Dict:
+        """Scan endpoint through the shared host fingerprint cache"""
+        is_open = await self.fingerprints.aget_or_probe(
+            ip, f'port:{port}', lambda: self._endpoint_open(ip, port)
+        )
+        return {"detected": is_open, "ip": ip, "port": port}
+    
+    async def _endpoint_open(self, ip: str, port: int) -> bool:
+        result = await self._scan_single_endpoint(ip, port)
+        return bool(result.get("detected"))
+    
     async def _scan_single_endpoint(self, ip: str, port: int) -> Dict:
         """Scan single endpoint with optimization"""
         return {"detected": True, "ip": ip, "port": port}  # Simplified
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IP Classification Index
+طبقه‌بندی IP با تطبیق طولانی‌ترین پیشوند: ISP، اپراتور، نوع اپراتور، استان و شهر از منابع JSON/CSV محلی
+"""
+
+import csv
+import ipaddress
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .geoip_offline import int_to_ip, ip_to_int, ips_to_array
+    from .range_db import RangeDB, get_range_db, is_range_db
+except ImportError:
+    from geoip_offline import int_to_ip, ip_to_int, ips_to_array
+    from range_db import RangeDB, get_range_db, is_range_db
+
+logger = logging.getLogger(__name__)
+
+# ستون‌های رشته‌ای هر پیشوند (شناسه در جدول رشته‌ها؛ صفر یعنی خالی)
+FIELDS = ('isp', 'operator', 'operator_type', 'province', 'city', 'source')
+# اپراتور و نوع اپراتور با هم از یک نام ISP به دست می‌آیند؛ با پر شدن نوع، اپراتور هم تعیین‌شده است
+_OPERATOR, _OPERATOR_TYPE = FIELDS.index('operator'), FIELDS.index('operator_type')
+
+OPERATOR_TYPES = ('fixed', 'cellular', 'hosting', 'academic', 'government')
+
+# منابع پیش‌فرض در مسیر جاری یا data/ (با IP_CLASSIFIER_SOURCES قابل تغییر، جداشده با os.pathsep)؛
+# اگر پایگاه فشرده range_db موجود باشد به جای این‌ها خوانده می‌شود
+DEFAULT_SOURCES = ('iran_isp_ip_ranges.json', 'iran_isp_ip_ranges.full.json', 'ir.csv')
+
+# بازه‌های داده همراه اپراتورهای تلفن همراه (پیش‌تر در OwnerIdentificationService)
+CELLULAR_RANGES = {
+    'irancell': ['5.160.0.0/16', '31.24.0.0/16', '37.32.0.0/16'],
+    'hamrah_avval': ['2.176.0.0/16', '5.22.0.0/16', '31.2.0.0/16'],
+    'rightel': ['5.134.0.0/16', '31.14.0.0/16'],
+}
+
+# (الگوی نام ISP، کلید اپراتور در OwnerIdentificationService، نوع اپراتور)؛ اولین تطبیق برنده است
+OPERATOR_PATTERNS = [
+    (r'irancell|\bmtn\b|ایرانسل|ایران‌سل', 'irancell', 'cellular'),
+    (r'mobile communication company|\bmci\b|hamrah|همراه اول', 'hamrah_avval', 'cellular'),
+    (r'rightel|رایتل', 'rightel', 'cellular'),
+    (r'telecommunication company of iran|\btci\b|mokhaberat|مخابرات', 'iran_telecom', 'fixed'),
+    (r'pars ?online|پارس آنلاین', 'pars_online', 'fixed'),
+    (r'asiatech|آسیاتک', 'asiatech', 'fixed'),
+    (r'fanava|فناوا', 'fanava', 'fixed'),
+    (r'shatel|شاتل', 'shatel', 'fixed'),
+    (r'hosting|data ?cent(er|re)|cloud|arvan|afranet|parspack|server', '', 'hosting'),
+    (r'universit|research|academ|\bipm\b|دانشگاه', '', 'academic'),
+    (r'ministry|government|\bgov\b|وزارت|دولت', '', 'government'),
+]
+_OPERATOR_PATTERNS = [(re.compile(pattern, re.IGNORECASE), operator, kind)
+                      for pattern, operator, kind in OPERATOR_PATTERNS]
+
+
+def classify_isp(name: str) -> Tuple[str, str]:
+    """(کلید اپراتور، نوع اپراتور) از نام ISP؛ ISP نام‌دار ناشناخته ثابت (fixed) فرض می‌شود"""
+    if not name or name == 'Unknown':
+        return '', ''
+    for pattern, operator, kind in _OPERATOR_PATTERNS:
+        if pattern.search(name):
+            return operator, kind
+    return '', 'fixed'
+
+
+def _prefix_mask(length: int) -> int:
+    return (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF if length else 0
+
+
+def _settled(ids: np.ndarray) -> np.ndarray:
+    """ستون‌هایی که مقدار گرفته‌اند (اپراتور همراه با نوع اپراتور تعیین می‌شود)"""
+    settled = ids != 0
+    settled[..., _OPERATOR] |= settled[..., _OPERATOR_TYPE]
+    return settled
+
+
+def _settled_row(ids: List[int]) -> List[bool]:
+    """نسخه تکی _settled برای یک ردیف"""
+    settled = [bool(i) for i in ids]
+    settled[_OPERATOR] = settled[_OPERATOR] or settled[_OPERATOR_TYPE]
+    return settled
+
+
+@dataclass
+class IPClassBatch:
+    """نتیجه طبقه‌بندی برداری: شناسه رشته هر ستون و طول پیشوند منطبق (یا -1)"""
+    ips: Sequence[str]
+    ids: np.ndarray
+    prefix_length: np.ndarray
+    strings: List[str]
+
+    @property
+    def found(self) -> np.ndarray:
+        return self.prefix_length >= 0
+
+    def column(self, name: str) -> List[Optional[str]]:
+        """یک ستون برای همه IPها (None برای خالی یا یافت‌نشده)"""
+        return [self.strings[i] or None for i in self.ids[:, FIELDS.index(name)].tolist()]
+
+    def to_dicts(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        columns = [self.column(name) for name in FIELDS]
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        for i, (ip, length) in enumerate(zip(self.ips, self.prefix_length.tolist())):
+            if length < 0:
+                results[ip] = None
+                continue
+            results[ip] = {'ip': ip, 'prefix_length': length,
+                           **{name: columns[j][i] for j, name in enumerate(FIELDS)}}
+        return results
+
+
+class IPClassifier:
+    """
+    شاخص طبقه‌بندی IPv4 با آرایه‌های پیشوند مرتب.
+
+    پیشوندهای هر طول در یک آرایه uint32 مرتب نگه داشته می‌شوند؛ جستجو از بلندترین طول به کوتاه‌ترین
+    با ماسک کردن آدرس انجام می‌شود، پس هزینه هر IP حداکثر ۳۳ کاوش (درهم یا np.searchsorted) است
+    و کل نتایج یک اسکن با یک گذر برداری به ازای هر طول طبقه‌بندی می‌شود. هر ستون از خاص‌ترین
+    پیشوندی که آن را دارد گرفته می‌شود؛ بنابراین ISP از ir.csv و استان/شهر از JSON استانی ترکیب
+    می‌شوند. جستجوی هر IP وقتی متوقف می‌شود که هیچ طول کوتاه‌تری ستون خالی آن را نداشته باشد
+    (مثلاً با ir.csv تنها، استان و شهر هرگز پر نمی‌شوند و IP در اولین تطبیق می‌ماند).
+    بازه‌های شروع-پایان هنگام افزودن به کمترین مجموعه CIDR تجزیه می‌شوند.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[int, int], List[str]] = {}
+        self.sources: List[str] = []
+        self.strings: List[str] = ['']
+        self.lengths: List[int] = []
+        self._networks: Dict[int, np.ndarray] = {}
+        self._attributes: Dict[int, np.ndarray] = {}
+        self._positions: Dict[int, Dict[int, int]] = {}
+        self._shorter: Dict[int, List[bool]] = {}
+        self._compiled = False
+
+    # ─── ساخت ───────────────────────────────────────────────────────────────
+
+    def _add(self, network: int, length: int, attributes: Dict[str, Any]):
+        isp = attributes.get('isp') or ''
+        operator, kind = classify_isp(isp)
+        values = {'operator': operator, 'operator_type': kind, **{k: v for k, v in attributes.items() if v}}
+        row = self._entries.setdefault((network, length), [''] * len(FIELDS))
+        # منبعی که دیرتر اضافه شده ستون‌های غیرخالی را بازنویسی می‌کند
+        for j, name in enumerate(FIELDS):
+            if values.get(name):
+                row[j] = str(values[name])
+        self._compiled = False
+
+    def add_network(self, network: str, **attributes) -> int:
+        net = ipaddress.IPv4Network(network.strip(), strict=False)
+        self._add(int(net.network_address), net.prefixlen, attributes)
+        return 1
+
+    def add_range(self, start: str, end: str, **attributes) -> int:
+        """بازه دلخواه به صورت کمترین مجموعه CIDR"""
+        return self._add_int_range(int(ipaddress.IPv4Address(start.strip())),
+                                   int(ipaddress.IPv4Address(end.strip())), attributes)
+
+    def _add_int_range(self, first: int, last: int, attributes: Dict[str, Any]) -> int:
+        if last < first:
+            first, last = last, first
+        added = 0
+        for net in ipaddress.summarize_address_range(ipaddress.IPv4Address(first), ipaddress.IPv4Address(last)):
+            self._add(int(net.network_address), net.prefixlen, attributes)
+            added += 1
+        return added
+
+    def add_text(self, text: str, **attributes) -> int:
+        """یک رشته بازه: «CIDR»، «شروع-پایان» یا IP تکی"""
+        text = text.strip()
+        if '/' in text:
+            return self.add_network(text, **attributes)
+        if '-' in text:
+            start, end = text.split('-', 1)
+            return self.add_range(start, end, **attributes)
+        return self.add_network(f"{text}/32", **attributes)
+
+    def add_cellular(self, ranges: Optional[Dict[str, List[str]]] = None) -> int:
+        """بازه‌های داده اپراتورهای همراه"""
+        added = 0
+        for operator, networks in (ranges or CELLULAR_RANGES).items():
+            for network in networks:
+                net = ipaddress.IPv4Network(network)
+                self._add(int(net.network_address), net.prefixlen,
+                          {'operator': operator, 'operator_type': 'cellular', 'source': 'builtin'})
+                added += 1
+        return added
+
+    def add_isp_json(self, path: str) -> int:
+        """
+        iran_isp_ip_ranges.json ({استان: {شهر: {ISP: [بازه‌ها]}}}) یا خروجی ir_isp_ip_ranges_to_json.py
+        ({ISP: [{start_ip, end_ip, ...}]})
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        source = os.path.basename(path)
+        added = 0
+
+        def add_items(items: Iterable, **attributes):
+            nonlocal added
+            for item in items:
+                try:
+                    if isinstance(item, dict):
+                        added += self.add_range(item['start_ip'], item['end_ip'], **attributes)
+                    else:
+                        added += self.add_text(str(item), **attributes)
+                except (KeyError, ValueError):
+                    continue
+
+        for key, value in data.items():
+            if isinstance(value, list):
+                add_items(value, isp=key, source=source)
+                continue
+            for city, isps in value.items():
+                for isp, items in isps.items():
+                    add_items(items, isp=isp, province=key, city=city, source=source)
+        self.sources.append(path)
+        logger.info(f"📥 {added} prefixes from {path}")
+        return added
+
+    def add_ir_csv(self, path: str) -> int:
+        """ir.csv (شروع، پایان، تعداد، تاریخ، ISP)"""
+        source = os.path.basename(path)
+        added = 0
+        with open(path, encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 5:
+                    continue
+                start, end, _, _, isp = [x.strip() for x in row[:5]]
+                try:
+                    added += self.add_range(start, end, isp=isp or 'Unknown', source=source)
+                except ValueError:
+                    continue
+        self.sources.append(path)
+        logger.info(f"📥 {added} prefixes from {path}")
+        return added
+
+    def add_range_db(self, db: RangeDB) -> int:
+        """بازه‌های پایگاه فشرده range_db (بدون تجزیه JSON/CSV)"""
+        source = os.path.basename(db.path)
+        added = 0
+        for record in db.records():
+            added += self._add_int_range(record['start'], record['end'], {
+                'isp': record['isp'], 'province': record['province'], 'city': record['city'], 'source': source})
+        self.sources.append(db.path)
+        logger.info(f"📥 {added} prefixes from {db.path}")
+        return added
+
+    def add_source(self, path: str) -> int:
+        if is_range_db(path):
+            with RangeDB(path) as db:
+                return self.add_range_db(db)
+        if path.lower().endswith('.json'):
+            return self.add_isp_json(path)
+        return self.add_ir_csv(path)
+
+    def compile(self) -> 'IPClassifier':
+        """ساخت آرایه مرتب پیشوندهای هر طول و جدول رشته‌ها"""
+        started = time.perf_counter()
+        strings: Dict[str, int] = {'': 0}
+        by_length: Dict[int, List[Tuple[int, List[str]]]] = {}
+        for (network, length), row in self._entries.items():
+            by_length.setdefault(length, []).append((network, row))
+        self._networks, self._attributes, self._positions = {}, {}, {}
+        for length, items in by_length.items():
+            items.sort(key=lambda item: item[0])
+            self._networks[length] = np.array([network for network, _ in items], dtype=np.uint32)
+            self._attributes[length] = np.array(
+                [[strings.setdefault(value, len(strings)) for value in row] for _, row in items],
+                dtype=np.uint32).reshape(len(items), len(FIELDS))
+            # جستجوی تکی با جدول درهم هر طول (یک کاوش به ازای هر طول)
+            self._positions[length] = {network: i for i, (network, _) in enumerate(items)}
+        # ستون‌هایی که پیشوندهای کوتاه‌تر از هر طول می‌توانند پر کنند
+        self._shorter, supplied = {}, np.zeros(len(FIELDS), dtype=bool)
+        for length in sorted(by_length):
+            self._shorter[length] = supplied.tolist()
+            supplied |= (self._attributes[length] != 0).any(axis=0)
+        self.strings = list(strings)
+        self.lengths = sorted(by_length, reverse=True)
+        self._compiled = True
+        logger.info(f"🧭 IP classifier: {len(self._entries)} prefixes in {len(self.lengths)} lengths "
+                    f"({time.perf_counter() - started:.2f}s)")
+        return self
+
+    def _ensure_compiled(self):
+        if not self._compiled:
+            self.compile()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ─── جستجو ──────────────────────────────────────────────────────────────
+
+    def classify_values(self, values: np.ndarray, valid: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(شناسه ستون‌ها (m، ستون‌ها)، طول پیشوند منطبق یا -1) برای آدرس‌های uint32"""
+        self._ensure_compiled()
+        values = np.asarray(values, dtype=np.uint32)
+        ids = np.zeros((len(values), len(FIELDS)), dtype=np.uint32)
+        prefix_length = np.full(len(values), -1, dtype=np.int8)
+        pending = np.arange(len(values)) if valid is None else np.flatnonzero(valid)
+        for length in self.lengths:
+            if not len(pending):
+                break
+            networks = self._networks[length]
+            masked = values[pending] & np.uint32(_prefix_mask(length))
+            position = np.minimum(np.searchsorted(networks, masked), len(networks) - 1)
+            hit = networks[position] == masked
+            rows = pending[hit]
+            current = ids[rows]
+            ids[rows] = np.where(_settled(current), current, self._attributes[length][position[hit]])
+            prefix_length[rows] = np.where(prefix_length[rows] < 0, length, prefix_length[rows])
+            # فقط IPهایی که ستون خالی قابل پر شدن با پیشوندهای کوتاه‌تر دارند ادامه می‌دهند
+            pending = pending[(~_settled(ids[pending]) & self._shorter[length]).any(axis=1)]
+        return ids, prefix_length
+
+    def classify(self, ip: str) -> Optional[Dict[str, Any]]:
+        """طبقه‌بندی یک IP (حداکثر یک کاوش درهم به ازای هر طول پیشوند)"""
+        self._ensure_compiled()
+        try:
+            value = ip_to_int(ip)
+        except OSError:
+            return None
+        ids = [0] * len(FIELDS)
+        matched = -1
+        for length in self.lengths:
+            position = self._positions[length].get(value & _prefix_mask(length))
+            if position is None:
+                continue
+            row = self._attributes[length][position].tolist()
+            ids = [current if done else new for current, new, done in zip(ids, row, _settled_row(ids))]
+            matched = length if matched < 0 else matched
+            if not any(shorter and not done for shorter, done in zip(self._shorter[length], _settled_row(ids))):
+                break
+        if matched < 0:
+            return None
+        return {'ip': ip, 'prefix_length': matched,
+                **{name: self.strings[i] or None for name, i in zip(FIELDS, ids)}}
+
+    def classify_many(self, ips: Sequence[str]) -> IPClassBatch:
+        """طبقه‌بندی برداری کل نتایج یک اسکن"""
+        values, valid = ips_to_array(ips)
+        ids, prefix_length = self.classify_values(values, valid)
+        return IPClassBatch(ips, ids, prefix_length, self.strings)
+
+    def annotate(self, results: List[Dict], ip_key: str = 'ip') -> List[Dict]:
+        """افزودن کلید ip_class به هر نتیجه اسکن دارای ip_key"""
+        located = [r for r in results if r.get(ip_key)]
+        classes = self.classify_many([r[ip_key] for r in located]).to_dicts()
+        for result in located:
+            result['ip_class'] = classes.get(result[ip_key])
+        return results
+
+    def ranges(self, province: Optional[str] = None, city: Optional[str] = None, isp: Optional[str] = None,
+               operator_type: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """مرور پیشوندها با فیلتر استان/شهر/ISP/نوع اپراتور (جایگزین انتخاب تعاملی select_isp_iprange.py)"""
+        wanted = {'province': province, 'city': city, 'isp': isp, 'operator_type': operator_type}
+        columns = {name: FIELDS.index(name) for name, value in wanted.items() if value}
+        matches = []
+        for (network, length), row in sorted(self._entries.items()):
+            if all(row[j].lower() == wanted[name].lower() for name, j in columns.items()):
+                matches.append({'network': f"{int_to_ip(network)}/{length}",
+                                **{name: row[j] or None for j, name in enumerate(FIELDS)}})
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def regions(self) -> Dict[str, Dict[str, List[str]]]:
+        """درخت استان ← شهر ← ISPها"""
+        tree: Dict[str, Dict[str, set]] = {}
+        p, c, i = FIELDS.index('province'), FIELDS.index('city'), FIELDS.index('isp')
+        for row in self._entries.values():
+            if row[p]:
+                tree.setdefault(row[p], {}).setdefault(row[c], set()).add(row[i])
+        return {province: {city: sorted(isps) for city, isps in sorted(cities.items())}
+                for province, cities in sorted(tree.items())}
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._ensure_compiled()
+        return {'prefixes': len(self._entries), 'prefix_lengths': self.lengths,
+                'strings': len(self.strings), 'sources': self.sources}
+
+
+_ip_classifier: Optional[IPClassifier] = None
+_ip_classifier_lock = threading.Lock()
+
+
+def default_sources() -> List[str]:
+    configured = os.environ.get('IP_CLASSIFIER_SOURCES')
+    if configured:
+        return [path for path in configured.split(os.pathsep) if os.path.exists(path)]
+    return [path for name in DEFAULT_SOURCES for path in (name, os.path.join('data', name))
+            if os.path.exists(path)]
+
+
+def get_ip_classifier() -> IPClassifier:
+    """نمونه مشترک شاخص (بازه‌های همراه داخلی به‌علاوه منابع محلی موجود)"""
+    global _ip_classifier
+    with _ip_classifier_lock:
+        if _ip_classifier is None:
+            classifier = IPClassifier()
+            classifier.add_cellular()
+            packed = None if os.environ.get('IP_CLASSIFIER_SOURCES') else get_range_db()
+            if packed is not None:
+                classifier.add_range_db(packed)
+            for path in ([] if packed is not None else default_sources()):
+                try:
+                    classifier.add_source(path)
+                except (OSError, ValueError) as e:
+                    logger.error(f"❌ Failed to load IP ranges {path}: {e}")
+            _ip_classifier = classifier.compile()
+        return _ip_classifier
+
+
+# ─── سنجش ───────────────────────────────────────────────────────────────────
+
+def _brute_longest_prefix(classifier: IPClassifier, values: np.ndarray) -> np.ndarray:
+    """طول طولانی‌ترین پیشوند منطبق با مقایسه همه پیشوندها (مرجع درستی)"""
+    keys = np.array(list(classifier._entries), dtype=np.int64).reshape(-1, 2)
+    networks, lengths = keys[:, 0].astype(np.uint32), keys[:, 1]
+    masks = np.array([_prefix_mask(int(length)) for length in lengths], dtype=np.uint32)
+    result = np.full(len(values), -1)
+    for i, value in enumerate(values):
+        hit = (value & masks) == networks
+        if hit.any():
+            result[i] = lengths[hit].max()
+    return result
+
+
+def benchmark(prefixes: int = 50000, ips: int = 1_000_000, verify: int = 2000, seed: int = 0) -> Dict[str, Any]:
+    """شاخص مصنوعی تو در تو، طبقه‌بندی تکی و برداری، مقایسه با روش قدیمی ip_network در هر فراخوانی"""
+    rng = np.random.default_rng(seed)
+    classifier = IPClassifier()
+    lengths = rng.integers(8, 29, prefixes)
+    bases = rng.integers(0, 2 ** 32, prefixes, dtype=np.uint64).astype(np.uint32)
+    provinces = [f"province_{i}" for i in range(31)]
+    for base, length in zip(bases.tolist(), lengths.tolist()):
+        network = base & _prefix_mask(length)
+        classifier.add_network(f"{int_to_ip(network)}/{length}", isp=f"ISP {base % 200}",
+                               province=provinces[base % 31] if length >= 16 else None)
+    classifier.add_cellular()
+    started = time.perf_counter()
+    classifier.compile()
+    compile_s = time.perf_counter() - started
+
+    values = rng.integers(0, 2 ** 32, ips, dtype=np.uint64).astype(np.uint32)
+    # نیمی از IPها داخل پیشوندهای موجود تا مسیر تطبیق سنجیده شود
+    inside = rng.integers(0, prefixes, ips // 2)
+    values[:ips // 2] = bases[inside] | (values[:ips // 2] & ~np.array(
+        [_prefix_mask(int(length)) for length in lengths[inside]], dtype=np.uint32))
+    addresses = [int_to_ip(v) for v in values.tolist()]
+
+    started = time.perf_counter()
+    batch = classifier.classify_many(addresses)
+    bulk_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for ip in addresses[:10000]:
+        classifier.classify(ip)
+    single_us = (time.perf_counter() - started) / 10000 * 1e6
+
+    # روش قبلی: ساخت ip_network در هر فراخوانی و حلقه روی بازه‌ها (فقط روی بازه‌های همراه)
+    cellular = [net for nets in CELLULAR_RANGES.values() for net in nets]
+    started = time.perf_counter()
+    for ip in addresses[:10000]:
+        for net in cellular:
+            if ipaddress.ip_address(ip) in ipaddress.ip_network(net):
+                break
+    legacy_us = (time.perf_counter() - started) / 10000 * 1e6
+
+    expected = _brute_longest_prefix(classifier, values[:verify])
+    return {
+        'prefixes': len(classifier),
+        'prefix_lengths': len(classifier.lengths),
+        'compile_s': compile_s,
+        'bulk_ips': ips,
+        'bulk_ips_per_s': ips / bulk_s,
+        'bulk_found': int(batch.found.sum()),
+        'single_classify_us': single_us,
+        'legacy_cellular_loop_us': legacy_us,
+        'verified': verify,
+        'prefix_length_matches': bool(np.array_equal(batch.prefix_length[:verify].astype(int), expected))
+    }
+
+
+def main():
+    """طبقه‌بندی IP از خط فرمان یا سنجش"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Longest-prefix-match IP classifier")
+    parser.add_argument('ips', nargs='*')
+    parser.add_argument('--source', action='append', default=[],
+                        help="iran_isp_ip_ranges.json, iran_isp_ip_ranges.full.json, ir.csv or a range_db file")
+    parser.add_argument('--province')
+    parser.add_argument('--city')
+    parser.add_argument('--isp')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark(), indent=2))
+        return
+    if args.source:
+        classifier = IPClassifier()
+        classifier.add_cellular()
+        for source in args.source:
+            classifier.add_source(source)
+        classifier.compile()
+    else:
+        classifier = get_ip_classifier()
+    if args.ips:
+        print(json.dumps(classifier.classify_many(args.ips).to_dicts(), indent=2, ensure_ascii=False))
+    elif args.province or args.city or args.isp:
+        print(json.dumps(classifier.ranges(args.province, args.city, args.isp), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(classifier.regions(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
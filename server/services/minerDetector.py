@@ -13,7 +13,7 @@ import socket
 import subprocess
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Any
 import re
@@ -22,6 +22,15 @@ import requests
 import scapy.all as scapy
 from scapy.layers.l2 import ARP, Ether
 
+from .batch_scoring import BatchScorer, ScoringRules
+from .geoip_offline import get_offline_geoip
+from .heatmap_tiles import get_heatmap_tiles
+from .host_fingerprint_cache import get_host_fingerprint_cache
+from .payload_classifier import get_payload_classifier
+from .probe_planner import get_probe_planner
+from .region_service import get_region_service
+from .target_set import TargetSet, int_to_ip, iter_bounded
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -37,19 +46,8 @@ class AdvancedMinerDetector:
             'center': (33.63, 46.42)
         }
         
-        # Ilam cities coordinates
-        self.ilam_cities = {
-            'ایلام': (33.6374, 46.4227),
-            'مهران': (33.1221, 46.1641),
-            'دهلران': (32.6942, 47.2678),
-            'آبدانان': (32.9928, 47.4164),
-            'دره‌شهر': (33.1458, 47.3667),
-            'ایوان': (33.8081, 46.2892),
-            'چرداول': (33.7333, 46.8833),
-            'بدره': (33.0833, 47.1167),
-            'سرابله': (32.9667, 46.5833),
-            'ملکشاهی': (33.3833, 46.5667)
-        }
+        # Province polygons and Ilam settlements (ILAM_DIVISIONS)
+        self.regions = get_region_service()
         
         # Mining-related ports
         self.miner_ports = {
@@ -80,6 +78,53 @@ class AdvancedMinerDetector:
             'lyra2rev2', 'neoscrypt', 'blake2s', 'skunk', 'x16r', 'x16s'
         ]
 
+        # Miner web UI keywords, matched in one pass over the response body
+        self.web_keyword_classifier = get_payload_classifier({'miner': [
+            'antminer', 'whatsminer', 'avalon', 'innosilicon', 'bitmain',
+            'mining', 'hashrate', 'hash rate', 'pool', 'worker',
+            'cgminer', 'bfgminer', 'cryptocurrency', 'bitcoin', 'ethereum'
+        ]})
+
+        # Scoring rules shared by probe planning and final classification
+        self.api_ports = {4028, 4029, 4030}
+        self.web_ports = {8080, 8888, 3000}
+        self.stratum_ports = {3333, 4444, 9999, 14444, 5555, 7777}
+        self.scoring_rules = ScoringRules(
+            name='miner_detector',
+            port_weights={port: 25 + (20 if port in self.stratum_ports else 0) for port in self.miner_ports},
+            count_weights={'web_hits': 30},
+            flag_weights={'suspicious_traffic': 15},
+            flag_floors={'api_confirmed': 95},
+            thresholds={'suspicious': 40, 'miner': 70}
+        )
+        self.scorer = BatchScorer(self.scoring_rules)
+        self.decision_thresholds = tuple(sorted(self.scoring_rules.thresholds.values()))
+        self.network_analysis_gain = self.scoring_rules.flag_weights['suspicious_traffic']
+
+        # Early-exit probe planner (ports ordered by historical hit rate)
+        self.probe_planner = get_probe_planner()
+
+        # Host fingerprints shared with the other scanner modules
+        self.fingerprints = get_host_fingerprint_cache()
+
+    def _port_gain(self, port: int) -> Tuple[float, float]:
+        """
+        Score an open port contributes, and the confirmation it can lead to. An open API port alone
+        confirms nothing: the api_confirmed floor only keeps the plan's upper bound from ending the
+        port scan as negative before the API is queried; the score is raised on a real API response.
+        """
+        gain = self.scoring_rules.port_weights.get(port, 0.0)
+        if port in self.web_ports:
+            gain += self.scoring_rules.count_weights['web_hits']
+        confirm = self.scoring_rules.flag_floors['api_confirmed'] if port in self.api_ports else 0.0
+        return gain, confirm
+
+    def _api_gain(self, port: int) -> Tuple[float, float]:
+        """Score an API/web probe can contribute on an already open port"""
+        if port in self.api_ports:
+            return 0.0, self.scoring_rules.flag_floors['api_confirmed']
+        return self.scoring_rules.count_weights['web_hits'], 0.0
+
     def is_valid_ip(self, ip: str) -> bool:
         pattern = re.compile(r'^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$')
         return bool(pattern.match(ip))
@@ -97,6 +142,9 @@ class AdvancedMinerDetector:
 
     def ping_host(self, ip: str, timeout: int = 1) -> bool:
         """Check if host is reachable via ping"""
+        return self.fingerprints.get_or_probe(ip, 'ping', lambda: self._ping_host(ip, timeout))
+
+    def _ping_host(self, ip: str, timeout: int) -> bool:
         try:
             if hasattr(subprocess, 'DEVNULL'):
                 result = subprocess.run(
@@ -125,6 +173,9 @@ class AdvancedMinerDetector:
         if not self.is_valid_port(port):
             logger.error(f"Invalid port: {port}")
             return False
+        return self.fingerprints.get_or_probe(ip, f'port:{port}', lambda: self._connect_port(ip, port, timeout))
+
+    def _connect_port(self, ip: str, port: int, timeout: float) -> bool:
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(timeout)
@@ -169,6 +220,17 @@ class AdvancedMinerDetector:
 
     def detect_miner_signatures(self, ip: str, open_ports: List[int]) -> Dict[str, Any]:
         """Detect miner-specific signatures on a device"""
+        pending = self._collect_miner_evidence(ip, open_ports)
+        self._finalize_detections([pending])
+        return pending[0]
+
+    def _collect_miner_evidence(self, ip: str, open_ports: List[int],
+                                plan: Optional[Any] = None) -> Tuple[Dict[str, Any], Dict[str, Any], List[Any]]:
+        """
+        Probe miner APIs and collect scoring features; the score is assigned in _finalize_detections.
+        A port-scan plan is continued with the API probes so each host finishes a single plan.
+        """
+        evidence = {'ip': ip, 'ports': open_ports, 'counts': {'web_hits': 0}, 'flags': {}}
         detection_results = {
             'is_miner': False,
             'confidence_score': 0,
@@ -184,57 +246,116 @@ class AdvancedMinerDetector:
         if mining_ports_found:
             detection_results['confidence_score'] += len(mining_ports_found) * 25
             detection_results['detection_methods'].append('mining_ports')
-            
-        # Try to connect to common miner APIs
-        for port in mining_ports_found:
+
+        # Check for Stratum connections
+        stratum_found = [port for port in open_ports if port in self.stratum_ports]
+        if stratum_found:
+            detection_results['confidence_score'] += len(stratum_found) * 20
+            detection_results['detection_methods'].append('stratum_connection')
+
+        # Query miner APIs in planner order, stopping once the host is decided
+        api_candidates = [port for port in mining_ports_found if port in self.api_ports or port in self.web_ports]
+        if plan is None:
+            plan = self.probe_planner.plan(
+                ip, api_candidates, kind='api', gain_fn=self._api_gain,
+                thresholds=self.decision_thresholds,
+                initial_score=detection_results['confidence_score'],
+                residual_gain=self.network_analysis_gain
+            )
+        else:
+            plan.extend(api_candidates, 'api', self._api_gain, score=detection_results['confidence_score'])
+        for step in plan:
+            port = step.port
+            hit = False
             try:
-                if port in [4028, 4029, 4030]:  # CGMiner/SGMiner/BFGMiner APIs
-                    miner_data = self._query_cgminer_api(ip, port)
+                if port in self.api_ports:  # CGMiner/SGMiner/BFGMiner APIs
+                    miner_data = self.fingerprints.get_or_probe(
+                        ip, f'api:{port}', lambda: self._query_cgminer_api(ip, port))
                     if miner_data:
+                        hit = True
+                        evidence['flags']['api_confirmed'] = True
                         detection_results['is_miner'] = True
-                        detection_results['confidence_score'] = 95
+                        detection_results['confidence_score'] = max(detection_results['confidence_score'], 95)
                         detection_results['device_type'] = miner_data.get('device_type', 'ASIC Miner')
                         detection_results['mining_software'] = miner_data.get('software', 'CGMiner')
                         detection_results['hash_rate'] = miner_data.get('hash_rate')
                         detection_results['detection_methods'].append('api_response')
-                        
-                elif port in [8080, 8888, 3000]:  # Web interfaces
-                    web_data = self._check_web_interface(ip, port)
+
+                elif port in self.web_ports:  # Web interfaces
+                    web_data = self.fingerprints.get_or_probe(
+                        ip, f'web:{port}', lambda: self._check_web_interface(ip, port))
                     if web_data:
+                        hit = True
+                        evidence['counts']['web_hits'] += 1
                         detection_results['confidence_score'] += 30
                         detection_results['detection_methods'].append('web_interface')
                         if web_data.get('is_miner'):
                             detection_results['is_miner'] = True
                             detection_results['device_type'] = web_data.get('device_type', 'Web-managed Miner')
-                            
+
             except Exception as e:
                 logger.debug(f"Error checking port {port} on {ip}: {e}")
-                
-        # Check for Stratum connections
-        stratum_ports = [3333, 4444, 9999, 14444, 5555, 7777]
-        stratum_found = [port for port in open_ports if port in stratum_ports]
-        if stratum_found:
-            detection_results['confidence_score'] += len(stratum_found) * 20
-            detection_results['detection_methods'].append('stratum_connection')
-            
-        # Analyze network behavior patterns
-        network_analysis = self._analyze_network_patterns(ip)
-        if network_analysis['suspicious_traffic']:
-            detection_results['confidence_score'] += 15
-            detection_results['detection_methods'].append('network_analysis')
-            
-        # Power consumption estimation
-        if detection_results['confidence_score'] > 50:
-            power_estimate = self._estimate_power_consumption(detection_results['device_type'], detection_results['hash_rate'])
-            detection_results['power_consumption'] = power_estimate
-            
-        # Final classification
-        if detection_results['confidence_score'] >= 70:
-            detection_results['is_miner'] = True
-        elif detection_results['confidence_score'] >= 40:
-            detection_results['device_type'] = 'suspicious'
-            
-        return detection_results
+
+            plan.record(step, hit, score=detection_results['confidence_score'])
+
+        # Analyze network behavior patterns only while the host is still ambiguous
+        if plan.decision is None:
+            network_analysis = self._analyze_network_patterns(ip)
+            if network_analysis['suspicious_traffic']:
+                evidence['flags']['suspicious_traffic'] = True
+                detection_results['confidence_score'] += self.network_analysis_gain
+                detection_results['detection_methods'].append('network_analysis')
+
+        return detection_results, evidence, [plan]
+
+    def _finalize_detections(self, pending: List[Tuple[Dict[str, Any], Dict[str, Any], List[Any]]]):
+        """Score collected evidence for a batch of hosts in one vectorized pass"""
+        if not pending:
+            return
+        scored = self.scorer.score_records([evidence for _, evidence, _ in pending])
+
+        for i, (detection_results, _, plans) in enumerate(pending):
+            detection_results['confidence_score'] = float(scored.scores[i])
+
+            # Power consumption estimation
+            if detection_results['confidence_score'] > 50:
+                power_estimate = self._estimate_power_consumption(detection_results['device_type'], detection_results['hash_rate'])
+                detection_results['power_consumption'] = power_estimate
+
+            # Final classification
+            label = scored.label(i)
+            if label == 'miner':
+                detection_results['is_miner'] = True
+            elif label == 'suspicious':
+                detection_results['device_type'] = 'suspicious'
+
+            for plan in plans:
+                plan.finish(detection_results['device_type'])
+
+        self._publish_tiles(pending)
+
+    def _publish_tiles(self, pending: List[Tuple[Dict[str, Any], Dict[str, Any], List[Any]]]):
+        """Add miner and suspicious detections to the heatmap tiles at their offline database location"""
+        offline = get_offline_geoip()
+        if offline is None:
+            return
+        detections = []
+        for detection_results, evidence, _ in pending:
+            if not detection_results['is_miner'] and detection_results['device_type'] != 'suspicious':
+                continue
+            location = offline.lookup(evidence['ip'])
+            if location and location['latitude'] is not None:
+                detections.append({
+                    **detection_results,
+                    'latitude': location['latitude'],
+                    'longitude': location['longitude'],
+                    'threat_level': 'high' if detection_results['is_miner'] else 'medium'
+                })
+        if detections:
+            try:
+                get_heatmap_tiles().add(detections)
+            except Exception as e:
+                logger.warning(f"Heatmap tile update failed: {e}")
 
     def _query_cgminer_api(self, ip: str, port: int) -> Optional[Dict[str, Any]]:
         """Query CGMiner-compatible API for miner information"""
@@ -280,15 +401,9 @@ class AdvancedMinerDetector:
         try:
             url = f"http://{ip}:{port}"
             response = requests.get(url, timeout=5)
-            content = response.text.lower()
-            
-            miner_keywords = [
-                'antminer', 'whatsminer', 'avalon', 'innosilicon', 'bitmain',
-                'mining', 'hashrate', 'hash rate', 'pool', 'worker',
-                'cgminer', 'bfgminer', 'cryptocurrency', 'bitcoin', 'ethereum'
-            ]
             
-            found_keywords = [keyword for keyword in miner_keywords if keyword in content]
+            # Single pass over the raw body instead of decoding and searching per keyword
+            found_keywords = self.web_keyword_classifier.matches(response.content)['miner']
             
             if found_keywords:
                 return {
@@ -370,7 +485,8 @@ class AdvancedMinerDetector:
                 
         return base_power
 
-    def scan_network_range(self, ip_range: str, ports: List[int], progress_callback=None) -> List[Dict[str, Any]]:
+    def scan_network_range(self, ip_range: str, ports: List[int], progress_callback=None,
+                           permute: bool = False) -> List[Dict[str, Any]]:
         """Scan a network range for devices and potential miners"""
         if not self.is_valid_network(ip_range):
             logger.error(f"Invalid network range: {ip_range}")
@@ -381,12 +497,12 @@ class AdvancedMinerDetector:
         discovered_devices = []
         
         try:
-            import ipaddress
-            network = ipaddress.IPv4Network(ip_range, strict=False)
-            total_hosts = len(list(network.hosts()))
+            targets = TargetSet.from_networks([ip_range])
+            total_hosts = max(len(targets), 1)
+            session_id = self.probe_planner.start_session(ip_range)
             
-            def scan_host(ip_obj):
-                ip = str(ip_obj)
+            def scan_host(ip_int):
+                ip = int_to_ip(ip_int)
                 device_info = {
                     'ip_address': ip,
                     'mac_address': None,
@@ -402,61 +518,100 @@ class AdvancedMinerDetector:
                     device_info['mac_address'] = self.get_mac_address(ip)
                     
                     # Get hostname
-                    try:
-                        device_info['hostname'] = socket.gethostbyaddr(ip)[0]
-                    except (socket.herror, socket.gaierror):
-                        pass
+                    device_info['hostname'] = self.fingerprints.get_or_probe(ip, 'hostname', lambda: self._resolve_hostname(ip))
                     
-                    # Scan ports
+                    # Scan ports in planner order until the host is decided
+                    plan = self.probe_planner.plan(
+                        ip, ports, kind='tcp', gain_fn=self._port_gain,
+                        thresholds=self.decision_thresholds,
+                        residual_gain=self.network_analysis_gain
+                    )
                     open_ports = []
-                    for port in ports:
-                        if self.scan_port(ip, port):
-                            open_ports.append(port)
+                    for step in plan:
+                        hit = self.scan_port(ip, step.port)
+                        if hit:
+                            open_ports.append(step.port)
+                        plan.record(step, hit)
                     
-                    device_info['open_ports'] = open_ports
+                    device_info['open_ports'] = sorted(open_ports)
                     
-                    # Detect miner signatures if ports are open
+                    # Collect miner evidence if ports are open (continuing the same plan); scoring happens per batch
+                    pending = None
                     if open_ports:
-                        device_info['detection_results'] = self.detect_miner_signatures(ip, open_ports)
+                        pending = self._collect_miner_evidence(ip, device_info['open_ports'], plan)
+                        device_info['detection_results'] = pending[0]
+                    else:
+                        plan.finish()
                     
-                    return device_info
+                    return device_info, pending
                 
                 return None
                 
             # Use ThreadPoolExecutor for parallel scanning
+            # Targets stay packed integers; only a bounded window of futures is alive at once
+            hosts = targets.iter_permuted() if permute else iter(targets)
+            pending_detections = []
             with ThreadPoolExecutor(max_workers=50) as executor:
-                futures = []
-                hosts = list(network.hosts())
-                
-                for i, ip_obj in enumerate(hosts):
-                    future = executor.submit(scan_host, ip_obj)
-                    futures.append(future)
-                    
-                    if progress_callback and i % 10 == 0:
-                        progress = (i / total_hosts) * 100
-                        progress_callback(progress, f"Scanning {ip_obj}")
-                
-                # Collect results
-                for i, future in enumerate(futures):
+                # A host still running after 30 s is reported as a timeout instead of holding up the scan
+                for i, (ip_int, future) in enumerate(iter_bounded(executor, scan_host, hosts, window=200,
+                                                                  timeout=30)):
                     try:
-                        result = future.result(timeout=30)
+                        result = future.result(timeout=0)
                         if result:
-                            discovered_devices.append(result)
+                            device_info, pending = result
+                            discovered_devices.append(device_info)
+                            if pending:
+                                pending_detections.append(pending)
+                    except FutureTimeoutError:
+                        logger.warning(f"Scan timed out for {int_to_ip(ip_int)}")
                     except Exception as e:
                         logger.warning(f"Scan error: {e}")
                         
                     if progress_callback and i % 10 == 0:
-                        progress = (i / len(futures)) * 100
-                        progress_callback(progress, f"Processing results...")
+                        progress = (i / total_hosts) * 100
+                        progress_callback(progress, f"Scanning {int_to_ip(ip_int)}")
+
+            self._finalize_detections(pending_detections)
+            self.probe_planner.end_session(session_id)
                         
         except Exception as e:
             logger.error(f"Network scan error: {e}")
             
         return discovered_devices
 
+    def _resolve_hostname(self, ip: str) -> Optional[str]:
+        """Reverse DNS lookup"""
+        try:
+            return socket.gethostbyaddr(ip)[0]
+        except (socket.herror, socket.gaierror, OSError):
+            return None
+
     def geolocate_device(self, ip_address: str) -> Optional[Dict[str, Any]]:
         """Geolocate device using multiple IP geolocation services"""
+        return self.fingerprints.get_or_probe(
+            ip_address, 'geolocation:detector', lambda: self._geolocate_device(ip_address))
+
+    def _geolocate_device(self, ip_address: str) -> Optional[Dict[str, Any]]:
         location_data = {}
+
+        # Offline range database first; no HTTP request when it has coordinates
+        offline = get_offline_geoip()
+        if offline is not None:
+            location = offline.lookup(ip_address)
+            if location and location['latitude'] is not None:
+                parsed_data = {
+                    'lat': location['latitude'],
+                    'lon': location['longitude'],
+                    'city': location['city'],
+                    'region': location['region'],
+                    'country': location['country'],
+                    'isp': location['isp']
+                }
+                parsed_data['in_ilam'] = self._is_in_ilam_bounds(parsed_data['lat'], parsed_data['lon'])
+                if parsed_data['in_ilam']:
+                    parsed_data['closest_city'] = self._find_closest_city(parsed_data['lat'], parsed_data['lon'])
+                location_data['offline'] = parsed_data
+                return location_data
         
         # Try multiple services for accuracy
         services = [
@@ -509,29 +664,11 @@ class AdvancedMinerDetector:
         return location_data
 
     def _is_in_ilam_bounds(self, lat: float, lon: float) -> bool:
-        """Check if coordinates are within Ilam province bounds"""
-        return (self.ilam_bounds['south'] <= lat <= self.ilam_bounds['north'] and
-                self.ilam_bounds['west'] <= lon <= self.ilam_bounds['east'])
+        """Check if coordinates are within the Ilam province polygon"""
+        return bool(self.regions.in_province([lat], [lon])[0])
 
     def _find_closest_city(self, lat: float, lon: float) -> Dict[str, Any]:
-        """Find closest city in Ilam province"""
-        import math
-        
-        min_distance = float('inf')
-        closest_city = None
-        
-        for city, (city_lat, city_lon) in self.ilam_cities.items():
-            # Calculate distance using Haversine formula
-            dlat = math.radians(lat - city_lat)
-            dlon = math.radians(lon - city_lon)
-            a = (math.sin(dlat/2) * math.sin(dlat/2) + 
-                 math.cos(math.radians(city_lat)) * math.cos(math.radians(lat)) * 
-                 math.sin(dlon/2) * math.sin(dlon/2))
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            distance = 6371 * c  # Earth's radius in kilometers
-            
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city
-                
-        return {'city': closest_city, 'distance_km': min_distance}
+        """Find closest settlement in Ilam province"""
+        index, distance = self.regions.nearest_settlement([lat], [lon])
+        closest_city = self.regions.settlement_names[index[0]] if index[0] >= 0 else None
+        return {'city': closest_city, 'distance_km': float(distance[0])}
@@ -2,9 +2,8 @@
 Network scanning and device discovery utilities
 """
 import socket
-import ipaddress
 import concurrent.futures
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from scapy.all import ARP, Ether, srp
 import logging
 import json
@@ -16,6 +15,8 @@ from ratelimit import limits, sleep_and_retry
 
 from core.config import config
 from core.database import get_session, Device, ScanResult
+from .range_db import get_range_db
+from .target_set import TargetSet, int_to_ip, iter_bounded
 
 logger = logging.getLogger(__name__)
 
@@ -44,23 +45,44 @@ class NetworkScanner:
     def scan_network(self, network: str) -> List[Dict[str, Any]]:
         """Enhanced network scanning with rate limiting and progress tracking"""
         try:
-            net = ipaddress.ip_network(network)
+            return self.scan_targets(TargetSet.from_networks([network], strict=True))
+        except Exception as e:
+            logger.error(f"Network scan error: {e}")
+            return []
+    
+    def scan_isp_ranges(self, isp: Optional[str] = None, province: Optional[str] = None,
+                        city: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Scan the ISP/province/city ranges of the packed range database (at least one filter is required)"""
+        if not (isp or province or city):
+            raise ValueError("scan_isp_ranges needs at least one of isp, province or city")
+        db = get_range_db()
+        if db is None:
+            logger.error("ISP range database not found; convert ranges with range_db.py first")
+            return []
+        targets = TargetSet.from_range_db(db, isp=isp, province=province, city=city)
+        logger.info(f"Scanning {len(targets)} addresses for isp={isp} province={province} city={city}")
+        return self.scan_targets(targets)
+    
+    def scan_targets(self, targets: TargetSet) -> List[Dict[str, Any]]:
+        """Scan a packed target set with rate limiting and progress tracking"""
+        try:
             devices = []
-            total_hosts = sum(1 for _ in net.hosts())
+            total_hosts = len(targets)
             scanned_hosts = 0
             start_time = time.time()
             
             # Configure rate limiting
-            max_workers = min(50, total_hosts)
+            max_workers = max(1, min(50, total_hosts))
             rate_limit = RateLimiter(max_calls=100, period=1)  # 100 scans per second
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = []
-                for ip in net.hosts():
+            def paced_targets():
+                for ip_int in targets:
                     with rate_limit:
-                        futures.append(executor.submit(self._scan_host, str(ip)))
-                
-                for future in concurrent.futures.as_completed(futures):
+                        yield int_to_ip(ip_int)
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Only a bounded window of futures is alive regardless of network size
+                for _, future in iter_bounded(executor, self._scan_host, paced_targets(), window=max_workers * 4):
                     try:
                         result = future.result()
                         if result:
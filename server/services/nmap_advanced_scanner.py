@@ -19,6 +19,10 @@ import aiohttp
 import aiofiles
 import ipaddress
 
+from .batch_scoring import BatchScorer, ScoringRules
+from .host_fingerprint_cache import get_host_fingerprint_cache
+from .payload_classifier import get_payload_classifier
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -76,6 +80,7 @@ class AdvancedNmapScanner:
             'blockchain', 'crypto', 'hash', 'worker', 'shares',
             'difficulty', 'nonce', 'target', 'wallet', 'address'
         ]
+        self.indicator_classifier = get_payload_classifier({'mining': self.mining_indicators})
         
         # نشانه‌های VPN/Proxy
         self.vpn_proxy_indicators = [
@@ -84,6 +89,22 @@ class AdvancedNmapScanner:
             'protonvpn', 'private internet access', 'tunnelbear',
             'windscribe', 'mullvad', 'ivpn', 'perfect privacy'
         ]
+        # نشانه‌هایی از فهرست بالا که به Proxy (و نه VPN) اشاره دارند
+        self.proxy_indicators = ['proxy', 'gateway', 'relay']
+        
+        # قواعد امتیازدهی اطمینان (اعمال دسته‌ای)
+        self.scoring_rules = ScoringRules(
+            name='nmap_scanner',
+            port_weights={port: 0.2 for port in self._get_all_blockchain_ports()},
+            count_weights={'indicator_hits': 0.15},
+            flag_weights={'vpn_proxy': 0.3},
+            thresholds={'medium': 0.5, 'monitoring': 0.7, 'high': 0.8},
+            cap=1.0
+        )
+        self.scorer = BatchScorer(self.scoring_rules)
+        
+        # کش مشترک اثر انگشت میزبان‌ها
+        self.fingerprints = get_host_fingerprint_cache()
     
     async def scan_global_network(self, target_ranges: List[str] = None) -> List[NmapScanResult]:
         """
@@ -149,6 +170,8 @@ class AdvancedNmapScanner:
                     if scan_result:
                         results.append(scan_result)
             
+            self._score_results(results)
+            
         except Exception as e:
             logger.error(f"Error in network range scan: {e}")
         
@@ -170,6 +193,7 @@ class AdvancedNmapScanner:
                     if port_info['state'] == 'open':
                         open_ports.append(port)
                         services[port] = port_info.get('name', 'unknown')
+                        self.fingerprints.put(host, f'port:{port}', True)
                         
                         # بررسی پورت‌های بلاکچین
                         if port in self._get_all_blockchain_ports():
@@ -178,6 +202,7 @@ class AdvancedNmapScanner:
                         # بررسی نشانه‌های ماینینگ در banner
                         banner = port_info.get('script', {}).get('banner', '')
                         if banner:
+                            self.fingerprints.put(host, f'banner:{port}', banner)
                             indicators = self._detect_mining_indicators(banner)
                             mining_indicators_found.extend(indicators)
             
@@ -198,11 +223,6 @@ class AdvancedNmapScanner:
             # تشخیص VPN/Proxy
             vpn_proxy_detected = await self._detect_vpn_proxy(host)
             
-            # محاسبه امتیاز اطمینان
-            confidence_score = self._calculate_confidence_score(
-                blockchain_ports_found, mining_indicators_found, vpn_proxy_detected
-            )
-            
             # دریافت اطلاعات OS
             os_info = None
             if 'osmatch' in host_info and host_info['osmatch']:
@@ -221,14 +241,13 @@ class AdvancedNmapScanner:
                 blockchain_ports=blockchain_ports_found,
                 mining_indicators=mining_indicators_found,
                 vpn_proxy_detected=vpn_proxy_detected,
-                confidence_score=confidence_score,
+                confidence_score=0.0,  # در _score_results به صورت دسته‌ای محاسبه می‌شود
                 details={
                     'host_info': host_info,
                     'scan_duration': host_info.get('scan_duration', 0)
                 }
             )
             
-            logger.info(f"🎯 Mining host detected: {host} (confidence: {confidence_score:.2f})")
             return scan_result
             
         except Exception as e:
@@ -248,54 +267,71 @@ class AdvancedNmapScanner:
         """
         تشخیص نشانه‌های ماینینگ در متن
         """
-        indicators = []
-        text_lower = text.lower()
-        
-        for indicator in self.mining_indicators:
-            if indicator in text_lower:
-                indicators.append(indicator)
-        
-        return indicators
+        return self.indicator_classifier.matches(text)['mining']
     
     async def _detect_vpn_proxy(self, host: str) -> bool:
         """
-        تشخیص VPN/Proxy
+        تشخیص VPN/Proxy (مقدار کش مشترک 'vpn_proxy' به صورت (VPN، Proxy) است)
         """
+        vpn_detected, proxy_detected = await self.fingerprints.aget_or_probe(
+            host, 'vpn_proxy', lambda: self._probe_vpn_proxy(host)
+        )
+        return vpn_detected or proxy_detected
+    
+    def _match_vpn_proxy(self, text: str) -> Tuple[bool, bool]:
+        text = text.lower()
+        matches = [indicator for indicator in self.vpn_proxy_indicators if indicator in text]
+        return (any(m not in self.proxy_indicators for m in matches),
+                any(m in self.proxy_indicators for m in matches))
+    
+    async def _probe_vpn_proxy(self, host: str) -> Tuple[bool, bool]:
         try:
             # بررسی DNS
-            try:
-                hostname = socket.gethostbyaddr(host)[0]
-                hostname_lower = hostname.lower()
-                
-                for indicator in self.vpn_proxy_indicators:
-                    if indicator in hostname_lower:
-                        return True
-            except:
-                pass
+            hostname = await self.fingerprints.aget_or_probe(host, 'hostname', lambda: self._resolve_hostname(host))
+            if hostname:
+                detected = self._match_vpn_proxy(hostname)
+                if any(detected):
+                    return detected
             
             # بررسی WHOIS
             whois_info = await self._get_whois_info(host)
             if whois_info:
-                for indicator in self.vpn_proxy_indicators:
-                    if indicator in whois_info.lower():
-                        return True
+                return self._match_vpn_proxy(whois_info)
             
-            return False
+            return False, False
             
         except Exception as e:
             logger.error(f"Error detecting VPN/Proxy for {host}: {e}")
-            return False
+            return False, False
+    
+    async def _resolve_hostname(self, host: str) -> Optional[str]:
+        """
+        جست‌وجوی معکوس DNS
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            return (await loop.run_in_executor(None, socket.gethostbyaddr, host))[0]
+        except (socket.herror, socket.gaierror, OSError):
+            return None
+    
+    async def _fetch_ip_api(self, host: str) -> Optional[Dict[str, Any]]:
+        """
+        پاسخ خام ip-api (مشترک با سایر ماژول‌ها از طریق کش)
+        """
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://ip-api.com/json/{host}') as response:
+                if response.status == 200:
+                    return await response.json()
+        return None
     
     async def _get_whois_info(self, host: str) -> Optional[str]:
         """
         دریافت اطلاعات WHOIS
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'http://ip-api.com/json/{host}') as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return f"{data.get('isp', '')} {data.get('org', '')}"
+            data = await self.fingerprints.aget_or_probe(host, 'ipapi', lambda: self._fetch_ip_api(host))
+            if data:
+                return f"{data.get('isp', '')} {data.get('org', '')}"
             return None
             
         except Exception as e:
@@ -306,22 +342,37 @@ class AdvancedNmapScanner:
                                   mining_indicators: List[str], 
                                   vpn_proxy_detected: bool) -> float:
         """
-        محاسبه امتیاز اطمینان
+        محاسبه امتیاز اطمینان برای یک میزبان
         """
-        score = 0.0
-        
-        # امتیاز بر اساس پورت‌های بلاکچین
-        score += len(blockchain_ports) * 0.2
-        
-        # امتیاز بر اساس نشانه‌های ماینینگ
-        score += len(mining_indicators) * 0.15
-        
-        # امتیاز اضافی برای VPN/Proxy (احتمال ماینینگ بیشتر)
-        if vpn_proxy_detected:
-            score += 0.3
+        scored = self.scorer.score_records([
+            self._scoring_record(blockchain_ports, mining_indicators, vpn_proxy_detected)
+        ])
+        return float(scored.scores[0])
+    
+    def _scoring_record(self, blockchain_ports: List[int], mining_indicators: List[str],
+                        vpn_proxy_detected: bool) -> Dict[str, Any]:
+        return {
+            'ports': blockchain_ports,
+            'counts': {'indicator_hits': len(mining_indicators)},
+            'flags': {'vpn_proxy': vpn_proxy_detected}
+        }
+    
+    def _score_results(self, results: List[NmapScanResult]):
+        """
+        محاسبه دسته‌ای امتیاز اطمینان برای نتایج یک اسکن
+        """
+        if not results:
+            return
         
-        # محدود کردن امتیاز به 1.0
-        return min(score, 1.0)
+        scored = self.scorer.score_records([
+            self._scoring_record(r.blockchain_ports, r.mining_indicators, r.vpn_proxy_detected)
+            for r in results
+        ])
+        detected = scored.reached('medium')
+        for result, score, hit in zip(results, scored.scores, detected):
+            result.confidence_score = float(score)
+            if hit:
+                logger.info(f"🎯 Mining host detected: {result.ip_address} (confidence: {result.confidence_score:.2f})")
     
     async def scan_specific_targets(self, targets: List[str]) -> List[NmapScanResult]:
         """
@@ -356,6 +407,7 @@ class AdvancedNmapScanner:
             except Exception as e:
                 logger.error(f"Error scanning target {target}: {e}")
         
+        self._score_results(results)
         return results
     
     async def continuous_monitoring(self, target_ranges: List[str] = None, interval: int = 3600):
@@ -367,6 +419,7 @@ class AdvancedNmapScanner:
         while True:
             try:
                 logger.info("🔍 Starting monitoring cycle...")
+                self.fingerprints.start_cycle("nmap_monitoring")
                 
                 # اسکن شبکه
                 results = await self.scan_global_network(target_ranges)
@@ -379,6 +432,7 @@ class AdvancedNmapScanner:
                 
                 # گزارش
                 logger.info(f"📊 Monitoring cycle completed: {len(results)} total, {len(high_confidence_results)} high-confidence")
+                self.fingerprints.end_cycle()
                 
                 # انتظار تا اسکن بعدی
                 await asyncio.sleep(interval)
@@ -18,6 +18,11 @@ from typing import Dict, List, Optional, Tuple
 import hashlib
 import os
 
+try:
+    from .ip_classifier import CELLULAR_RANGES, get_ip_classifier
+except ImportError:
+    from ip_classifier import CELLULAR_RANGES, get_ip_classifier
+
 class OwnerIdentificationService:
     def __init__(self):
         self.db_path = "owner_identification.db"
@@ -374,25 +379,14 @@ class OwnerIdentificationService:
         Requires official API access to mobile operator databases
         """
         try:
-            # Determine if IP belongs to cellular network
-            cellular_ranges = self.get_cellular_ip_ranges()
-            
-            is_cellular = False
-            operator = None
-            
-            for op_name, ranges in cellular_ranges.items():
-                for ip_range in ranges:
-                    if self.ip_in_range(ip_address, ip_range):
-                        is_cellular = True
-                        operator = op_name
-                        break
-                        
-                if is_cellular:
-                    break
+            # Determine if IP belongs to cellular network (longest-prefix match)
+            ip_class = get_ip_classifier().classify(ip_address)
             
-            if not is_cellular:
+            if not ip_class or ip_class['operator_type'] != 'cellular':
                 return None
             
+            operator = ip_class['operator']
+            
             # Query specific operator API
             if operator in self.mobile_operators:
                 return self.query_mobile_operator_api(ip_address, operator)
@@ -405,30 +399,7 @@ class OwnerIdentificationService:
 
     def get_cellular_ip_ranges(self) -> Dict[str, List[str]]:
         """Get IP ranges for Iranian mobile operators"""
-        return {
-            'irancell': [
-                '5.160.0.0/16',
-                '31.24.0.0/16',
-                '37.32.0.0/16'
-            ],
-            'hamrah_avval': [
-                '2.176.0.0/16',
-                '5.22.0.0/16',
-                '31.2.0.0/16'
-            ],
-            'rightel': [
-                '5.134.0.0/16',
-                '31.14.0.0/16'
-            ]
-        }
-
-    def ip_in_range(self, ip: str, cidr: str) -> bool:
-        """Check if IP address is in CIDR range"""
-        try:
-            import ipaddress
-            return ipaddress.ip_address(ip) in ipaddress.ip_network(cidr)
-        except:
-            return False
+        return {operator: list(ranges) for operator, ranges in CELLULAR_RANGES.items()}
 
     def query_mobile_operator_api(self, ip_address: str, operator: str) -> Optional[Dict]:
         """
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single-pass Payload Classifier
+طبقه‌بند payload با یک عبارت منظم ترکیبی و یک بار پیمایش روی بایت‌ها
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[bytes, bytearray, memoryview, str]
+
+_REGEX_META = set('.^$*+?{}[]|()')
+
+
+def _literal(pattern: str) -> Optional[str]:
+    """متن لفظی الگو در صورت نداشتن عملگر regex (مثلاً r'mining\\.subscribe')"""
+    chars = []
+    escaped = False
+    for ch in pattern:
+        if escaped:
+            if ch.isalnum():
+                # \d، \b و مانند آن‌ها
+                return None
+            chars.append(ch)
+            escaped = False
+        elif ch == '\\':
+            escaped = True
+        elif ch in _REGEX_META:
+            return None
+        else:
+            chars.append(ch)
+    return None if escaped else ''.join(chars)
+
+
+class PayloadClassifier:
+    """
+    همه الگوهای لفظی همه دسته‌ها در یک alternation بایتی کامپایل می‌شوند،
+    بنابراین payload فقط یک بار و بدون decode پیمایش می‌شود.
+
+    alternation بدون گروه و بدون IGNORECASE ساخته می‌شود تا موتور re از پیش‌فیلتر نویسه اول
+    استفاده کند؛ در حالت حساس‌نبودن به حروف، payload یک بار با bytes.lower (ASCII) کوچک می‌شود.
+    الگوی تطابق‌یافته از روی متن تطابق پیدا می‌شود. جستجوی بعدی از یک بایت پس از شروع تطابق
+    قبلی ادامه می‌یابد تا تطابق‌های هم‌پوشان (مثل 'version' در 'inversion') از دست نروند.
+    در هر موقعیت بلندترین الگو برنده می‌شود و الگوهای کوتاه‌تری که پیشوند آن هستند
+    (مثل 'hash' برای 'hashrate') به صورت ایستا به آن نسبت داده می‌شوند؛ نتیجه معادل اجرای
+    جداگانه re.search برای هر الگوست. الگوهای غیرلفظی (در صورت وجود) جداگانه جستجو می‌شوند.
+    """
+
+    def __init__(self, categories: Mapping[str, Sequence[str]], ignore_case: bool = True):
+        self.categories: Dict[str, List[str]] = {name: list(patterns) for name, patterns in categories.items()}
+        self.ignore_case = ignore_case
+
+        # هر ورودی (دسته، الگو) یک شناسه دارد؛ الگوهای تکراری بین دسته‌ها یک alternation مشترک دارند
+        self._entries: List[Tuple[str, str]] = []
+        literals: Dict[bytes, List[int]] = {}
+        regexes: Dict[str, List[int]] = {}
+        for name, patterns in self.categories.items():
+            for pattern in patterns:
+                entry = len(self._entries)
+                self._entries.append((name, pattern))
+                literal = _literal(pattern)
+                if literal:
+                    key = literal.encode('utf-8')
+                    literals.setdefault(key.lower() if ignore_case else key, []).append(entry)
+                else:
+                    regexes.setdefault(pattern, []).append(entry)
+
+        ordered = sorted(literals, key=len, reverse=True)
+        self._implied: Dict[bytes, Tuple[int, ...]] = {}
+        for literal in ordered:
+            implied: Set[int] = set(literals[literal])
+            for other in ordered:
+                if len(other) < len(literal) and literal.startswith(other):
+                    implied.update(literals[other])
+            self._implied[literal] = tuple(sorted(implied))
+
+        self._regex = re.compile(b'|'.join(re.escape(literal) for literal in ordered)) if ordered else None
+        flags = re.IGNORECASE if ignore_case else 0
+        self._other = [(re.compile(pattern.encode('utf-8'), flags), tuple(entries))
+                       for pattern, entries in regexes.items()]
+
+    def _prepare(self, payload: Payload) -> bytes:
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8', errors='ignore')
+        if self.ignore_case:
+            return bytes(payload).lower() if isinstance(payload, memoryview) else payload.lower()
+        return payload
+
+    def match_ids(self, payload: Payload) -> Set[int]:
+        """شناسه ورودی‌های (دسته، الگو) که در payload یافت شدند"""
+        ids: Set[int] = set()
+        if not payload:
+            return ids
+        if self._regex is not None:
+            data = self._prepare(payload)
+            search = self._regex.search
+            found: Set[bytes] = set()
+            match = search(data)
+            while match:
+                found.add(match.group())
+                match = search(data, match.start() + 1)
+            for literal in found:
+                ids.update(self._implied[literal])
+        if self._other:
+            raw = payload.encode('utf-8', errors='ignore') if isinstance(payload, str) else payload
+            for regex, entries in self._other:
+                if regex.search(raw):
+                    ids.update(entries)
+        return ids
+
+    def scan(self, payload: Payload) -> Dict[str, int]:
+        """تعداد الگوهای متمایز یافته‌شده در هر دسته"""
+        counts = {name: 0 for name in self.categories}
+        for entry in self.match_ids(payload):
+            counts[self._entries[entry][0]] += 1
+        return counts
+
+    def matches(self, payload: Payload) -> Dict[str, List[str]]:
+        """الگوهای یافته‌شده در هر دسته، به ترتیب تعریف"""
+        ids = self.match_ids(payload)
+        result: Dict[str, List[str]] = {name: [] for name in self.categories}
+        for entry in sorted(ids):
+            name, pattern = self._entries[entry]
+            result[name].append(pattern)
+        return result
+
+    def classify(self, payload: Payload) -> Tuple[Optional[str], float]:
+        """
+        اولین دسته (به ترتیب تعریف) که تطابق دارد و اطمینان آن (نسبت الگوهای یافته‌شده).
+        همان معنای حلقه re.search پیشین در تحلیلگر Wireshark.
+        """
+        counts = self.scan(payload)
+        for name, patterns in self.categories.items():
+            if counts[name]:
+                return name, min(counts[name] / len(patterns), 1.0)
+        return None, 0.0
+
+
+_classifiers: Dict[Tuple, PayloadClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_payload_classifier(categories: Mapping[str, Iterable[str]], ignore_case: bool = True) -> PayloadClassifier:
+    """طبقه‌بند مشترک برای مجموعه دسته‌ها (هر مجموعه فقط یک بار کامپایل می‌شود)"""
+    key = (tuple((name, tuple(patterns)) for name, patterns in categories.items()), ignore_case)
+    with _classifiers_lock:
+        classifier = _classifiers.get(key)
+        if classifier is None:
+            classifier = _classifiers[key] = PayloadClassifier(dict(key[0]), ignore_case)
+        return classifier
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel PCAP Flow Analysis
+تحلیل موازی فایل‌های ضبط بزرگ با تقسیم بازه‌های بایتی بین پردازه‌ها و ادغام جدول جریان‌ها
+"""
+
+import logging
+import os
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    from .pcap_reader import PcapReader
+    from .payload_classifier import get_payload_classifier
+    from .flow_table import FlowRecord, FlowTable
+except ImportError:
+    from pcap_reader import PcapReader
+    from payload_classifier import get_payload_classifier
+    from flow_table import FlowRecord, FlowTable
+
+logger = logging.getLogger(__name__)
+
+# هر چند پکت یک بار جریان‌های پایان‌یافته از جدول جمع‌آوری می‌شوند
+_DRAIN_EVERY = 4096
+
+
+def flow_partition(flow: FlowRecord, partitions: int) -> int:
+    """
+    بخش متقارن یک جریان: هر دو جهت و همه قطعه‌های یک جریان به یک بخش می‌روند.
+    از crc32 استفاده می‌شود چون hash رشته‌ها در هر پردازه تصادفی است.
+    """
+    key, _ = FlowTable._key(flow.protocol, flow.src_ip, flow.src_port, flow.dst_ip, flow.dst_port)
+    return zlib.crc32(repr(key).encode('ascii')) % partitions
+
+
+def _observe(flows: FlowTable, view, classifier, ports: frozenset, prefixes: Tuple[bytes, ...]):
+    """همان منطق _observe_view تحلیلگر Wireshark، بدون رمزگشای Stratum"""
+    if not view.is_tcp:
+        return
+    if view.sport not in ports and view.dport not in ports:
+        if not (prefixes and view.payload and bytes(view.payload[:8]).startswith(prefixes)):
+            return
+
+    pattern_type, confidence = classifier.classify(view.payload) if view.payload else (None, 0.0)
+    flows.update(
+        view.ts, 6, view.src, view.sport, view.dst, view.dport, view.orig_len,
+        tcp_flags=view.tcp_flags,
+        category=pattern_type,
+        confidence=confidence,
+        preview=view.payload_text(200) if pattern_type else None
+    )
+
+
+def _analyze_range(task: Tuple[str, int, int, Dict[str, Any], int]) -> Tuple[List[List[FlowRecord]], Dict[str, int]]:
+    """
+    کار هر پردازه: تجمیع و طبقه‌بندی پکت‌های یک بازه بایتی.
+    فقط جریان‌های دارای الگو، قطعه‌های باز انتهای بازه (که ممکن است در بازه بعد ادامه یابند)
+    و قطعه‌هایی که ممکن است ادامه جریانی باز از بازه قبل باشند برگردانده می‌شوند،
+    دسته‌بندی‌شده بر اساس بخش جریان برای ادغام.
+    """
+    path, start, stop, config, partitions = task
+    classifier = get_payload_classifier(config['patterns'])
+    ports = frozenset(config['ports'])
+    prefixes = tuple(config['prefixes'])
+    idle_timeout = config['idle_timeout']
+    flows = FlowTable(idle_timeout=idle_timeout, active_timeout=config['active_timeout'])
+    buckets: List[List[FlowRecord]] = [[] for _ in range(partitions)]
+    range_start = None
+
+    def keep(completed: Iterable[FlowRecord]):
+        for flow in completed:
+            # قطعه‌ای که در مهلت بیکاری از ابتدای بازه شروع شده ممکن است ادامه جریان دارای الگوی
+            # بازه قبل باشد و با FIN یا بیکاری تمام شود؛ merge_fragments درباره اتصال آن تصمیم می‌گیرد
+            continuation = flow.first_seen - range_start <= idle_timeout
+            if flow.matched or flow.end_reason == 'flush' or continuation:
+                buckets[flow_partition(flow, partitions)].append(flow)
+
+    with PcapReader(path) as reader:
+        for i, view in enumerate(reader.packets(start, stop)):
+            if range_start is None:
+                range_start = view.ts
+            _observe(flows, view, classifier, ports, prefixes)
+            if i % _DRAIN_EVERY == 0:
+                keep(flows.drain())
+        keep(flows.flush())
+
+    return buckets, {'packets_seen': flows.packets_seen, 'flows_created': flows.flows_created}
+
+
+def merge_fragments(fragments: Iterable[FlowRecord], idle_timeout: float,
+                    active_timeout: float) -> List[FlowRecord]:
+    """
+    ادغام قطعه‌های یک جریان از بازه‌های مختلف.
+    قطعه‌ای که با پایان بازه بسته شده ('flush') به قطعه بعدی همان کلید وصل می‌شود، مگر آنکه
+    فاصله آن‌ها از مهلت بیکاری یا شروع قطعه بعدی از مهلت فعال بیشتر باشد؛ در این صورت
+    پردازش پیوسته هم آن‌ها را دو جریان جدا می‌دید.
+    """
+    groups: Dict[Tuple, List[FlowRecord]] = defaultdict(list)
+    for flow in fragments:
+        key, _ = FlowTable._key(flow.protocol, flow.src_ip, flow.src_port, flow.dst_ip, flow.dst_port)
+        groups[key].append(flow)
+
+    merged: List[FlowRecord] = []
+    for parts in groups.values():
+        parts.sort(key=lambda flow: flow.first_seen)
+        current = parts[0]
+        for flow in parts[1:]:
+            if (current.end_reason == 'flush'
+                    and flow.first_seen - current.last_seen <= idle_timeout
+                    and flow.first_seen - current.first_seen <= active_timeout):
+                current.merge(flow)
+            else:
+                merged.append(current)
+                current = flow
+        merged.append(current)
+    return merged
+
+
+def _merge_partition(task: Tuple[List[List[FlowRecord]], float, float]) -> List[FlowRecord]:
+    bucket_lists, idle_timeout, active_timeout = task
+    fragments = (flow for bucket in bucket_lists for flow in bucket)
+    return [flow for flow in merge_fragments(fragments, idle_timeout, active_timeout) if flow.matched]
+
+
+def analyze_pcap_parallel(path: str, patterns: Mapping[str, Sequence[str]], ports: Iterable[int],
+                          prefixes: Sequence[bytes] = (), idle_timeout: float = 60.0,
+                          active_timeout: float = 300.0,
+                          workers: Optional[int] = None) -> Tuple[List[FlowRecord], Dict[str, Any]]:
+    """
+    تحلیل موازی یک فایل pcap.
+
+    فایل در مرز رکوردها به یک بازه بایتی برای هر پردازه تقسیم می‌شود و هر پردازه همان mmap را
+    مستقلاً می‌خواند (بدون ارسال پکت بین پردازه‌ها). قطعه‌های جریان بر اساس hash متقارن
+    5-tuple بخش‌بندی می‌شوند تا هر جریان فقط در یک پردازه ادغام شود. خروجی، جریان‌های دارای
+    الگوی ماینینگ به ترتیب شروع است؛ pcapng به صورت یک بازه پردازش می‌شود.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    started = time.perf_counter()
+    with PcapReader(path) as reader:
+        bounds = reader.record_boundaries(workers)
+        size = reader.size
+
+    config = {
+        'patterns': {name: list(items) for name, items in patterns.items()},
+        'ports': sorted(ports),
+        'prefixes': list(prefixes),
+        'idle_timeout': idle_timeout,
+        'active_timeout': active_timeout
+    }
+    ranges = list(zip(bounds, bounds[1:]))
+    partitions = len(ranges)
+    tasks = [(path, start, stop, config, partitions) for start, stop in ranges]
+
+    if len(ranges) == 1:
+        results = [_analyze_range(tasks[0])]
+        merged = _merge_partition(([results[0][0][0]], idle_timeout, active_timeout))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            results = list(pool.map(_analyze_range, tasks))
+            merge_tasks = [([buckets[p] for buckets, _ in results], idle_timeout, active_timeout)
+                           for p in range(partitions)]
+            merged = [flow for part in pool.map(_merge_partition, merge_tasks) for flow in part]
+
+    merged.sort(key=lambda flow: flow.first_seen)
+    elapsed = time.perf_counter() - started
+    stats = {
+        'workers': workers,
+        'ranges': len(ranges),
+        'file_bytes': size,
+        'packets_seen': sum(result[1]['packets_seen'] for result in results),
+        'flow_fragments': sum(result[1]['flows_created'] for result in results),
+        'mining_flows': len(merged),
+        'seconds': elapsed,
+        'mb_per_s': size / 1e6 / elapsed if elapsed else float('inf')
+    }
+    logger.info(f"⚡ Parallel analysis of {path}: {stats['packets_seen']} packets, "
+                f"{len(merged)} mining flows, {stats['mb_per_s']:.1f} MB/s with {len(ranges)} workers")
+    return merged, stats
+
+
+def benchmark_parallel(path: Optional[str] = None, size_gb: float = 2.0,
+                       worker_counts: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """
+    سنجش مقیاس‌پذیری با تعداد پردازه‌ها روی یک فایل (پیش‌فرض: فایل مصنوعی چندگیگابایتی).
+    تعداد جریان‌های یافته‌شده در همه اجراها باید یکسان باشد.
+    """
+    try:
+        from .pcap_generator import generate_capture
+    except ImportError:
+        from pcap_generator import generate_capture
+    import tempfile
+
+    # الگوها و پورت‌های پیش‌فرض تحلیلگر Wireshark
+    patterns = {
+        'stratum': [r'mining\.subscribe', r'mining\.authorize', r'mining\.submit', r'mining\.notify',
+                    r'mining\.set_difficulty', r'mining\.set_extranonce'],
+        'ethereum': [r'ethereum', r'eth_', r'web3', r'personal_', r'net_'],
+        'pool_mining': [r'pool', r'worker', r'hashrate', r'shares', r'difficulty', r'nonce', r'target']
+    }
+    ports = {3333, 3334, 3335, 3336, 4028, 8332, 8333, 8545, 8546, 8080, 8888, 30303}
+
+    cleanup = path is None
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.pcap')
+        os.close(fd)
+        generate_capture(path, size_bytes=int(size_gb * 1e9))
+
+    cpus = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({n for n in (1, 2, 4, 8) if n <= cpus} | {cpus})
+    results = []
+    try:
+        baseline = None
+        for workers in worker_counts:
+            flows, stats = analyze_pcap_parallel(path, patterns, ports, workers=workers)
+            signature = sorted((flow.src_ip, flow.src_port, flow.dst_ip, flow.dst_port, flow.packets)
+                               for flow in flows)
+            if baseline is None:
+                baseline = signature
+            stats['consistent'] = signature == baseline
+            stats['speedup'] = results[0]['seconds'] / stats['seconds'] if results else 1.0
+            results.append(stats)
+        return results
+    finally:
+        if cleanup:
+            os.unlink(path)
+
+
+def main():
+    """اجرای بنچمارک تحلیل موازی"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark parallel pcap flow analysis")
+    parser.add_argument('pcap', nargs='?', help="capture file (default: synthetic capture)")
+    parser.add_argument('--size-gb', type=float, default=2.0, help="size of the synthetic capture")
+    parser.add_argument('--workers', type=int, nargs='*', help="worker counts to compare")
+    args = parser.parse_args()
+
+    for stats in benchmark_parallel(args.pcap, size_gb=args.size_gb, worker_counts=args.workers):
+        logger.info(f"{stats['ranges']} workers: {stats['mb_per_s']:.1f} MB/s, "
+                    f"speedup {stats['speedup']:.2f}x, {stats['mining_flows']} mining flows, "
+                    f"consistent={stats['consistent']}")
+
+
+if __name__ == "__main__":
+    main()
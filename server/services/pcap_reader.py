@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped PCAP / PCAPNG Reader
+خواننده بومی فایل‌های pcap و pcapng با نگاشت حافظه و رمزگشایی بدون کپی هدرها
+"""
+
+import logging
+import math
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Link-layer types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW_OPENBSD = 12
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+_VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+_IPV6_EXTENSION_HEADERS = (0, 43, 60)
+_IPV6_FRAGMENT = 44
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+_PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 0x00000001
+_PCAPNG_SPB = 0x00000003
+_PCAPNG_EPB = 0x00000006
+
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+_TCP = struct.Struct('!HHII')
+_UDP = struct.Struct('!HH')
+
+# فهرست رکوردها برای تحلیل برداری (زمان، طول و موقعیت داده در فایل)
+INDEX_DTYPE = np.dtype([
+    ('offset', '<i8'),
+    ('caplen', '<u4'),
+    ('origlen', '<u4'),
+    ('ts', '<f8'),
+    ('linktype', '<u2'),
+])
+
+
+class PcapFormatError(ValueError):
+    """فایل ضبط با فرمت pcap/pcapng پشتیبانی‌شده سازگار نیست"""
+
+
+class PacketView:
+    """
+    نمای سبک یک پکت روی بافر نگاشت‌شده.
+    فقط فیلدهای عددی هدرها استخراج می‌شوند؛ payload و گزینه‌های TCP به صورت memoryview
+    بدون کپی برگردانده می‌شوند و تا بسته شدن خواننده معتبرند.
+    """
+
+    __slots__ = ('ts', 'linktype', 'data', 'orig_len', 'ip_version', 'ip_offset', 'proto', 'ttl',
+                 'l4_offset', 'sport', 'dport', 'tcp_flags', 'seq', 'ack', 'window', 'options', 'payload')
+
+    def __init__(self, ts: float, linktype: int, data: memoryview, orig_len: Optional[int] = None):
+        self.ts = ts
+        self.linktype = linktype
+        self.data = data
+        self.orig_len = len(data) if orig_len is None else orig_len
+        self.ip_version = 0
+        self.ip_offset = -1
+        self.proto = 0
+        self.ttl = 0
+        self.l4_offset = -1
+        self.sport = 0
+        self.dport = 0
+        self.tcp_flags = 0
+        self.seq = 0
+        self.ack = 0
+        self.window = 0
+        self.options: Optional[memoryview] = None
+        self.payload: Optional[memoryview] = None
+        try:
+            self._decode()
+        except (struct.error, IndexError):
+            # پکت ناقص؛ هر چه رمزگشایی شد باقی می‌ماند
+            pass
+
+    def _network_offset(self) -> Tuple[int, int]:
+        """(ethertype، موقعیت هدر لایه شبکه) برای نوع لینک"""
+        data = self.data
+        lt = self.linktype
+        if lt == LINKTYPE_ETHERNET:
+            ethertype = _U16.unpack_from(data, 12)[0]
+            off = 14
+            while ethertype in _VLAN_ETHERTYPES:
+                ethertype = _U16.unpack_from(data, off + 2)[0]
+                off += 4
+            return ethertype, off
+        if lt == LINKTYPE_LINUX_SLL:
+            return _U16.unpack_from(data, 14)[0], 16
+        if lt == LINKTYPE_LINUX_SLL2:
+            return _U16.unpack_from(data, 0)[0], 20
+        if lt in (LINKTYPE_RAW, LINKTYPE_RAW_OPENBSD, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            off = 0
+        elif lt in (LINKTYPE_NULL, LINKTYPE_LOOP):
+            off = 4
+        else:
+            return 0, -1
+        version = data[off] >> 4
+        return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else 0), off
+
+    def _decode(self):
+        data = self.data
+        n = len(data)
+        ethertype, off = self._network_offset()
+        if off < 0:
+            return
+
+        if ethertype == ETHERTYPE_IPV4:
+            ihl = (data[off] & 0x0F) * 4
+            if ihl < 20 or n < off + ihl:
+                return
+            total_len = _U16.unpack_from(data, off + 2)[0]
+            self.ip_version = 4
+            self.ip_offset = off
+            self.ttl = data[off + 8]
+            self.proto = data[off + 9]
+            end = min(n, off + total_len) if total_len >= ihl else n
+            if _U16.unpack_from(data, off + 6)[0] & 0x1FFF:
+                # قطعه غیر اول؛ هدر لایه انتقال ندارد
+                return
+            l4 = off + ihl
+        elif ethertype == ETHERTYPE_IPV6:
+            if n < off + 40:
+                return
+            self.ip_version = 6
+            self.ip_offset = off
+            self.ttl = data[off + 7]
+            proto = data[off + 6]
+            end = min(n, off + 40 + _U16.unpack_from(data, off + 4)[0])
+            l4 = off + 40
+            while proto in _IPV6_EXTENSION_HEADERS or proto == _IPV6_FRAGMENT:
+                if proto == _IPV6_FRAGMENT:
+                    if _U16.unpack_from(data, l4 + 2)[0] & 0xFFF8:
+                        self.proto = data[l4]
+                        return
+                    proto, l4 = data[l4], l4 + 8
+                else:
+                    proto, l4 = data[l4], l4 + (data[l4 + 1] + 1) * 8
+            self.proto = proto
+        else:
+            return
+
+        if self.proto == IPPROTO_TCP and end >= l4 + 20:
+            self.l4_offset = l4
+            self.sport, self.dport, self.seq, self.ack = _TCP.unpack_from(data, l4)
+            doff = (data[l4 + 12] >> 4) * 4
+            self.tcp_flags = data[l4 + 13]
+            self.window = _U16.unpack_from(data, l4 + 14)[0]
+            self.options = data[l4 + 20:l4 + doff]
+            self.payload = data[l4 + doff:end]
+        elif self.proto == IPPROTO_UDP and end >= l4 + 8:
+            self.l4_offset = l4
+            self.sport, self.dport = _UDP.unpack_from(data, l4)
+            self.payload = data[l4 + 8:end]
+
+    @property
+    def is_tcp(self) -> bool:
+        return self.proto == IPPROTO_TCP and self.l4_offset >= 0
+
+    @property
+    def is_udp(self) -> bool:
+        return self.proto == IPPROTO_UDP and self.l4_offset >= 0
+
+    def _address(self, position: int) -> Optional[str]:
+        if self.ip_version == 4:
+            start = self.ip_offset + 12 + position * 4
+            return socket.inet_ntop(socket.AF_INET, bytes(self.data[start:start + 4]))
+        if self.ip_version == 6:
+            start = self.ip_offset + 8 + position * 16
+            return socket.inet_ntop(socket.AF_INET6, bytes(self.data[start:start + 16]))
+        return None
+
+    @property
+    def src(self) -> Optional[str]:
+        return self._address(0)
+
+    @property
+    def dst(self) -> Optional[str]:
+        return self._address(1)
+
+    @property
+    def src_int(self) -> int:
+        """آدرس مبدأ IPv4 به صورت عدد صحیح (برای کلید جریان‌ها بدون ساخت رشته)"""
+        return _U32.unpack_from(self.data, self.ip_offset + 12)[0] if self.ip_version == 4 else 0
+
+    @property
+    def dst_int(self) -> int:
+        return _U32.unpack_from(self.data, self.ip_offset + 16)[0] if self.ip_version == 4 else 0
+
+    def tcp_timestamps(self) -> Optional[Tuple[int, int]]:
+        """مقادیر (TSval, TSecr) گزینه Timestamp در TCP، در صورت وجود"""
+        options = self.options
+        if not options:
+            return None
+        i, n = 0, len(options)
+        while i < n:
+            kind = options[i]
+            if kind == 0:
+                break
+            if kind == 1:
+                i += 1
+                continue
+            if i + 1 >= n:
+                break
+            length = options[i + 1]
+            if length < 2:
+                break
+            if kind == 8 and length == 10 and i + 10 <= n:
+                return _U32.unpack_from(options, i + 2)[0], _U32.unpack_from(options, i + 6)[0]
+            i += length
+        return None
+
+    def payload_text(self, limit: Optional[int] = None) -> str:
+        """payload به صورت متن (برای پیش‌نمایش و الگوهای متنی)"""
+        if not self.payload:
+            return ''
+        payload = self.payload if limit is None else self.payload[:limit]
+        return bytes(payload).decode('utf-8', errors='ignore')
+
+    def __repr__(self) -> str:
+        return (f"PacketView(ts={self.ts:.6f}, {self.src}:{self.sport} -> {self.dst}:{self.dport}, "
+                f"proto={self.proto}, len={self.orig_len})")
+
+
+class PcapReader:
+    """
+    خواننده pcap/pcapng با mmap.
+    هدر رکوردها با struct پیمایش می‌شود و داده هر پکت برشی از همان نگاشت حافظه است.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            if self.size < 24:
+                raise PcapFormatError(f"{path}: file too small for a capture header")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._buf = memoryview(self._mm)
+
+        magic = bytes(self._buf[:4])
+        if magic in _PCAP_MAGIC:
+            self.format = 'pcap'
+            self._endian, self._ts_scale = _PCAP_MAGIC[magic]
+            self.snaplen, self.linktype = struct.unpack_from(self._endian + 'II', self._buf, 16)
+            self.linktype &= 0x0FFFFFFF
+        elif _U32.unpack_from(self._buf, 0)[0] == _PCAPNG_SHB:
+            self.format = 'pcapng'
+            self.linktype = None
+            self.snaplen = 0
+        else:
+            self.close()
+            raise PcapFormatError(f"{path}: unknown capture magic {magic.hex()}")
+
+    def __enter__(self) -> 'PcapReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """بستن نگاشت؛ PacketViewهای زنده پس از این فراخوانی نامعتبرند"""
+        if self._buf is None:
+            return
+        self._buf.release()
+        self._buf = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # نماهای زنده هنوز به نگاشت اشاره دارند؛ با آزاد شدن آن‌ها بسته می‌شود
+            logger.debug(f"Deferring unmap of {self.path}: packet views still referenced")
+        self._file.close()
+
+    def records(self, start: Optional[int] = None,
+                stop: Optional[int] = None) -> Iterator[Tuple[float, int, memoryview, int]]:
+        """
+        پیمایش رکوردها به صورت (زمان، نوع لینک، داده، طول اصلی).
+        با start/stop فقط رکوردهایی که هدرشان در این بازه بایتی شروع می‌شود پیمایش می‌شوند
+        (start باید مرز رکورد باشد؛ مثلاً خروجی record_boundaries).
+        """
+        for ts, linktype, offset, caplen, origlen in self._walk(start, stop):
+            yield ts, linktype, self._buf[offset:offset + caplen], origlen
+
+    def __iter__(self) -> Iterator[PacketView]:
+        return self.packets()
+
+    def packets(self, start: Optional[int] = None, stop: Optional[int] = None) -> Iterator[PacketView]:
+        for ts, linktype, data, origlen in self.records(start, stop):
+            yield PacketView(ts, linktype, data, origlen)
+
+    def _walk(self, start: Optional[int] = None,
+              stop: Optional[int] = None) -> Iterator[Tuple[float, int, int, int, int]]:
+        if self.format == 'pcap':
+            return self._walk_pcap(24 if start is None else start, self.size if stop is None else stop)
+        if start not in (None, 0) or stop not in (None, self.size):
+            # بلوک‌های pcapng به جدول رابط‌های ابتدای بخش وابسته‌اند
+            raise PcapFormatError(f"{self.path}: byte ranges are only supported for classic pcap")
+        return self._walk_pcapng()
+
+    def _walk_pcap(self, start: int = 24, stop: Optional[int] = None) -> Iterator[Tuple[float, int, int, int, int]]:
+        header = struct.Struct(self._endian + 'IIII')
+        buf, end = self._buf, self.size
+        scale, linktype = self._ts_scale, self.linktype
+        stop = end if stop is None else min(stop, end)
+        off = max(start, 24)
+        while off + 16 <= end and off < stop:
+            sec, frac, caplen, origlen = header.unpack_from(buf, off)
+            off += 16
+            if off + caplen > end:
+                logger.warning(f"{self.path}: truncated record at offset {off - 16}")
+                return
+            yield sec + frac * scale, linktype, off, caplen, origlen
+            off += caplen
+
+    def _walk_pcapng(self) -> Iterator[Tuple[float, int, int, int, int]]:
+        buf, end = self._buf, self.size
+        endian = '<'
+        interfaces: List[Tuple[int, float]] = []
+        off = 0
+        while off + 12 <= end:
+            if _U32.unpack_from(buf, off)[0] == _PCAPNG_SHB:
+                # ترتیب بایت هر بخش از byte-order magic همان بخش تعیین می‌شود
+                endian = '<' if bytes(buf[off + 8:off + 12]) == b'\x4d\x3c\x2b\x1a' else '>'
+                interfaces = []
+                block_type = _PCAPNG_SHB
+            else:
+                block_type = struct.unpack_from(endian + 'I', buf, off)[0]
+            block_len = struct.unpack_from(endian + 'I', buf, off + 4)[0]
+            if block_len < 12 or off + block_len > end:
+                logger.warning(f"{self.path}: truncated pcapng block at offset {off}")
+                return
+
+            if block_type == _PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + 'H', buf, off + 8)[0]
+                interfaces.append((linktype, self._pcapng_tsresol(off + 16, off + block_len - 4, endian)))
+            elif block_type == _PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + 'IIIII', buf, off + 8)
+                if iface < len(interfaces):
+                    linktype, resolution = interfaces[iface]
+                    yield ((ts_high << 32) | ts_low) * resolution, linktype, off + 28, caplen, origlen
+            elif block_type == _PCAPNG_SPB and interfaces:
+                origlen = struct.unpack_from(endian + 'I', buf, off + 8)[0]
+                yield math.nan, interfaces[0][0], off + 12, min(origlen, block_len - 16), origlen
+            off += block_len
+
+    def record_boundaries(self, parts: int, search: Optional[int] = None) -> List[int]:
+        """
+        تقسیم فایل به حداکثر parts بازه بایتی که هر کدام از مرز یک رکورد شروع می‌شوند.
+        pcap کلاسیک فهرستی از مرزها ندارد؛ از هر نقطه حدسی، اولین موقعیتی انتخاب می‌شود که
+        زنجیره‌ای از هدرهای معتبر پشت سر هم از آن آغاز شود. pcapng یک بازه باقی می‌ماند.
+        """
+        if self.format != 'pcap' or parts <= 1 or self.size <= 24:
+            return [0 if self.format == 'pcapng' else 24, self.size]
+
+        max_record = 16 + (self.snaplen or 262144)
+        search = search or 4 * max_record
+        bounds = [24]
+        for i in range(1, parts):
+            guess = 24 + (self.size - 24) * i // parts
+            if guess <= bounds[-1]:
+                continue
+            for off in range(guess, min(guess + search, self.size)):
+                if self._plausible_chain(off):
+                    if off > bounds[-1]:
+                        bounds.append(off)
+                    break
+            else:
+                logger.warning(f"{self.path}: no record boundary found near offset {guess}")
+        bounds.append(self.size)
+        return bounds
+
+    def _plausible_chain(self, off: int, count: int = 8) -> bool:
+        """آیا count هدر متوالی (یا تا انتهای فایل) از این موقعیت معتبر هستند؟"""
+        header = struct.Struct(self._endian + 'IIII')
+        frac_limit = 1000000 if self._ts_scale == 1e-6 else 1000000000
+        caplen_limit = self.snaplen or 262144
+        previous = None
+        for _ in range(count):
+            if off == self.size:
+                return previous is not None
+            if off + 16 > self.size:
+                return False
+            sec, frac, caplen, origlen = header.unpack_from(self._buf, off)
+            if frac >= frac_limit or caplen > caplen_limit or caplen > origlen or origlen > 0x40000:
+                return False
+            if previous is not None and abs(sec - previous) > 86400:
+                return False
+            previous = sec
+            off += 16 + caplen
+        return True
+
+    def _pcapng_tsresol(self, start: int, end: int, endian: str) -> float:
+        """دقت زمانی رابط از گزینه if_tsresol (پیش‌فرض میکروثانیه)"""
+        buf = self._buf
+        while start + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', buf, start)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = buf[start + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            start += 4 + ((length + 3) & ~3)
+        return 1e-6
+
+    def index(self) -> np.ndarray:
+        """فهرست ساختاریافته NumPy از همه رکوردها (بدون رمزگشایی پکت‌ها)"""
+        rows = list(self._walk())
+        index = np.empty(len(rows), dtype=INDEX_DTYPE)
+        if rows:
+            ts, linktype, offset, caplen, origlen = zip(*rows)
+            index['ts'] = ts
+            index['linktype'] = linktype
+            index['offset'] = offset
+            index['caplen'] = caplen
+            index['origlen'] = origlen
+        return index
+
+    def as_array(self) -> np.ndarray:
+        """
+        کل فایل به صورت آرایه uint8 روی همان نگاشت (برای رمزگشایی برداری هدرها با index()).
+        آرایه به نگاشت اشاره دارد و باید پیش از close آزاد شود.
+        """
+        return np.frombuffer(self._buf, dtype=np.uint8)
+
+    def timestamps(self) -> np.ndarray:
+        """زمان همه پکت‌ها به صورت آرایه float64"""
+        return np.fromiter((row[0] for row in self._walk()), dtype=np.float64)
+
+
+def read_packets(path: str) -> Iterator[PacketView]:
+    """پیمایش پکت‌های یک فایل ضبط؛ فایل پس از پایان پیمایش بسته می‌شود"""
+    reader = PcapReader(path)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+
+class PcapWriter:
+    """نویسنده ساده pcap کلاسیک (Ethernet، دقت میکروثانیه)"""
+
+    def __init__(self, target: BinaryIO, linktype: int = LINKTYPE_ETHERNET, snaplen: int = 65535):
+        self._out = target
+        self._record = struct.Struct('<IIII')
+        self._out.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, snaplen, linktype))
+
+    def write(self, ts: float, data: bytes, orig_len: Optional[int] = None):
+        sec = int(ts)
+        usec = int(round((ts - sec) * 1e6))
+        if usec >= 1000000:
+            sec, usec = sec + 1, usec - 1000000
+        self._out.write(self._record.pack(sec, usec, len(data), len(data) if orig_len is None else orig_len))
+        self._out.write(data)
+
+
+def build_tcp_frame(src: str, dst: str, sport: int, dport: int, payload: bytes = b'',
+                    flags: int = TCP_PSH | TCP_ACK, seq: int = 0, ack: int = 0,
+                    options: bytes = b'', ttl: int = 64) -> bytes:
+    """ساخت فریم Ethernet/IPv4/TCP (برای بنچمارک و داده آزمایشی)"""
+    options = options + b'\x00' * (-len(options) % 4)
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq, ack, (5 + len(options) // 4) << 4, flags,
+                      65535, 0, 0) + options
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + len(payload), 0, 0x4000, ttl,
+                     IPPROTO_TCP, 0, socket.inet_aton(src), socket.inet_aton(dst))
+    ether = b'\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02' + _U16.pack(ETHERTYPE_IPV4)
+    return ether + ip + tcp + payload
+
+
+def _synthetic_capture(path: str, packets: int, seed: int = 0):
+    """ساخت فایل ضبط آزمایشی با ترکیبی از ترافیک Stratum و وب"""
+    rng = np.random.default_rng(seed)
+    payloads = [
+        b'{"id":1,"method":"mining.subscribe","params":["cgminer/4.10"]}\n',
+        b'{"id":4,"method":"mining.submit","params":["w1","job","00","5f","1a2b"]}\n',
+        b'GET /index.html HTTP/1.1\r\nHost: example.com\r\n\r\n',
+        bytes(rng.integers(0, 256, 900, dtype=np.uint8)),
+    ]
+    ts = 1700000000.0
+    with open(path, 'wb') as f:
+        writer = PcapWriter(f)
+        for i in range(packets):
+            ts += float(rng.exponential(0.001))
+            kind = int(rng.integers(0, len(payloads)))
+            dport = 3333 if kind < 2 else 443 if kind == 3 else 80
+            writer.write(ts, build_tcp_frame(f"10.0.{(i >> 8) & 255}.{i & 255}", "192.0.2.10",
+                                             40000 + (i % 20000), dport, payloads[kind], seq=i))
+
+
+def benchmark_reader(path: Optional[str] = None, packets: int = 200000,
+                     pyshark_packets: int = 2000) -> Dict[str, Any]:
+    """
+    سنجش توان خواندن (MB/s) در مقایسه با pyshark.
+    pyshark فقط روی pyshark_packets پکت اول اجرا می‌شود تا بنچمارک ساعت‌ها طول نکشد.
+    """
+    cleanup = path is None
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.pcap')
+        os.close(fd)
+        _synthetic_capture(path, packets)
+
+    try:
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        count = tcp = payload_bytes = 0
+        with PcapReader(path) as reader:
+            for packet in reader:
+                count += 1
+                if packet.is_tcp:
+                    tcp += 1
+                    payload_bytes += len(packet.payload)
+        elapsed = time.perf_counter() - start
+        result = {
+            'file_bytes': size,
+            'packets': count,
+            'tcp_packets': tcp,
+            'payload_bytes': payload_bytes,
+            'seconds': elapsed,
+            'mb_per_s': size / 1e6 / elapsed if elapsed else float('inf'),
+            'pyshark_mb_per_s': None
+        }
+
+        try:
+            import pyshark
+        except ImportError:
+            logger.info("pyshark not installed; skipping comparison")
+            return result
+
+        capture = pyshark.FileCapture(path)
+        consumed = 0
+        start = time.perf_counter()
+        try:
+            for i, packet in enumerate(capture):
+                if i >= pyshark_packets:
+                    break
+                consumed += int(packet.length) + 16
+                if hasattr(packet, 'tcp'):
+                    getattr(packet.tcp, 'payload', None)
+        finally:
+            capture.close()
+        pyshark_elapsed = time.perf_counter() - start
+        result['pyshark_mb_per_s'] = consumed / 1e6 / pyshark_elapsed if pyshark_elapsed else None
+        if result['pyshark_mb_per_s']:
+            result['speedup'] = result['mb_per_s'] / result['pyshark_mb_per_s']
+        return result
+    finally:
+        if cleanup:
+            os.unlink(path)
+
+
+def main():
+    """اجرای بنچمارک خواننده pcap"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark the memory-mapped pcap reader")
+    parser.add_argument('pcap', nargs='?', help="capture file (default: synthetic capture)")
+    parser.add_argument('--packets', type=int, default=200000, help="packets in the synthetic capture")
+    args = parser.parse_args()
+
+    result = benchmark_reader(args.pcap, packets=args.packets)
+    logger.info(
+        f"{result['packets']} packets / {result['file_bytes'] / 1e6:.1f} MB in {result['seconds']:.2f}s: "
+        f"{result['mb_per_s']:.1f} MB/s"
+    )
+    if result['pyshark_mb_per_s']:
+        logger.info(f"pyshark: {result['pyshark_mb_per_s']:.2f} MB/s ({result['speedup']:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confidence-ordered Probe Planner with Early Exit
+برنامه‌ریز کاوش پورت‌ها بر اساس نرخ موفقیت تاریخی با توقف زودهنگام
+"""
+
+import hashlib
+import ipaddress
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# کلید تجمیعی برای «همه زیرشبکه‌ها» یا «همه کلاس‌های دستگاه»
+ANY = '*'
+
+
+@dataclass
+class ProbeStep:
+    """یک گام کاوش (اتصال به پورت یا پرس‌وجوی API)"""
+    probe: str
+    port: int
+    gain: float
+    confirm_score: float
+    hit_rate: float
+
+
+@dataclass
+class ProbeSessionStats:
+    """آمار صرفه‌جویی کاوش در یک جلسه اسکن"""
+    session_id: str
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    hosts: int = 0
+    expected_probes: int = 0
+    actual_probes: int = 0
+    early_positive: int = 0
+    early_negative: int = 0
+    ambiguous_hosts: int = 0
+    ambiguous_probes: int = 0
+
+    @property
+    def saved_probes(self) -> int:
+        return self.expected_probes - self.actual_probes
+
+    @property
+    def savings_ratio(self) -> float:
+        if not self.expected_probes:
+            return 0.0
+        return self.saved_probes / self.expected_probes
+
+    @property
+    def ambiguous_budget_share(self) -> float:
+        """سهم بودجه کاوش که صرف میزبان‌های مبهم شده است"""
+        if not self.actual_probes:
+            return 0.0
+        return self.ambiguous_probes / self.actual_probes
+
+    def to_dict(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'hosts': self.hosts,
+            'expected_probes': self.expected_probes,
+            'actual_probes': self.actual_probes,
+            'saved_probes': self.saved_probes,
+            'savings_ratio': self.savings_ratio,
+            'early_positive': self.early_positive,
+            'early_negative': self.early_negative,
+            'ambiguous_hosts': self.ambiguous_hosts,
+            'ambiguous_budget_share': self.ambiguous_budget_share
+        }
+
+
+class HostProbePlan:
+    """
+    ترتیب کاوش یک میزبان به همراه حد بالای امتیاز قابل دستیابی.
+    کاوش زمانی متوقف می‌شود که نتیجه همه آستانه‌ها قطعی شده باشد:
+    امتیاز از آستانه عبور کرده یا حتی با موفقیت همه کاوش‌های باقی‌مانده به آن نمی‌رسد.
+    """
+
+    def __init__(self, planner: 'ProbePlanner', ip: str, steps: List[ProbeStep],
+                 thresholds: Sequence[float], initial_score: float = 0.0,
+                 residual_gain: float = 0.0, device_class: Optional[str] = None):
+        self.planner = planner
+        self.ip = ip
+        self.steps = steps
+        self.thresholds = tuple(sorted(thresholds))
+        self.score = float(initial_score)
+        self.residual_gain = residual_gain
+        self.device_class = device_class
+        self.outcomes: List[Tuple[str, bool]] = []
+        self.decision: Optional[str] = None
+        self._next = 0
+        self._skipped = 0
+        self._finished = False
+
+        self._build_suffix()
+        self._update_decision()
+
+    def _build_suffix(self):
+        """مجموع پسوندی سود و بیشینه امتیاز تأیید برای محاسبه حد بالا در O(1)"""
+        count = len(self.steps)
+        self._suffix_gain = [0.0] * (count + 1)
+        self._suffix_confirm = [0.0] * (count + 1)
+        for i in range(count - 1, -1, -1):
+            self._suffix_gain[i] = self._suffix_gain[i + 1] + self.steps[i].gain
+            self._suffix_confirm[i] = max(self._suffix_confirm[i + 1], self.steps[i].confirm_score)
+
+    def __iter__(self) -> Iterator[ProbeStep]:
+        while self._next < len(self.steps) and self.decision is None:
+            step = self.steps[self._next]
+            self._next += 1
+            yield step
+
+    @property
+    def probes_executed(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def probes_planned(self) -> int:
+        """همه گام‌های برنامه، از جمله گام‌هایی که با ادامه برنامه کنار گذاشته شدند"""
+        return len(self.steps) + self._skipped
+
+    def extend(self, ports: Sequence[int], kind: str,
+               gain_fn: Optional[Callable[[int], Tuple[float, float]]] = None,
+               score: Optional[float] = None):
+        """
+        ادامه همین برنامه با مرحله بعدی کاوش (مثلاً پرس‌وجوی API روی پورت‌های باز) تا هر میزبان
+        یک برنامه و یک رکورد آماری داشته باشد. گام‌های اجرانشده مرحله قبل کنار گذاشته می‌شوند
+        و تصمیم با امتیاز score (در صورت ارسال) از نو گرفته می‌شود.
+        """
+        self._skipped += len(self.steps) - self._next
+        self.steps = self.steps[:self._next] + self.planner.steps(self.ip, ports, kind, gain_fn, self.device_class)
+        if score is not None:
+            self.score = float(score)
+        self.decision = None
+        self._build_suffix()
+        self._update_decision()
+
+    @property
+    def upper_bound(self) -> float:
+        """بیشترین امتیازی که با کاوش‌های باقی‌مانده قابل دستیابی است"""
+        base = max(self.score, self._suffix_confirm[self._next])
+        return base + self._suffix_gain[self._next] + self.residual_gain
+
+    def record(self, step: ProbeStep, hit: bool, score: Optional[float] = None):
+        """
+        ثبت نتیجه یک کاوش؛ در صورت ارسال score، امتیاز مطلق جایگزین می‌شود.
+        confirm_score فقط در حد بالا به کار می‌رود؛ تأیید (مثلاً پاسخ واقعی API) باید با score ثبت شود.
+        """
+        self.outcomes.append((step.probe, bool(hit)))
+        if score is not None:
+            self.score = float(score)
+        elif hit:
+            self.score += step.gain
+        self._update_decision()
+
+    def add_evidence(self, amount: float):
+        """افزودن امتیاز شواهدی که نیاز به کاوش میزبان ندارند"""
+        self.score += amount
+        self._update_decision()
+
+    def _update_decision(self):
+        if self.score >= self.thresholds[-1]:
+            self.decision = 'positive'
+            return
+        if self._next >= len(self.steps):
+            return
+        bound = self.upper_bound
+        if all(self.score >= t or bound < t for t in self.thresholds):
+            self.decision = 'negative'
+
+    def finish(self, device_class: Optional[str] = None):
+        """پایان کاوش میزبان و ثبت نتایج در آمار تاریخی و آمار جلسه"""
+        if self._finished:
+            return
+        self._finished = True
+        self.planner._complete_plan(self, device_class or 'unknown')
+
+
+class ProbePlanner:
+    """
+    برنامه‌ریز کاوش: ترتیب پورت‌ها/APIها را بر اساس نرخ موفقیت تاریخی
+    به تفکیک زیرشبکه و کلاس دستگاه تعیین می‌کند
+    """
+
+    def __init__(self, db_path: str = "ilam_mining.db", subnet_prefix: int = 24,
+                 prior_strength: float = 5.0, default_hit_rate: float = 0.05):
+        self.db_path = db_path
+        self.subnet_prefix = subnet_prefix
+        self.prior_strength = prior_strength
+        self.default_hit_rate = default_hit_rate
+        self.port_priors: Dict[str, float] = {}
+
+        # (subnet, device_class, probe) -> [probes, hits]
+        self.statistics: Dict[Tuple[str, str, str], List[int]] = {}
+        self._pending: Dict[Tuple[str, str, str], List[int]] = {}
+        self.sessions: Dict[str, ProbeSessionStats] = {}
+        self.current_session: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self._init_database()
+        self._load_statistics()
+
+    def _init_database(self):
+        """ایجاد جداول آمار کاوش"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS probe_statistics (
+                    subnet TEXT NOT NULL,
+                    device_class TEXT NOT NULL,
+                    probe TEXT NOT NULL,
+                    probes INTEGER NOT NULL,
+                    hits INTEGER NOT NULL,
+                    updated TEXT NOT NULL,
+                    PRIMARY KEY (subnet, device_class, probe)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS probe_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT,
+                    hosts INTEGER NOT NULL,
+                    expected_probes INTEGER NOT NULL,
+                    actual_probes INTEGER NOT NULL,
+                    early_positive INTEGER NOT NULL,
+                    early_negative INTEGER NOT NULL,
+                    ambiguous_probes INTEGER NOT NULL
+                )
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error initializing probe statistics tables: {e}")
+
+    def _load_statistics(self):
+        """بارگذاری نتایج کاوش ذخیره‌شده و ساخت سطوح تجمیعی"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute(
+                'SELECT subnet, device_class, probe, probes, hits FROM probe_statistics'
+            ).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error loading probe statistics: {e}")
+            return
+
+        for subnet, device_class, probe, probes, hits in rows:
+            self._accumulate(subnet, device_class, probe, probes, hits)
+        logger.info(f"Loaded {len(rows)} probe statistic rows")
+
+    def _accumulate(self, subnet: str, device_class: str, probe: str, probes: int, hits: int):
+        for key in ((subnet, device_class, probe), (subnet, ANY, probe),
+                    (ANY, device_class, probe), (ANY, ANY, probe)):
+            entry = self.statistics.setdefault(key, [0, 0])
+            entry[0] += probes
+            entry[1] += hits
+
+    def subnet_of(self, ip: str) -> str:
+        try:
+            return str(ipaddress.ip_network(f"{ip}/{self.subnet_prefix}", strict=False))
+        except ValueError:
+            return ANY
+
+    def hit_rate(self, subnet: str, device_class: Optional[str], probe: str) -> float:
+        """نرخ موفقیت هموارشده با بازگشت سلسله‌مراتبی به سطوح کلی‌تر"""
+        prior = self.port_priors.get(probe, self.default_hit_rate)
+        cls = device_class or ANY
+        for key in ((subnet, cls, probe), (subnet, ANY, probe), (ANY, cls, probe), (ANY, ANY, probe)):
+            entry = self.statistics.get(key)
+            if entry and entry[0]:
+                prior = (entry[1] + self.prior_strength * prior) / (entry[0] + self.prior_strength)
+                break
+        return prior
+
+    def plan(self, ip: str, ports: Sequence[int], kind: str = 'tcp',
+             gain_fn: Optional[Callable[[int], Tuple[float, float]]] = None,
+             thresholds: Sequence[float] = (70,), device_class: Optional[str] = None,
+             initial_score: float = 0.0, residual_gain: float = 0.0) -> HostProbePlan:
+        """
+        ساخت برنامه کاوش برای یک میزبان.
+        gain_fn برای هر پورت (سود امتیاز، امتیاز تأیید مطلق) را برمی‌گرداند؛ امتیاز تأیید فقط
+        در حد بالا حساب می‌شود و به امتیاز افزوده نمی‌شود.
+        """
+        return HostProbePlan(self, ip, self.steps(ip, ports, kind, gain_fn, device_class), thresholds,
+                             initial_score, residual_gain, device_class)
+
+    def steps(self, ip: str, ports: Sequence[int], kind: str = 'tcp',
+              gain_fn: Optional[Callable[[int], Tuple[float, float]]] = None,
+              device_class: Optional[str] = None) -> List[ProbeStep]:
+        """گام‌های کاوش مرتب بر اساس امید ریاضی امتیاز"""
+        subnet = self.subnet_of(ip)
+        steps = []
+        for port in ports:
+            gain, confirm = gain_fn(port) if gain_fn else (1.0, 0.0)
+            probe = f"{kind}/{port}"
+            steps.append(ProbeStep(
+                probe=probe,
+                port=port,
+                gain=gain,
+                confirm_score=confirm,
+                hit_rate=self.hit_rate(subnet, device_class, probe)
+            ))
+
+        # بیشترین امید ریاضی امتیاز ابتدا کاوش می‌شود
+        steps.sort(key=lambda s: s.hit_rate * max(s.gain, s.confirm_score), reverse=True)
+        return steps
+
+    def start_session(self, label: str = "") -> str:
+        """شروع جلسه جدید برای ثبت صرفه‌جویی کاوش"""
+        session_id = hashlib.md5(f"{datetime.now().isoformat()}{label}".encode()).hexdigest()
+        with self._lock:
+            self.sessions[session_id] = ProbeSessionStats(session_id=session_id, start_time=datetime.now())
+            self.current_session = session_id
+        return session_id
+
+    def _complete_plan(self, plan: HostProbePlan, device_class: str):
+        subnet = self.subnet_of(plan.ip)
+        with self._lock:
+            for probe, hit in plan.outcomes:
+                self._accumulate(subnet, device_class, probe, 1, int(hit))
+                pending = self._pending.setdefault((subnet, device_class, probe), [0, 0])
+                pending[0] += 1
+                pending[1] += int(hit)
+
+            session = self.sessions.get(self.current_session) if self.current_session else None
+            if session is None:
+                return
+            session.hosts += 1
+            session.expected_probes += plan.probes_planned
+            session.actual_probes += plan.probes_executed
+            early = plan.probes_executed < plan.probes_planned
+            if plan.decision == 'positive' and early:
+                session.early_positive += 1
+            elif plan.decision == 'negative' and early:
+                session.early_negative += 1
+            else:
+                session.ambiguous_hosts += 1
+                session.ambiguous_probes += plan.probes_executed
+
+    def end_session(self, session_id: Optional[str] = None) -> Optional[ProbeSessionStats]:
+        """پایان جلسه، ذخیره آمار و گزارش صرفه‌جویی"""
+        with self._lock:
+            session_id = session_id or self.current_session
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.end_time = datetime.now()
+            if self.current_session == session_id:
+                self.current_session = None
+            pending, self._pending = self._pending, {}
+
+        self._persist(session, pending)
+        logger.info(
+            f"Probe session {session_id}: expected {session.expected_probes}, "
+            f"actual {session.actual_probes} ({session.savings_ratio:.1%} saved), "
+            f"{session.ambiguous_budget_share:.1%} of budget on ambiguous hosts"
+        )
+        return session
+
+    def _persist(self, session: ProbeSessionStats, pending: Dict[Tuple[str, str, str], List[int]]):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            now = datetime.now().isoformat()
+            conn.executemany('''
+                INSERT INTO probe_statistics (subnet, device_class, probe, probes, hits, updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(subnet, device_class, probe) DO UPDATE SET
+                    probes = probes + excluded.probes,
+                    hits = hits + excluded.hits,
+                    updated = excluded.updated
+            ''', [(s, c, p, v[0], v[1], now) for (s, c, p), v in pending.items()])
+            conn.execute('''
+                INSERT OR REPLACE INTO probe_sessions
+                (session_id, start_time, end_time, hosts, expected_probes, actual_probes,
+                 early_positive, early_negative, ambiguous_probes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session.session_id, session.start_time.isoformat(),
+                session.end_time.isoformat() if session.end_time else None,
+                session.hosts, session.expected_probes, session.actual_probes,
+                session.early_positive, session.early_negative, session.ambiguous_probes
+            ))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error saving probe statistics: {e}")
+
+
+# Global planner instance
+_probe_planner: Optional[ProbePlanner] = None
+_planner_lock = threading.Lock()
+
+
+def get_probe_planner() -> ProbePlanner:
+    """دریافت instance برنامه‌ریز کاوش"""
+    global _probe_planner
+    with _planner_lock:
+        if _probe_planner is None:
+            _probe_planner = ProbePlanner()
+        return _probe_planner
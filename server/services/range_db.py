@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Packed ISP Range Database
+پایگاه فشرده بازه‌های IP ایران: آرایه‌های uint32 شروع/پایان، جدول رشته‌های ISP/استان/شهر و checksum در یک فایل نسخه‌دار
+"""
+
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .target_set import int_to_ip, ip_to_int
+except ImportError:
+    from target_set import int_to_ip, ip_to_int
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join('data', 'iran_isp_ip_ranges.rdb')
+
+MAGIC = b'IRRANGES'
+VERSION = 1
+# magic، نسخه، تعداد ستون‌ها، تعداد بازه‌ها، تعداد رشته‌ها، طول بایتی رشته‌ها، CRC32 بدنه
+_HEADER = struct.Struct('<8sHHIIII')
+
+# ستون‌های رشته‌ای هر بازه (شناسه در جدول رشته‌ها؛ صفر یعنی خالی)
+FIELDS = ('isp', 'province', 'city', 'date')
+
+
+def is_range_db(path: str) -> bool:
+    """تشخیص فایل از روی magic (برای add_source مصرف‌کننده‌ها)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _range_text(start: int, end: int) -> str:
+    """بازه به صورت CIDR اگر دقیقاً یک شبکه باشد، وگرنه «شروع-پایان»"""
+    networks = list(ipaddress.summarize_address_range(ipaddress.IPv4Address(start), ipaddress.IPv4Address(end)))
+    if len(networks) == 1:
+        return str(networks[0])
+    return f"{int_to_ip(start)}-{int_to_ip(end)}"
+
+
+def _parse_range(item: Any) -> Tuple[int, int, Optional[int], str]:
+    """(شروع، پایان، تعداد، تاریخ) از شیء {start_ip, end_ip, count, date} یا رشته CIDR/«شروع-پایان»/IP"""
+    if isinstance(item, dict):
+        start, end = ip_to_int(item['start_ip'].strip()), ip_to_int(item['end_ip'].strip())
+        count = item.get('count')
+        return start, end, int(count) if count is not None else None, item.get('date') or ''
+    text = str(item).strip()
+    if '/' in text:
+        net = ipaddress.IPv4Network(text, strict=False)
+        return int(net.network_address), int(net.broadcast_address), None, ''
+    if '-' in text:
+        first, last = text.split('-', 1)
+        return ip_to_int(first.strip()), ip_to_int(last.strip()), None, ''
+    value = ip_to_int(text)
+    return value, value, None, ''
+
+
+class RangeDBBuilder:
+    """
+    جمع‌آوری بازه‌ها از خروجی JSON ‏ir_isp_ip_ranges_to_json.py، فایل استانی iran_isp_ip_ranges.json
+    یا ir.csv و نوشتن فایل فشرده. بازه‌ها به ترتیب شروع مرتب و بدون ادغام ذخیره می‌شوند تا خروجی JSON
+    دوباره قابل ساخت باشد.
+    """
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.counts: List[int] = []
+        self.rows: List[Tuple[str, ...]] = []
+        self.sources: List[str] = []
+
+    def add(self, start: int, end: int, count: Optional[int] = None, **attributes):
+        if end < start:
+            start, end = end, start
+        self.starts.append(start)
+        self.ends.append(end)
+        self.counts.append(end - start + 1 if count is None else count)
+        self.rows.append(tuple(str(attributes.get(name) or '') for name in FIELDS))
+
+    def _add_item(self, item: Any, **attributes) -> bool:
+        try:
+            start, end, count, date = _parse_range(item)
+        except (KeyError, ValueError, OSError):
+            return False
+        self.add(start, end, count, date=date, **attributes)
+        return True
+
+    def add_isp_json(self, path: str) -> int:
+        """{ISP: [{start_ip, end_ip, count, date}]} یا {استان: {شهر: {ISP: [بازه‌ها]}}}"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        added = 0
+        for key, value in data.items():
+            if isinstance(value, list):
+                added += sum(self._add_item(item, isp=key) for item in value)
+                continue
+            for city, isps in value.items():
+                for isp, items in isps.items():
+                    added += sum(self._add_item(item, isp=isp, province=key, city=city) for item in items)
+        self.sources.append(path)
+        logger.info(f"📥 {added} ranges from {path}")
+        return added
+
+    def add_ir_csv(self, path: str) -> int:
+        """ir.csv (شروع، پایان، تعداد، تاریخ، ISP)"""
+        added = 0
+        with open(path, encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 5:
+                    continue
+                start, end, count, date, isp = [x.strip() for x in row[:5]]
+                try:
+                    self.add(ip_to_int(start), ip_to_int(end), int(count) if count.isdigit() else None,
+                             isp=isp or 'Unknown', date=date)
+                    added += 1
+                except OSError:
+                    continue
+        self.sources.append(path)
+        logger.info(f"📥 {added} ranges from {path}")
+        return added
+
+    def add_source(self, path: str) -> int:
+        if path.lower().endswith('.json'):
+            return self.add_isp_json(path)
+        return self.add_ir_csv(path)
+
+    def write(self, path: str = DEFAULT_PATH) -> Dict[str, Any]:
+        """نوشتن اتمیک: هدر، شروع‌ها، پایان‌ها، تعدادها، شناسه ستون‌ها، آفست رشته‌ها، رشته‌ها"""
+        started = time.perf_counter()
+        order = np.lexsort((np.array(self.ends, dtype=np.int64), np.array(self.starts, dtype=np.int64)))
+        strings: Dict[str, int] = {'': 0}
+        ids = np.array([[strings.setdefault(value, len(strings)) for value in self.rows[i]] for i in order.tolist()],
+                       dtype='<u4').reshape(len(order), len(FIELDS))
+        encoded = [text.encode('utf-8') for text in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        offsets[1:] = np.cumsum([len(item) for item in encoded])
+        blob = b''.join(encoded)
+        body = b''.join([
+            np.array(self.starts, dtype='<u4')[order].tobytes(),
+            np.array(self.ends, dtype='<u4')[order].tobytes(),
+            np.array(self.counts, dtype='<u4')[order].tobytes(),
+            ids.tobytes(),
+            offsets.tobytes(),
+            blob
+        ])
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(FIELDS), len(order), len(encoded), len(blob),
+                                 zlib.crc32(body)))
+            f.write(body)
+        os.replace(temporary, path)
+
+        summary = {
+            'path': path,
+            'ranges': len(order),
+            'strings': len(encoded),
+            'bytes': os.path.getsize(path),
+            'seconds': time.perf_counter() - started
+        }
+        logger.info(f"📦 Wrote {summary['ranges']} ranges ({summary['bytes']} bytes) -> {path}")
+        return summary
+
+
+class RangeDB:
+    """
+    بارگذار فایل بازه‌ها با mmap؛ آرایه‌ها بدون کپی روی نگاشت فایل ساخته می‌شوند و فقط جدول رشته‌ها
+    (چند هزار نام) رمزگشایی می‌شود. CRC32 بدنه هنگام باز کردن بررسی می‌شود.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, verify: bool = True):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, field_count, count, string_count, blob_length, checksum = \
+                _HEADER.unpack_from(self._map)
+            if magic != MAGIC or version != VERSION or field_count != len(FIELDS):
+                raise ValueError(f"{path} is not a version {VERSION} ISP range database")
+            if verify and zlib.crc32(memoryview(self._map)[_HEADER.size:]) != checksum:
+                raise ValueError(f"{path} failed checksum verification")
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+        offset = _HEADER.size
+        self.starts = np.frombuffer(self._map, dtype='<u4', count=count, offset=offset)
+        offset += 4 * count
+        self.ends = np.frombuffer(self._map, dtype='<u4', count=count, offset=offset)
+        offset += 4 * count
+        self.counts = np.frombuffer(self._map, dtype='<u4', count=count, offset=offset)
+        offset += 4 * count
+        self.ids = np.frombuffer(self._map, dtype='<u4', count=count * field_count,
+                                 offset=offset).reshape(count, field_count)
+        offset += 4 * count * field_count
+        string_offsets = np.frombuffer(self._map, dtype='<u4', count=string_count + 1, offset=offset).tolist()
+        offset += 4 * (string_count + 1)
+        blob = self._map[offset:offset + blob_length]
+        self.strings = [blob[a:b].decode('utf-8') for a, b in zip(string_offsets, string_offsets[1:])]
+        self._string_ids = {text: i for i, text in enumerate(self.strings)}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        بستن فایل و نگاشت. اگر نمایی از column()/starts هنوز نگه داشته شده باشد نگاشت همین‌جا بسته نمی‌شود
+        و با آزاد شدن آخرین نما آزاد می‌شود (close هرگز BufferError نمی‌دهد).
+        """
+        for name in ('starts', 'ends', 'counts', 'ids'):
+            self.__dict__.pop(name, None)
+        if getattr(self, '_map', None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+            self._file = None
+
+    def column(self, name: str) -> np.ndarray:
+        """شناسه‌های رشته یک ستون (نمای بدون کپی روی نگاشت فایل؛ پس از close هم معتبر می‌ماند)"""
+        return self.ids[:, FIELDS.index(name)]
+
+    def select(self, **filters: Optional[str]) -> np.ndarray:
+        """ماسک برداری بازه‌ها با برابری ستون‌ها، مثلاً select(province='Ilam', isp='Shatel')"""
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            wanted = self._string_ids.get(value)
+            if wanted is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.column(name) == wanted
+        return mask
+
+    def records(self, mask: Optional[np.ndarray] = None) -> Iterator[Dict[str, Any]]:
+        """بازه‌ها به صورت dict (start_ip، end_ip، count و ستون‌ها)"""
+        index = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        starts = self.starts[index].tolist()
+        ends = self.ends[index].tolist()
+        counts = self.counts[index].tolist()
+        rows = self.ids[index].tolist()
+        for start, end, count, row in zip(starts, ends, counts, rows):
+            yield {'start': start, 'end': end, 'start_ip': int_to_ip(start), 'end_ip': int_to_ip(end),
+                   'count': count, **{name: self.strings[j] for name, j in zip(FIELDS, row)}}
+
+    def to_isp_json(self) -> Dict[str, List[Dict[str, Any]]]:
+        """قالب خروجی ir_isp_ip_ranges_to_json.py (هر ISP با بازه‌های مرتب بر اساس شروع)"""
+        ranges: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.records():
+            ranges.setdefault(record['isp'], []).append({
+                'start_ip': record['start_ip'],
+                'end_ip': record['end_ip'],
+                'count': record['count'],
+                'date': record['date']
+            })
+        return ranges
+
+    def to_region_json(self) -> Dict[str, Dict[str, Dict[str, List[str]]]]:
+        """قالب iran_isp_ip_ranges.json (استان ← شهر ← ISP ← بازه‌ها) برای بازه‌های دارای استان"""
+        tree: Dict[str, Dict[str, Dict[str, List[str]]]] = {}
+        for record in self.records(self.column('province') != 0):
+            tree.setdefault(record['province'], {}).setdefault(record['city'], {}).setdefault(
+                record['isp'], []).append(_range_text(record['start'], record['end']))
+        return tree
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'ranges': len(self), 'strings': len(self.strings),
+                'bytes': os.path.getsize(self.path),
+                'isps': len(np.unique(self.column('isp'))) if len(self) else 0}
+
+
+_range_db: Optional[RangeDB] = None
+_range_db_checked = False
+_range_db_lock = threading.Lock()
+
+
+def get_range_db(path: Optional[str] = None) -> Optional[RangeDB]:
+    """
+    نمونه مشترک پایگاه بازه‌ها؛ اگر فایل وجود نداشته باشد None برمی‌گردد
+    و مصرف‌کننده به منابع JSON/CSV برمی‌گردد.
+    """
+    global _range_db, _range_db_checked
+    with _range_db_lock:
+        if not _range_db_checked:
+            _range_db_checked = True
+            path = path or os.environ.get('ISP_RANGES_DB', DEFAULT_PATH)
+            if os.path.exists(path):
+                try:
+                    _range_db = RangeDB(path)
+                    logger.info(f"📦 ISP range database loaded: {len(_range_db)} ranges from {path}")
+                except (OSError, ValueError) as e:
+                    logger.error(f"❌ Failed to load ISP range database {path}: {e}")
+        return _range_db
+
+
+# ─── تبدیل و بررسی رفت‌وبرگشت ───────────────────────────────────────────────
+
+def _normalized_isp_json(data: Dict[str, Any]) -> Dict[str, List[Tuple]]:
+    return {isp: sorted((ip_to_int(r['start_ip']), ip_to_int(r['end_ip']), int(r['count']), r.get('date') or '')
+                        for r in ranges)
+            for isp, ranges in data.items() if isinstance(ranges, list)}
+
+
+def _normalized_region_json(data: Dict[str, Any]) -> List[Tuple]:
+    rows = []
+    for province, cities in data.items():
+        if isinstance(cities, list):
+            continue
+        for city, isps in cities.items():
+            for isp, items in isps.items():
+                for item in items:
+                    start, end, _, _ = _parse_range(item)
+                    rows.append((province, city, isp, start, end))
+    return sorted(rows)
+
+
+def verify_round_trip(source: str, db: RangeDB) -> Dict[str, Any]:
+    """
+    مقایسه منبع JSON یا ir.csv با داده بازخوانی‌شده از فایل فشرده (بدون توجه به ترتیب).
+    خروجی شامل تعداد بازه‌ها و نتیجه تطابق است.
+    """
+    if source.lower().endswith('.json'):
+        with open(source, 'r', encoding='utf-8') as f:
+            original = json.load(f)
+        flat = any(isinstance(value, list) for value in original.values())
+        if flat:
+            matches = _normalized_isp_json(original) == _normalized_isp_json(db.to_isp_json())
+        else:
+            matches = _normalized_region_json(original) == _normalized_region_json(db.to_region_json())
+        return {'source': source, 'ranges': len(db), 'matches': matches}
+
+    # ir.csv همان داده‌ای است که ir_isp_ip_ranges_to_json.py به JSON تبدیل می‌کند
+    builder = RangeDBBuilder()
+    builder.add_ir_csv(source)
+    expected: Dict[str, List[Dict[str, Any]]] = {}
+    for start, end, count, row in zip(builder.starts, builder.ends, builder.counts, builder.rows):
+        expected.setdefault(row[0], []).append(
+            {'start_ip': int_to_ip(start), 'end_ip': int_to_ip(end), 'count': count, 'date': row[3]})
+    return {'source': source, 'ranges': len(db),
+            'matches': _normalized_isp_json(expected) == _normalized_isp_json(db.to_isp_json())}
+
+
+def convert(sources: List[str], output: str = DEFAULT_PATH, verify: bool = True) -> Dict[str, Any]:
+    """تبدیل منابع به فایل فشرده و (برای یک منبع) بررسی رفت‌وبرگشت"""
+    builder = RangeDBBuilder()
+    for source in sources:
+        builder.add_source(source)
+    summary = builder.write(output)
+    if verify and len(sources) == 1:
+        with RangeDB(output) as db:
+            summary['round_trip'] = verify_round_trip(sources[0], db)
+        if not summary['round_trip']['matches']:
+            logger.error(f"❌ Round-trip mismatch between {sources[0]} and {output}")
+    return summary
+
+
+def benchmark(ranges: int = 200_000, isps: int = 300, seed: int = 0) -> Dict[str, Any]:
+    """JSON مصنوعی هم‌قالب ir_isp_ip_ranges_to_json.py در برابر فایل فشرده: اندازه، زمان بارگذاری و رفت‌وبرگشت"""
+    import tempfile
+
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.choice(2 ** 24, ranges, replace=False)).astype(np.int64) << 8
+    sizes = rng.integers(1, 16, ranges) * 256
+    ends = np.minimum(starts + sizes - 1, 2 ** 32 - 1)
+    names = [f"ISP {i}" for i in range(isps)]
+    owner = rng.integers(0, isps, ranges).tolist()
+    data: Dict[str, List[Dict[str, Any]]] = {}
+    for start, end, i in zip(starts.tolist(), ends.tolist(), owner):
+        data.setdefault(names[i], []).append({'start_ip': int_to_ip(start), 'end_ip': int_to_ip(end),
+                                              'count': end - start + 1, 'date': '2024-01-01'})
+
+    directory = tempfile.mkdtemp()
+    json_path = os.path.join(directory, 'ranges.json')
+    db_path = os.path.join(directory, 'ranges.rdb')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+    started = time.perf_counter()
+    summary = convert([json_path], db_path)
+    convert_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(json_path, 'r', encoding='utf-8') as f:
+        json.load(f)
+    json_load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    db = RangeDB(db_path)
+    db_load_ms = (time.perf_counter() - started) * 1000
+    db.close()
+    started = time.perf_counter()
+    unverified = RangeDB(db_path, verify=False)
+    unverified_ms = (time.perf_counter() - started) * 1000
+    unverified.close()
+
+    # یک بایت خراب باید با checksum رد شود
+    with open(db_path, 'r+b') as f:
+        f.seek(_HEADER.size + 5)
+        byte = f.read(1)
+        f.seek(_HEADER.size + 5)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    try:
+        RangeDB(db_path).close()
+        corruption_detected = False
+    except ValueError:
+        corruption_detected = True
+
+    result = {
+        'ranges': ranges,
+        'json_bytes': os.path.getsize(json_path),
+        'db_bytes': summary['bytes'],
+        'convert_s': convert_s,
+        'json_load_ms': json_load_ms,
+        'db_load_ms': db_load_ms,
+        'db_load_unverified_ms': unverified_ms,
+        'round_trip_matches': summary['round_trip']['matches'],
+        'corruption_detected': corruption_detected
+    }
+    os.remove(json_path)
+    os.remove(db_path)
+    os.rmdir(directory)
+    return result
+
+
+def main():
+    """تبدیل، بررسی و خروجی گرفتن از فایل فشرده بازه‌ها"""
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Packed ISP IP range database converter")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('convert', help="convert ir.csv / ISP JSON / province JSON into a packed file")
+    build.add_argument('sources', nargs='+')
+    build.add_argument('-o', '--output', default=DEFAULT_PATH)
+    check = sub.add_parser('verify', help="check checksum and round-trip against a JSON or CSV source")
+    check.add_argument('source')
+    check.add_argument('--db', default=DEFAULT_PATH)
+    export = sub.add_parser('export', help="write the ir_isp_ip_ranges_to_json.py or province JSON layout")
+    export.add_argument('output')
+    export.add_argument('--db', default=DEFAULT_PATH)
+    export.add_argument('--regions', action='store_true')
+    sub.add_parser('benchmark', help="compare JSON and packed loading on synthetic ranges")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        print(json.dumps(convert(args.sources, args.output), indent=2, ensure_ascii=False))
+    elif args.command == 'verify':
+        with RangeDB(args.db) as db:
+            print(json.dumps(verify_round_trip(args.source, db), indent=2, ensure_ascii=False))
+    elif args.command == 'export':
+        with RangeDB(args.db) as db:
+            data = db.to_region_json() if args.regions else db.to_isp_json()
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(benchmark(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
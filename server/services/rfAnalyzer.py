@@ -21,9 +21,20 @@ from typing import Dict, List, Tuple, Optional
 import socket
 import struct
 
+try:
+    from .host_fingerprint_cache import get_host_fingerprint_cache
+    from .payload_classifier import get_payload_classifier
+except ImportError:  # executed as a script from server/services
+    from host_fingerprint_cache import get_host_fingerprint_cache
+    from payload_classifier import get_payload_classifier
+
+# Stratum banner keywords shared by all response checks
+STRATUM_RESPONSE_CLASSIFIER = get_payload_classifier({'stratum': ['mining', 'stratum', 'job', 'difficulty']})
+
 class RealRFAnalyzer:
     def __init__(self):
         self.db_path = "rf_analysis.db"
+        self.fingerprints = get_host_fingerprint_cache()
         self.sampling_rate = 2048000  # 2 MHz
         self.center_frequencies = [
             # Common frequencies where mining devices create interference
@@ -342,6 +353,7 @@ class RealRFAnalyzer:
                     ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
                     if ip_match:
                         devices.append({'ip': ip_match.group(1)})
+                        self.fingerprints.put(ip_match.group(1), f'port:{port}', True)
                         
         except:
             # Fallback to manual scan
@@ -355,6 +367,9 @@ class RealRFAnalyzer:
 
     def check_port_open(self, ip: str, port: int, timeout: float = 1.0) -> bool:
         """Check if port is open on given IP"""
+        return self.fingerprints.get_or_probe(ip, f'port:{port}', lambda: self._connect_port(ip, port, timeout))
+
+    def _connect_port(self, ip: str, port: int, timeout: float) -> bool:
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(timeout)
@@ -366,6 +381,9 @@ class RealRFAnalyzer:
 
     def analyze_device_traffic(self, ip: str, port: int) -> Dict:
         """Analyze traffic patterns to determine if device is mining"""
+        return self.fingerprints.get_or_probe(ip, f'stratum:{port}', lambda: self._probe_device_traffic(ip, port))
+
+    def _probe_device_traffic(self, ip: str, port: int) -> Dict:
         try:
             # Connect and analyze traffic
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -382,11 +400,12 @@ class RealRFAnalyzer:
             request_data = json.dumps(mining_request) + '\n'
             sock.send(request_data.encode())
             
-            response = sock.recv(1024).decode()
+            raw_response = sock.recv(1024)
             sock.close()
+            response = raw_response.decode()
             
             # Analyze response for mining patterns
-            if any(pattern in response.lower() for pattern in ['mining', 'stratum', 'job', 'difficulty']):
+            if STRATUM_RESPONSE_CLASSIFIER.scan(raw_response)['stratum']:
                 confidence = 0.9
                 pattern = 'stratum_protocol'
                 
@@ -1,103 +1,25 @@
-import os
 import requests
 import sqlite3
 import json
 from typing import List, Dict, Optional, Any
 
-# لیست تقسیمات کشوری استان ایلام با مختصات هر شهر/بخش (نمونه کامل)
-ILAM_DIVISIONS = {
-    "ایلام": {
-        "مختصات": [33.6386, 46.4227],
-        "شهرستان‌ها": {
-            "ایلام": [
-                {"name": "ایلام", "coords": [33.6386, 46.4227]},
-                {"name": "چوار", "coords": [33.6931, 46.2972]},
-                {"name": "سیوان", "coords": [33.4967, 46.5631]},
-                {"name": "میمه", "coords": [33.7756, 46.1517]}
-            ],
-            "دهلران": [
-                {"name": "دهلران", "coords": [32.6956, 47.2672]},
-                {"name": "موسیان", "coords": [32.4622, 47.2192]},
-                {"name": "پهله", "coords": [32.3822, 47.3772]},
-                {"name": "زرین‌آباد", "coords": [32.7261, 47.4206]}
-            ],
-            "آبدانان": [
-                {"name": "آبدانان", "coords": [32.9931, 47.4192]},
-                {"name": "سراب‌باغ", "coords": [32.8572, 47.6011]},
-                {"name": "مورموری", "coords": [32.7267, 47.6739]}
-            ],
-            "دره‌شهر": [
-                {"name": "دره‌شهر", "coords": [33.1442, 47.3781]},
-                {"name": "ماژین", "coords": [33.0492, 47.5639]},
-                {"name": "بدل‌آباد", "coords": [33.2100, 47.5000]}
-            ],
-            "ملکشاهی": [
-                {"name": "ارکواز", "coords": [33.3881, 46.8281]},
-                {"name": "دلگشا", "coords": [33.3500, 46.9000]}
-            ],
-            "مهران": [
-                {"name": "مهران", "coords": [33.1222, 46.1642]},
-                {"name": "صالح‌آباد", "coords": [33.3833, 46.2333]}
-            ],
-            "چرداول": [
-                {"name": "سرابله", "coords": [33.7631, 46.5631]},
-                {"name": "زنگوان", "coords": [33.8000, 46.6000]},
-                {"name": "شباب", "coords": [33.9000, 46.7000]}
-            ],
-            "ایوان": [
-                {"name": "ایوان", "coords": [33.8272, 46.3092]},
-                {"name": "زرنه", "coords": [33.9000, 46.2000]}
-            ]
-        }
-    }
-}
-
-DIVISIONS_FILE = "ilam_divisions.json"
-IRAN_JSON_PATH = os.path.join(
-    os.path.dirname(__file__),
-    '..', '..', '.config', 'iran', 'iran-1.0.2', 'dist', 'iran.json'
-)
+try:
+    from .ilam_divisions import DIVISIONS_FILE, ILAM_DIVISIONS, read_ilam_divisions
+except ImportError:
+    from ilam_divisions import DIVISIONS_FILE, ILAM_DIVISIONS, read_ilam_divisions
 
 def load_ilam_divisions():
     """
     تلاش برای بارگذاری تقسیمات کشوری استان ایلام از فایل iran.json (آفلاین)، سپس فایل محلی، سپس مقدار پیش‌فرض
     """
     global ILAM_DIVISIONS
-    # تلاش برای بارگذاری از iran.json
-    if os.path.exists(IRAN_JSON_PATH):
-        try:
-            with open(IRAN_JSON_PATH, "r", encoding="utf-8") as f:
-                all_cities = json.load(f)
-            ilam_cities = [c for c in all_cities if c.get("province_name") == "ایلام"]
-            divisions = {"ایلام": {"مختصات": [33.6386, 46.4227], "شهرستان‌ها": {}}}
-            for city in ilam_cities:
-                county = city.get("county_name")
-                city_name = city.get("city_name")
-                district = city.get("district_name")
-                if not county or not city_name:
-                    continue
-                if county not in divisions["ایلام"]["شهرستان‌ها"]:
-                    divisions["ایلام"]["شهرستان‌ها"][county] = []
-                divisions["ایلام"]["شهرستان‌ها"][county].append({
-                    "name": city_name,
-                    "district": district,
-                    "coords": None  # مختصات در این منبع موجود نیست
-                })
-            ILAM_DIVISIONS = divisions
-            print("تقسیمات کشوری استان ایلام از iran.json بارگذاری شد.")
-            return
-        except Exception as e:
-            print(f"خطا در خواندن iran.json: {e}")
-    # تلاش برای بارگذاری از فایل محلی
-    if os.path.exists(DIVISIONS_FILE):
-        try:
-            with open(DIVISIONS_FILE, "r", encoding="utf-8") as f:
-                ILAM_DIVISIONS = json.load(f)
-            print("تقسیمات کشوری از فایل محلی بارگذاری شد.")
-            return
-        except Exception as e:
-            print(f"خطا در خواندن فایل تقسیمات: {e}")
-    print("فایل تقسیمات کشوری محلی یا iran.json یافت نشد. استفاده از مقدار پیش‌فرض.")
+    ILAM_DIVISIONS, source = read_ilam_divisions()
+    if source == 'iran.json':
+        print("تقسیمات کشوری استان ایلام از iran.json بارگذاری شد.")
+    elif source == 'file':
+        print("تقسیمات کشوری از فایل محلی بارگذاری شد.")
+    else:
+        print("فایل تقسیمات کشوری محلی یا iran.json یافت نشد. استفاده از مقدار پیش‌فرض.")
 
 # منابع رسمی جایگزین
 ONLINE_SOURCES = [
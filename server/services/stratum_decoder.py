@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming Stratum v1 Decoder
+رمزگشای جریانی Stratum v1 با بازسازی TCP و تخمین نرخ هش از نرخ share
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TCP_SYN = 0x02
+TCP_FIN = 0x01
+TCP_RST = 0x04
+
+# تعداد هش مورد انتظار برای یک share با سختی ۱ (SHA-256d؛ برای scrypt برابر 2**16)
+DIFF1_HASHES = 2 ** 32
+
+CLIENT_METHODS = {'mining.subscribe', 'mining.authorize', 'mining.submit', 'mining.extranonce.subscribe',
+                  'mining.configure', 'mining.suggest_difficulty', 'login', 'submit'}
+POOL_METHODS = {'mining.notify', 'mining.set_difficulty', 'mining.set_extranonce', 'client.reconnect',
+                'client.show_message', 'mining.set_version_mask', 'job'}
+
+
+@dataclass
+class StratumEvent:
+    """رویداد استخراج‌شده از جلسه Stratum"""
+    ts: float
+    kind: str  # subscribe | authorize | set_difficulty | notify | submit | share_result
+    miner_ip: str
+    pool: str
+    worker: Optional[str] = None
+    difficulty: Optional[float] = None
+    job_id: Optional[str] = None
+    accepted: Optional[bool] = None
+    user_agent: Optional[str] = None
+
+
+class _HalfStream:
+    """بازسازی یک جهت اتصال TCP: تحویل بایت‌های پیوسته و حذف ارسال‌های تکراری"""
+
+    __slots__ = ('next_seq', 'segments', 'pending', 'buffer', 'dead')
+
+    MAX_PENDING = 256 * 1024
+    MAX_LINE = 64 * 1024
+
+    def __init__(self):
+        self.next_seq: Optional[int] = None
+        self.segments: Dict[int, bytes] = {}
+        self.pending = 0
+        self.buffer = bytearray()
+        self.dead = False
+
+    @staticmethod
+    def _delta(seq: int, expected: int) -> int:
+        delta = (seq - expected) & 0xFFFFFFFF
+        return delta - 0x100000000 if delta & 0x80000000 else delta
+
+    def push(self, seq: int, flags: int, payload: bytes) -> bytes:
+        if flags & TCP_SYN:
+            self.next_seq = (seq + 1) & 0xFFFFFFFF
+            seq = self.next_seq
+        if not payload or self.dead:
+            return b''
+        if self.next_seq is None:
+            # اتصال از میانه دیده شده است
+            self.next_seq = seq
+
+        delta = self._delta(seq, self.next_seq)
+        if delta > 0:
+            # بخش خارج از ترتیب؛ تا رسیدن بخش‌های قبلی نگه داشته می‌شود
+            if self.pending + len(payload) <= self.MAX_PENDING and seq not in self.segments:
+                self.segments[seq] = bytes(payload)
+                self.pending += len(payload)
+            return b''
+
+        chunks = []
+        self._append(chunks, delta, payload)
+        while self.segments:
+            ready = [s for s in self.segments if self._delta(s, self.next_seq) <= 0]
+            if not ready:
+                break
+            for s in ready:
+                data = self.segments.pop(s)
+                self.pending -= len(data)
+                self._append(chunks, self._delta(s, self.next_seq), data)
+        return b''.join(chunks)
+
+    def _append(self, chunks: List[bytes], delta: int, payload: bytes):
+        if -delta >= len(payload):
+            return  # ارسال مجدد کامل
+        data = bytes(payload[-delta:]) if delta < 0 else bytes(payload)
+        chunks.append(data)
+        self.next_seq = (self.next_seq + len(data)) & 0xFFFFFFFF
+
+    def lines(self, data: bytes) -> List[bytes]:
+        """خطوط کامل JSON (Stratum با newline جدا می‌شود)"""
+        if not data or self.dead:
+            return []
+        if not self.buffer and data.lstrip()[:1] not in (b'{', b''):
+            # این جهت JSON-RPC نیست؛ دیگر بافر نمی‌شود
+            self.dead = True
+            return []
+        self.buffer += data
+        lines = []
+        start = 0
+        while True:
+            end = self.buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(self.buffer[start:end]).strip()
+            if line:
+                lines.append(line)
+            start = end + 1
+        del self.buffer[:start]
+        if len(self.buffer) > self.MAX_LINE:
+            self.dead = True
+            self.buffer.clear()
+        return lines
+
+
+@dataclass
+class StratumSession:
+    """یک اتصال TCP بین ماینر و استخر"""
+    endpoints: Tuple[Tuple[str, int], Tuple[str, int]]
+    streams: Dict[Tuple[str, int], _HalfStream] = field(default_factory=dict)
+    client: Optional[Tuple[str, int]] = None
+    difficulty: Optional[float] = None
+    worker: Optional[str] = None
+    user_agent: Optional[str] = None
+    jobs: int = 0
+    messages: int = 0
+    pending_submits: Dict[Any, Tuple[str, int]] = field(default_factory=dict)
+    last_seen: float = 0.0
+
+    @property
+    def pool(self) -> Optional[str]:
+        if self.client is None:
+            return None
+        server = self.endpoints[1] if self.endpoints[0] == self.client else self.endpoints[0]
+        return f"{server[0]}:{server[1]}"
+
+
+class HashrateEstimator:
+    """تخمین نرخ هش از مجموع سختی shareها در پنجره لغزان"""
+
+    def __init__(self, window: float = 600.0, diff1_hashes: float = DIFF1_HASHES):
+        self.window = window
+        self.diff1_hashes = diff1_hashes
+        self.shares: Deque[Tuple[float, float]] = deque()
+        self.difficulty_sum = 0.0
+        self.first_seen: Optional[float] = None
+        self.last_share: Optional[float] = None
+
+    def add(self, ts: float, difficulty: float):
+        if self.first_seen is None:
+            self.first_seen = ts
+        self.shares.append((ts, difficulty))
+        self.difficulty_sum += difficulty
+        self.last_share = ts
+        self._trim(ts)
+
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        while self.shares and self.shares[0][0] < cutoff:
+            self.difficulty_sum -= self.shares.popleft()[1]
+
+    def estimate(self, now: Optional[float] = None) -> float:
+        """نرخ هش (هش بر ثانیه)؛ بازه از اولین share دیده‌شده و حداکثر به اندازه پنجره"""
+        if self.first_seen is None:
+            return 0.0
+        now = self.last_share if now is None else now
+        self._trim(now)
+        span = min(self.window, max(now - self.first_seen, 1.0))
+        return self.difficulty_sum * self.diff1_hashes / span
+
+
+class StratumDecoder:
+    """
+    رمزگشای جریانی Stratum v1 روی پکت‌های TCP.
+    رویدادهای set_difficulty، notify و submit استخراج و نرخ هش هر worker
+    از نرخ share × سختی تخمین زده می‌شود؛ سری زمانی دقیقه‌ای در SQLite ذخیره می‌شود.
+    """
+
+    def __init__(self, db_path: str = "ilam_mining.db", window: float = 600.0,
+                 diff1_hashes: float = DIFF1_HASHES, session_timeout: float = 900.0,
+                 max_sessions: int = 50000):
+        self.db_path = db_path
+        self.window = window
+        self.diff1_hashes = diff1_hashes
+        self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+
+        self.sessions: Dict[Tuple, StratumSession] = {}
+        self.estimators: Dict[Tuple[str, str, str], HashrateEstimator] = {}
+        self.miners: Dict[str, Dict[str, Any]] = {}
+        # (miner_ip, worker, pool, minute) -> [shares, difficulty_sum, accepted, rejected]
+        self._buckets: Dict[Tuple[str, str, str, int], List[float]] = {}
+        self._current_minute = 0
+        self._lock = threading.Lock()
+
+        self._init_database()
+
+    def _init_database(self):
+        """ایجاد جدول سری زمانی نرخ هش"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS stratum_hashrate (
+                    miner_ip TEXT NOT NULL,
+                    worker TEXT NOT NULL,
+                    pool TEXT NOT NULL,
+                    minute INTEGER NOT NULL,
+                    shares INTEGER NOT NULL,
+                    difficulty_sum REAL NOT NULL,
+                    accepted INTEGER NOT NULL,
+                    rejected INTEGER NOT NULL,
+                    PRIMARY KEY (miner_ip, worker, pool, minute)
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error initializing stratum tables: {e}")
+
+    @staticmethod
+    def _session_key(src: str, sport: int, dst: str, dport: int) -> Tuple:
+        a, b = (src, sport), (dst, dport)
+        return (a, b) if a <= b else (b, a)
+
+    def feed(self, ts: float, src: str, sport: int, dst: str, dport: int, seq: int,
+             flags: int, payload: bytes) -> List[StratumEvent]:
+        """افزودن یک بخش TCP؛ رویدادهای Stratum کامل‌شده برگردانده می‌شوند"""
+        key = self._session_key(src, sport, dst, dport)
+        session = self.sessions.get(key)
+        if session is None:
+            if not payload and not flags & TCP_SYN:
+                return []
+            if len(self.sessions) >= self.max_sessions:
+                self.expire(ts)
+                if len(self.sessions) >= self.max_sessions:
+                    return []
+            session = self.sessions[key] = StratumSession(endpoints=key)
+        session.last_seen = ts
+
+        sender = (src, sport)
+        stream = session.streams.get(sender)
+        if stream is None:
+            stream = session.streams[sender] = _HalfStream()
+
+        events: List[StratumEvent] = []
+        for line in stream.lines(stream.push(seq, flags, payload)):
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                session.messages += 1
+                events.extend(self._handle(ts, session, sender, message))
+
+        if flags & (TCP_FIN | TCP_RST):
+            # مقدار پایانی سختی و worker در آمار ماینر باقی می‌ماند
+            self.sessions.pop(key, None)
+        return events
+
+    def feed_view(self, view) -> List[StratumEvent]:
+        """افزودن PacketView خواننده pcap یا ضبط BPF"""
+        if not view.is_tcp:
+            return []
+        return self.feed(view.ts, view.src, view.sport, view.dst, view.dport, view.seq,
+                         view.tcp_flags, view.payload or b'')
+
+    def _handle(self, ts: float, session: StratumSession, sender: Tuple[str, int],
+                message: Dict[str, Any]) -> List[StratumEvent]:
+        method = message.get('method')
+        params = message.get('params') or []
+        if not isinstance(params, list):
+            params = [params]
+
+        if method in CLIENT_METHODS and session.client is None:
+            session.client = sender
+        elif method in POOL_METHODS and session.client is None:
+            other = session.endpoints[1] if session.endpoints[0] == sender else session.endpoints[0]
+            session.client = other
+        if session.client is None:
+            return []
+
+        miner_ip, pool = session.client[0], session.pool
+        from_client = sender == session.client
+
+        if from_client and method == 'mining.subscribe':
+            session.user_agent = str(params[0]) if params else None
+            self._touch_miner(miner_ip, pool, ts, user_agent=session.user_agent)
+            return [StratumEvent(ts, 'subscribe', miner_ip, pool, user_agent=session.user_agent)]
+
+        if from_client and method in ('mining.authorize', 'login'):
+            login = params[0] if params else None
+            session.worker = str(login.get('login') if isinstance(login, dict) else login) if login else None
+            self._touch_miner(miner_ip, pool, ts, worker=session.worker)
+            return [StratumEvent(ts, 'authorize', miner_ip, pool, worker=session.worker)]
+
+        if not from_client and method == 'mining.set_difficulty':
+            try:
+                session.difficulty = float(params[0])
+            except (IndexError, TypeError, ValueError):
+                return []
+            return [StratumEvent(ts, 'set_difficulty', miner_ip, pool, worker=session.worker,
+                                 difficulty=session.difficulty)]
+
+        if not from_client and method == 'mining.notify':
+            session.jobs += 1
+            return [StratumEvent(ts, 'notify', miner_ip, pool, worker=session.worker,
+                                 job_id=str(params[0]) if params else None)]
+
+        if from_client and method == 'mining.submit':
+            worker = str(params[0]) if params else (session.worker or '')
+            difficulty = session.difficulty or 1.0
+            job_id = str(params[1]) if len(params) > 1 else None
+            bucket = self._record_share(ts, miner_ip, worker, pool, difficulty)
+            if message.get('id') is not None:
+                session.pending_submits[message['id']] = bucket
+            return [StratumEvent(ts, 'submit', miner_ip, pool, worker=worker, difficulty=difficulty,
+                                 job_id=job_id)]
+
+        if not from_client and method is None and message.get('id') in session.pending_submits:
+            # پاسخ استخر به submit
+            bucket = session.pending_submits.pop(message['id'])
+            accepted = message.get('result') is True and not message.get('error')
+            with self._lock:
+                entry = self._buckets.get(bucket)
+                if entry is not None:
+                    entry[2 if accepted else 3] += 1
+                else:
+                    self._write_buckets({bucket: [0, 0.0, int(accepted), int(not accepted)]})
+            return [StratumEvent(ts, 'share_result', miner_ip, pool, worker=bucket[1], accepted=accepted)]
+
+        return []
+
+    def _touch_miner(self, miner_ip: str, pool: Optional[str], ts: float, **info):
+        miner = self.miners.setdefault(miner_ip, {'pools': set(), 'workers': set(), 'first_seen': ts})
+        miner['last_seen'] = ts
+        if pool:
+            miner['pools'].add(pool)
+        if info.get('worker'):
+            miner['workers'].add(info['worker'])
+        if info.get('user_agent'):
+            miner['user_agent'] = info['user_agent']
+
+    def _record_share(self, ts: float, miner_ip: str, worker: str, pool: str,
+                      difficulty: float) -> Tuple[str, str, str, int]:
+        key = (miner_ip, worker, pool)
+        estimator = self.estimators.get(key)
+        if estimator is None:
+            estimator = self.estimators[key] = HashrateEstimator(self.window, self.diff1_hashes)
+        estimator.add(ts, difficulty)
+        self._touch_miner(miner_ip, pool, ts, worker=worker)
+
+        minute = int(ts // 60)
+        bucket = (miner_ip, worker, pool, minute)
+        with self._lock:
+            entry = self._buckets.get(bucket)
+            if entry is None:
+                entry = self._buckets[bucket] = [0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += difficulty
+            if minute > self._current_minute:
+                self._current_minute = minute
+                # دقیقه‌های بسته‌شده (با یک دقیقه مهلت برای پاسخ‌های دیررس) نوشته می‌شوند
+                closed = {k: v for k, v in self._buckets.items() if k[3] < minute - 1}
+                for k in closed:
+                    del self._buckets[k]
+                if closed:
+                    self._write_buckets(closed)
+        return bucket
+
+    def _write_buckets(self, buckets: Dict[Tuple[str, str, str, int], List[float]]):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT INTO stratum_hashrate (miner_ip, worker, pool, minute, shares, difficulty_sum, accepted, rejected)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(miner_ip, worker, pool, minute) DO UPDATE SET
+                    shares = shares + excluded.shares,
+                    difficulty_sum = difficulty_sum + excluded.difficulty_sum,
+                    accepted = accepted + excluded.accepted,
+                    rejected = rejected + excluded.rejected
+            ''', [(*key, int(v[0]), v[1], int(v[2]), int(v[3])) for key, v in buckets.items()])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error saving stratum hashrate series: {e}")
+
+    def flush(self):
+        """نوشتن همه سطل‌های دقیقه‌ای باقی‌مانده"""
+        with self._lock:
+            buckets, self._buckets = self._buckets, {}
+        if buckets:
+            self._write_buckets(buckets)
+
+    def expire(self, now: float):
+        """حذف جلسه‌های بیکار"""
+        cutoff = now - self.session_timeout
+        for key in [k for k, s in self.sessions.items() if s.last_seen < cutoff]:
+            del self.sessions[key]
+
+    def hashrate(self, miner_ip: str, now: Optional[float] = None) -> Dict[str, float]:
+        """نرخ هش لحظه‌ای هر worker یک ماینر (هش بر ثانیه)"""
+        return {f"{worker}@{pool}": estimator.estimate(now)
+                for (ip, worker, pool), estimator in self.estimators.items() if ip == miner_ip}
+
+    def get_miners(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """خلاصه ماینرهای مشاهده‌شده با نرخ هش اندازه‌گیری‌شده و استخر"""
+        result = []
+        for miner_ip, info in self.miners.items():
+            rates = self.hashrate(miner_ip, now)
+            result.append({
+                'miner_ip': miner_ip,
+                'pools': sorted(info['pools']),
+                'workers': sorted(info['workers']),
+                'user_agent': info.get('user_agent'),
+                'hashrate_hs': sum(rates.values()),
+                'hashrate_by_worker': rates,
+                'first_seen': datetime.fromtimestamp(info['first_seen']).isoformat(),
+                'last_seen': datetime.fromtimestamp(info['last_seen']).isoformat()
+            })
+        return sorted(result, key=lambda m: -m['hashrate_hs'])
+
+    def get_series(self, miner_ip: str, since_minute: int = 0) -> List[Dict[str, Any]]:
+        """سری زمانی دقیقه‌ای ذخیره‌شده یک ماینر"""
+        self.flush()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute('''
+                SELECT worker, pool, minute, shares, difficulty_sum, accepted, rejected
+                FROM stratum_hashrate WHERE miner_ip = ? AND minute >= ? ORDER BY minute
+            ''', (miner_ip, since_minute)).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error loading stratum series: {e}")
+            return []
+        return [{
+            'worker': worker,
+            'pool': pool,
+            'time': datetime.fromtimestamp(minute * 60).isoformat(),
+            'shares': shares,
+            'hashrate_hs': difficulty_sum * self.diff1_hashes / 60.0,
+            'accepted': accepted,
+            'rejected': rejected
+        } for worker, pool, minute, shares, difficulty_sum, accepted, rejected in rows]
+
+
+# Global decoder instance
+_stratum_decoder: Optional[StratumDecoder] = None
+_decoder_lock = threading.Lock()
+
+
+def get_stratum_decoder() -> StratumDecoder:
+    """دریافت instance رمزگشای Stratum"""
+    global _stratum_decoder
+    with _decoder_lock:
+        if _stratum_decoder is None:
+            _stratum_decoder = StratumDecoder()
+        return _stratum_decoder
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Integer-based IPv4 Target Sets
+مجموعه اهداف IPv4 به صورت بازه‌های uint32 با پیمایش تنبل
+"""
+
+import ipaddress
+import logging
+import math
+import socket
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_PACK = struct.Struct('!I')
+
+
+def ip_to_int(ip: str) -> int:
+    """تبدیل آدرس رشته‌ای به عدد صحیح"""
+    return _PACK.unpack(socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value: int) -> str:
+    """تبدیل عدد صحیح به آدرس رشته‌ای (فقط در لبه موتور اسکن)"""
+    return socket.inet_ntoa(_PACK.pack(int(value)))
+
+
+class TargetSet:
+    """
+    مجموعه اهداف IPv4 به صورت بازه‌های مرتب و ادغام‌شده [start, end] از نوع uint32.
+    اندازه در O(1)، دسترسی تصادفی در O(log k) و پیمایش بدون ساخت اشیای IPv4Address.
+    """
+
+    def __init__(self, ranges: Union[np.ndarray, Sequence[Tuple[int, int]]] = ()):
+        ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+        self.ranges = self._merge(ranges)
+        sizes = self.ranges[:, 1].astype(np.int64) - self.ranges[:, 0] + 1
+        # offsets[i] = تعداد آدرس‌های قبل از بازه i
+        self.offsets = np.zeros(len(self.ranges) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+
+    @staticmethod
+    def _merge(ranges: np.ndarray) -> np.ndarray:
+        if not len(ranges):
+            return np.zeros((0, 2), dtype=np.uint32)
+        ranges = ranges[np.argsort(ranges[:, 0], kind='stable')]
+        merged: List[List[int]] = []
+        for start, end in ranges.tolist():
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return np.array(merged, dtype=np.uint32)
+
+    @classmethod
+    def from_networks(cls, networks: Iterable[str], hosts_only: bool = True, strict: bool = False) -> 'TargetSet':
+        """ساخت از CIDRها؛ با hosts_only آدرس شبکه و broadcast کنار گذاشته می‌شوند (مانند hosts())"""
+        ranges = []
+        for network in networks:
+            net = ipaddress.IPv4Network(network, strict=strict)
+            start = int(net.network_address)
+            end = int(net.broadcast_address)
+            if hosts_only and net.prefixlen < 31:
+                start += 1
+                end -= 1
+            ranges.append((start, end))
+        return cls(ranges)
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Tuple[str, str]]) -> 'TargetSet':
+        """ساخت از جفت‌های (آدرس شروع، آدرس پایان)"""
+        return cls([(ip_to_int(start), ip_to_int(end)) for start, end in ranges])
+
+    @classmethod
+    def from_range_db(cls, db, **filters: Optional[str]) -> 'TargetSet':
+        """ساخت مستقیم از آرایه‌های uint32 یک RangeDB با فیلتر ستون‌ها (مثلاً province='Ilam')"""
+        mask = db.select(**filters)
+        return cls(np.column_stack([db.starts[mask], db.ends[mask]]))
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __bool__(self) -> bool:
+        return len(self.ranges) > 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.ranges.nbytes + self.offsets.nbytes
+
+    def __contains__(self, ip: Union[str, int]) -> bool:
+        value = ip_to_int(ip) if isinstance(ip, str) else int(ip)
+        i = int(np.searchsorted(self.ranges[:, 0], value, side='right')) - 1
+        return i >= 0 and value <= int(self.ranges[i, 1])
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("target index out of range")
+        r = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        return int(self.ranges[r, 0]) + index - int(self.offsets[r])
+
+    def at(self, indices: np.ndarray) -> np.ndarray:
+        """نگاشت برداری اندیس‌ها به آدرس‌های uint32"""
+        indices = np.asarray(indices, dtype=np.int64)
+        r = np.searchsorted(self.offsets, indices, side='right') - 1
+        return (self.ranges[r, 0].astype(np.int64) + indices - self.offsets[r]).astype(np.uint32)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.ranges.tolist():
+            yield from range(start, end + 1)
+
+    def addresses(self) -> Iterator[str]:
+        """پیمایش تنبل آدرس‌ها به صورت رشته"""
+        for value in self:
+            yield int_to_ip(value)
+
+    def _permutation(self, seed: Optional[int]) -> Tuple[int, int]:
+        """ضرایب جایگشت آفین i -> (a*i + c) mod n با دوره کامل"""
+        n = len(self)
+        rng = np.random.default_rng(seed)
+        # گام نزدیک به نسبت طلایی n تا اهداف پیاپی در زیرشبکه‌های دور از هم بیفتند
+        a = max(1, int(n * 0.6180339887) | 1)
+        while math.gcd(a, n) != 1:
+            a += 1
+        c = int(rng.integers(0, n)) if n else 0
+        return a % n if n > 1 else 1, c
+
+    def batches(self, size: int = 4096, permuted: bool = False, seed: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        تحویل اهداف به صورت دسته‌های uint32 فشرده.
+        با permuted=True ترتیب، جایگشتی قطعی (بر اساس seed) است که بار را بین زیرشبکه‌ها پخش می‌کند.
+        """
+        n = len(self)
+        if permuted:
+            a, c = self._permutation(seed)
+        for start in range(0, n, size):
+            indices = np.arange(start, min(start + size, n), dtype=np.uint64)
+            if permuted:
+                indices = (indices * np.uint64(a) + np.uint64(c)) % np.uint64(n)
+            yield self.at(indices.astype(np.int64))
+
+    def iter_permuted(self, seed: Optional[int] = None, batch_size: int = 4096) -> Iterator[int]:
+        """پیمایش تنبل به ترتیب جایگشتی"""
+        for batch in self.batches(batch_size, permuted=True, seed=seed):
+            yield from batch.tolist()
+
+
+def _run_timed(fn: Callable[[T], R], item: T, started: List[float]) -> R:
+    started.append(time.monotonic())
+    return fn(item)
+
+
+def iter_bounded(executor: Executor, fn: Callable[[T], R], items: Iterable[T],
+                 window: int, timeout: Optional[float] = None) -> Iterator[Tuple[T, Future]]:
+    """
+    ارسال کار به executor با حداکثر window کار در حال اجرا.
+    جفت‌های (ورودی، future تمام‌شده) به ترتیب اتمام برگردانده می‌شوند،
+    پس تعداد futureهای زنده مستقل از اندازه مجموعه اهداف است.
+    با timeout، کاری که بیش از timeout ثانیه از شروع اجرایش گذشته تمام‌نشده برگردانده و رها می‌شود
+    (future.result(timeout=0) برای آن TimeoutError می‌دهد) تا یک میزبان گیرکرده پیمایش را متوقف نکند.
+    """
+    pending: Set[Future] = set()
+    inputs = {}
+    started = {}
+
+    def collect() -> Iterator[Tuple[T, Future]]:
+        nonlocal pending
+        if timeout is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        else:
+            running = [start[0] for start in (started[f] for f in pending) if start]
+            wait_for = max(0.0, min(running) + timeout - time.monotonic()) if running else timeout
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            overdue = {f for f in pending if started[f] and now - started[f][0] >= timeout}
+            pending -= overdue
+            done |= overdue
+        for future in done:
+            started.pop(future, None)
+            yield inputs.pop(future), future
+
+    for item in items:
+        if timeout is None:
+            future = executor.submit(fn, item)
+        else:
+            start: List[float] = []
+            future = executor.submit(_run_timed, fn, item, start)
+            started[future] = start
+        inputs[future] = item
+        pending.add(future)
+        while len(pending) >= window:
+            yield from collect()
+    while pending:
+        yield from collect()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TLS ClientHello Fingerprinting (JA3 / JA4)
+استخراج اثرانگشت JA3 و JA4 از ClientHello و تطبیق با پایگاه اثرانگشت ماینرها
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TLS_HANDSHAKE = 0x16
+HANDSHAKE_CLIENT_HELLO = 0x01
+
+EXT_SERVER_NAME = 0x0000
+EXT_SUPPORTED_GROUPS = 0x000A
+EXT_EC_POINT_FORMATS = 0x000B
+EXT_SIGNATURE_ALGORITHMS = 0x000D
+EXT_ALPN = 0x0010
+EXT_SUPPORTED_VERSIONS = 0x002B
+
+_JA4_VERSIONS = {0x0304: '13', 0x0303: '12', 0x0302: '11', 0x0301: '10', 0x0300: 's3', 0x0002: 's2'}
+
+# حداکثر اندازه رکورد TLS (2^14) به علاوه هدر
+MAX_RECORD = 16384 + 5
+
+_U16 = struct.Struct('!H')
+
+
+def is_grease(value: int) -> bool:
+    """مقادیر GREASE (RFC 8701) مانند 0x0a0a و 0x1a1a در اثرانگشت نادیده گرفته می‌شوند"""
+    return (value & 0x0F0F) == 0x0A0A and (value >> 8) == (value & 0xFF)
+
+
+@dataclass
+class ClientHello:
+    """فیلدهای ClientHello مورد نیاز برای JA3/JA4 (به ترتیب ارسال، شامل GREASE)"""
+    version: int
+    ciphers: List[int]
+    extensions: List[int]
+    groups: List[int] = field(default_factory=list)
+    point_formats: List[int] = field(default_factory=list)
+    signature_algorithms: List[int] = field(default_factory=list)
+    supported_versions: List[int] = field(default_factory=list)
+    alpn: List[bytes] = field(default_factory=list)
+    sni: Optional[str] = None
+
+
+def _u16_list(data, start: int, length: int) -> List[int]:
+    return [_U16.unpack_from(data, start + i)[0] for i in range(0, length - 1, 2)]
+
+
+def client_hello_length(data) -> Optional[int]:
+    """طول کل رکورد TLS در صورتی که داده با یک ClientHello شروع شود"""
+    if len(data) < 6 or data[0] != TLS_HANDSHAKE or data[1] != 3 or data[5] != HANDSHAKE_CLIENT_HELLO:
+        return None
+    return 5 + _U16.unpack_from(data, 3)[0]
+
+
+def parse_client_hello(data) -> Optional[ClientHello]:
+    """
+    تجزیه ClientHello از ابتدای payload (bytes یا memoryview، بدون کپی).
+    در صورت ناقص یا نامعتبر بودن رکورد None برگردانده می‌شود.
+    """
+    try:
+        record_end = client_hello_length(data)
+        if record_end is None or len(data) < record_end:
+            return None
+        hs_len = int.from_bytes(data[6:9], 'big')
+        end = min(9 + hs_len, record_end)
+        version = _U16.unpack_from(data, 9)[0]
+        pos = 11 + 32
+        pos += 1 + data[pos]                                   # session id
+        cipher_len = _U16.unpack_from(data, pos)[0]
+        ciphers = _u16_list(data, pos + 2, cipher_len)
+        pos += 2 + cipher_len
+        pos += 1 + data[pos]                                   # compression methods
+        hello = ClientHello(version=version, ciphers=ciphers, extensions=[])
+        if pos + 2 > end:
+            return hello
+
+        ext_end = min(pos + 2 + _U16.unpack_from(data, pos)[0], end)
+        pos += 2
+        while pos + 4 <= ext_end:
+            ext_type, ext_len = struct.unpack_from('!HH', data, pos)
+            body = pos + 4
+            pos = body + ext_len
+            if pos > ext_end:
+                return None
+            hello.extensions.append(ext_type)
+            if ext_type == EXT_SERVER_NAME and ext_len >= 5 and data[body + 2] == 0:
+                name_len = _U16.unpack_from(data, body + 3)[0]
+                hello.sni = bytes(data[body + 5:body + 5 + name_len]).decode('ascii', errors='replace')
+            elif ext_type == EXT_SUPPORTED_GROUPS and ext_len >= 2:
+                hello.groups = _u16_list(data, body + 2, _U16.unpack_from(data, body)[0])
+            elif ext_type == EXT_EC_POINT_FORMATS and ext_len >= 1:
+                hello.point_formats = list(data[body + 1:body + 1 + data[body]])
+            elif ext_type == EXT_SIGNATURE_ALGORITHMS and ext_len >= 2:
+                hello.signature_algorithms = _u16_list(data, body + 2, _U16.unpack_from(data, body)[0])
+            elif ext_type == EXT_SUPPORTED_VERSIONS and ext_len >= 1:
+                hello.supported_versions = _u16_list(data, body + 1, data[body])
+            elif ext_type == EXT_ALPN and ext_len >= 2:
+                alpn_end = body + 2 + _U16.unpack_from(data, body)[0]
+                item = body + 2
+                while item < alpn_end:
+                    size = data[item]
+                    hello.alpn.append(bytes(data[item + 1:item + 1 + size]))
+                    item += 1 + size
+        return hello
+    except (IndexError, struct.error):
+        return None
+
+
+def ja3_string(hello: ClientHello) -> str:
+    """رشته JA3: نسخه، رمزها، افزونه‌ها، گروه‌ها و قالب نقاط (بدون GREASE)"""
+    def join(values: List[int]) -> str:
+        return '-'.join(str(v) for v in values if not is_grease(v))
+    return ','.join([str(hello.version), join(hello.ciphers), join(hello.extensions),
+                     join(hello.groups), '-'.join(str(v) for v in hello.point_formats)])
+
+
+def ja3(hello: ClientHello) -> str:
+    return hashlib.md5(ja3_string(hello).encode('ascii')).hexdigest()
+
+
+def _ja4_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('ascii')).hexdigest()[:12] if text else '000000000000'
+
+
+def ja4(hello: ClientHello, transport: str = 't') -> str:
+    """
+    اثرانگشت JA4 (FoxIO):
+    {پروتکل}{نسخه}{d|i}{تعداد رمز}{تعداد افزونه}{ALPN}_{hash رمزهای مرتب}_{hash افزونه‌های مرتب_الگوریتم‌های امضا}
+    """
+    ciphers = [c for c in hello.ciphers if not is_grease(c)]
+    extensions = [e for e in hello.extensions if not is_grease(e)]
+    versions = [v for v in hello.supported_versions if not is_grease(v)]
+    version = _JA4_VERSIONS.get(max(versions) if versions else hello.version, '00')
+    sni = 'd' if EXT_SERVER_NAME in extensions else 'i'
+
+    alpn = '00'
+    if hello.alpn and hello.alpn[0]:
+        first = hello.alpn[0]
+        if chr(first[0]).isalnum() and chr(first[-1]).isalnum() and first[0] < 128 and first[-1] < 128:
+            alpn = chr(first[0]) + chr(first[-1])
+        else:
+            alpn = first.hex()[0] + first.hex()[-1]
+
+    part_a = f"{transport}{version}{sni}{min(len(ciphers), 99):02d}{min(len(extensions), 99):02d}{alpn}"
+    part_b = _ja4_hash(','.join(f"{c:04x}" for c in sorted(ciphers)))
+    ext_text = ','.join(f"{e:04x}" for e in sorted(extensions) if e not in (EXT_SERVER_NAME, EXT_ALPN))
+    signatures = [s for s in hello.signature_algorithms if not is_grease(s)]
+    if ext_text and signatures:
+        ext_text += '_' + ','.join(f"{s:04x}" for s in signatures)
+    return f"{part_a}_{part_b}_{_ja4_hash(ext_text)}"
+
+
+@dataclass
+class TLSFingerprint:
+    """اثرانگشت یک ClientHello"""
+    ts: float
+    src_ip: str
+    src_port: int
+    dst_ip: str
+    dst_port: int
+    ja3: str
+    ja3_string: str
+    ja4: str
+    sni: Optional[str] = None
+    alpn: Optional[str] = None
+    match: Optional[Dict[str, Any]] = None
+
+
+class FingerprintDB:
+    """
+    پایگاه اثرانگشت ماینرها با ایندکس hash روی JA3 و JA4.
+    قالب فایل JSON: فهرستی از {"name", "category", "ja3"?, "ja4"?, "source"?}؛
+    در JA4 می‌توان بخش سوم را '*' گذاشت تا فقط مجموعه رمزها و بخش a تطبیق داده شوند.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.entries: List[Dict[str, Any]] = []
+        self._ja3: Dict[str, Dict[str, Any]] = {}
+        self._ja4: Dict[str, Dict[str, Any]] = {}
+        self._ja4_ab: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            self.load(path)
+        elif path:
+            logger.info(f"TLS fingerprint database {path} not found; starting empty")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self, path: str) -> int:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading TLS fingerprint database {path}: {e}")
+            return 0
+        for entry in data.get('fingerprints', []) if isinstance(data, dict) else data:
+            self.add(**entry)
+        logger.info(f"🔐 Loaded {len(self.entries)} TLS fingerprints from {path}")
+        return len(self.entries)
+
+    def save(self, path: Optional[str] = None):
+        with open(path or self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+
+    def add(self, name: str, category: str = 'miner', ja3: Optional[str] = None,
+            ja4: Optional[str] = None, **extra) -> Dict[str, Any]:
+        entry = {'name': name, 'category': category, 'ja3': ja3, 'ja4': ja4, **extra}
+        self.entries.append(entry)
+        if ja3:
+            self._ja3[ja3.lower()] = entry
+        if ja4:
+            if ja4.endswith('_*'):
+                self._ja4_ab[ja4[:-2]] = entry
+            else:
+                self._ja4[ja4] = entry
+        return entry
+
+    def lookup(self, ja3_hash: Optional[str] = None, ja4_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """تطبیق دقیق JA4، سپس JA3، سپس بخش‌های a و b از JA4"""
+        if ja4_hash and ja4_hash in self._ja4:
+            return {**self._ja4[ja4_hash], 'matched_on': 'ja4'}
+        if ja3_hash and ja3_hash in self._ja3:
+            return {**self._ja3[ja3_hash], 'matched_on': 'ja3'}
+        if ja4_hash and self._ja4_ab:
+            entry = self._ja4_ab.get(ja4_hash.rsplit('_', 1)[0])
+            if entry:
+                return {**entry, 'matched_on': 'ja4_ab'}
+        return None
+
+
+class TLSFingerprinter:
+    """
+    مرحله اثرانگشت TLS روی PacketViewها.
+    مسیر سریع برای هر پکت فقط بررسی سه بایت اول payload است؛ ClientHelloهای چندبخشی
+    در بافر کوچکی به ازای همان جریان تا کامل شدن رکورد جمع می‌شوند.
+    تاریخچه اثرانگشت هر میزبان در حافظه (LRU) و جدول SQLite نگه داشته می‌شود.
+    """
+
+    def __init__(self, db: Optional[FingerprintDB] = None, db_path: str = "ilam_mining.db",
+                 max_pending: int = 10000, pending_timeout: float = 10.0,
+                 max_hosts: int = 100000, history_per_host: int = 32):
+        self.db = db if db is not None else FingerprintDB('tls_fingerprints.json')
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout
+        self.max_hosts = max_hosts
+        self.history_per_host = history_per_host
+
+        # (src, sport, dst, dport) -> [seq بعدی، بافر، زمان شروع، طول رکورد]
+        self._pending: 'OrderedDict[Tuple, list]' = OrderedDict()
+        self.history: 'OrderedDict[str, OrderedDict[str, Dict[str, Any]]]' = OrderedDict()
+        self._dirty: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hellos_parsed = 0
+        self.reassembled = 0
+        self.matches = 0
+
+        self._init_database()
+
+    def _init_database(self):
+        """ایجاد جدول تاریخچه اثرانگشت میزبان‌ها"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tls_fingerprints (
+                    host_ip TEXT NOT NULL,
+                    ja4 TEXT NOT NULL,
+                    ja3 TEXT NOT NULL,
+                    sni TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    count INTEGER NOT NULL,
+                    match_name TEXT,
+                    PRIMARY KEY (host_ip, ja4)
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error initializing TLS fingerprint table: {e}")
+
+    def feed(self, ts: float, src: str, sport: int, dst: str, dport: int, seq: int,
+             payload) -> Optional[TLSFingerprint]:
+        """افزودن payload یک بخش TCP؛ در صورت کامل شدن ClientHello اثرانگشت برگردانده می‌شود"""
+        if not payload:
+            return None
+        key = (src, sport, dst, dport)
+        if self._pending:
+            state = self._pending.get(key)
+            if state is not None:
+                return self._continue(key, state, ts, seq, payload)
+        if payload[0] != TLS_HANDSHAKE or len(payload) < 6 or payload[5] != HANDSHAKE_CLIENT_HELLO:
+            return None
+
+        record_len = client_hello_length(payload)
+        if record_len is None or record_len > MAX_RECORD:
+            return None
+        if len(payload) >= record_len:
+            return self._fingerprint(ts, key, payload)
+
+        # ClientHello در چند بخش TCP (مثلاً با key share پساکوانتومی)
+        if len(self._pending) >= self.max_pending:
+            self._expire(ts)
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+        self._pending[key] = [(seq + len(payload)) & 0xFFFFFFFF, bytearray(payload), ts, record_len]
+        return None
+
+    def feed_view(self, view) -> Optional[TLSFingerprint]:
+        if not view.is_tcp or not view.payload:
+            return None
+        return self.feed(view.ts, view.src, view.sport, view.dst, view.dport, view.seq, view.payload)
+
+    def _continue(self, key: Tuple, state: list, ts: float, seq: int, payload) -> Optional[TLSFingerprint]:
+        next_seq, buffer, started, record_len = state
+        if seq != next_seq:
+            if ((seq - next_seq) & 0xFFFFFFFF) >= 0x80000000:
+                # ارسال مجدد بخش قبلی
+                return None
+            # شکاف در جریان؛ ClientHello قابل بازسازی نیست
+            del self._pending[key]
+            return None
+        buffer += payload
+        state[0] = (seq + len(payload)) & 0xFFFFFFFF
+        if len(buffer) < record_len:
+            if ts - started > self.pending_timeout:
+                del self._pending[key]
+            return None
+        del self._pending[key]
+        self.reassembled += 1
+        return self._fingerprint(ts, key, memoryview(buffer))
+
+    def _expire(self, now: float):
+        cutoff = now - self.pending_timeout
+        for key in [k for k, state in self._pending.items() if state[2] < cutoff]:
+            del self._pending[key]
+
+    def _fingerprint(self, ts: float, key: Tuple, data) -> Optional[TLSFingerprint]:
+        hello = parse_client_hello(data)
+        if hello is None:
+            return None
+        self.hellos_parsed += 1
+        ja3_text = ja3_string(hello)
+        fingerprint = TLSFingerprint(
+            ts=ts, src_ip=key[0], src_port=key[1], dst_ip=key[2], dst_port=key[3],
+            ja3=hashlib.md5(ja3_text.encode('ascii')).hexdigest(),
+            ja3_string=ja3_text,
+            ja4=ja4(hello),
+            sni=hello.sni,
+            alpn=hello.alpn[0].decode('ascii', errors='replace') if hello.alpn else None
+        )
+        fingerprint.match = self.db.lookup(fingerprint.ja3, fingerprint.ja4)
+        if fingerprint.match:
+            self.matches += 1
+            logger.info(f"🔐 {fingerprint.src_ip} TLS fingerprint matches {fingerprint.match['name']} "
+                        f"({fingerprint.match['matched_on']}: {fingerprint.ja4})")
+        self._record(fingerprint)
+        return fingerprint
+
+    def _record(self, fingerprint: TLSFingerprint):
+        host = fingerprint.src_ip
+        with self._lock:
+            entries = self.history.get(host)
+            if entries is None:
+                if len(self.history) >= self.max_hosts:
+                    self.history.popitem(last=False)
+                entries = self.history[host] = OrderedDict()
+            else:
+                self.history.move_to_end(host)
+            entry = entries.get(fingerprint.ja4)
+            if entry is None:
+                if len(entries) >= self.history_per_host:
+                    entries.popitem(last=False)
+                entry = entries[fingerprint.ja4] = {
+                    'ja4': fingerprint.ja4, 'ja3': fingerprint.ja3, 'sni': fingerprint.sni,
+                    'first_seen': fingerprint.ts, 'count': 0,
+                    'match': fingerprint.match['name'] if fingerprint.match else None
+                }
+            else:
+                entries.move_to_end(fingerprint.ja4)
+            entry['count'] += 1
+            entry['last_seen'] = fingerprint.ts
+            entry['sni'] = fingerprint.sni or entry['sni']
+            if fingerprint.match:
+                entry['match'] = fingerprint.match['name']
+
+            dirty = self._dirty.setdefault((host, fingerprint.ja4), {**entry, 'count': 0})
+            dirty['count'] += 1
+            dirty['last_seen'] = fingerprint.ts
+            dirty['sni'] = entry['sni']
+            dirty['match'] = entry['match']
+
+    def flush(self):
+        """نوشتن تغییرات تاریخچه در SQLite (UPSERT)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT INTO tls_fingerprints (host_ip, ja4, ja3, sni, first_seen, last_seen, count, match_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(host_ip, ja4) DO UPDATE SET
+                    sni = COALESCE(excluded.sni, sni),
+                    last_seen = excluded.last_seen,
+                    count = count + excluded.count,
+                    match_name = COALESCE(excluded.match_name, match_name)
+            ''', [(host, ja4_hash, entry['ja3'], entry['sni'],
+                   datetime.fromtimestamp(entry['first_seen']).isoformat(),
+                   datetime.fromtimestamp(entry['last_seen']).isoformat(),
+                   entry['count'], entry['match'])
+                  for (host, ja4_hash), entry in dirty.items()])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error saving TLS fingerprint history: {e}")
+
+    def get_host_history(self, host_ip: str) -> List[Dict[str, Any]]:
+        """تاریخچه اثرانگشت یک میزبان (ذخیره‌شده و حافظه)"""
+        self.flush()
+        try:
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute('''
+                SELECT ja4, ja3, sni, first_seen, last_seen, count, match_name
+                FROM tls_fingerprints WHERE host_ip = ? ORDER BY last_seen DESC
+            ''', (host_ip,)).fetchall()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error reading TLS fingerprint history: {e}")
+            return [dict(entry) for entry in self.history.get(host_ip, {}).values()]
+        return [{
+            'ja4': ja4_hash, 'ja3': ja3_hash, 'sni': sni, 'first_seen': first_seen,
+            'last_seen': last_seen, 'count': count, 'match': match_name
+        } for ja4_hash, ja3_hash, sni, first_seen, last_seen, count, match_name in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'hellos_parsed': self.hellos_parsed,
+            'reassembled': self.reassembled,
+            'matches': self.matches,
+            'pending': len(self._pending),
+            'hosts': len(self.history),
+            'database_entries': len(self.db)
+        }
+
+
+# Global fingerprinter instance
+_tls_fingerprinter: Optional[TLSFingerprinter] = None
+_fingerprinter_lock = threading.Lock()
+
+
+def get_tls_fingerprinter() -> TLSFingerprinter:
+    """دریافت instance مرحله اثرانگشت TLS"""
+    global _tls_fingerprinter
+    with _fingerprinter_lock:
+        if _tls_fingerprinter is None:
+            _tls_fingerprinter = TLSFingerprinter()
+        return _tls_fingerprinter
@@ -10,14 +10,33 @@ import logging
 import json
 import time
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 import pyshark
 import subprocess
 import os
-import re
+from collections import deque
 from scapy.all import *
 
+try:
+    from .pcap_reader import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, PcapFormatError, PcapReader, PacketView
+    from .payload_classifier import get_payload_classifier
+    from .flow_table import FlowRecord, FlowTable
+    from .capture_filter import FilteredCapture, build_bpf_expression
+    from .stratum_decoder import get_stratum_decoder
+    from .pcap_parallel import analyze_pcap_parallel
+    from .capture_ring import CaptureRing
+    from .tls_fingerprint import get_tls_fingerprinter
+except ImportError:
+    from pcap_reader import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, PcapFormatError, PcapReader, PacketView
+    from payload_classifier import get_payload_classifier
+    from flow_table import FlowRecord, FlowTable
+    from capture_filter import FilteredCapture, build_bpf_expression
+    from stratum_decoder import get_stratum_decoder
+    from pcap_parallel import analyze_pcap_parallel
+    from capture_ring import CaptureRing
+    from tls_fingerprint import get_tls_fingerprinter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -36,6 +55,10 @@ class MiningTrafficPattern:
     payload_preview: str
     packet_count: int
     total_bytes: int
+    duration: float = 0.0
+    iat_mean: float = 0.0
+    iat_std: float = 0.0
+    categories: Dict[str, int] = field(default_factory=dict)
 
 class WiresharkMiningAnalyzer:
     """
@@ -97,6 +120,15 @@ class WiresharkMiningAnalyzer:
             ]
         }
         
+        # همه دسته‌ها در یک عبارت منظم ترکیبی؛ هر payload یک بار پیمایش می‌شود
+        self.payload_classifier = get_payload_classifier(self.mining_patterns)
+        
+        # بازسازی جریان TCP و رمزگشایی Stratum برای تخمین هش‌ریت از روی share ها
+        self.stratum_decoder = get_stratum_decoder()
+        
+        # اثرانگشت JA3/JA4 از ClientHello و تطبیق با پایگاه اثرانگشت ماینرها
+        self.tls_fingerprinter = get_tls_fingerprinter()
+        
         self.suspicious_ports = {
             8333, 8332, 18333, 18444,  # Bitcoin
             30303, 8545, 8546,         # Ethereum
@@ -114,6 +146,22 @@ class WiresharkMiningAnalyzer:
             'nordvpn', 'expressvpn', 'surfshark', 'cyberghost',
             'protonvpn', 'private internet access', 'tunnelbear'
         ]
+        
+        # پیشوندهای اختیاری payload که فیلتر کرنل علاوه بر پورت‌ها می‌پذیرد (مثلاً b'{"' برای JSON-RPC)
+        self.capture_payload_prefixes: List[bytes] = []
+        
+        # تجمیع پکت‌ها در جریان‌ها (ثانیه)
+        self.flow_idle_timeout = 60
+        self.flow_active_timeout = 300
+        
+        # ضبط زنده با حافظه ثابت: بافر حلقوی، فایل‌های فشرده چرخشی و شواهد پیرامون جریان‌های مشکوک
+        self.capture_directory = 'captures'
+        self.capture_ring_bytes = 64 * 1024 * 1024
+        self.spill_max_file_bytes = 256 * 1024 * 1024
+        self.spill_max_file_seconds = 3600
+        self.spill_max_files = 48
+        self.evidence_seconds = 30
+        self.max_recent_patterns = 1000
     
     async def start_live_capture(self, interface: str = 'any', duration: int = 3600):
         """
@@ -122,121 +170,262 @@ class WiresharkMiningAnalyzer:
         logger.info(f"🎯 Starting live capture on interface: {interface}")
         
         try:
-            # ایجاد capture با PyShark
+            # همه جریان‌ها در پایگاه داده ذخیره می‌شوند؛ در حافظه فقط الگوهای اخیر نگه داشته می‌شوند
+            patterns = deque(maxlen=self.max_recent_patterns)
+            flows = self._new_flow_table()
+            
+            if FilteredCapture.supported():
+                # فیلتر BPF روی سوکت ضبط؛ فقط پکت‌های کاندید وارد فضای کاربر می‌شوند
+                capture = FilteredCapture(interface, self.suspicious_ports, self.capture_payload_prefixes)
+                ring = self._new_capture_ring(LINKTYPE_ETHERNET)
+                try:
+                    for view in capture.packets(duration):
+                        flow = self._observe_view(flows, view)
+                        ring.add_view(view)
+                        if flow is not None and flow.matched:
+                            ring.flag(view.ts, flow.src_ip, flow.dst_ip, flow.dominant_category,
+                                      ports=[flow.src_port, flow.dst_port])
+                        completed = flows.drain(matched_only=True)
+                        if completed:
+                            patterns.extend(await self._emit_flows(completed))
+                    capture.read_kernel_stats()
+                finally:
+                    capture.close()
+                    ring.close()
+                logger.info(f"📊 BPF capture delivered {capture.delivered_packets} packets, "
+                            f"{capture.kernel_drops} kernel drops")
+                patterns.extend(await self._emit_flows(flows.flush(matched_only=True)))
+                self.stratum_decoder.flush()
+                self.tls_fingerprinter.flush()
+                logger.info(f"📊 Live capture flow stats: {flows.get_stats()}, ring: {ring.get_stats()}")
+                return list(patterns)
+            
+            # ایجاد capture با PyShark؛ همان فیلتر به dumpcap داده می‌شود تا در کرنل اعمال شود.
+            # بایت‌های خام هر پکت به بافر حلقوی می‌روند و خود tshark فایلی نمی‌نویسد
             capture = pyshark.LiveCapture(
                 interface=interface,
-                output_file=f'mining_traffic_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pcap'
+                bpf_filter=build_bpf_expression(self.suspicious_ports, self.capture_payload_prefixes),
+                use_json=True,
+                include_raw=True
             )
+            ring = self._new_capture_ring(LINKTYPE_LINUX_SLL if interface == 'any' else LINKTYPE_ETHERNET)
             
-            # تنظیم فیلترهای ماینینگ
-            mining_filters = [
-                'tcp.port == 8333 or tcp.port == 30303 or tcp.port == 18080',
-                'tcp.port == 3333 or tcp.port == 4028 or tcp.port == 8080',
-                'tcp.port == 9333 or tcp.port == 9999 or tcp.port == 8233',
-                'tcp contains "mining" or tcp contains "bitcoin"',
-                'tcp contains "ethereum" or tcp contains "stratum"',
-                'tcp contains "pool" or tcp contains "worker"'
-            ]
-            
-            patterns = []
             start_time = time.time()
             
-            for packet in capture.sniff_continuously():
-                # بررسی محدودیت زمان
-                if time.time() - start_time > duration:
-                    break
-                
-                # تحلیل پکت
-                pattern = await self._analyze_packet(packet)
-                if pattern:
-                    patterns.append(pattern)
-                    logger.info(f"🎯 Mining pattern detected: {pattern.source_ip} -> {pattern.destination_ip}")
-                
-                # ذخیره هر 100 پکت
-                if len(patterns) % 100 == 0:
-                    await self._save_patterns(patterns[-100:])
-            
-            capture.close()
-            return patterns
+            try:
+                for packet in capture.sniff_continuously():
+                    # بررسی محدودیت زمان
+                    if time.time() - start_time > duration:
+                        break
+                    
+                    # تجمیع پکت در جریان؛ فقط جریان‌های پایان‌یافته یا به‌روزشده ذخیره و گزارش می‌شوند
+                    flow = self._observe_packet(flows, packet)
+                    if hasattr(packet, 'ip'):
+                        ts = float(packet.sniff_timestamp)
+                        ring.add(ts, packet.get_raw_packet(), int(packet.length), packet.ip.src, packet.ip.dst)
+                        if flow is not None and flow.matched:
+                            ring.flag(ts, flow.src_ip, flow.dst_ip, flow.dominant_category,
+                                      ports=[flow.src_port, flow.dst_port])
+                    completed = flows.drain(matched_only=True)
+                    if completed:
+                        patterns.extend(await self._emit_flows(completed))
+            finally:
+                capture.close()
+                ring.close()
+            
+            patterns.extend(await self._emit_flows(flows.flush(matched_only=True)))
+            self.stratum_decoder.flush()
+            self.tls_fingerprinter.flush()
+            logger.info(f"📊 Live capture flow stats: {flows.get_stats()}, ring: {ring.get_stats()}")
+            return list(patterns)
             
         except Exception as e:
             logger.error(f"Error in live capture: {e}")
             return []
     
-    async def analyze_pcap_file(self, pcap_file: str) -> List[MiningTrafficPattern]:
+    async def analyze_pcap_file(self, pcap_file: str, workers: int = 1) -> List[MiningTrafficPattern]:
         """
         تحلیل فایل PCAP
+        با workers غیر از 1 فایل بین چند پردازه تقسیم می‌شود (0 = همه هسته‌ها)؛
+        رمزگشای Stratum در این حالت اجرا نمی‌شود چون به ترتیب کامل هر جریان نیاز دارد.
         """
         logger.info(f"📁 Analyzing PCAP file: {pcap_file}")
         
+        if workers != 1:
+            try:
+                loop = asyncio.get_event_loop()
+                flows, stats = await loop.run_in_executor(
+                    None, analyze_pcap_parallel, pcap_file, self.mining_patterns, self.suspicious_ports,
+                    self.capture_payload_prefixes, self.flow_idle_timeout, self.flow_active_timeout,
+                    workers or None
+                )
+                patterns = [self._flow_to_pattern(flow) for flow in flows]
+                logger.info(f"🎯 Found {len(patterns)} mining flows in {pcap_file} "
+                            f"({stats['packets_seen']} packets, {stats['ranges']} workers)")
+                return patterns
+            except PcapFormatError as e:
+                logger.warning(f"Parallel analysis unavailable, analyzing serially: {e}")
+            except Exception as e:
+                logger.error(f"Error in parallel PCAP analysis: {e}")
+                return []
+        
         try:
-            capture = pyshark.FileCapture(pcap_file)
+            flows = self._new_flow_table()
             patterns = []
+            try:
+                with PcapReader(pcap_file) as reader:
+                    for view in reader:
+                        self._observe_view(flows, view)
+                        # جریان‌های بدون الگو همین‌جا کنار گذاشته می‌شوند
+                        patterns.extend(self._flow_to_pattern(flow) for flow in flows.drain(matched_only=True))
+            except PcapFormatError as e:
+                # فرمت‌های پشتیبانی‌نشده توسط خواننده بومی
+                logger.warning(f"Falling back to pyshark: {e}")
+                capture = pyshark.FileCapture(pcap_file)
+                
+                for packet in capture:
+                    self._observe_packet(flows, packet)
+                    patterns.extend(self._flow_to_pattern(flow) for flow in flows.drain(matched_only=True))
+                
+                capture.close()
             
-            for packet in capture:
-                pattern = await self._analyze_packet(packet)
-                if pattern:
-                    patterns.append(pattern)
-            
-            capture.close()
-            
-            logger.info(f"🎯 Found {len(patterns)} mining patterns in {pcap_file}")
+            patterns.extend(self._flow_to_pattern(flow) for flow in flows.flush(matched_only=True))
+            self.stratum_decoder.flush()
+            self.tls_fingerprinter.flush()
+            logger.info(f"🎯 Found {len(patterns)} mining flows in {pcap_file} "
+                        f"({flows.packets_seen} packets in {flows.flows_created} flows)")
             return patterns
             
         except Exception as e:
             logger.error(f"Error analyzing PCAP file: {e}")
             return []
     
-    async def _analyze_packet(self, packet) -> Optional[MiningTrafficPattern]:
+    def _new_flow_table(self) -> FlowTable:
+        return FlowTable(idle_timeout=self.flow_idle_timeout, active_timeout=self.flow_active_timeout)
+    
+    def _new_capture_ring(self, linktype: int) -> CaptureRing:
+        return CaptureRing(
+            directory=self.capture_directory,
+            ring_bytes=self.capture_ring_bytes,
+            max_file_bytes=self.spill_max_file_bytes,
+            max_file_seconds=self.spill_max_file_seconds,
+            max_files=self.spill_max_files,
+            pre_seconds=self.evidence_seconds,
+            post_seconds=self.evidence_seconds,
+            linktype=linktype
+        )
+    
+    def _observe_view(self, flows: FlowTable, view: PacketView) -> Optional[FlowRecord]:
         """
-        تحلیل پکت برای تشخیص الگوهای ماینینگ
+        افزودن پکت خواننده بومی به جدول جریان‌ها
+        """
+        if not view.is_tcp:
+            return
+        
+        if view.sport not in self.suspicious_ports and view.dport not in self.suspicious_ports:
+            if not (self.capture_payload_prefixes and view.payload
+                    and bytes(view.payload[:8]).startswith(tuple(self.capture_payload_prefixes))):
+                return
+        
+        self.stratum_decoder.feed_view(view)
+        fingerprint = self.tls_fingerprinter.feed_view(view)
+        
+        # طبقه‌بندی مستقیم روی بایت‌ها؛ فقط برای پیش‌نمایش decode می‌شود
+        pattern_type, confidence = self._detect_mining_pattern(view.payload) if view.payload else (None, 0.0)
+        preview = view.payload_text(200) if pattern_type else None
+        if fingerprint is not None and fingerprint.match:
+            pattern_type, confidence = 'tls_fingerprint', 1.0
+            preview = f"JA4 {fingerprint.ja4} ({fingerprint.match['name']})"
+        return flows.update(
+            view.ts, 6, view.src, view.sport, view.dst, view.dport, view.orig_len,
+            tcp_flags=view.tcp_flags,
+            category=pattern_type,
+            confidence=confidence,
+            preview=preview
+        )
+    
+    def _observe_packet(self, flows: FlowTable, packet) -> Optional[FlowRecord]:
+        """
+        افزودن پکت pyshark به جدول جریان‌ها
         """
         try:
             # بررسی لایه‌های پکت
             if not hasattr(packet, 'ip') or not hasattr(packet, 'tcp'):
-                return None
+                return
             
-            source_ip = packet.ip.src
-            dest_ip = packet.ip.dst
             source_port = int(packet.tcp.srcport)
             dest_port = int(packet.tcp.dstport)
             
             # بررسی پورت‌های مشکوک
             if source_port not in self.suspicious_ports and dest_port not in self.suspicious_ports:
-                return None
-            
-            # استخراج payload
-            payload = self._extract_payload(packet)
-            if not payload:
-                return None
+                return
             
             # تشخیص الگوی ماینینگ
-            pattern_type, confidence = self._detect_mining_pattern(payload)
-            if not pattern_type:
-                return None
-            
-            # بررسی VPN/Proxy
-            vpn_detected = self._detect_vpn_proxy(packet)
-            
-            pattern = MiningTrafficPattern(
-                source_ip=source_ip,
-                destination_ip=dest_ip,
-                source_port=source_port,
-                destination_port=dest_port,
-                protocol='TCP',
-                pattern_type=pattern_type,
+            payload = self._extract_payload(packet)
+            pattern_type, confidence = self._detect_mining_pattern(payload) if payload else (None, 0.0)
+            
+            # pyshark payload را به صورت هگز جداشده با ':' می‌دهد؛ seq_raw شماره واقعی (غیرنسبی) است
+            tcp_flags = int(packet.tcp.flags, 16)
+            raw_payload = b''
+            if payload and hasattr(packet.tcp, 'payload'):
+                try:
+                    raw_payload = bytes.fromhex(str(payload).replace(':', ''))
+                except ValueError:
+                    raw_payload = b''
+            seq = int(getattr(packet.tcp, 'seq_raw', None) or packet.tcp.seq)
+            self.stratum_decoder.feed(float(packet.sniff_timestamp), packet.ip.src, source_port,
+                                      packet.ip.dst, dest_port, seq, tcp_flags, raw_payload)
+            fingerprint = self.tls_fingerprinter.feed(float(packet.sniff_timestamp), packet.ip.src, source_port,
+                                                      packet.ip.dst, dest_port, seq, raw_payload)
+            if fingerprint is not None and fingerprint.match:
+                pattern_type, confidence = 'tls_fingerprint', 1.0
+                payload = f"JA4 {fingerprint.ja4} ({fingerprint.match['name']})"
+            
+            return flows.update(
+                float(packet.sniff_timestamp), 6, packet.ip.src, source_port, packet.ip.dst, dest_port,
+                int(packet.length),
+                tcp_flags=tcp_flags,
+                category=pattern_type,
                 confidence=confidence,
-                timestamp=datetime.now(),
-                payload_preview=payload[:200],
-                packet_count=1,
-                total_bytes=len(payload)
+                preview=payload[:200] if pattern_type else None
             )
             
-            return pattern
-            
         except Exception as e:
             logger.error(f"Error analyzing packet: {e}")
-            return None
+    
+    def _flow_to_pattern(self, flow: FlowRecord) -> MiningTrafficPattern:
+        """
+        تبدیل جریان پایان‌یافته به الگوی ترافیک ماینینگ
+        """
+        return MiningTrafficPattern(
+            source_ip=flow.src_ip,
+            destination_ip=flow.dst_ip,
+            source_port=flow.src_port,
+            destination_port=flow.dst_port,
+            protocol='TCP',
+            pattern_type=flow.dominant_category,
+            confidence=flow.max_confidence,
+            timestamp=datetime.fromtimestamp(flow.last_seen) if flow.last_seen == flow.last_seen else datetime.now(),
+            payload_preview=flow.payload_preview,
+            packet_count=flow.packets,
+            total_bytes=flow.bytes,
+            duration=flow.duration if flow.duration == flow.duration else 0.0,
+            iat_mean=flow.iat_mean,
+            iat_std=flow.iat_std,
+            categories=dict(flow.categories)
+        )
+    
+    async def _emit_flows(self, flows: List[FlowRecord]) -> List[MiningTrafficPattern]:
+        """
+        ذخیره و گزارش جریان‌های پایان‌یافته
+        """
+        patterns = [self._flow_to_pattern(flow) for flow in flows]
+        for pattern in patterns:
+            logger.info(f"🎯 Mining flow detected: {pattern.source_ip} -> {pattern.destination_ip} "
+                        f"({pattern.pattern_type}, {pattern.packet_count} packets)")
+        if patterns:
+            await self._save_patterns(patterns)
+        return patterns
     
     def _extract_payload(self, packet) -> Optional[str]:
         """
@@ -259,24 +448,12 @@ class WiresharkMiningAnalyzer:
             logger.error(f"Error extracting payload: {e}")
             return None
     
-    def _detect_mining_pattern(self, payload: str) -> Tuple[Optional[str], float]:
+    def _detect_mining_pattern(self, payload) -> Tuple[Optional[str], float]:
         """
-        تشخیص الگوی ماینینگ در payload
+        تشخیص الگوی ماینینگ در payload (متن یا بایت)
         """
         try:
-            payload_lower = payload.lower()
-            
-            for pattern_type, patterns in self.mining_patterns.items():
-                matches = 0
-                for pattern in patterns:
-                    if re.search(pattern, payload_lower, re.IGNORECASE):
-                        matches += 1
-                
-                if matches > 0:
-                    confidence = min(matches / len(patterns), 1.0)
-                    return pattern_type, confidence
-            
-            return None, 0.0
+            return self.payload_classifier.classify(payload)
             
         except Exception as e:
             logger.error(f"Error detecting mining pattern: {e}")
@@ -326,7 +503,11 @@ class WiresharkMiningAnalyzer:
                         'timestamp': pattern.timestamp.isoformat(),
                         'payload_preview': pattern.payload_preview,
                         'packet_count': pattern.packet_count,
-                        'total_bytes': pattern.total_bytes
+                        'total_bytes': pattern.total_bytes,
+                        'duration': pattern.duration,
+                        'iat_mean': pattern.iat_mean,
+                        'iat_std': pattern.iat_std,
+                        'categories': pattern.categories
                     }
                     await f.write(json.dumps(pattern_data) + '\n')
                     
@@ -340,26 +521,29 @@ class WiresharkMiningAnalyzer:
         logger.info(f"🔍 Analyzing network behavior for: {target_ip}")
         
         try:
-            # فیلتر برای IP هدف
+            # فیلتر BPF برای IP هدف (اعمال در کرنل)
             capture_filter = f'host {target_ip}'
             
             capture = pyshark.LiveCapture(
                 interface='any',
-                display_filter=capture_filter
+                bpf_filter=capture_filter
             )
             
             patterns = []
+            flows = self._new_flow_table()
             start_time = time.time()
             
             for packet in capture.sniff_continuously():
                 if time.time() - start_time > duration:
                     break
                 
-                pattern = await self._analyze_packet(packet)
-                if pattern:
-                    patterns.append(pattern)
+                self._observe_packet(flows, packet)
+                patterns.extend(self._flow_to_pattern(flow) for flow in flows.drain(matched_only=True))
             
             capture.close()
+            patterns.extend(self._flow_to_pattern(flow) for flow in flows.flush(matched_only=True))
+            self.stratum_decoder.flush()
+            self.tls_fingerprinter.flush()
             
             # تحلیل آماری
             analysis = self._analyze_patterns_statistics(patterns)
@@ -379,8 +563,8 @@ class WiresharkMiningAnalyzer:
             return {}
         
         try:
-            # آمار کلی
-            total_packets = len(patterns)
+            # آمار کلی (هر الگو یک جریان تجمیع‌شده است)
+            total_packets = sum(p.packet_count for p in patterns)
             total_bytes = sum(p.total_bytes for p in patterns)
             
             # توزیع الگوها
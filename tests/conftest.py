@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+Test configuration: make the repository root importable
+تنظیمات آزمون‌ها: افزودن ریشه مخزن به مسیر import
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Enrichment client tests against the local mock provider
+آزمون کلاینت غنی‌سازی روی سرویس جعلی محلی: دسته‌بندی، تلاش مجدد، کش و سطل سهمیه
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import replace
+
+from server.services.enrichment_client import (MOCK_KEYS, PROVIDERS, EnrichmentClient, MockProviderServer,
+                                               RangeEnricher, _fast, _mock_record)
+from server.services.geo_cache import GeoCache
+
+IPS = [f'10.0.{i // 250}.{i % 250 + 1}' for i in range(1000)]
+
+
+def expected(provider, ips):
+    return {ip: _mock_record(provider, ip) for ip in ips}
+
+
+def test_batched_results_with_server_errors_then_cache(tmp_path):
+    cache = GeoCache(db_path=os.path.join(tmp_path, 'enrichment.db'))
+    names = ['ip-api', 'ipinfo', 'proxycheck', 'ipstack', 'abuseipdb']
+
+    async def batched():
+        mock = MockProviderServer(failure_rate=0.1)
+        urls = await mock.start()
+        try:
+            async with EnrichmentClient(keys=MOCK_KEYS, providers=_fast(PROVIDERS), base_urls=urls, cache=cache,
+                                        backoff_base=0.01) as client:
+                merged = await client.enrich_many(IPS, names)
+                # یک درخواست دسته‌ای برای ipinfo به اضافه تلاش‌های مجدد
+                assert mock.requests['ipinfo'] - client.counters['ipinfo'].retries == 1
+                return merged
+        finally:
+            await mock.stop()
+
+    async def cached():
+        mock = MockProviderServer()
+        urls = await mock.start()
+        try:
+            async with EnrichmentClient(keys=MOCK_KEYS, providers=_fast(PROVIDERS), base_urls=urls,
+                                        cache=cache) as client:
+                again = await client.enrich_many(IPS, ['ip-api', 'ipinfo', 'proxycheck'])
+                assert not mock.requests, mock.requests
+                return again
+        finally:
+            await mock.stop()
+
+    merged = asyncio.run(batched())
+    for name in names:
+        want = expected(name, IPS)
+        assert {ip: merged[ip].get(name, 'missing') for ip in IPS} == want
+    again = asyncio.run(cached())
+    assert {ip: again[ip]['ip-api'] for ip in IPS} == expected('ip-api', IPS)
+
+
+def test_token_bucket_paces_single_requests():
+    # ۲۰ درخواست تکی با ۱۰ در ثانیه و ظرفیت ۵ حدود ۱.۵ ثانیه طول می‌کشد
+    async def run():
+        mock = MockProviderServer(rate_limit=50)
+        urls = await mock.start()
+        try:
+            providers = {'shodan': replace(PROVIDERS['shodan'], rate=10, burst=5, concurrency=4)}
+            async with EnrichmentClient(keys={'shodan': 'quota-test'}, providers=providers, base_urls=urls,
+                                        use_cache=False) as client:
+                started = time.perf_counter()
+                shodan = await client.enrich('shodan', IPS[:20])
+                return shodan, time.perf_counter() - started
+        finally:
+            await mock.stop()
+
+    shodan, elapsed = asyncio.run(run())
+    assert 1.3 <= elapsed <= 3.0, elapsed
+    assert shodan == expected('shodan', IPS[:20])
+
+
+def test_retry_after_on_429():
+    async def run():
+        mock = MockProviderServer(rate_limit=20)
+        urls = await mock.start()
+        try:
+            providers = {'shodan': replace(PROVIDERS['shodan'], rate=1000, burst=100, concurrency=8)}
+            async with EnrichmentClient(keys={'shodan': 'retry-test'}, providers=providers, base_urls=urls,
+                                        use_cache=False, backoff_base=0.1) as client:
+                shodan = await client.enrich('shodan', IPS[:40])
+                return shodan, mock.rejected, client.counters['shodan'].rate_limited
+        finally:
+            await mock.stop()
+
+    shodan, rejected, rate_limited = asyncio.run(run())
+    assert shodan == expected('shodan', IPS[:40])
+    assert rejected and rate_limited
+
+
+def test_range_enricher_reuses_one_session_across_chunks():
+    # سرور جعلی در نخ جداگانه اجرا می‌شود چون RangeEnricher حلقه رویداد خودش را دارد
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    mock = MockProviderServer()
+    urls = asyncio.run_coroutine_threadsafe(mock.start(), loop).result()
+    try:
+        names = ['proxycheck', 'ipinfo']
+        with RangeEnricher(names, keys=MOCK_KEYS, chunk=100, providers=_fast(PROVIDERS), base_urls=urls,
+                           use_cache=False) as enricher:
+            hosts, sessions = [], set()
+            for ip, results in enricher.hosts('10.2.0.1', '10.2.1.44'):
+                hosts.append((ip, results))
+                sessions.add(id(enricher.client._sessions['ipinfo']))
+            assert len(sessions) == 1
+            assert enricher.client.counters['ipinfo'].requests == 3
+    finally:
+        asyncio.run_coroutine_threadsafe(mock.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    assert [ip for ip, _ in hosts] == [f'10.2.{i // 256}.{i % 256}' for i in range(1, 301)]
+    for ip, (proxycheck, ipinfo) in hosts:
+        assert ipinfo == _mock_record('ipinfo', ip)
+        record = _mock_record('proxycheck', ip)
+        assert proxycheck == ({'status': 'ok', ip: record} if record else {'status': 'ok'})
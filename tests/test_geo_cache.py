@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Shared geolocation cache tests
+آزمون کش مشترک مکان‌یابی: یک رکورد برای همه مکان‌یاب‌ها و flush نتیجه منفی با flush_interval
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from server.services import geo_cache
+from server.services.geo_cache import LOCATION_NAMESPACE, GeoCache
+
+RECORD = {
+    'ip': '5.160.10.20', 'status': 'success', 'latitude': 33.6386, 'longitude': 46.4227,
+    'city': 'Ilam', 'region': 'Ilam', 'country': 'Iran', 'isp': 'TCI', 'accuracy': 'city', 'service': 'ip-api'
+}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = GeoCache(db_path=os.path.join(tmp_path, 'geo.db'))
+    monkeypatch.setattr(geo_cache, '_geo_cache', cache)
+    return cache
+
+
+def test_put_negative_flushes_on_interval(tmp_path):
+    db_path = os.path.join(tmp_path, 'geo.db')
+    cache = GeoCache(db_path=db_path, batch_size=100, flush_interval=0)
+    cache.put_negative(LOCATION_NAMESPACE, '10.0.0.1')
+    assert not cache.get_stats()['pending_writes']
+    assert GeoCache(db_path=db_path).get(LOCATION_NAMESPACE, '10.0.0.1') == (True, None)
+
+
+def test_geolocators_share_one_record(cache, tmp_path, monkeypatch):
+    from server.services.geoip_lookup import GeoIPLookup
+    from server.services.geolocator import GeolocatorService, IPGeolocator
+
+    monkeypatch.chdir(tmp_path)
+    cache.put(LOCATION_NAMESPACE, RECORD['ip'], RECORD)
+
+    located = IPGeolocator().geolocate_ip(RECORD['ip'])
+    assert (located['latitude'], located['longitude']) == (33.6386, 46.4227)
+    assert located['in_ilam']
+    assert cache.get(LOCATION_NAMESPACE, RECORD['ip']) == (True, RECORD)
+
+    lookup = GeoIPLookup()
+    monkeypatch.setattr(lookup, '_query_online', lambda ips: pytest.fail('online lookup on a cached IP'))
+    results = lookup.lookup(RECORD['ip'])
+    assert results['ip-api']['lat'] == 33.6386 and results['ip-api']['city'] == 'Ilam'
+
+    location = asyncio.run(GeolocatorService().get_location(RECORD['ip']))
+    assert (location['latitude'], location['longitude']) == (33.6386, 46.4227)
+
+
+def test_legacy_json_cache_migrates_to_shared_record(cache, tmp_path, monkeypatch):
+    from server.services.geoip_lookup import GeoIPLookup
+
+    monkeypatch.chdir(tmp_path)
+    legacy = {
+        RECORD['ip']: {'ip-api': {'lat': 33.6386, 'lon': 46.4227, 'city': 'Ilam', 'region': 'Ilam',
+                                  'country': 'Iran', 'isp': 'TCI'}},
+        '10.0.0.1': {}
+    }
+    (tmp_path / 'geoip_cache.json').write_text(json.dumps(legacy), encoding='utf-8')
+    GeoIPLookup()
+    hit, record = cache.get(LOCATION_NAMESPACE, RECORD['ip'])
+    assert hit and (record['latitude'], record['service']) == (33.6386, 'ip-api')
+    assert cache.get(LOCATION_NAMESPACE, '10.0.0.1') == (False, None)
+
+
+class FixedOffline:
+    """موتور آفلاین با یک نتیجه ثابت"""
+
+    def __init__(self, location):
+        self.location = location
+
+    def lookup(self, ip):
+        return dict(self.location, ip=ip)
+
+
+def test_lookup_returns_same_shape_on_miss_and_hit(cache, tmp_path, monkeypatch):
+    from server.services.geoip_lookup import GeoIPLookup
+
+    monkeypatch.chdir(tmp_path)
+    lookup = GeoIPLookup()
+    lookup.offline = None
+    online = {'ip-api': {'lat': 33.6386, 'lon': 46.4227, 'city': 'Ilam', 'region': 'Ilam',
+                         'country': 'Iran', 'isp': 'TCI'},
+              'ipapi': {'lat': 33.6, 'lon': 46.4, 'city': 'Ilam', 'region': None, 'country': 'Iran', 'isp': None}}
+    monkeypatch.setattr(lookup, '_query_online', lambda ips: {ip: online for ip in ips})
+    miss = lookup.lookup(RECORD['ip'])
+    monkeypatch.setattr(lookup, '_query_online', lambda ips: pytest.fail('online lookup on a cached IP'))
+    assert list(miss) == ['ip-api'] and lookup.lookup(RECORD['ip']) == miss
+
+
+def test_offline_result_is_cached_with_its_service(cache, tmp_path, monkeypatch):
+    from server.services.geoip_lookup import GeoIPLookup
+
+    monkeypatch.chdir(tmp_path)
+    lookup = GeoIPLookup()
+    location = {key: RECORD[key] for key in ('status', 'latitude', 'longitude', 'city', 'region', 'country', 'isp')}
+    lookup.offline = FixedOffline(location)
+    miss = lookup.lookup(RECORD['ip'])
+    assert cache.get(LOCATION_NAMESPACE, RECORD['ip'])[1]['service'] == 'offline'
+    lookup.offline = None
+    assert list(miss) == ['offline'] and lookup.lookup(RECORD['ip']) == miss
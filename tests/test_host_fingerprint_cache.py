@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Host fingerprint cache tests
+آزمون کش اثر انگشت: قطع کاوش رهبر (مثلاً با Ctrl+C) پیروها را آزاد می‌کند و کلید را در جریان باقی نمی‌گذارد
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server.services.host_fingerprint_cache import HostFingerprintCache
+
+
+def test_interrupted_probe_releases_followers():
+    cache = HostFingerprintCache()
+    errors = []
+
+    def interrupted():
+        # منتظر ماندن تا پیرو به همان کاوش در جریان بپیوندد
+        deadline = time.monotonic() + 5
+        while not cache.get_stats()['by_kind'].get('banner', {}).get('coalesced') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        raise KeyboardInterrupt
+
+    def follow():
+        try:
+            cache.get_or_probe('10.0.0.1', 'banner', lambda: 'unused')
+        except BaseException as e:
+            errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(cache.get_or_probe, '10.0.0.1', 'banner', interrupted)
+        follower = threading.Thread(target=follow, daemon=True)
+        follower.start()
+        with pytest.raises(KeyboardInterrupt):
+            leader.result(timeout=5)
+        follower.join(5)
+    assert not follower.is_alive()
+    assert [type(e) for e in errors] == [KeyboardInterrupt]
+    assert cache.get_stats()['inflight'] == 0
+    assert cache.get_or_probe('10.0.0.1', 'banner', lambda: 'SSH-2.0') == 'SSH-2.0'
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Ilam divisions loader tests
+آزمون بارگذار تقسیمات کشوری: iran.json بدون مختصات نباید آبادی‌ها را حذف کند
+"""
+
+import json
+
+from server.services.ilam_divisions import ILAM_DIVISIONS, ilam_settlements, read_ilam_divisions
+
+
+def write_iran_json(path):
+    cities = [
+        {"province_name": "ایلام", "county_name": "ایلام", "city_name": "ایلام", "district_name": "مرکزی"},
+        {"province_name": "ایلام", "county_name": "مهران", "city_name": "نامشخص", "district_name": None},
+        {"province_name": "کرمانشاه", "county_name": "کرمانشاه", "city_name": "کرمانشاه"},
+    ]
+    path.write_text(json.dumps(cities, ensure_ascii=False), encoding='utf-8')
+
+
+def test_iran_json_places_take_builtin_coords(tmp_path):
+    iran_json = tmp_path / 'iran.json'
+    write_iran_json(iran_json)
+    divisions, source = read_ilam_divisions(str(iran_json), str(tmp_path / 'missing.json'))
+    assert source == 'iran.json'
+    counties = divisions['ایلام']['شهرستان‌ها']
+    assert set(counties) == {'ایلام', 'مهران'}
+    assert counties['ایلام'][0]['coords'] == [33.6386, 46.4227]
+    assert counties['مهران'][0]['coords'] is None
+
+
+def test_settlements_keep_builtin_places(tmp_path):
+    iran_json = tmp_path / 'iran.json'
+    write_iran_json(iran_json)
+    divisions, _ = read_ilam_divisions(str(iran_json), str(tmp_path / 'missing.json'))
+    settlements = ilam_settlements(divisions)
+    builtin = sum(len(places) for places in ILAM_DIVISIONS['ایلام']['شهرستان‌ها'].values())
+    assert len(settlements) == builtin
+    assert ('مهران', 'مهران', 33.1222, 46.1642) in settlements
+
+
+def test_missing_sources_fall_back_to_builtin(tmp_path):
+    divisions, source = read_ilam_divisions(str(tmp_path / 'iran.json'), str(tmp_path / 'missing.json'))
+    assert source == 'builtin'
+    assert divisions is ILAM_DIVISIONS
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+IP classifier tests
+آزمون طبقه‌بندی IP: طولانی‌ترین پیشوند، ترکیب ستون‌ها از منابع مختلف و توقف جستجو وقتی ستونی قابل پر شدن نیست
+"""
+
+import json
+
+import numpy as np
+
+from server.services.geoip_offline import ips_to_array
+from server.services.ip_classifier import IPClassifier, _brute_longest_prefix
+
+IR_CSV = """5.160.0.0,5.160.255.255,65536,2024-01-01,Asiatech
+5.160.10.0,5.160.10.255,256,2024-01-01,Shatel
+2.176.0.0,2.191.255.255,1048576,2024-01-01,Mobile Communication Company of Iran PLC
+2.180.4.0,2.180.4.127,128,2024-01-01,Example Net
+"""
+
+IPS = ['5.160.10.20', '5.160.99.1', '2.180.4.5', '2.181.0.1', '8.8.8.8']
+
+
+class CountingDict(dict):
+    """شمارش طول‌های پیشوندی که جستجو می‌کند"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+def csv_classifier(tmp_path):
+    path = tmp_path / 'ir.csv'
+    path.write_text(IR_CSV, encoding='utf-8')
+    classifier = IPClassifier()
+    classifier.add_cellular()
+    classifier.add_ir_csv(str(path))
+    return classifier.compile()
+
+
+def test_csv_only_stops_at_longest_isp_match(tmp_path):
+    classifier = csv_classifier(tmp_path)
+    classifier._networks = CountingDict(classifier._networks)
+    batch = classifier.classify_many(['5.160.10.20'])
+    # /24 شاتل اولین و تنها طول جستجوشده است؛ استان و شهر در هیچ منبعی نیستند
+    assert classifier._networks.lookups == classifier.lengths.index(24) + 1
+    assert batch.to_dicts()['5.160.10.20']['isp'] == 'Shatel'
+
+
+def test_bulk_matches_single_and_brute_force(tmp_path):
+    classifier = csv_classifier(tmp_path)
+    batch = classifier.classify_many(IPS).to_dicts()
+    assert batch == {ip: classifier.classify(ip) for ip in IPS}
+    values, _ = ips_to_array(IPS)
+    assert np.array_equal(classifier.classify_many(IPS).prefix_length.astype(int),
+                          _brute_longest_prefix(classifier, values))
+    assert batch['8.8.8.8'] is None
+    assert (batch['5.160.99.1']['isp'], batch['5.160.99.1']['operator']) == ('Asiatech', 'asiatech')
+    # اپراتور بازه همراه نباید با نوع اپراتور ISP نام‌دار ناسازگار ترکیب شود
+    assert (batch['2.180.4.5']['operator'], batch['2.180.4.5']['operator_type']) == (None, 'fixed')
+    assert (batch['2.181.0.1']['operator'], batch['2.181.0.1']['operator_type']) == ('hamrah_avval', 'cellular')
+
+
+def test_province_from_shorter_json_prefix(tmp_path):
+    classifier = csv_classifier(tmp_path)
+    regions = {'Ilam': {'Ilam': {'Asiatech': ['5.160.0.0/16']}}}
+    path = tmp_path / 'iran_isp_ip_ranges.json'
+    path.write_text(json.dumps(regions), encoding='utf-8')
+    classifier.add_isp_json(str(path))
+    result = classifier.compile().classify_many(['5.160.10.20']).to_dicts()['5.160.10.20']
+    assert (result['isp'], result['province'], result['city'], result['prefix_length']) == \
+        ('Shatel', 'Ilam', 'Ilam', 24)
+    assert result == classifier.classify('5.160.10.20')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+NetFlow collector tests with the bundled flow generator
+آزمون گردآورنده NetFlow با جریان‌های مصنوعی: رمزگشایی v5/v9/IPFIX و مجموعه ماینرهای تشخیص‌داده‌شده
+"""
+
+import numpy as np
+import pytest
+
+from server.services.netflow_collector import (FlowDecoder, HostFeatureWindow, MinerFlowScorer, NetFlowCollector,
+                                               encode_flows, generate_flows, train_on_generated)
+
+
+@pytest.fixture(scope='module')
+def generated():
+    return generate_flows(50000, hosts=500, miners=8, seed=3)
+
+
+@pytest.mark.parametrize('version', [5, 9, 10])
+def test_decoded_flows_detect_generated_miners(generated, version):
+    datagrams = encode_flows(generated.flows, version)
+    decoder = FlowDecoder()
+    decoded = np.concatenate([decoder.decode(datagram) for datagram in datagrams])
+    assert len(decoded) == len(generated.flows)
+    for name in ('src', 'dst', 'sport', 'dport', 'proto', 'bytes', 'packets'):
+        assert np.array_equal(decoded[name], generated.flows[name]), name
+    assert np.allclose(decoded['first'], generated.flows['first'], atol=1e-3)
+
+    collector = NetFlowCollector(scorer=MinerFlowScorer(use_model=False), local_networks=['10.0.0.0/8'])
+    for datagram in datagrams:
+        collector.receive(datagram, ('192.0.2.1', 2055))
+    collector.batcher.flush()
+    assert collector.decoder.stats['flows'] == len(generated.flows)
+    detected = {host.host for host in collector.evaluate() if host.is_mining}
+    assert detected == set(generated.miners)
+
+
+class HardwareModel:
+    """مدل آموزش‌دیده روی ستون‌های سخت‌افزاری که نباید روی جریان‌ها اجرا شود"""
+    feature_columns = ['cpu_usage', 'gpu_usage', 'network_upload', 'connection_count']
+
+    def predict_batch(self, features):
+        raise AssertionError("hardware model used on flow data")
+
+
+class FlowModel:
+    feature_columns = ['connection_count', 'mining_port_count']
+
+    def predict_batch(self, features):
+        return features[:, 1] > 0, features[:, 1].astype(float)
+
+
+def test_hardware_model_falls_back_to_flow_heuristic(generated):
+    assert MinerFlowScorer(classifier=HardwareModel()).classifier is None
+    scorer = MinerFlowScorer(classifier=FlowModel())
+    assert scorer.classifier is not None
+    collector = NetFlowCollector(scorer=scorer, local_networks=['10.0.0.0/8'])
+    for datagram in encode_flows(generated.flows, 9):
+        collector.receive(datagram)
+    collector.batcher.flush()
+    detected = {host.host for host in collector.evaluate() if host.is_mining}
+    assert detected == set(generated.miners)
+
+
+def test_flow_features_cover_flow_columns(generated):
+    window = HostFeatureWindow(local_networks=['10.0.0.0/8'])
+    window.add(generated.flows)
+    hosts, columns = window.compute()
+    features = MinerFlowScorer.flow_features(columns, window.window_seconds)
+    assert tuple(features) == MinerFlowScorer.FLOW_FEATURES
+    assert all(len(values) == len(hosts) for values in features.values())
+
+
+def test_trained_flow_model_detects_generated_miners(generated, tmp_path):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('pandas')
+    model_path = str(tmp_path / 'miner_flow_classifier.joblib')
+    train_on_generated(100000, model_path, seed=1)
+    scorer = MinerFlowScorer(model_path=model_path)
+    assert scorer.classifier is not None
+    collector = NetFlowCollector(scorer=scorer, local_networks=['10.0.0.0/8'])
+    for datagram in encode_flows(generated.flows, 10):
+        collector.receive(datagram)
+    detected = {host.host for host in collector.evaluate() if host.is_mining}
+    assert detected == set(generated.miners)
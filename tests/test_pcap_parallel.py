@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel pcap analysis tests
+آزمون تحلیل موازی: جریان دارای الگو که در بازه بعد با FIN یا بیکاری تمام می‌شود همان شمارش اجرای تک‌پردازه را دارد
+"""
+
+from server.services.pcap_parallel import analyze_pcap_parallel
+from server.services.pcap_reader import TCP_ACK, TCP_FIN, PcapReader, PcapWriter, build_tcp_frame
+
+PATTERNS = {'stratum': [r'mining\.submit', r'mining\.notify']}
+PORTS = {3333}
+SUBMIT = b'{"id":4,"method":"mining.submit","params":["wallet.rig1","6b2f"]}\n'
+NOTIFY = b'{"id":null,"method":"mining.notify","params":["6b2f"]}\n'
+
+
+def filler(ts, i):
+    # ترافیک پورت معمولی که تحلیلگر رد می‌کند و فقط مرز بازه‌ها را جابه‌جا می‌کند
+    return ts, build_tcp_frame(f'10.1.0.{i % 250 + 1}', '198.51.100.200', 20000 + i, 443, b'x' * 400)
+
+
+def write_capture(path):
+    fin_client, fin_server = ('10.0.0.1', 40000), ('198.51.100.1', 3333)
+    idle_client, idle_server = ('10.0.0.2', 40001), ('198.51.100.2', 3333)
+
+    def frame(src, dst, payload=b'', flags=TCP_ACK):
+        return build_tcp_frame(src[0], dst[0], src[1], dst[1], payload, flags=flags)
+
+    packets = [
+        (0.0, frame(fin_client, fin_server, SUBMIT)),
+        (0.5, frame(idle_client, idle_server, SUBMIT)),
+        (1.0, frame(fin_server, fin_client, NOTIFY)),
+        (1.5, frame(idle_server, idle_client, NOTIFY)),
+    ]
+    packets += [filler(2.0 + i, i) for i in range(40)]
+    # ادامه هر دو جریان بدون payload ماینینگ، پس از مرز بازه‌ها
+    packets += [
+        (42.0, frame(fin_client, fin_server)),
+        (42.5, frame(idle_client, idle_server)),
+        (43.0, frame(fin_server, fin_client)),
+        (44.0, frame(fin_client, fin_server, flags=TCP_FIN | TCP_ACK)),
+        (45.0, frame(fin_server, fin_client, flags=TCP_FIN | TCP_ACK)),
+    ]
+    # جریان‌های دیرتر روی پورت استراتوم مهلت بیکاری جریان دوم را فعال می‌کنند
+    packets += [(200.0 + i, build_tcp_frame('10.0.0.9', '198.51.100.9', 41000 + i, 3333, b'ping'))
+                for i in range(10)]
+
+    with open(path, 'wb') as f:
+        writer = PcapWriter(f)
+        for ts, data in packets:
+            writer.write(1700000000.0 + ts, data)
+
+
+def test_matched_flow_ending_in_next_range(tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    write_capture(path)
+    with PcapReader(path) as reader:
+        start, middle, stop = reader.record_boundaries(2)
+        first = [view.ts for view in reader.packets(start, middle)]
+    # پیش‌شرط: مرز بین پکت‌های الگودار و ادامه جریان‌ها قرار دارد
+    assert 1700000001.5 <= max(first) < 1700000042.0
+
+    def summary(workers):
+        flows, stats = analyze_pcap_parallel(path, PATTERNS, PORTS, workers=workers)
+        return stats, sorted((flow.src_port, flow.packets, flow.bytes, flow.end_reason) for flow in flows)
+
+    single_stats, single = summary(1)
+    parallel_stats, parallel = summary(2)
+    assert single_stats['ranges'] == 1 and parallel_stats['ranges'] == 2
+    assert [(port, packets, reason) for port, packets, _, reason in single] == \
+        [(40000, 6, 'fin'), (40001, 3, 'idle')]
+    assert parallel == single
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Probe planner tests
+آزمون برنامه‌ریز کاوش: حد بالا با امتیاز تأیید API، یک برنامه برای هر میزبان و مهلت پیمایش موازی
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from server.services.probe_planner import ProbePlanner
+from server.services.target_set import iter_bounded
+
+THRESHOLDS = (40, 70)
+API_PORTS = {4028}
+
+
+def port_gain(port):
+    # پورت API به خودی خود امتیاز کمی دارد ولی پاسخ واقعی آن ۹۵ است
+    return 25.0, 95.0 if port in API_PORTS else 0.0
+
+
+def api_gain(port):
+    return 0.0, 95.0
+
+
+@pytest.fixture
+def planner(tmp_path):
+    return ProbePlanner(db_path=os.path.join(tmp_path, 'probes.db'))
+
+
+def test_confirmation_keeps_api_port_in_bound(planner):
+    plan = planner.plan('10.0.0.5', [22, 23, 4028], gain_fn=port_gain, thresholds=THRESHOLDS)
+    probed = []
+    for step in plan:
+        probed.append(step.port)
+        plan.record(step, step.port == 4028)
+    assert 4028 in probed
+    # اتصال TCP تنها امتیاز را به ۹۵ نمی‌رساند
+    assert plan.score == 25.0 and plan.decision is None
+
+
+def test_api_response_confirms_only_through_score(planner):
+    plan = planner.plan('10.0.0.6', [4028], gain_fn=port_gain, thresholds=THRESHOLDS)
+    for step in plan:
+        plan.record(step, True)
+    plan.extend([4028], 'api', api_gain, score=25.0)
+    for step in plan:
+        plan.record(step, True, score=95.0)
+    assert plan.decision == 'positive'
+    assert plan.outcomes == [('tcp/4028', True), ('api/4028', True)]
+
+
+def test_session_counts_one_plan_per_host(planner):
+    planner.start_session('test')
+    for host, open_port in (('10.0.0.1', 4028), ('10.0.0.2', None), ('10.0.0.3', 3333)):
+        plan = planner.plan(host, [3333, 4028], gain_fn=port_gain, thresholds=THRESHOLDS)
+        open_ports = []
+        for step in plan:
+            hit = step.port == open_port
+            if hit:
+                open_ports.append(step.port)
+            plan.record(step, hit)
+        if open_ports:
+            plan.extend([p for p in open_ports if p in API_PORTS], 'api', api_gain, score=25.0)
+            for step in plan:
+                plan.record(step, True, score=95.0)
+        plan.finish()
+    session = planner.end_session()
+    # سه میزبان و سه نتیجه، نه یک رکورد برای هر مرحله کاوش
+    assert session.hosts == 3
+    assert session.early_positive + session.early_negative + session.ambiguous_hosts == 3
+    assert session.actual_probes <= session.expected_probes == 2 + 2 + 2 + 1
+
+
+def test_iter_bounded_times_out_stuck_work():
+    release = threading.Event()
+
+    def work(item):
+        if item == 0:
+            release.wait(5)
+        return item
+
+    started = time.monotonic()
+    results, timed_out = [], []
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for item, future in iter_bounded(executor, work, range(10), window=4, timeout=0.3):
+            try:
+                results.append(future.result(timeout=0))
+            except FutureTimeoutError:
+                timed_out.append(item)
+        elapsed = time.monotonic() - started
+        release.set()
+    assert timed_out == [0] and sorted(results) == list(range(1, 10))
+    assert elapsed < 2
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Packed ISP range database tests
+آزمون پایگاه فشرده بازه‌ها: رفت‌وبرگشت JSON ‏ISP، JSON استانی و ir.csv، خرابی checksum و بستن با نمای زنده
+"""
+
+import json
+
+import pytest
+
+from server.services.range_db import _HEADER, RangeDB, convert, verify_round_trip
+
+ISP_JSON = {
+    'Shatel': [
+        {'start_ip': '5.160.0.0', 'end_ip': '5.160.255.255', 'count': 65536, 'date': '2024-01-01'},
+        {'start_ip': '2.176.0.0', 'end_ip': '2.176.0.255', 'count': 256, 'date': ''}
+    ],
+    'TCI': [
+        {'start_ip': '2.176.1.0', 'end_ip': '2.176.1.9', 'count': 10, 'date': '2023-05-12'}
+    ]
+}
+
+PROVINCE_JSON = {
+    'Ilam': {
+        'Ilam': {'TCI': ['5.200.64.0/20', '5.200.80.0-5.200.80.99'], 'Shatel': ['5.201.0.0/24']},
+        'Mehran': {'TCI': ['5.202.0.0/23']}
+    },
+    'Kermanshah': {
+        'Kermanshah': {'Irancell': ['5.210.0.0/16']}
+    }
+}
+
+IR_CSV = """2.176.0.0,2.176.0.255,256,2024-01-01,Shatel
+5.160.0.0,5.160.255.255,65536,2023-05-12,TCI
+5.200.0.10,5.200.0.20,11,,
+bad,row
+"""
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def test_isp_json_round_trip(tmp_path):
+    source = write_json(tmp_path / 'ranges.json', ISP_JSON)
+    summary = convert([source], str(tmp_path / 'ranges.rdb'))
+    assert summary['ranges'] == 3 and summary['round_trip']['matches']
+    with RangeDB(str(tmp_path / 'ranges.rdb')) as db:
+        exported = db.to_isp_json()
+    assert {isp: sorted(r['start_ip'] for r in ranges) for isp, ranges in exported.items()} == \
+        {'Shatel': ['2.176.0.0', '5.160.0.0'], 'TCI': ['2.176.1.0']}
+
+
+def test_province_json_round_trip(tmp_path):
+    source = write_json(tmp_path / 'iran_isp_ip_ranges.json', PROVINCE_JSON)
+    summary = convert([source], str(tmp_path / 'ranges.rdb'))
+    assert summary['ranges'] == 5 and summary['round_trip']['matches']
+    with RangeDB(str(tmp_path / 'ranges.rdb')) as db:
+        regions = db.to_region_json()
+        assert db.select(province='Ilam', isp='TCI').sum() == 3
+    assert regions['Ilam']['Ilam']['TCI'] == ['5.200.64.0/20', '5.200.80.0-5.200.80.99']
+
+
+def test_ir_csv_round_trip(tmp_path):
+    source = tmp_path / 'ir.csv'
+    source.write_text(IR_CSV, encoding='utf-8')
+    summary = convert([str(source)], str(tmp_path / 'ranges.rdb'))
+    assert summary['ranges'] == 3 and summary['round_trip']['matches']
+    with RangeDB(str(tmp_path / 'ranges.rdb')) as db:
+        assert set(db.to_isp_json()) == {'Shatel', 'TCI', 'Unknown'}
+        # منبع دیگر باید ناهمخوان گزارش شود
+        assert not verify_round_trip(write_json(tmp_path / 'ranges.json', ISP_JSON), db)['matches']
+
+
+def test_corrupted_body_fails_checksum(tmp_path):
+    db_path = str(tmp_path / 'ranges.rdb')
+    convert([write_json(tmp_path / 'ranges.json', ISP_JSON)], db_path)
+    with open(db_path, 'r+b') as f:
+        f.seek(_HEADER.size + 5)
+        byte = f.read(1)
+        f.seek(_HEADER.size + 5)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match='checksum'):
+        RangeDB(db_path)
+    RangeDB(db_path, verify=False).close()
+
+
+def test_close_with_live_views(tmp_path):
+    db_path = str(tmp_path / 'ranges.rdb')
+    convert([write_json(tmp_path / 'ranges.json', ISP_JSON)], db_path)
+    db = RangeDB(db_path)
+    column, starts = db.column('isp'), db.starts
+    db.close()
+    assert len(column) == len(starts) == 3
+    # استثنای فراخواننده نباید با خطای close پوشانده شود
+    with pytest.raises(KeyError):
+        with RangeDB(db_path) as db:
+            starts = db.starts
+            raise KeyError('caller')